@@ -0,0 +1,115 @@
+"""Batch allocation (services/allocation.py) vs running /dealers/match per requirement.
+
+The baseline walks the open requirements one at a time and fills each from its
+/dealers/match ranking (largest stock first), which is what clients do today.
+Both plans are scored on allocated kg, kg*km shipped and price earned.
+
+Run from backend/:  python -m benchmarks.bench_allocation [--dealers 10000 --requirements 1000]
+"""
+import argparse
+import random
+import time
+
+from config import ALLOCATION_UNKNOWN_DISTANCE_KM
+from models import ScrapType
+from services.allocation import plan_allocation
+from services.geo import haversine_distance, has_location
+
+CITIES = [
+    (19.07, 72.88), (28.61, 77.21), (12.97, 77.59), (13.08, 80.27), (22.57, 88.36),
+    (17.39, 78.49), (18.52, 73.86), (23.02, 72.57), (26.91, 75.79), (21.15, 79.09),
+]
+SCRAP_TYPES = [t.value for t in ScrapType]
+
+
+def make_market(dealers, requirements, scrap_types=SCRAP_TYPES, seed=11):
+    rng = random.Random(seed)
+
+    def place():
+        if rng.random() < 0.02:
+            return {"latitude": None, "longitude": None}
+        city_lat, city_lon = rng.choice(CITIES)
+        return {"latitude": rng.gauss(city_lat, 0.3), "longitude": rng.gauss(city_lon, 0.3)}
+
+    reqs = [{
+        "id": f"req-{i}", "industry_id": f"industry-{i % 300}", "scrap_type": rng.choice(scrap_types),
+        "required_kg": round(rng.uniform(50, 2000), 2), "fulfilled_kg": round(rng.uniform(0, 40), 2),
+        "price_per_kg": rng.choice([None, 5, 8, 12, 20]), "profiles": place(),
+    } for i in range(requirements)]
+    inventory = [{
+        "id": f"inv-{i}", "dealer_id": f"dealer-{i}", "scrap_type": rng.choice(scrap_types),
+        "quantity_kg": round(rng.uniform(0, 150), 2), "profiles": place(),
+    } for i in range(dealers)]
+    return reqs, inventory
+
+
+def _km(requirement, stock):
+    a, b = requirement["profiles"], stock["profiles"]
+    if not has_location(a["latitude"], a["longitude"]) or not has_location(b["latitude"], b["longitude"]):
+        return ALLOCATION_UNKNOWN_DISTANCE_KM
+    return haversine_distance(a["latitude"], a["longitude"], b["latitude"], b["longitude"])
+
+
+def sequential_match(reqs, inventory):
+    """/dealers/match's ranking applied to each requirement in turn."""
+    left = {row["id"]: float(row["quantity_kg"]) for row in inventory}
+    by_type = {}
+    for row in inventory:
+        by_type.setdefault(row["scrap_type"], []).append(row)
+    plan = []
+    for requirement in reqs:
+        remaining = float(requirement["required_kg"]) - float(requirement["fulfilled_kg"])
+        ranked = sorted(
+            by_type.get(requirement["scrap_type"], []),
+            key=lambda d: min(left[d["id"]] / remaining, 1.0),
+            reverse=True,
+        )
+        for stock in ranked:
+            quantity = min(remaining, left[stock["id"]])
+            if quantity <= 0:
+                break
+            left[stock["id"]] -= quantity
+            remaining -= quantity
+            plan.append((requirement, stock, quantity))
+    return plan
+
+
+def score(plan):
+    kg = sum(q for _, _, q in plan)
+    kg_km = sum(q * _km(r, s) for r, s, q in plan)
+    earned = sum(q * float(r["price_per_kg"] or 0) for r, _, q in plan)
+    return kg, kg_km, earned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dealers", type=int, default=10_000)
+    parser.add_argument("--requirements", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{args.dealers} dealers x {args.requirements} requirements")
+    print(f"{'market':<12} {'method':<12} {'time':>9} {'allocated kg':>13} {'kg*km / kg':>11} {'earned':>12}")
+    for market, scrap_types in (("6 types", SCRAP_TYPES), ("1 type", ["iron"])):
+        reqs, inventory = make_market(args.dealers, args.requirements, scrap_types)
+
+        t0 = time.perf_counter()
+        baseline = sequential_match(reqs, inventory)
+        baseline_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = plan_allocation(reqs, inventory)
+        batch_s = time.perf_counter() - t0
+        reqs_by_id = {r["id"]: r for r in reqs}
+        stock_by_id = {s["id"]: s for s in inventory}
+        batch = [
+            (reqs_by_id[a["requirement_id"]], stock_by_id[a["inventory_id"]], a["quantity_kg"])
+            for a in result["allocations"]
+        ]
+
+        for method, plan, seconds in (("per-request", baseline, baseline_s), ("batch", batch, batch_s)):
+            kg, kg_km, earned = score(plan)
+            print(f"{market:<12} {method:<12} {seconds:8.2f}s {kg:13.0f} {kg_km / kg:11.1f} {earned:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
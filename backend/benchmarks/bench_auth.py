@@ -0,0 +1,81 @@
+"""Access-token verification throughput: signature check vs. the per-token memo.
+
+For each signing algorithm Supabase uses, `--tokens` distinct tokens (one per
+simulated user) are verified cold (signature check; the JWKS is already
+cached), then the same tokens again from TokenVerifier's memo. Either way no
+network call is made; the old alternative was one Supabase Auth round-trip
+(GET /auth/v1/user) per request.
+
+Run from backend/:  python -m benchmarks.bench_auth [--tokens 5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+SECRET = "bench-jwt-secret-with-at-least-32-bytes"
+
+
+def signing_keys():
+    """algorithm -> (private key, public JWK or None for the shared secret)"""
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return {
+        "HS256": (SECRET, None),
+        "ES256": (ec_key, json.loads(jwt.algorithms.ECAlgorithm.to_jwk(ec_key.public_key()))),
+        "RS256": (rsa_key, json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(rsa_key.public_key()))),
+    }
+
+
+def make_tokens(n, key, algorithm):
+    now = int(time.time())
+    return [
+        jwt.encode({"sub": f"user-{i}", "aud": "authenticated", "role": "authenticated", "iat": now, "exp": now + 3600},
+                   key, algorithm=algorithm, headers={"kid": "bench"} if algorithm != "HS256" else None)
+        for i in range(n)
+    ]
+
+
+async def timed(verifier, tokens):
+    t0 = time.perf_counter()
+    for token in tokens:
+        await verifier.verify(token)
+    return time.perf_counter() - t0
+
+
+async def run(n):
+    from services.auth import TokenVerifier
+
+    print(f"{n} distinct tokens per run")
+    print(f"{'algorithm':<10} {'signature check':>28} {'memo hit':>28}")
+    for algorithm, (key, public) in signing_keys().items():
+        jwks = {"keys": [{**public, "kid": "bench", "alg": algorithm}] if public else []}
+        http = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=jwks)))
+        verifier = TokenVerifier(secret=SECRET, jwks_url="http://auth/jwks", maxsize=n, http=http)
+        tokens = make_tokens(n + 1, key, algorithm)
+        await verifier.verify(tokens.pop())   # loads the JWKS
+        cold = await timed(verifier, tokens)
+        warm = await timed(verifier, tokens)
+        print(f"{algorithm:<10} " + " ".join(
+            f"{n / elapsed:>12,.0f}/s {elapsed / n * 1e6:>8.1f}µs each" for elapsed in (cold, warm)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "http://standin")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    asyncio.run(run(args.tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Onboarding burst against a stand-in Supabase Auth: direct calls vs. the auth gateway.
+
+`--users` new users sign up at once and then log in, each through a client that
+fires `--retries` extra identical requests (a flaky mobile connection retrying
+before the first answer). They come from `--ips` client addresses (campus or
+carrier NAT). The stand-in answers every Auth call after `--latency` seconds
+over a real socket.
+  direct   every request calls Supabase Auth (the old handlers)
+  gateway  services/auth_gateway.py with the configured AUTH_* limits
+
+Reported per phase: upstream Auth calls, most upstream calls at once, status
+counts and client-side p50/p99.
+
+Run from backend/:  python -m benchmarks.bench_auth_gateway [--users 300 --retries 2 --ips 100]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+PORT = 54331
+
+
+class Direct:
+    """No limits, no coalescing, no queue: what the handlers did before the gateway."""
+
+    async def call(self, kind, client_ip, email, payload, fn):
+        return await fn()
+
+
+async def burst(client, requests):
+    latencies, statuses = [], Counter()
+
+    async def one(path, body, ip):
+        t0 = time.perf_counter()
+        response = await client.post(path, json=body, headers={"X-Forwarded-For": ip})
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] += 1
+
+    await asyncio.gather(*(one(*r) for r in requests))
+    latencies.sort()
+    return statuses, statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+async def run(args):
+    from benchmarks.postgrest_standin import PostgrestStandIn, serve
+    from database import close_clients
+    from main import app
+    from routers import auth
+    from services.auth_gateway import AuthGateway
+
+    auth.AUTH_TRUST_FORWARDED_FOR = True
+    copies = 1 + args.retries
+    print(f"{args.users} users x {copies} identical requests from {args.ips} IPs, "
+          f"{args.latency * 1000:.0f}ms per Auth call")
+    print(f"{'mode':<8} {'phase':<7} {'auth calls':>10} {'peak':>5} {'p50':>8} {'p99':>8}  statuses")
+
+    for mode, gateway in (("direct", Direct()), ("gateway", AuthGateway())):
+        standin = PostgrestStandIn(latency=args.latency)
+        server = await serve(standin, PORT)
+        auth.auth_gateway = gateway
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=120) as client:
+                for phase, path, body in (
+                    ("signup", "/auth/signup", lambda i: {"email": f"u{i}@example.com", "password": "pw-123456",
+                                                          "name": f"User {i}"}),
+                    ("login", "/auth/login", lambda i: {"email": f"u{i}@example.com", "password": "pw-123456"}),
+                ):
+                    calls = standin.auth_calls
+                    standin.auth_peak = 0
+                    statuses, p50, p99 = await burst(client, [
+                        (path, body(i), f"10.0.0.{i % args.ips}") for i in range(args.users) for _ in range(copies)
+                    ])
+                    print(f"{mode:<8} {phase:<7} {standin.auth_calls - calls:>10} {standin.auth_peak:>5} "
+                          f"{p50:>6.0f}ms {p99:>6.0f}ms  {dict(sorted(statuses.items()))}")
+        finally:
+            server.should_exit = True
+            await close_clients()
+            await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--retries", type=int, default=2, help="extra identical requests per user")
+    parser.add_argument("--ips", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds per stand-in Auth call")
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Ingesting a batch of donations: POST /scrap/donate per item vs POST /scrap/donate/bulk.
+
+Runs against the PostgREST stand-in (own process, fixed per-query latency):
+  single c=1    one uploader posting items one after another
+  single c=N    the same items with N requests in flight
+  bulk array    one call with a JSON array body
+  bulk ndjson   one call streaming NDJSON
+
+Run from backend/:  python -m benchmarks.bench_bulk_donate [--latency 0.02 --items 2000]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+
+import httpx
+
+from benchmarks.loadtest_async import PORT, run_standin, wait_for_port
+
+DONOR = str(uuid.uuid5(uuid.NAMESPACE_OID, "donor"))   # seeded by loadtest_async.seed
+
+
+def donations(n):
+    return [
+        {"scrap_type": "plastic", "weight_kg": 1 + i % 20, "pickup_address": f"Block {i // 40}, Flat {i % 40}"}
+        for i in range(n)
+    ]
+
+
+async def single(client, items, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with semaphore:
+            response = await client.post("/scrap/donate", params={"user_id": DONOR}, json=item)
+            response.raise_for_status()
+
+    await asyncio.gather(*(one(item) for item in items))
+
+
+async def bulk(client, items, ndjson):
+    if ndjson:
+        async def body():
+            for item in items:
+                yield json.dumps(item).encode() + b"\n"
+        content, content_type = body(), "application/x-ndjson"
+    else:
+        content, content_type = json.dumps(items).encode(), "application/json"
+    response = await client.post(
+        "/scrap/donate/bulk", params={"user_id": DONOR}, content=content, headers={"Content-Type": content_type}
+    )
+    response.raise_for_status()
+    assert response.json()["created"] == len(items)
+
+
+async def run(n, concurrency):
+    from main import app  # imported after SUPABASE_URL points at the stand-in
+
+    items = donations(n)
+    sample = max(n // 10, 50)   # the serial run is slow; time a slice of the batch
+    scenarios = {
+        "single c=1": (sample, lambda client: single(client, items[:sample], 1)),
+        f"single c={concurrency}": (n, lambda client: single(client, items, concurrency)),
+        "bulk array": (n, lambda client: bulk(client, items, ndjson=False)),
+        "bulk ndjson": (n, lambda client: bulk(client, items, ndjson=True)),
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=600) as client:
+        print(f"{n} donations ({sample} for c=1)")
+        for name, (count, scenario) in scenarios.items():
+            t0 = time.perf_counter()
+            await scenario(client)
+            elapsed = time.perf_counter() - t0
+            print(f"{name:<14} {elapsed:7.2f}s  {count / elapsed:8.0f} donations/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stand-in query")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+
+    standin = multiprocessing.Process(target=run_standin, args=(args.latency,), daemon=True)
+    standin.start()
+    try:
+        wait_for_port(PORT)
+        asyncio.run(run(args.items, args.concurrency))
+    finally:
+        standin.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""100 partners racing to accept the same new pickup: old 4-step accept vs `claim_scrap_request`.
+
+Against the in-process PostgREST stand-in with a fixed per-query latency, every
+partner tries to accept one pending request at the same moment:
+  legacy   role, coins and request reads, then the guarded pending -> accepted update
+  claim    one claim_scrap_request call (role, coins and status checked in the UPDATE)
+Reported per round: winners (must be 1), DB calls, and how long losers waited to
+hear they lost.
+
+Run from backend/:  python -m benchmarks.bench_claim_race [--partners 100 --rounds 20]
+"""
+import argparse
+import asyncio
+import math
+import os
+import statistics
+import time
+
+
+def make_standin(partners, latency):
+    from benchmarks.postgrest_standin import PostgrestStandIn
+    from benchmarks.standin_functions import FUNCTIONS
+
+    return PostgrestStandIn(tables={
+        "profiles": [{"id": "donor", "name": "D", "role": "user", "scrap_coins": 0}]
+        + [{"id": f"p{i}", "name": f"P{i}", "role": "dealer", "scrap_coins": 10_000} for i in range(partners)],
+        "scrap_requests": [],
+    }, rpc=FUNCTIONS, latency=latency)
+
+
+# ---- The chain PUT /scrap/requests/{id}/accept ran before db_claim_migration.sql ----
+
+async def legacy_accept(client, request_id, partner_id):
+    from config import COIN_MULTIPLIERS
+
+    role, partner, request = await asyncio.gather(
+        client.table("profiles").select("role").eq("id", partner_id).single().execute(),
+        client.table("profiles").select("scrap_coins").eq("id", partner_id).single().execute(),
+        client.table("scrap_requests").select("*").eq("id", request_id).single().execute(),
+    )
+    if role.data["role"] not in ("dealer", "artist"):
+        return False
+    required = math.floor(float(request.data["weight_kg"]) * COIN_MULTIPLIERS.get(request.data["scrap_type"], 10))
+    if partner.data["scrap_coins"] < required:
+        return False
+    result = await client.table("scrap_requests").update({"partner_id": partner_id, "status": "accepted"}).eq(
+        "id", request_id).eq("status", "pending").execute()
+    return bool(result.data)
+
+
+async def claim_accept(client, request_id, partner_id):
+    from services.claims import AlreadyClaimed, claim_pickup
+
+    try:
+        await claim_pickup(client, request_id, partner_id)
+        return True
+    except AlreadyClaimed:
+        return False
+
+
+async def race(client, standin, accept, request_id, partners):
+    standin.tables["scrap_requests"].append(
+        {"id": request_id, "user_id": "donor", "scrap_type": "iron", "weight_kg": 3, "status": "pending"}
+    )
+    lost = []
+
+    async def one(partner_id):
+        t0 = time.perf_counter()
+        won = await accept(client, request_id, partner_id)
+        if not won:
+            lost.append(time.perf_counter() - t0)
+        return won
+
+    winners = sum(await asyncio.gather(*(one(f"p{i}") for i in range(partners))))
+    return winners, lost
+
+
+async def run(partners, rounds, latency):
+    from benchmarks.postgrest_standin import client_for
+
+    print(f"{partners} partners per request, {rounds} requests, {latency * 1000:.0f}ms per query")
+    for name, accept in (("legacy", legacy_accept), ("claim", claim_accept)):
+        standin = make_standin(partners, latency)
+        client = client_for(standin)
+        winners, lost = [], []
+        t0 = time.perf_counter()
+        for r in range(rounds):
+            won, waits = await race(client, standin, accept, f"r{r}", partners)
+            winners.append(won)
+            lost.extend(waits)
+        elapsed = time.perf_counter() - t0
+        lost.sort()
+        print(f"{name:<7} winners/request {min(winners)}-{max(winners)}  "
+              f"{standin.requests / (rounds * partners):.1f} calls/partner  "
+              f"loser p50 {statistics.median(lost) * 1000:6.1f}ms  p95 {lost[int(len(lost) * 0.95)] * 1000:6.1f}ms  "
+              f"{elapsed:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--partners", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per stand-in query")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "http://standin")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    asyncio.run(run(args.partners, args.rounds, args.latency))
+
+
+if __name__ == "__main__":
+    main()
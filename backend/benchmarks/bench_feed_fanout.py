@@ -0,0 +1,125 @@
+"""Delivering a new donation to N connected partners: polling vs the SSE feed.
+
+N dealers around Mumbai either
+  poll    each GET /scrap/requests/available once (what it costs every poll interval)
+  push    hold GET /scrap/requests/stream open; one POST /scrap/donate is timed
+          until every stream has received the `add` event
+The API is served by uvicorn on a real socket; the PostgREST stand-in is in-process.
+
+Run from backend/:  python -m benchmarks.bench_feed_fanout [--partners 100 1000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+
+PORT = 54331
+MARKER = "fan-out probe"
+
+
+def make_standin(partners, latency, pending=500, seed=3):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).isoformat()
+    donor = str(uuid.uuid4())
+    dealers = [str(uuid.uuid4()) for _ in range(partners)]
+    standin = PostgrestStandIn(latency=latency)
+    standin.seed("profiles", [{"id": donor, "name": "Donor", "role": "user", "phone": "1"}] + [
+        {"id": dealer, "name": "Dealer", "role": "dealer", "latitude": rng.gauss(19.07, 0.01),
+         "longitude": rng.gauss(72.88, 0.01)}
+        for dealer in dealers
+    ])
+    standin.seed("scrap_requests", [
+        {"id": str(uuid.uuid4()), "user_id": donor, "scrap_type": "iron", "weight_kg": 3, "status": "pending",
+         "latitude": rng.gauss(19.07, 0.3), "longitude": rng.gauss(72.88, 0.3), "created_at": now}
+        for _ in range(pending)
+    ])
+    return standin, donor, dealers
+
+
+async def poll(client, dealers):
+    t0 = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.get("/scrap/requests/available", params={"partner_id": dealer}) for dealer in dealers
+    ))
+    assert all(r.status_code == 200 for r in responses)
+    return time.perf_counter() - t0
+
+
+async def push(client, donor, dealers):
+    connected = 0
+    all_connected = asyncio.Event()
+    received = []
+
+    async def listen(dealer):
+        nonlocal connected
+        async with client.stream("GET", "/scrap/requests/stream", params={"partner_id": dealer}) as response:
+            async for line in response.aiter_lines():
+                if line == "event: snapshot":
+                    connected += 1
+                    if connected == len(dealers):
+                        all_connected.set()
+                elif line.startswith("data:") and MARKER in line:
+                    # Only the timed donation; the feed ticker also adds requests as radii grow
+                    received.append(time.perf_counter())
+                    return
+
+    listeners = [asyncio.create_task(listen(dealer)) for dealer in dealers]
+    await asyncio.wait_for(all_connected.wait(), 120)
+
+    t0 = time.perf_counter()
+    donated = await client.post(f"/scrap/donate?user_id={donor}", json={
+        "scrap_type": "plastic", "weight_kg": 2, "pickup_address": "Bench", "description": MARKER,
+        "latitude": 19.07, "longitude": 72.88,
+    })
+    donated.raise_for_status()
+    await asyncio.wait_for(asyncio.gather(*listeners), 120)
+    return max(received) - t0, sorted(received)[len(received) // 2] - t0
+
+
+async def run(partners, latency):
+    from database import get_db
+    from main import app
+    from routers.scrap import pending_index
+
+    print(f"{'partners':>8} {'poll once (all)':>16} {'push: last add':>16} {'push: p50 add':>14}")
+    for n in partners:
+        standin, donor, dealers = make_standin(n, latency)
+        app.dependency_overrides[get_db] = lambda: client_for(standin)
+        pending_index.invalidate()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=120) as client:
+            poll_s = await poll(client, dealers)
+            last_s, p50_s = await push(client, donor, dealers)
+        print(f"{n:>8} {poll_s * 1000:>13.0f} ms {last_s * 1000:>13.0f} ms {p50_s * 1000:>11.0f} ms")
+
+        server.should_exit = True
+        await serving
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--partners", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per stand-in query")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "http://standin")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    asyncio.run(run(args.partners, args.latency))
+
+
+if __name__ == "__main__":
+    main()
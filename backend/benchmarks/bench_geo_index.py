@@ -0,0 +1,125 @@
+"""Spatial grid index / NumPy batch filter vs. the old linear haversine scan for /scrap/requests/available.
+
+Run from backend/:  python -m benchmarks.bench_geo_index [--sizes 10000 100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from services.geo import (
+    DEFAULT_AGE_MINUTES,
+    PendingColumns,
+    PendingRequestIndex,
+    decay_radius,
+    has_location,
+    haversine_distance,
+    parse_created_at,
+)
+
+# Donations cluster around cities; a few come in without coordinates
+CITIES = [
+    (19.07, 72.88), (28.61, 77.21), (12.97, 77.59), (13.08, 80.27), (22.57, 88.36),
+    (17.39, 78.49), (18.52, 73.86), (23.02, 72.57), (26.91, 75.79), (21.15, 79.09),
+]
+
+
+def make_pending(n, now, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        if rng.random() < 0.01:
+            lat = lon = None
+        else:
+            city_lat, city_lon = rng.choice(CITIES)
+            lat = rng.gauss(city_lat, 0.4)
+            lon = rng.gauss(city_lon, 0.4)
+        created = now - timedelta(minutes=rng.uniform(0, 180))
+        rows.append({
+            "id": f"req-{i}",
+            "scrap_type": "iron",
+            "weight_kg": 5,
+            "latitude": lat,
+            "longitude": lon,
+            "created_at": created.isoformat(),
+            "status": "pending",
+        })
+    return rows
+
+
+def make_partners(n, seed=7):
+    rng = random.Random(seed)
+    partners = []
+    for _ in range(n):
+        city_lat, city_lon = rng.choice(CITIES)
+        partners.append((rng.gauss(city_lat, 0.3), rng.gauss(city_lon, 0.3)))
+    return partners
+
+
+def linear_scan(pending_requests, partner_lat, partner_lon, now):
+    """The pre-index algorithm from get_available_requests."""
+    filtered_requests = []
+    for req in pending_requests:
+        req_lat = req.get("latitude")
+        req_lon = req.get("longitude")
+        if not has_location(req_lat, req_lon):
+            filtered_requests.append(req)
+            continue
+        dist_km = haversine_distance(partner_lat, partner_lon, req_lat, req_lon)
+        created_ts = parse_created_at(req.get("created_at"))
+        age_minutes = DEFAULT_AGE_MINUTES if created_ts is None else (now.timestamp() - created_ts) / 60.0
+        if dist_km <= decay_radius(age_minutes):
+            filtered_requests.append({**req, "distance_km": round(dist_km, 1)})
+    return filtered_requests
+
+
+def bench(n, n_queries):
+    now = datetime.now(timezone.utc)
+    rows = make_pending(n, now)
+    partners = make_partners(n_queries)
+
+    t0 = time.perf_counter()
+    index = PendingRequestIndex()
+    index.rebuild(rows)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    linear_hits = sum(len(linear_scan(rows, lat, lon, now)) for lat, lon in partners)
+    linear_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    t0 = time.perf_counter()
+    index_hits = sum(len(index.nearby(lat, lon, now)) for lat, lon in partners)
+    index_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    # Whole-table NumPy filter, no grid (what the batch path does per partner)
+    columns = PendingColumns.from_rows(rows)
+    t0 = time.perf_counter()
+    for lat, lon in partners:
+        columns.within(lat, lon, now.timestamp())
+    numpy_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    # All partners' feeds at once, as the warm-feeds job computes them
+    t0 = time.perf_counter()
+    feeds = index.feeds(((i, lat, lon) for i, (lat, lon) in enumerate(partners)), now)
+    batch_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    assert linear_hits == index_hits == sum(len(f) for f in feeds.values()), (linear_hits, index_hits)
+    print(
+        f"n={n:>7}  build={build_s * 1000:8.1f} ms  "
+        f"linear={linear_ms:8.2f}  index={index_ms:7.2f}  numpy_scan={numpy_ms:7.2f}  "
+        f"batch={batch_ms:7.2f} ms/partner  "
+        f"speedup={linear_ms / index_ms:6.1f}x  avg_results={index_hits / n_queries:.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    for n in args.sizes:
+        bench(n, args.queries)
+
+
+if __name__ == "__main__":
+    main()
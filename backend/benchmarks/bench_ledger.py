@@ -0,0 +1,105 @@
+"""Coin-moving latency: old read-modify-write chains vs. the `transfer_coins` RPC.
+
+Needs a local Supabase stack (`supabase start`) with schema.sql applied; point
+SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY at it. Two throwaway users are created.
+
+Run from backend/:  python -m benchmarks.bench_ledger [--iterations 200]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from supabase import AsyncClient
+
+from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from services.ledger import transfer_coins
+
+
+async def make_user(client, role):
+    email = f"bench-{uuid.uuid4().hex[:10]}@example.com"
+    user = await client.auth.admin.create_user({"email": email, "password": uuid.uuid4().hex, "email_confirm": True})
+    await client.table("profiles").insert({
+        "id": user.user.id, "name": "bench", "email": email, "role": role, "scrap_coins": 10_000_000,
+    }).execute()
+    return user.user.id
+
+
+# ---- The chains the routers used before transfer_coins ----
+
+async def legacy_transfer(client, payer, payee, amount, check_funds):
+    payer_coins = (await client.table("profiles").select("scrap_coins").eq("id", payer).single().execute()).data["scrap_coins"]
+    if check_funds and payer_coins < amount:
+        return
+    await client.table("profiles").update({"scrap_coins": payer_coins - amount}).eq("id", payer).execute()
+    payee_coins = (await client.table("profiles").select("scrap_coins").eq("id", payee).single().execute()).data["scrap_coins"]
+    await client.table("profiles").update({"scrap_coins": payee_coins + amount}).eq("id", payee).execute()
+    await client.table("transactions").insert([
+        {"user_id": payer, "amount": -amount, "type": "purchase", "description": "bench"},
+        {"user_id": payee, "amount": amount, "type": "purchase", "description": "bench"},
+    ]).execute()
+
+
+async def legacy_mint(client, user, amount):
+    coins = (await client.table("profiles").select("scrap_coins").eq("id", user).single().execute()).data["scrap_coins"]
+    await client.table("profiles").update({"scrap_coins": coins + amount}).eq("id", user).execute()
+    await client.table("transactions").insert({"user_id": user, "amount": amount, "type": "purchase"}).execute()
+
+
+SCENARIOS = {
+    # endpoint: (legacy call, rpc call)
+    "complete_scrap_request": (
+        lambda c, a, b: legacy_transfer(c, a, b, 1, check_funds=False),
+        lambda c, a, b: transfer_coins(c, a, b, 1, "donation_reward", debit_type="pickup_cost", mode="overdraft"),
+    ),
+    "purchase_product": (
+        lambda c, a, b: legacy_transfer(c, a, b, 1, check_funds=True),
+        lambda c, a, b: transfer_coins(c, a, b, 1, "purchase"),
+    ),
+    "fulfill_requirement": (
+        lambda c, a, b: legacy_transfer(c, a, b, 1, check_funds=True),
+        lambda c, a, b: transfer_coins(c, a, b, 1, "purchase", mode="partial"),
+    ),
+    "update_contract_status": (
+        lambda c, a, b: legacy_transfer(c, a, b, 1, check_funds=True),
+        lambda c, a, b: transfer_coins(c, a, b, 1, "contract_payment", mode="skip"),
+    ),
+    "purchase_coins": (
+        lambda c, a, b: legacy_mint(c, b, 1),
+        lambda c, a, b: transfer_coins(c, None, b, 1, "purchase"),
+    ),
+}
+
+
+async def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+async def run(iterations):
+    client = AsyncClient(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    payer = await make_user(client, "industry")
+    payee = await make_user(client, "dealer")
+
+    print(f"{'endpoint':<24} {'before p50':>11} {'before p95':>11} {'after p50':>10} {'after p95':>10}")
+    for name, (legacy, rpc) in SCENARIOS.items():
+        before = await timed(lambda: legacy(client, payer, payee), iterations)
+        after = await timed(lambda: rpc(client, payer, payee), iterations)
+        print(f"{name:<24} {before[0]:9.2f}ms {before[1]:9.2f}ms {after[0]:8.2f}ms {after[1]:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
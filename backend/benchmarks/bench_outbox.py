@@ -0,0 +1,196 @@
+"""Handler latency with inline side effects vs. the transactional outbox.
+
+`--pickups` accepted pickups are completed and `--fulfillments` supplies are
+recorded, `--concurrency` at a time, against the in-process PostgREST stand-in
+with `--latency` seconds per call:
+  inline  the chains the handlers ran before the outbox: read, update, pay,
+          stock / deduct, record, pay, update progress, one round-trip after another
+  outbox  complete_scrap_request / record_fulfillment (state change + outbox row
+          in one call) while an OutboxWorker drains the events alongside
+
+Reported per flow: handler p50/p95 and, for the outbox, how long after the
+last handler returned the worker had applied everything and the largest
+backlog it reported. Last, `--backlog` pickups are completed with the worker
+stopped and then drained from cold, which gives the worker's own throughput.
+
+Run from backend/:  python -m benchmarks.bench_outbox [--pickups 1000 --fulfillments 500 --latency 0.01]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+DEALERS = 50
+
+
+def seed(standin, pickups):
+    standin.seed("profiles", [
+        *({"id": f"d{i}", "name": f"d{i}", "role": "dealer", "scrap_coins": 10**9} for i in range(DEALERS)),
+        *({"id": f"u{i}", "name": f"u{i}", "role": "user", "scrap_coins": 0} for i in range(pickups)),
+        {"id": "ind", "name": "ind", "role": "industry", "scrap_coins": 10**9},
+    ])
+    standin.seed("scrap_requests", [
+        {"id": f"r{i}", "user_id": f"u{i}", "partner_id": f"d{i % DEALERS}", "scrap_type": "iron",
+         "weight_kg": 2.5, "status": "accepted", "coins_awarded": 0}
+        for i in range(pickups)
+    ])
+    standin.seed("dealer_inventory", [
+        {"id": f"inv{i}", "dealer_id": f"d{i}", "scrap_type": "glass", "quantity_kg": 10**6} for i in range(DEALERS)
+    ])
+    standin.seed("industry_requirements", [
+        {"id": f"req{i}", "industry_id": "ind", "scrap_type": "glass", "required_kg": 10**6, "fulfilled_kg": 0,
+         "price_per_kg": 3, "status": "open"}
+        for i in range(DEALERS)
+    ])
+    standin.seed("requirement_fulfillments", [])
+
+
+# ---- The chains the handlers ran before the outbox ----
+
+async def inline_complete(db, request_id, partner_id):
+    from config import COIN_MULTIPLIERS
+    from services.inventory import add_dealer_stock
+    from services.ledger import transfer_coins
+
+    request = (await db.table("scrap_requests").select("*").eq("id", request_id).eq(
+        "partner_id", partner_id).eq("status", "accepted").single().execute()).data
+    weight_kg = float(request["weight_kg"])
+    coins = int(weight_kg * COIN_MULTIPLIERS.get(request["scrap_type"], 10))
+    _, _, role = await asyncio.gather(
+        db.table("scrap_requests").update({"status": "completed", "coins_awarded": coins}).eq("id", request_id).execute(),
+        transfer_coins(db, partner_id, request["user_id"], coins, "donation_reward", reference_id=request_id,
+                       debit_type="pickup_cost", mode="overdraft"),
+        db.table("profiles").select("role").eq("id", partner_id).single().execute(),
+    )
+    if role.data["role"] == "dealer":
+        await add_dealer_stock(db, partner_id, request["scrap_type"], weight_kg)
+
+
+async def inline_fulfill(db, requirement_id, dealer_id, kg):
+    from services.ledger import transfer_coins
+
+    _, requirement = await asyncio.gather(
+        db.table("profiles").select("role").eq("id", dealer_id).single().execute(),
+        db.table("industry_requirements").select("*").eq("id", requirement_id).single().execute(),
+    )
+    requirement = requirement.data
+    inventory = (await db.table("dealer_inventory").select("*").eq("dealer_id", dealer_id).eq(
+        "scrap_type", requirement["scrap_type"]).execute()).data[0]
+    await asyncio.gather(
+        db.table("dealer_inventory").update({"quantity_kg": float(inventory["quantity_kg"]) - kg}).eq(
+            "id", inventory["id"]).execute(),
+        db.table("requirement_fulfillments").insert({
+            "requirement_id": requirement_id, "dealer_id": dealer_id, "quantity_kg": kg, "status": "completed",
+        }).execute(),
+    )
+    await transfer_coins(db, requirement["industry_id"], dealer_id, int(kg * requirement["price_per_kg"]), "purchase",
+                         reference_id=requirement_id, mode="partial")
+    await db.table("industry_requirements").update({
+        "fulfilled_kg": float(requirement["fulfilled_kg"]) + kg, "status": "partially_fulfilled",
+    }).eq("id", requirement_id).execute()
+
+
+async def outbox_complete(db, request_id, partner_id):
+    from services.claims import complete_pickup
+    from services.outbox import outbox_worker
+
+    await complete_pickup(db, request_id, partner_id)
+    outbox_worker.wake()
+
+
+async def outbox_fulfill(db, requirement_id, dealer_id, kg):
+    from services.inventory import record_fulfillment
+    from services.outbox import outbox_worker
+
+    await record_fulfillment(db, requirement_id, dealer_id, kg)
+    outbox_worker.wake()
+
+
+async def timed_calls(calls, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(call):
+        async with slots:
+            t0 = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(one(c) for c in calls))
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95) - 1] * 1000
+
+
+async def run(args):
+    from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+    from benchmarks.standin_functions import FUNCTIONS
+    from services.claims import complete_pickup
+    from services.metrics import outbox_backlog
+    from services.outbox import outbox_worker
+
+    print(f"{args.pickups} pickups + {args.fulfillments} fulfillments, {args.concurrency} at a time, "
+          f"{args.latency * 1000:.0f}ms per database call")
+    print(f"{'mode':<7} {'flow':<8} {'p50':>8} {'p95':>8}   {'drained after':>13} {'peak backlog':>12}")
+
+    for mode, complete, fulfill in (("inline", inline_complete, inline_fulfill),
+                                    ("outbox", outbox_complete, outbox_fulfill)):
+        standin = PostgrestStandIn(rpc=FUNCTIONS, latency=args.latency)
+        seed(standin, args.pickups + args.backlog)
+        db = client_for(standin)
+        worker = asyncio.create_task(outbox_worker.run(db, poll_seconds=1)) if mode == "outbox" else None
+        peak = 0
+
+        async def watch():
+            nonlocal peak
+            while True:
+                peak = max(peak, int(outbox_backlog.value()))
+                await asyncio.sleep(0.01)
+
+        watcher = asyncio.create_task(watch())
+        for flow, calls in (
+            ("complete", [lambda i=i: complete(db, f"r{i}", f"d{i % DEALERS}") for i in range(args.pickups)]),
+            ("fulfill", [lambda i=i: fulfill(db, f"req{i % DEALERS}", f"d{i % DEALERS}", 1.0)
+                         for i in range(args.fulfillments)]),
+        ):
+            peak = 0
+            p50, p95 = await timed_calls(calls, args.concurrency)
+            line = f"{mode:<7} {flow:<8} {p50:>6.1f}ms {p95:>6.1f}ms"
+            if worker:
+                handlers_done = time.perf_counter()
+                while any(e["status"] == "pending" for e in standin.tables["outbox_events"]):
+                    await asyncio.sleep(0.005)
+                line += f"   {(time.perf_counter() - handlers_done) * 1000:>11.0f}ms {peak:>12}"
+            print(line)
+        watcher.cancel()
+        if worker:
+            worker.cancel()
+            await timed_calls([
+                lambda i=i: complete_pickup(db, f"r{i}", f"d{i % DEALERS}")
+                for i in range(args.pickups, args.pickups + args.backlog)
+            ], args.concurrency)
+            t0 = time.perf_counter()
+            while await outbox_worker.drain_once(db):
+                pass
+            elapsed = time.perf_counter() - t0
+            print(f"worker drained a backlog of {args.backlog} events in {elapsed * 1000:.0f}ms "
+                  f"({args.backlog / elapsed:,.0f} events/s, {outbox_worker.batch_size} per drain_outbox call)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pickups", type=int, default=1000)
+    parser.add_argument("--fulfillments", type=int, default=500)
+    parser.add_argument("--backlog", type=int, default=2000, help="events queued while the worker is stopped")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per stand-in call")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "http://standin")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Listing throughput with and without the response cache, and with ETag revalidation.
+
+Drives GET /products/ and GET /industry/requirements through the app against
+the PostgREST stand-in (own process, fixed per-query latency):
+  no cache     listing_cache.ttl = 0, every request queries the stand-in
+  cache        repeated identical requests are served from the worker cache
+  cache + 304  clients send If-None-Match and get empty 304s
+
+Run from backend/:  python -m benchmarks.bench_response_cache [--latency 0.02 --requests 2000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+
+import httpx
+
+from benchmarks.loadtest_async import PORT, drive, run_standin, wait_for_port
+
+PATHS = {  # name: (path, listing_cache namespace)
+    "product listing": ("/products/", "products"),
+    "requirement listing": ("/industry/requirements", "requirements"),
+}
+
+
+async def run(total, concurrency):
+    from main import app  # imported after SUPABASE_URL points at the stand-in
+    from services.response_cache import listing_cache
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        print(f"{total} requests per run, concurrency {concurrency}")
+        print(f"{'endpoint':<20} {'no cache':>16} {'cache':>16} {'cache + 304':>16}")
+        for name, (path, namespace) in PATHS.items():
+            results = []
+            etag = (await client.get(path)).headers["etag"]
+            for ttl, headers in ((0, {}), (30, {}), (30, {"If-None-Match": etag})):
+                listing_cache.ttl = ttl
+                listing_cache.invalidate(namespace)
+                client.headers.clear()
+                client.headers.update(headers)
+                rps, p50 = await drive(client, path, total, concurrency)
+                results.append(f"{rps:7.0f} req/s {p50:4.0f}ms")
+            print(f"{name:<20} " + " ".join(f"{r:>16}" for r in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stand-in query")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+
+    standin = multiprocessing.Process(target=run_standin, args=(args.latency,), daemon=True)
+    standin.start()
+    try:
+        wait_for_port(PORT)
+        asyncio.run(run(args.requests, args.concurrency))
+    finally:
+        standin.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Startup cost and connection reuse: one Supabase client per router vs. the shared pool.
+
+"per-router" builds seven default clients up front, one per router module as
+before database.py. "shared" builds the pooled client from database.py on
+first use. The same query mix is then sent through each setup against the
+PostgREST stand-in. The benchmark reports client construction time, the TCP
+connections the stand-in (its own process) saw, and request latency.
+
+Plain http:// to localhost only speaks HTTP/1.1, so a single pool needs one
+connection per in-flight request. Supabase is reached over https:// where
+HTTP/2 is negotiated and requests multiplex over a few connections. --tls serves
+the stand-in with hypercorn (pip install hypercorn) over HTTP/2 to measure that case.
+
+Run from backend/:  python -m benchmarks.bench_startup [--requests 2000 --concurrency 50]
+                    python -m benchmarks.bench_startup --tls cert.pem key.pem
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.loadtest_async import wait_for_port
+from benchmarks.postgrest_standin import PostgrestStandIn, serve
+
+PORT = 54330
+ROUTER_CLIENTS = 7  # auth (admin + anon), scrap, industry, products, coins, contracts
+
+
+def import_time(runs=5):
+    """Median wall time of a fresh `import main`, which must no longer open any client."""
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], check=True, env=os.environ)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def run_standin(connections, tls):
+    """Stand-in process; reports the number of TCP connections it saw per setup."""
+    standin = PostgrestStandIn(latency=0.005)
+    standin.seed("profiles", [{"id": str(i), "name": f"p{i}", "role": "dealer"} for i in range(20)])
+    standin.rpc["reset_peers"] = lambda s, params: connections.put(len(s.peers)) or s.peers.clear()
+
+    if tls:
+        from hypercorn.asyncio import serve as serve_h2
+        from hypercorn.config import Config
+
+        config = Config()
+        config.bind = [f"127.0.0.1:{PORT}"]
+        config.certfile, config.keyfile = tls
+        config.keep_alive_timeout = 3600
+        config.keep_alive_max_requests = 10 ** 9
+        config.loglevel = "warning"
+        asyncio.run(serve_h2(standin.app, config))
+        return
+
+    async def forever():
+        await serve(standin, PORT)
+        await asyncio.Event().wait()
+
+    asyncio.run(forever())
+
+
+async def drive(clients, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            client = clients[i % len(clients)]   # requests spread over routers
+            t0 = time.perf_counter()
+            await client.table("profiles").select("id, name").eq("role", "dealer").execute()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return total / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def run(total, concurrency, connections):
+    from supabase import AsyncClient
+    import database
+    from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+
+    t0 = time.perf_counter()
+    per_router = [AsyncClient(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY) for _ in range(ROUTER_CLIENTS)]
+    per_router_build = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    shared = database.get_db()
+    shared_build = (time.perf_counter() - t0) * 1000
+
+    print(f"import main: {import_time():.0f} ms (no clients built at import)")
+    print(f"{'setup':<12} {'build':>9} {'connections':>12} {'req/s':>9} {'p50':>9} {'p99':>9}")
+    for name, clients, build in (("shared", [shared], shared_build), ("per-router", per_router, per_router_build)):
+        await drive(clients, concurrency, concurrency)   # warm-up
+        rps, p50, p99 = await drive(clients, total, concurrency)
+        await clients[0].rpc("reset_peers", {}).execute()
+        print(f"{name:<12} {build:7.1f}ms {connections.get():>12} {rps:9.1f} {p50:7.2f}ms {p99:7.2f}ms")
+
+    for client in per_router:
+        await client.postgrest.aclose()
+    await database.close_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tls", nargs=2, metavar=("CERT", "KEY"), help="serve over HTTPS/HTTP/2 (self-signed ok)")
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"{'https' if args.tls else 'http'}://127.0.0.1:{PORT}"
+    if args.tls:
+        os.environ["SSL_CERT_FILE"] = args.tls[0]   # trusted by httpx
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    connections = multiprocessing.Queue()
+    standin = multiprocessing.Process(target=run_standin, args=(connections, args.tls), daemon=True)
+    standin.start()
+    try:
+        wait_for_port(PORT)
+        asyncio.run(run(args.requests, args.concurrency, connections))
+    finally:
+        standin.terminate()
+
+
+if __name__ == "__main__":
+    main()
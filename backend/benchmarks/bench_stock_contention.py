@@ -0,0 +1,85 @@
+"""Buyers racing for the last units: old read-check-write vs the `purchase_product` RPC.
+
+N buyers (one coroutine each) try to buy 1 unit of a product with S in stock,
+against the in-process PostgREST stand-in with a fixed per-query latency:
+  legacy   select the product, check stock, transfer coins, update stock
+  rpc      one purchase_product call (conditional decrement + payment)
+Reported: units sold vs stock (oversold when higher), wall time, DB calls.
+
+Run from backend/:  python -m benchmarks.bench_stock_contention [--buyers 500 --stock 50]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+def make_standin(buyers, stock_quantity, latency):
+    from benchmarks.postgrest_standin import PostgrestStandIn
+    from benchmarks.standin_functions import FUNCTIONS
+
+    return PostgrestStandIn(tables={
+        "profiles": [{"id": "artist", "name": "A", "role": "artist", "scrap_coins": 0}]
+        + [{"id": f"b{i}", "name": f"B{i}", "role": "user", "scrap_coins": 1000} for i in range(buyers)],
+        "products": [{"id": "p1", "artist_id": "artist", "name": "Lamp", "price_coins": 10,
+                      "stock_quantity": stock_quantity, "is_available": True}],
+    }, rpc=FUNCTIONS, latency=latency)
+
+
+# ---- The chain purchase_product used before db_stock_reservation_migration.sql ----
+
+async def legacy_purchase(client, buyer):
+    from services.ledger import transfer_coins
+
+    product = (await client.table("products").select("*").eq("id", "p1").single().execute()).data
+    if product["stock_quantity"] < 1:
+        return False
+    await transfer_coins(client, from_id=buyer, to_id=product["artist_id"], amount=product["price_coins"],
+                         type="purchase", reference_id="p1")
+    new_stock = product["stock_quantity"] - 1
+    await client.table("products").update({"stock_quantity": new_stock, "is_available": new_stock > 0}).eq(
+        "id", "p1").execute()
+    return True
+
+
+async def rpc_purchase(client, buyer):
+    from services import stock
+
+    try:
+        await stock.purchase(client, "p1", buyer, 1)
+        return True
+    except stock.OutOfStock:
+        return False
+
+
+async def run(buyers, stock_quantity, latency):
+    from benchmarks.postgrest_standin import client_for
+
+    print(f"{buyers} buyers, {stock_quantity} in stock, {latency * 1000:.0f}ms per query")
+    for name, buy in (("legacy", legacy_purchase), ("rpc", rpc_purchase)):
+        standin = make_standin(buyers, stock_quantity, latency)
+        client = client_for(standin)
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(buy(client, f"b{i}") for i in range(buyers)))
+        elapsed = time.perf_counter() - t0
+        sold = sum(results)
+        left = standin.tables["products"][0]["stock_quantity"]
+        print(f"{name:<7} sold {sold:5} (oversold {max(sold - stock_quantity, 0):5})  stock left {left:5}  "
+              f"{elapsed:6.2f}s  {standin.requests / buyers:.1f} calls/buyer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per stand-in query")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "http://standin")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    asyncio.run(run(args.buyers, args.stock, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Throughput of the API against a PostgREST stand-in with fixed per-query latency.
+
+Each scenario is driven at concurrency 1 and at --concurrency. With blocking
+database calls on the event loop the two throughputs are the same; with the
+async client they scale with concurrency until the connection pool saturates.
+
+Run from backend/:  python -m benchmarks.loadtest_async [--latency 0.02 --requests 400]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.postgrest_standin import PostgrestStandIn, serve
+
+PORT = 54329
+
+
+def seed(standin):
+    now = datetime.now(timezone.utc).isoformat()
+    donor, dealer, industry = (str(uuid.uuid5(uuid.NAMESPACE_OID, name)) for name in ("donor", "dealer", "industry"))
+    standin.seed("profiles", [
+        {"id": donor, "name": "Donor", "role": "user", "scrap_coins": 0, "latitude": 19.07, "longitude": 72.88},
+        {"id": dealer, "name": "Dealer", "role": "dealer", "scrap_coins": 10_000, "latitude": 19.08, "longitude": 72.88},
+        {"id": industry, "name": "Industry", "role": "industry", "scrap_coins": 10_000},
+    ])
+    requirement = str(uuid.uuid5(uuid.NAMESPACE_OID, "requirement"))
+    standin.seed("industry_requirements", [{
+        "id": requirement, "industry_id": industry, "scrap_type": "iron", "required_kg": 100,
+        "fulfilled_kg": 0, "status": "open", "created_at": now, "profiles": {"name": "Industry"},
+    }])
+    standin.seed("requirement_fulfillments", [
+        {"id": str(uuid.uuid4()), "requirement_id": requirement, "dealer_id": dealer, "quantity_kg": 5}
+        for _ in range(5)
+    ])
+    standin.seed("scrap_requests", [
+        {"id": str(uuid.uuid4()), "user_id": donor, "scrap_type": "iron", "weight_kg": 3, "status": "pending",
+         "latitude": 19.07, "longitude": 72.88, "created_at": now, "profiles": {"name": "Donor"}}
+        for _ in range(50)
+    ])
+    standin.seed("products", [
+        {"id": str(uuid.uuid4()), "artist_id": dealer, "name": f"Art {i}", "is_available": True,
+         "stock_quantity": 3, "price_coins": 10, "created_at": now}
+        for i in range(20)
+    ])
+    return {
+        "requirement detail": f"/industry/requirements/{requirement}",
+        "available requests": f"/scrap/requests/available?partner_id={dealer}",
+        "product listing": "/products/",
+    }
+
+
+async def drive(client, path, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            response = await client.get(path)
+            if response.is_error:   # 304 revalidations count as successes
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - t0
+    return total / elapsed, statistics.median(latencies) * 1000
+
+
+def run_standin(latency):
+    """Stand-in process, so its CPU time does not compete with the API under test."""
+    standin = PostgrestStandIn(latency=latency)
+    seed(standin)
+
+    async def forever():
+        await serve(standin, PORT)
+        await asyncio.Event().wait()
+
+    asyncio.run(forever())
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"stand-in did not start on port {port}")
+
+
+async def run(latency, total, concurrency):
+    scenarios = seed(PostgrestStandIn())  # same deterministic ids as the stand-in process
+
+    from main import app  # imported after SUPABASE_URL points at the stand-in
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        print(f"stand-in latency {latency * 1000:.0f} ms/query, {total} requests per run")
+        for name, path in scenarios.items():
+            serial_rps, serial_p50 = await drive(client, path, max(total // 10, 20), 1)
+            rps, p50 = await drive(client, path, total, concurrency)
+            print(
+                f"{name:<20} c=1: {serial_rps:7.1f} req/s (p50 {serial_p50:6.1f} ms)   "
+                f"c={concurrency}: {rps:7.1f} req/s (p50 {p50:6.1f} ms)   gain {rps / serial_rps:5.1f}x"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stand-in query")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+
+    standin = multiprocessing.Process(target=run_standin, args=(args.latency,), daemon=True)
+    standin.start()
+    try:
+        wait_for_port(PORT)
+        asyncio.run(run(args.latency, args.requests, args.concurrency))
+    finally:
+        standin.terminate()
+
+
+if __name__ == "__main__":
+    main()
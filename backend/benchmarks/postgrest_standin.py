@@ -0,0 +1,299 @@
+"""In-memory stand-in for the slice of PostgREST the routers use, with injectable latency.
+
+Serves /rest/v1/<table> (select with eq/gt/in filters and or=(...) trees, column
+projection, order, limit, single-object responses, insert, update) and /rest/v1/rpc/<function> from Python dicts, so
+the API can be load-tested offline. Also serves the Supabase Auth email/password
+signup and sign-in (/auth/v1/signup, /auth/v1/token). Every response is delayed
+by `latency` seconds to stand in for the network + database round-trip.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns", "or"}
+
+
+def _coerce(value):
+    if value == "null":
+        return None
+    if value in ("true", "false"):
+        return value == "true"
+    return value
+
+
+def _split_top(text):
+    """Split on commas that are not inside parentheses or double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _matches_tree(row, conjunction, terms):
+    """Evaluate an or=(...)/and(...) logic tree of `column.op.value` terms."""
+    results = []
+    for term in _split_top(terms):
+        if term.startswith(("and(", "or(")):
+            name, _, inner = term.partition("(")
+            results.append(_matches_tree(row, name, inner[:-1]))
+        else:
+            column, _, expression = term.partition(".")
+            results.append(_matches(row, column, expression))
+    return any(results) if conjunction == "or" else all(results)
+
+
+def _project(row, select):
+    """Keep the selected columns; embedded resources are kept under their alias or table name."""
+    if not select or select == "*":
+        return dict(row)
+    projected = {}
+    for item in _split_top(select.replace(" ", "")):
+        if item == "*":
+            projected.update({k: v for k, v in row.items() if not isinstance(v, (dict, list))})
+            continue
+        name = item.split("(")[0]
+        alias, _, target = name.partition(":")
+        key = alias if target else name.split("!")[0]
+        if key in row:
+            projected[key] = row[key]
+    return projected
+
+
+def _matches(row, column, expression):
+    op, _, raw = expression.partition(".")
+    if op != "in":
+        raw = raw.strip('"')
+    value = row.get(column)
+    if op == "eq":
+        return _same(value, _coerce(raw))
+    if op == "neq":
+        return not _same(value, _coerce(raw))
+    if op in ("gt", "gte", "lt", "lte"):
+        if value is None:
+            return False
+        left, right = _comparable(value, raw)
+        return {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[op]
+    if op == "in":
+        options = [_coerce(v.strip('"')) for v in raw.strip("()").split(",") if v]
+        return any(_same(value, option) for option in options)
+    if op == "is":
+        return value is _coerce(raw)
+    raise ValueError(f"unsupported filter operator: {op}")
+
+
+def _same(value, raw):
+    if raw is None or isinstance(raw, bool):
+        return value is raw
+    if str(value) == raw:
+        return True
+    left, right = _comparable(value, raw)
+    return left == right
+
+
+def _comparable(value, raw):
+    try:
+        return float(value), float(raw)
+    except (TypeError, ValueError):
+        return str(value), str(raw)
+
+
+class RPCError(Exception):
+    """Raised by RPC handlers to answer like a plpgsql RAISE EXCEPTION."""
+
+    def __init__(self, message, details=None, code="P0001"):
+        super().__init__(message)
+        self.message = message
+        self.details = details
+        self.code = code   # SQLSTATE, e.g. 40001 for a serialization failure
+
+
+class PostgrestStandIn:
+    def __init__(self, tables=None, rpc=None, latency=0.0, record=False):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.rpc = dict(rpc or {})   # function name -> callable(standin, params) -> json
+        self.latency = latency
+        self.requests = 0
+        # (method, table, [(param, value), ...]) of every table request, when recording
+        self.queries = [] if record else None
+        self.peers = set()   # client (host, port) pairs seen, i.e. TCP connections opened
+        self.users = {}   # email -> Supabase Auth user (with its password)
+        self.auth_calls = 0
+        self.auth_in_flight = 0
+        self.auth_peak = 0   # most auth calls seen in flight at once
+        self.app = Starlette(routes=[
+            Route("/auth/v1/signup", self.handle_signup, methods=["POST"]),
+            Route("/auth/v1/token", self.handle_token, methods=["POST"]),
+            Route("/rest/v1/rpc/{function}", self.handle_rpc, methods=["GET", "POST"]),
+            Route("/rest/v1/{table}", self.handle_table, methods=["GET", "POST", "PATCH", "DELETE"]),
+        ])
+
+    def seed(self, table, rows):
+        self.tables.setdefault(table, []).extend(rows)
+
+    def _filtered(self, table, params):
+        rows = self.tables.setdefault(table, [])
+        for column, expression in params.multi_items():
+            if column in RESERVED_PARAMS:
+                continue
+            rows = [r for r in rows if _matches(r, column, expression)]
+        if "or" in params:
+            rows = [r for r in rows if _matches_tree(r, "or", params["or"][1:-1])]
+        return rows
+
+    async def _respond(self, request, data, status=200):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(data) != 1:
+                return JSONResponse(
+                    {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                     "details": f"The result contains {len(data)} rows", "hint": None},
+                    status_code=406,
+                )
+            data = data[0]
+        if "return=minimal" in request.headers.get("prefer", ""):
+            return Response(status_code=204 if status == 200 else status)
+        return JSONResponse(data, status_code=status)
+
+    def _count(self, request):
+        self.requests += 1
+        if request.client:
+            self.peers.add((request.client.host, request.client.port))
+
+    async def handle_table(self, request: Request):
+        self._count(request)
+        table = request.path_params["table"]
+        params = request.query_params
+        if self.queries is not None:
+            self.queries.append((request.method, table, params.multi_items()))
+
+        if request.method == "GET":
+            rows = self._filtered(table, params)
+            order = params.get("order")
+            if order:
+                for term in reversed(order.split(",")):
+                    column, _, direction = term.partition(".")
+                    rows = sorted(
+                        rows,
+                        key=lambda r: (r.get(column) is None, r.get(column) if r.get(column) is not None else ""),
+                        reverse=direction.startswith("desc"),
+                    )
+            offset = int(params.get("offset", 0))
+            if "limit" in params:
+                rows = rows[offset:offset + int(params["limit"])]
+            return await self._respond(request, [_project(r, params.get("select")) for r in rows])
+
+        if request.method == "POST":
+            body = json.loads(await request.body())
+            inserted = []
+            for row in body if isinstance(body, list) else [body]:
+                row = {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat(), **row}
+                self.tables.setdefault(table, []).append(row)
+                inserted.append(dict(row))
+            return await self._respond(request, inserted, status=201)
+
+        if request.method == "PATCH":
+            changes = json.loads(await request.body())
+            rows = self._filtered(table, params)
+            for row in rows:
+                row.update(changes)
+            return await self._respond(request, [dict(r) for r in rows])
+
+        rows = self._filtered(table, params)
+        self.tables[table] = [r for r in self.tables[table] if r not in rows]
+        return await self._respond(request, [dict(r) for r in rows])
+
+    async def handle_rpc(self, request: Request):
+        self._count(request)
+        function = request.path_params["function"]
+        params = json.loads(await request.body() or b"{}")
+        handler = self.rpc.get(function)
+        if handler is None:
+            return JSONResponse({"code": "PGRST202", "message": f"function {function} not found"}, status_code=404)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            return JSONResponse(handler(self, params))
+        except RPCError as e:
+            return JSONResponse(
+                {"code": e.code, "message": e.message, "details": e.details, "hint": None}, status_code=400
+            )
+
+
+    async def _auth(self, request, answer):
+        self._count(request)
+        self.auth_calls += 1
+        self.auth_in_flight += 1
+        self.auth_peak = max(self.auth_peak, self.auth_in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            status, body = answer(json.loads(await request.body()))
+            return JSONResponse(body, status_code=status)
+        finally:
+            self.auth_in_flight -= 1
+
+    def _session(self, user):
+        public = {k: v for k, v in user.items() if k != "password"}
+        return {"access_token": f"standin-{uuid.uuid4()}", "refresh_token": str(uuid.uuid4()),
+                "token_type": "bearer", "expires_in": 3600, "user": public}
+
+    async def handle_signup(self, request: Request):
+        def answer(body):
+            if body["email"] in self.users:
+                return 422, {"code": 422, "error_code": "user_already_exists", "msg": "User already registered"}
+            now = datetime.now(timezone.utc).isoformat()
+            user = self.users[body["email"]] = {
+                "id": str(uuid.uuid4()), "aud": "authenticated", "role": "authenticated", "email": body["email"],
+                "app_metadata": {"provider": "email"}, "user_metadata": body.get("data") or {},
+                "created_at": now, "email_confirmed_at": now, "password": body["password"],
+            }
+            return 200, self._session(user)
+        return await self._auth(request, answer)
+
+    async def handle_token(self, request: Request):
+        def answer(body):
+            user = self.users.get(body.get("email"))
+            if user is None or user["password"] != body.get("password"):
+                return 400, {"code": 400, "error_code": "invalid_credentials", "msg": "Invalid login credentials"}
+            return 200, self._session(user)
+        return await self._auth(request, answer)
+
+
+async def serve(standin, port):
+    """Start the stand-in on 127.0.0.1:`port` inside the running loop; returns the server."""
+    server = uvicorn.Server(uvicorn.Config(standin.app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.get_running_loop().create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+def client_for(standin, key="service"):
+    """Supabase client wired to the stand-in in-process (no socket), e.g. for dependency overrides."""
+    from supabase import AsyncClient
+    from supabase.lib.client_options import AsyncClientOptions
+    from services.metrics import db_event_hooks
+
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=standin.app), event_hooks=db_event_hooks())
+    return AsyncClient("http://standin", key, AsyncClientOptions(httpx_client=http))
@@ -0,0 +1,544 @@
+"""Python mirrors of the Postgres functions the routers call, for PostgrestStandIn(rpc=FUNCTIONS).
+
+Each takes (standin, params) like a stand-in RPC handler and follows the SQL
+in schema.sql / the db_*_migration.sql files closely enough for load tests:
+same results, same errors, same rows written. The rollup triggers
+(db_rollup_migration.sql) are called where the rows they watch are written.
+"""
+import json
+import math
+import uuid
+import weakref
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.postgrest_standin import RPCError
+
+
+def _profiles(standin):
+    return {p["id"]: p for p in standin.tables.setdefault("profiles", [])}
+
+
+def _ledger(standin, user_id, amount, type, reference_id, description):
+    row = {
+        "id": str(uuid.uuid4()), "user_id": user_id, "amount": amount, "type": type,
+        "reference_id": reference_id, "description": description,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    standin.tables.setdefault("transactions", []).append(row)
+    _rollup_transaction(standin, row)
+
+
+# ---- Rollups (db_rollup_migration.sql) ----
+
+_rollup_rows = weakref.WeakKeyDictionary()   # standin -> {table: (rows list, {key: row})}
+
+
+def _rollup_row(standin, table, key, columns):
+    rows = standin.tables.setdefault(table, [])
+    indexed, index = _rollup_rows.setdefault(standin, {}).get(table, (None, None))
+    if indexed is not rows:   # first use, or the table was replaced
+        index = {tuple(r[c] for c in columns): r for r in rows}
+        _rollup_rows[standin][table] = (rows, index)
+    row = index.get(key)
+    if row is None:
+        row = {**dict(zip(columns, key)), "value": 0}
+        rows.append(row)
+        index[key] = row
+    return row
+
+
+def _bump_rollup(standin, subject, scrap_type, amounts, at=None):
+    """bump_rollup; `amounts` is {metric: amount}, `at` an ISO timestamp (default now)."""
+    if subject is None:
+        return
+    day = (at or datetime.now(timezone.utc).isoformat())[:10]
+    for metric, amount in amounts.items():
+        _rollup_row(standin, "rollup_totals", (subject, metric, scrap_type or ""),
+                    ("subject_id", "metric", "scrap_type"))["value"] += amount
+        _rollup_row(standin, "rollup_daily", (subject, day, metric, scrap_type or ""),
+                    ("subject_id", "day", "metric", "scrap_type"))["value"] += amount
+
+
+def _rollup_pickup(standin, request, at=None):
+    """The scrap_requests_rollup trigger: `request` was just completed."""
+    kg = float(request["weight_kg"])
+    _bump_rollup(standin, request["user_id"], request["scrap_type"], {"donated_kg": kg, "donations": 1}, at)
+    _bump_rollup(standin, request.get("partner_id"), request["scrap_type"], {"collected_kg": kg, "pickups": 1}, at)
+
+
+def _rollup_fulfillment(standin, fulfillment):
+    """The requirement_fulfillments_rollup trigger."""
+    requirement = next((r for r in standin.tables.setdefault("industry_requirements", [])
+                        if r["id"] == fulfillment["requirement_id"]), None)
+    if requirement is None or fulfillment.get("status") != "completed":
+        return
+    kg, at = float(fulfillment["quantity_kg"]), fulfillment.get("created_at")
+    _bump_rollup(standin, fulfillment["dealer_id"], requirement["scrap_type"], {"supplied_kg": kg, "fulfillments": 1}, at)
+    _bump_rollup(standin, requirement["industry_id"], requirement["scrap_type"], {"received_kg": kg, "fulfillments": 1}, at)
+
+
+def _rollup_coin_metrics(standin, type, reference, amount):
+    """rollup_coin_metrics: (scrap_type, {metric: amount}) or None. Ids are unique across
+    tables, so the table the type points at is searched first (the SQL looks each up by key)."""
+    if not amount:
+        return None
+    coins = "coins_earned" if amount > 0 else "coins_spent"
+    if reference is None:
+        return ("", {"coins_bought": amount}) if type == "purchase" and amount > 0 else None
+    tables = ("products", "industry_requirements", "scrap_requests")
+    for table in reversed(tables) if type in ("donation_reward", "pickup_cost") else tables:
+        row = next((r for r in standin.tables.get(table, []) if r["id"] == reference), None)
+        if row is None:
+            continue
+        if table == "products":
+            return "", {"sales" if amount > 0 else "purchases": 1, coins: abs(amount)}
+        return row["scrap_type"], {coins: abs(amount)}
+    return None
+
+
+def _rollup_transaction(standin, row):
+    """The transactions_rollup trigger."""
+    metrics = _rollup_coin_metrics(standin, row["type"], row.get("reference_id"), row["amount"])
+    if metrics is not None:
+        _bump_rollup(standin, row["user_id"], metrics[0], metrics[1], row.get("created_at"))
+
+
+def rebuild_rollups(standin, params):
+    """rebuild_rollups (db_rollup_migration.sql)."""
+    standin.tables["rollup_totals"], standin.tables["rollup_daily"] = [], []
+    for request in standin.tables.get("scrap_requests", []):
+        if request["status"] == "completed":
+            _rollup_pickup(standin, request, request.get("updated_at"))
+    for fulfillment in standin.tables.get("requirement_fulfillments", []):
+        _rollup_fulfillment(standin, fulfillment)
+    for row in standin.tables.get("transactions", []):
+        _rollup_transaction(standin, row)
+    return {
+        "profiles": len({r["subject_id"] for r in standin.tables["rollup_totals"]}),
+        "total_rows": len(standin.tables["rollup_totals"]),
+        "daily_rows": len(standin.tables["rollup_daily"]),
+    }
+
+
+def transfer_coins(standin, params):
+    """transfer_coins (schema.sql)."""
+    profiles = _profiles(standin)
+    amount = params["p_amount"]
+    if amount is None or amount < 0:
+        raise RPCError(f"invalid_amount: {amount}")
+    payer, payee = params.get("p_from"), params.get("p_to")
+    for user_id in (payer, payee):
+        if user_id is not None and user_id not in profiles:
+            raise RPCError(f"profile_not_found: {user_id}")
+
+    if payer is not None:
+        balance = profiles[payer]["scrap_coins"]
+        if balance < amount:
+            mode = params.get("p_mode") or "require"
+            if mode == "require":
+                raise RPCError("insufficient_coins", json.dumps({"balance": balance, "needed": amount}))
+            if mode == "partial":
+                amount = max(balance, 0)
+            elif mode == "skip":
+                amount = 0
+
+    if amount > 0:
+        reference = params.get("p_reference_id")
+        if payer is not None:
+            profiles[payer]["scrap_coins"] -= amount
+            _ledger(standin, payer, -amount, params.get("p_debit_type") or params["p_type"], reference,
+                    (params.get("p_debit_description") or "").replace("{amount}", str(amount)))
+        if payee is not None:
+            profiles[payee]["scrap_coins"] += amount
+            _ledger(standin, payee, amount, params["p_type"], reference,
+                    (params.get("p_credit_description") or "").replace("{amount}", str(amount)))
+
+    return {
+        "amount": amount,
+        "from_balance": profiles[payer]["scrap_coins"] if payer is not None else None,
+        "to_balance": profiles[payee]["scrap_coins"] if payee is not None else None,
+    }
+
+
+def coin_balance(standin, params):
+    """coin_balance (db_balance_migration.sql); the stand-in keeps no snapshots."""
+    if params["p_user"] not in _profiles(standin):
+        return None
+    ledger = [t["amount"] for t in standin.tables.setdefault("transactions", []) if t["user_id"] == params["p_user"]]
+    return {"balance": sum(ledger), "snapshot_balance": None, "covered_until": None,
+            "delta": sum(ledger), "delta_count": len(ledger)}
+
+
+def complete_scrap_requests(standin, params):
+    """complete_scrap_requests (db_batch_complete_migration.sql)."""
+    from config import COIN_MULTIPLIERS  # not at import time: benchmarks set SUPABASE_URL first
+
+    profiles = _profiles(standin)
+    partner = profiles.get(params["p_partner"])
+    if partner is None:
+        raise RPCError(f"profile_not_found: {params['p_partner']}")
+    ids = params["p_ids"]
+    batch = [
+        r for r in standin.tables.setdefault("scrap_requests", [])
+        if r["id"] in ids and r.get("partner_id") == partner["id"] and r["status"] == "accepted"
+    ]
+
+    stock = {}
+    for r in batch:
+        weight = float(r["weight_kg"])
+        coins = math.floor(weight * COIN_MULTIPLIERS.get(r["scrap_type"], 10))
+        r.update(status="completed", coins_awarded=coins)
+        _rollup_pickup(standin, r)
+        profiles[r["user_id"]]["scrap_coins"] += coins
+        partner["scrap_coins"] -= coins
+        if coins > 0:
+            _ledger(standin, partner["id"], -coins, "pickup_cost", r["id"],
+                    f"Spent {coins} coins to collect {weight}kg of {r['scrap_type']}")
+            _ledger(standin, r["user_id"], coins, "donation_reward", r["id"],
+                    f"Earned {coins} coins for donating {weight}kg of {r['scrap_type']}")
+        stock[r["scrap_type"]] = stock.get(r["scrap_type"], 0) + weight
+
+    inventory = []
+    if partner["role"] == "dealer":
+        rows = standin.tables.setdefault("dealer_inventory", [])
+        for scrap_type, kg in stock.items():
+            row = next((i for i in rows if i["dealer_id"] == partner["id"] and i["scrap_type"] == scrap_type), None)
+            if row is None:
+                row = {"id": str(uuid.uuid4()), "dealer_id": partner["id"], "scrap_type": scrap_type, "quantity_kg": 0}
+                rows.append(row)
+            row["quantity_kg"] = float(row["quantity_kg"]) + kg
+            inventory.append({k: v for k, v in row.items() if k != "profiles"})
+
+    done = {r["id"] for r in batch}
+    return {
+        "completed": [{k: r[k] for k in ("id", "user_id", "scrap_type", "weight_kg", "coins_awarded")} for r in batch],
+        "skipped": [i for i in ids if i not in done],
+        "inventory": inventory,
+        "balances": {p: profiles[p]["scrap_coins"] for p in {partner["id"], *(r["user_id"] for r in batch)}},
+    }
+
+
+def claim_scrap_request(standin, params):
+    """claim_scrap_request (db_claim_migration.sql)."""
+    from config import COIN_MULTIPLIERS
+
+    partner = _profiles(standin).get(params["p_partner"])
+    request = next((r for r in standin.tables.setdefault("scrap_requests", []) if r["id"] == params["p_request"]), None)
+    if partner is None or partner["role"] not in ("dealer", "artist"):
+        raise RPCError(f"not_a_partner: {params['p_partner']}")
+    if request is None:
+        raise RPCError(f"request_not_found: {params['p_request']}")
+    if request["status"] != "pending":
+        raise RPCError("already_claimed", json.dumps({"status": request["status"]}))
+    required = math.floor(float(request["weight_kg"]) * COIN_MULTIPLIERS.get(request["scrap_type"], 10))
+    if (partner["scrap_coins"] or 0) < required:
+        raise RPCError("insufficient_coins", json.dumps({"balance": partner["scrap_coins"], "needed": required}))
+    request.update(partner_id=partner["id"], status="accepted", updated_at=datetime.now(timezone.utc).isoformat())
+    return {k: v for k, v in request.items() if k != "profiles"}
+
+
+def add_dealer_inventory(standin, params):
+    """add_dealer_inventory (db_index_migration.sql)."""
+    rows = standin.tables.setdefault("dealer_inventory", [])
+    row = next((i for i in rows if i["dealer_id"] == params["p_dealer"] and i["scrap_type"] == params["p_scrap_type"]), None)
+    if row is None:
+        row = {"id": str(uuid.uuid4()), "dealer_id": params["p_dealer"], "scrap_type": params["p_scrap_type"], "quantity_kg": 0}
+        rows.append(row)
+    row["quantity_kg"] = float(row["quantity_kg"]) + float(params["p_kg"])
+    return {k: v for k, v in row.items() if k != "profiles"}
+
+
+def _enqueue(standin, kind, key, payload):
+    """INSERT INTO outbox_events ... ON CONFLICT (idempotency_key) DO NOTHING RETURNING id"""
+    events = standin.tables.setdefault("outbox_events", [])
+    if any(e["idempotency_key"] == key for e in events):
+        return None
+    now = datetime.now(timezone.utc).isoformat()
+    events.append({
+        "id": len(events) + 1, "kind": kind, "idempotency_key": key, "payload": payload, "status": "pending",
+        "attempts": 0, "available_at": now, "last_error": None, "created_at": now, "processed_at": None,
+    })
+    return len(events)
+
+
+def complete_scrap_request(standin, params):
+    """complete_scrap_request (db_outbox_migration.sql)."""
+    from config import COIN_MULTIPLIERS
+
+    request = next((
+        r for r in standin.tables.setdefault("scrap_requests", [])
+        if r["id"] == params["p_request"] and r.get("partner_id") == params["p_partner"] and r["status"] == "accepted"
+    ), None)
+    if request is None:
+        raise RPCError(f"request_not_found: {params['p_request']}")
+    coins = math.floor(float(request["weight_kg"]) * COIN_MULTIPLIERS.get(request["scrap_type"], 10))
+    request.update(status="completed", coins_awarded=coins)
+    _rollup_pickup(standin, request)
+    profiles = _profiles(standin)
+    partner = profiles.get(params["p_partner"])
+    donor = profiles.get(request["user_id"])
+    balance = donor and donor["scrap_coins"] + (coins if donor["id"] != params["p_partner"] else 0)
+    event = _enqueue(standin, "pickup_completed", f"pickup_completed:{request['id']}", {
+        "request_id": request["id"], "user_id": request["user_id"], "partner_id": params["p_partner"],
+        "partner_role": partner and partner["role"], "scrap_type": request["scrap_type"],
+        "weight_kg": request["weight_kg"], "coins": coins,
+    })
+    return {**{k: request[k] for k in ("id", "user_id", "scrap_type", "weight_kg", "coins_awarded")},
+            "new_balance": balance, "event_id": event}
+
+
+def record_fulfillment(standin, params):
+    """record_fulfillment (db_outbox_migration.sql)."""
+    kg = params["p_kg"]
+    if kg is None or kg <= 0:
+        raise RPCError(f"invalid_quantity: {kg}")
+    requirement = next((
+        r for r in standin.tables.setdefault("industry_requirements", []) if r["id"] == params["p_requirement"]
+    ), None)
+    if requirement is None:
+        raise RPCError(f"requirement_not_found: {params['p_requirement']}")
+    if requirement["status"] == "closed":
+        raise RPCError("requirement_closed")
+    kg = min(float(kg), float(requirement["required_kg"]) - float(requirement["fulfilled_kg"]))
+    if kg <= 0:
+        raise RPCError("requirement_full")
+
+    scrap_type = requirement["scrap_type"]
+    inventory = next((
+        i for i in standin.tables.setdefault("dealer_inventory", [])
+        if i["dealer_id"] == params["p_dealer"] and i["scrap_type"] == scrap_type
+    ), None)
+    if inventory is None or float(inventory["quantity_kg"]) < kg:
+        raise RPCError("insufficient_inventory", json.dumps({
+            "available": inventory and float(inventory["quantity_kg"]), "needed": kg, "scrap_type": scrap_type,
+        }))
+    inventory["quantity_kg"] = float(inventory["quantity_kg"]) - kg
+
+    fulfillment = {"id": str(uuid.uuid4()), "requirement_id": requirement["id"], "dealer_id": params["p_dealer"],
+                   "quantity_kg": kg, "status": "completed", "created_at": datetime.now(timezone.utc).isoformat()}
+    standin.tables.setdefault("requirement_fulfillments", []).append(fulfillment)
+    _rollup_fulfillment(standin, fulfillment)
+    fulfilled = float(requirement["fulfilled_kg"]) + kg
+    requirement.update(fulfilled_kg=fulfilled,
+                       status="closed" if fulfilled >= float(requirement["required_kg"]) else "partially_fulfilled")
+
+    cost = math.floor(kg * float(requirement.get("price_per_kg") or 0))
+    event, earned = None, 0
+    if cost > 0:
+        industry = _profiles(standin).get(requirement["industry_id"])
+        earned = industry and min(cost, max(industry["scrap_coins"], 0))
+        event = _enqueue(standin, "requirement_fulfilled", f"requirement_fulfilled:{fulfillment['id']}", {
+            "fulfillment_id": fulfillment["id"], "requirement_id": requirement["id"],
+            "industry_id": requirement["industry_id"], "dealer_id": params["p_dealer"],
+            "scrap_type": scrap_type, "quantity_kg": kg, "coins": cost,
+        })
+    return {
+        "fulfillment_id": fulfillment["id"], "scrap_type": scrap_type, "quantity_kg": kg,
+        "fulfilled_kg": fulfilled, "required_kg": requirement["required_kg"], "status": requirement["status"],
+        "inventory": {k: v for k, v in inventory.items() if k != "profiles"}, "coins_due": cost,
+        "coins_earned": earned, "coins_pending": None if earned is None else cost - earned, "event_id": event,
+    }
+
+
+def _apply_outbox_event(standin, kind, payload):
+    """apply_outbox_event (db_outbox_migration.sql)."""
+    if kind == "pickup_completed":
+        weight, scrap_type, coins = payload["weight_kg"], payload["scrap_type"], payload["coins"]
+        transfer = transfer_coins(standin, {
+            "p_from": payload["partner_id"], "p_to": payload["user_id"], "p_amount": coins,
+            "p_type": "donation_reward", "p_debit_type": "pickup_cost", "p_reference_id": payload["request_id"],
+            "p_mode": "overdraft",
+            "p_debit_description": f"Spent {coins} coins to collect {weight}kg of {scrap_type}",
+            "p_credit_description": f"Earned {coins} coins for donating {weight}kg of {scrap_type}",
+        })
+        inventory = None
+        if payload["partner_role"] == "dealer":
+            inventory = add_dealer_inventory(standin, {
+                "p_dealer": payload["partner_id"], "p_scrap_type": scrap_type, "p_kg": weight,
+            })
+        return {"transfer": transfer, "inventory": inventory}
+    if kind == "requirement_fulfilled":
+        kg, scrap_type = payload["quantity_kg"], payload["scrap_type"]
+        return {"transfer": transfer_coins(standin, {
+            "p_from": payload["industry_id"], "p_to": payload["dealer_id"], "p_amount": payload["coins"],
+            "p_type": "purchase", "p_reference_id": payload["requirement_id"], "p_mode": "partial",
+            "p_debit_description": f"Paid {{amount}} coins for {kg}kg {scrap_type}",
+            "p_credit_description": f"Earned {{amount}} coins for supplying {kg}kg {scrap_type}",
+        })}
+    raise RPCError(f"unknown_outbox_kind: {kind}")
+
+
+def drain_outbox(standin, params):
+    """drain_outbox (db_outbox_migration.sql); the effects above fail before writing anything,
+    which stands in for the per-event subtransaction."""
+    now = datetime.now(timezone.utc)
+    pending = [e for e in standin.tables.setdefault("outbox_events", []) if e["status"] == "pending"]
+    due = sorted((e for e in pending if datetime.fromisoformat(e["available_at"]) <= now),
+                 key=lambda e: (e["available_at"], e["id"]))[:params["p_limit"]]
+    events = []
+    for event in due:
+        report = {"id": event["id"], "kind": event["kind"], "attempts": event["attempts"] + 1}
+        try:
+            report["result"] = _apply_outbox_event(standin, event["kind"], event["payload"])
+            event.update(status="done", processed_at=now.isoformat(), last_error=None)
+            report["status"] = "done"
+        except RPCError as e:
+            dead = event["attempts"] + 1 >= params["p_max_attempts"]
+            retry_at = now + timedelta(seconds=params["p_retry_seconds"] * 2 ** event["attempts"])
+            event.update(status="dead" if dead else "pending", last_error=e.message, available_at=retry_at.isoformat())
+            report.update(status="dead" if dead else "retry", error=e.message)
+        event["attempts"] += 1
+        events.append(report)
+
+    pending = [e for e in standin.tables["outbox_events"] if e["status"] == "pending"]
+    return {
+        "events": events,
+        "backlog": len(pending),
+        "oldest_seconds": max((now - datetime.fromisoformat(e["created_at"])).total_seconds() for e in pending)
+        if pending else 0,
+        "dead": sum(e["status"] == "dead" for e in standin.tables["outbox_events"]),
+    }
+
+
+def requeue_outbox_events(standin, params):
+    """requeue_outbox_events (db_outbox_migration.sql)."""
+    count = 0
+    for event in standin.tables.setdefault("outbox_events", []):
+        if event["status"] == "dead" and (params.get("p_ids") is None or event["id"] in params["p_ids"]):
+            event.update(status="pending", attempts=0, available_at=datetime.now(timezone.utc).isoformat())
+            count += 1
+    return count
+
+
+def nearby_pending_requests(standin, params):
+    """nearby_pending_requests (db_geo_pushdown_migration.sql)."""
+    from benchmarks.bench_geo_index import linear_scan
+
+    pending = [r for r in standin.tables.setdefault("scrap_requests", []) if r["status"] == "pending"]
+    if params.get("p_lat") is not None and params.get("p_lon") is not None:
+        pending = linear_scan(pending, params["p_lat"], params["p_lon"], datetime.now(timezone.utc))
+    return sorted(pending, key=lambda r: r.get("created_at") or "", reverse=True)
+
+
+def _product(standin, product_id):
+    return next((p for p in standin.tables.setdefault("products", []) if p["id"] == product_id), None)
+
+
+def _restock(product, quantity):
+    product["stock_quantity"] += quantity
+    product["is_available"] = True
+
+
+def release_expired_reservations(standin, params):
+    """release_expired_reservations (db_stock_reservation_migration.sql)."""
+    now = datetime.now(timezone.utc)
+    count = 0
+    for reservation in standin.tables.setdefault("stock_reservations", []):
+        if (reservation["status"] == "held" and datetime.fromisoformat(reservation["expires_at"]) <= now
+                and params.get("p_product") in (None, reservation["product_id"])):
+            reservation["status"] = "expired"
+            _restock(_product(standin, reservation["product_id"]), reservation["quantity"])
+            count += 1
+    return count
+
+
+def _take_stock(standin, product_id, quantity):
+    if quantity is None or quantity <= 0:
+        raise RPCError(f"invalid_quantity: {quantity}")
+    release_expired_reservations(standin, {"p_product": product_id})
+    product = _product(standin, product_id)
+    if product is None:
+        raise RPCError(f"product_not_found: {product_id}")
+    if product["stock_quantity"] < quantity:
+        raise RPCError("out_of_stock", json.dumps({"available": product["stock_quantity"], "requested": quantity}))
+    product["stock_quantity"] -= quantity
+    product["is_available"] = product["stock_quantity"] > 0
+    return product
+
+
+def reserve_stock(standin, params):
+    """reserve_stock (db_stock_reservation_migration.sql)."""
+    product = _take_stock(standin, params["p_product"], params["p_quantity"])
+    reservation = {
+        "id": str(uuid.uuid4()), "product_id": product["id"], "buyer_id": params["p_buyer"],
+        "quantity": params["p_quantity"], "status": "held",
+        "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=params["p_ttl_seconds"])).isoformat(),
+    }
+    standin.tables.setdefault("stock_reservations", []).append(reservation)
+    return {
+        "reservation_id": reservation["id"], "product_id": product["id"], "quantity": reservation["quantity"],
+        "expires_at": reservation["expires_at"], "remaining_stock": product["stock_quantity"],
+    }
+
+
+def release_stock_reservation(standin, params):
+    """release_stock_reservation (db_stock_reservation_migration.sql)."""
+    for reservation in standin.tables.setdefault("stock_reservations", []):
+        if (reservation["id"] == params["p_reservation"] and reservation["buyer_id"] == params["p_buyer"]
+                and reservation["status"] == "held"):
+            reservation["status"] = "released"
+            _restock(_product(standin, reservation["product_id"]), reservation["quantity"])
+            return True
+    return False
+
+
+def purchase_product(standin, params):
+    """purchase_product (db_stock_reservation_migration.sql); a failed payment undoes the stock change."""
+    reservation = None
+    if params.get("p_reservation") is None:
+        quantity = params["p_quantity"]
+        product = _take_stock(standin, params["p_product"], quantity)
+    else:
+        now = datetime.now(timezone.utc)
+        reservation = next((
+            r for r in standin.tables.setdefault("stock_reservations", [])
+            if r["id"] == params["p_reservation"] and r["product_id"] == params["p_product"]
+            and r["buyer_id"] == params["p_buyer"] and r["status"] == "held"
+            and datetime.fromisoformat(r["expires_at"]) > now
+        ), None)
+        if reservation is None:
+            raise RPCError(f"reservation_not_found: {params['p_reservation']}")
+        quantity = reservation["quantity"]
+        product = _product(standin, params["p_product"])
+
+    unit_price = product.get("price_coins") or 0
+    total = unit_price * quantity
+    pay = params.get("p_pay_with_coins", True)
+    if pay and total > 0:
+        try:
+            transfer_coins(standin, {
+                "p_from": params["p_buyer"], "p_to": product["artist_id"], "p_amount": total, "p_type": "purchase",
+                "p_reference_id": product["id"], "p_mode": "require",
+                "p_debit_description": f"Bought {quantity}× '{product['name']}' for {total} coins",
+                "p_credit_description": f"Sold {quantity}× '{product['name']}' for {total} coins",
+            })
+        except RPCError:
+            if reservation is None:
+                _restock(product, quantity)
+            raise
+    if reservation is not None:
+        reservation["status"] = "purchased"
+
+    return {
+        "product_id": product["id"], "name": product["name"], "quantity": quantity, "unit_price": unit_price,
+        "total_paid": total, "remaining_stock": product["stock_quantity"],
+    }
+
+
+FUNCTIONS = {
+    "transfer_coins": transfer_coins,
+    "coin_balance": coin_balance,
+    "complete_scrap_requests": complete_scrap_requests,
+    "claim_scrap_request": claim_scrap_request,
+    "nearby_pending_requests": nearby_pending_requests,
+    "add_dealer_inventory": add_dealer_inventory,
+    "complete_scrap_request": complete_scrap_request,
+    "record_fulfillment": record_fulfillment,
+    "drain_outbox": drain_outbox,
+    "requeue_outbox_events": requeue_outbox_events,
+    "release_expired_reservations": release_expired_reservations,
+    "reserve_stock": reserve_stock,
+    "release_stock_reservation": release_stock_reservation,
+    "purchase_product": purchase_product,
+    "rebuild_rollups": rebuild_rollups,
+}
@@ -0,0 +1,358 @@
+"""Offline benchmark suite: end-to-end flows against the PostgREST stand-in, with
+p50/p95/p99 latency, throughput and Supabase calls per request for every endpoint.
+
+Scenarios (each virtual user runs the whole flow, --concurrency flows in flight):
+  pickup    POST /scrap/donate -> PUT .../accept -> PUT .../complete
+  purchase  GET /products/ -> POST /products/{id}/purchase
+  fulfill   GET /industry/dealers/match/{id} -> POST /industry/requirements/{id}/fulfill
+  browse    partner feed, product and requirement listings, requirement detail
+
+The stand-in runs in its own process with a fixed per-query latency and a
+deterministic dataset (--scale multiplies every table), with Python mirrors of
+the Postgres functions (benchmarks/standin_functions.py). --save writes the
+results as JSON; --baseline compares against an earlier file and exits 1 when
+an endpoint's p95 or throughput moved past --tolerance or it makes more
+Supabase calls per request.
+
+Run from backend/:
+    python -m benchmarks.suite [--scale 1 --flows 200 --concurrency 20 --latency 0.005]
+    python -m benchmarks.suite --save before.json
+    python -m benchmarks.suite --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+
+from benchmarks.loadtest_async import PORT, wait_for_port
+from benchmarks.postgrest_standin import PostgrestStandIn, serve
+from benchmarks.standin_functions import FUNCTIONS
+
+SCRAP_TYPES = ("iron", "plastic", "copper", "glass", "ewaste", "other")
+RICH = 10 ** 9   # wallets and stock large enough that no flow runs out mid-benchmark
+
+
+def _id(kind, i):
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"suite-{kind}-{i}"))
+
+
+def seed_dataset(standin, scale=1.0, seed=7):
+    """Fill `standin` with a deterministic marketplace; returns the ids the scenarios use.
+
+    Sizes at scale 1: 500 donors, 50 dealers, 20 artists, 10 industries,
+    200 products, 60 requirements, 1000 pending and 2000 completed requests.
+    """
+    rng = random.Random(seed)
+    n = lambda base: max(1, int(base * scale))
+    now = datetime.now(timezone.utc)
+
+    def near_mumbai():
+        return round(19.07 + rng.gauss(0, 0.05), 5), round(72.88 + rng.gauss(0, 0.05), 5)
+
+    def profile(kind, i, role):
+        lat, lon = near_mumbai()
+        return {
+            "id": _id(kind, i), "name": f"{kind.title()} {i}", "email": f"{kind}{i}@example.com",
+            "phone": f"9{i:09d}", "location": "Mumbai", "role": role, "scrap_coins": RICH,
+            "organization_name": f"Org {i}" if role == "industry" else None,
+            "latitude": lat, "longitude": lon, "created_at": now.isoformat(),
+        }
+
+    donors = [profile("donor", i, "user") for i in range(n(500))]
+    dealers = [profile("dealer", i, "dealer") for i in range(n(50))]
+    artists = [profile("artist", i, "artist") for i in range(n(20))]
+    industries = [profile("industry", i, "industry") for i in range(n(10))]
+    standin.seed("profiles", donors + dealers + artists + industries)
+
+    def request_row(i, status, age_minutes):
+        donor = donors[i % len(donors)]
+        lat, lon = near_mumbai()
+        return {
+            "id": _id(f"request-{status}", i), "user_id": donor["id"],
+            "partner_id": dealers[i % len(dealers)]["id"] if status != "pending" else None,
+            "scrap_type": rng.choice(SCRAP_TYPES), "weight_kg": round(rng.uniform(1, 40), 2),
+            "description": None, "image_url": None, "status": status, "pickup_address": f"Flat {i}",
+            "latitude": lat, "longitude": lon, "coins_awarded": 0,
+            "created_at": (now - timedelta(minutes=age_minutes)).isoformat(),
+            "profiles": {"name": donor["name"], "location": donor["location"], "phone": donor["phone"]},
+        }
+
+    standin.seed("scrap_requests", [request_row(i, "pending", rng.uniform(0, 120)) for i in range(n(1000))])
+    standin.seed("scrap_requests", [request_row(i, "completed", rng.uniform(120, 10_000)) for i in range(n(2000))])
+
+    standin.seed("dealer_inventory", [
+        {"id": _id(f"inventory-{scrap_type}", i), "dealer_id": dealer["id"], "scrap_type": scrap_type,
+         "quantity_kg": RICH, "profiles": {"name": dealer["name"], "location": dealer["location"], "phone": dealer["phone"]}}
+        for i, dealer in enumerate(dealers) for scrap_type in SCRAP_TYPES
+    ])
+
+    products = [
+        {"id": _id("product", i), "artist_id": artists[i % len(artists)]["id"], "name": f"Art {i}",
+         "description": "Upcycled", "price_coins": rng.randint(5, 200), "stock_quantity": RICH,
+         "is_available": True, "created_at": (now - timedelta(minutes=i)).isoformat(),
+         "profiles": {"name": artists[i % len(artists)]["name"], "location": "Mumbai"}}
+        for i in range(n(200))
+    ]
+    standin.seed("products", products)
+
+    requirements = []
+    for i in range(n(60)):
+        industry = industries[i % len(industries)]
+        requirements.append({
+            "id": _id("requirement", i), "industry_id": industry["id"], "scrap_type": SCRAP_TYPES[i % len(SCRAP_TYPES)],
+            "required_kg": RICH, "fulfilled_kg": 0, "price_per_kg": rng.randint(1, 20), "status": "open",
+            "created_at": (now - timedelta(minutes=i)).isoformat(),
+            "profiles": {"name": industry["name"], "organization_name": industry["organization_name"], "location": "Mumbai"},
+        })
+    standin.seed("industry_requirements", requirements)
+    standin.seed("requirement_fulfillments", [])
+    standin.seed("transactions", [])
+
+    return {
+        "donors": [p["id"] for p in donors],
+        "dealers": [p["id"] for p in dealers],
+        "products": [p["id"] for p in products],
+        "requirements": [r["id"] for r in requirements],
+    }
+
+
+class Recorder:
+    """Latency samples and errors per endpoint ("METHOD /route/{template}")."""
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, method, route, params=None, json=None, **path):
+        endpoint = f"{method} {route}"
+        t0 = time.perf_counter()
+        response = await self.client.request(method, route.format(**path), params=params, json=json)
+        self.samples[endpoint].append(time.perf_counter() - t0)
+        if response.is_error:
+            self.errors[endpoint] += 1
+            raise FlowFailed(f"{endpoint}: {response.status_code} {response.text[:200]}")
+        return response
+
+
+class FlowFailed(Exception):
+    pass
+
+
+async def pickup_flow(rec, data, i):
+    dealer = data["dealers"][i % len(data["dealers"])]
+    donated = await rec.call("POST", "/scrap/donate", params={"user_id": data["donors"][i % len(data["donors"])]}, json={
+        "scrap_type": SCRAP_TYPES[i % len(SCRAP_TYPES)], "weight_kg": 2 + i % 10, "pickup_address": f"Flat {i}",
+        "latitude": 19.07, "longitude": 72.88,
+    })
+    request_id = donated.json()["data"][0]["id"]
+    await rec.call("PUT", "/scrap/requests/{request_id}/accept", json={"partner_id": dealer}, request_id=request_id)
+    await rec.call("PUT", "/scrap/requests/{request_id}/complete", json={"partner_id": dealer}, request_id=request_id)
+
+
+async def purchase_flow(rec, data, i):
+    await rec.call("GET", "/products/", params={"limit": 20})
+    await rec.call(
+        "POST", "/products/{product_id}/purchase", json={"buyer_id": data["donors"][i % len(data["donors"])]},
+        product_id=data["products"][i % len(data["products"])],
+    )
+
+
+async def fulfill_flow(rec, data, i):
+    requirement_id = data["requirements"][i % len(data["requirements"])]
+    await rec.call("GET", "/industry/dealers/match/{requirement_id}", params={"limit": 10}, requirement_id=requirement_id)
+    await rec.call(
+        "POST", "/industry/requirements/{requirement_id}/fulfill",
+        json={"dealer_id": data["dealers"][i % len(data["dealers"])], "quantity_kg": 1}, requirement_id=requirement_id,
+    )
+
+
+async def browse_flow(rec, data, i):
+    await rec.call("GET", "/scrap/requests/available", params={"partner_id": data["dealers"][i % len(data["dealers"])]})
+    await rec.call("GET", "/products/", params={"limit": 20})
+    await rec.call("GET", "/industry/requirements", params={"limit": 20})
+    await rec.call(
+        "GET", "/industry/requirements/{requirement_id}",
+        requirement_id=data["requirements"][i % len(data["requirements"])],
+    )
+
+
+SCENARIOS = {
+    "pickup": pickup_flow,
+    "purchase": purchase_flow,
+    "fulfill": fulfill_flow,
+    "browse": browse_flow,
+}
+
+
+def _db_calls():
+    """Supabase calls per route so far on this process: route -> (requests, calls)."""
+    from services.metrics import db_calls_per_request
+
+    return {labels[0]: db_calls_per_request.value(*labels) for labels in db_calls_per_request.label_sets()}
+
+
+async def run_scenario(client, flow, data, flows, concurrency, warmup):
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = []
+
+    async def one(rec, i):
+        async with semaphore:
+            try:
+                await flow(rec, data, i)
+            except FlowFailed as e:
+                failures.append(str(e))
+
+    # Each scenario starts from cold per-worker caches, so its numbers do not
+    # depend on which scenarios ran before it
+    from services.profiles import profile_cache
+    from services.response_cache import listing_cache
+
+    profile_cache.clear()
+    listing_cache.invalidate("products")
+    listing_cache.invalidate("requirements")
+
+    await asyncio.gather(*(one(Recorder(client), -1 - i) for i in range(warmup)))
+    before = _db_calls()
+    rec = Recorder(client)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(rec, i) for i in range(flows)))
+    elapsed = time.perf_counter() - t0
+    after = _db_calls()
+
+    endpoints = {}
+    for endpoint, samples in sorted(rec.samples.items()):
+        route = endpoint.split(" ", 1)[1]
+        requests = after.get(route, (0, 0))[0] - before.get(route, (0, 0))[0]
+        calls = after.get(route, (0, 0))[1] - before.get(route, (0, 0))[1]
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": rec.errors[endpoint],
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "rps": round(len(samples) / elapsed, 1),
+            "db_calls": round(calls / requests, 2) if requests else None,
+        }
+    return {"flows_per_second": round(flows / elapsed, 1), "failures": failures[:5], "endpoints": endpoints}
+
+
+def print_report(results):
+    print(f"{'endpoint':<56} {'n':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'db/req':>7}")
+    for name, scenario in results["scenarios"].items():
+        print(f"{name}: {scenario['flows_per_second']} flows/s")
+        for endpoint, s in scenario["endpoints"].items():
+            db_calls = "-" if s["db_calls"] is None else f"{s['db_calls']:.2f}"
+            print(
+                f"  {endpoint:<54} {s['requests']:>5} {s['errors']:>4} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+                f"{s['p99_ms']:>8.1f} {s['rps']:>8.1f} {db_calls:>7}"
+            )
+        for failure in scenario["failures"]:
+            print(f"  ! {failure}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`, one message each."""
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        base_endpoints = baseline.get("scenarios", {}).get(name, {}).get("endpoints", {})
+        for endpoint, s in scenario["endpoints"].items():
+            base = base_endpoints.get(endpoint)
+            if base is None:
+                continue
+            where = f"{name} {endpoint}"
+            if s["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{where}: p95 {base['p95_ms']:.1f} -> {s['p95_ms']:.1f} ms")
+            if s["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{where}: throughput {base['rps']:.1f} -> {s['rps']:.1f} req/s")
+            if s["db_calls"] is not None and base.get("db_calls") is not None and s["db_calls"] > base["db_calls"] + 0.01:
+                regressions.append(f"{where}: Supabase calls/request {base['db_calls']} -> {s['db_calls']}")
+            if s["errors"] > base.get("errors", 0):
+                regressions.append(f"{where}: errors {base.get('errors', 0)} -> {s['errors']}")
+    return regressions
+
+
+async def run(args):
+    data = seed_dataset(PostgrestStandIn(), args.scale)   # same deterministic ids as the stand-in process
+
+    from main import app  # imported after SUPABASE_URL points at the stand-in
+
+    results = {
+        "config": {k: getattr(args, k) for k in ("scale", "flows", "concurrency", "latency", "warmup")},
+        "scenarios": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=120) as client:
+        for name in args.scenarios:
+            results["scenarios"][name] = await run_scenario(
+                client, SCENARIOS[name], data, args.flows, args.concurrency, args.warmup
+            )
+    return results
+
+
+def run_standin(latency, scale):
+    """Stand-in process, so its CPU time does not compete with the API's event loop."""
+    standin = PostgrestStandIn(rpc=FUNCTIONS, latency=latency)
+    seed_dataset(standin, scale)
+
+    async def forever():
+        await serve(standin, PORT)
+        await asyncio.Event().wait()
+
+    asyncio.run(forever())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset size multiplier")
+    parser.add_argument("--flows", type=int, default=200, help="flows per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per stand-in query")
+    parser.add_argument("--warmup", type=int, default=10, help="unrecorded flows per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput change")
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "service")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("BALANCE_SNAPSHOT_INTERVAL_SECONDS", "0")
+
+    standin = multiprocessing.Process(target=run_standin, args=(args.latency, args.scale), daemon=True)
+    standin.start()
+    try:
+        wait_for_port(PORT, timeout=60)
+        results = asyncio.run(run(args))
+    finally:
+        standin.terminate()
+
+    print_report(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,27 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+# Local verification of Supabase access tokens (see services/auth.py). HS256
+# projects sign with the JWT secret; asymmetric signing keys come from the JWKS.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL") or (f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None)
+AUTH_JWKS_REFRESH_SECONDS = float(os.getenv("AUTH_JWKS_REFRESH_SECONDS", "600"))  # also refetched for an unknown key id
+AUTH_AUDIENCE = os.getenv("AUTH_AUDIENCE", "authenticated")
+AUTH_LEEWAY_SECONDS = float(os.getenv("AUTH_LEEWAY_SECONDS", "30"))  # clock skew allowed on exp/iat
+AUTH_SESSION_CACHE_MAXSIZE = int(os.getenv("AUTH_SESSION_CACHE_MAXSIZE", "10000"))  # verified tokens kept until they expire
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"  # false: calls without a token still work
+# Gateway in front of Supabase Auth for POST /auth/signup and /auth/login (see services/auth_gateway.py):
+# token buckets per client IP and per email, then at most N upstream calls at once
+AUTH_IP_RATE_PER_MINUTE = float(os.getenv("AUTH_IP_RATE_PER_MINUTE", "30"))
+AUTH_IP_BURST = int(os.getenv("AUTH_IP_BURST", "10"))
+AUTH_EMAIL_RATE_PER_MINUTE = float(os.getenv("AUTH_EMAIL_RATE_PER_MINUTE", "6"))
+AUTH_EMAIL_BURST = int(os.getenv("AUTH_EMAIL_BURST", "5"))
+AUTH_RATE_LIMIT_KEYS = int(os.getenv("AUTH_RATE_LIMIT_KEYS", "100000"))  # buckets kept per limiter (LRU)
+AUTH_UPSTREAM_CONCURRENCY = int(os.getenv("AUTH_UPSTREAM_CONCURRENCY", "20"))
+AUTH_UPSTREAM_QUEUE = int(os.getenv("AUTH_UPSTREAM_QUEUE", "500"))  # callers waiting for a slot before 503s
+AUTH_UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AUTH_UPSTREAM_QUEUE_TIMEOUT_SECONDS", "10"))
+AUTH_TRUST_FORWARDED_FOR = os.getenv("AUTH_TRUST_FORWARDED_FOR", "false").lower() == "true"  # behind a proxy
+
 # Scrap coin multipliers
 COIN_MULTIPLIERS = {
     "iron": 30,
@@ -17,3 +38,83 @@ COIN_MULTIPLIERS = {
     "ewaste": 50,
     "other": 10,
 }
+
+# In-process spatial index of pending scrap requests (see services/geo.py)
+GEO_INDEX_CELL_DEG = float(os.getenv("GEO_INDEX_CELL_DEG", "0.25"))
+# Rebuild from the database at least this often so other workers' writes show up
+GEO_INDEX_REFRESH_SECONDS = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "30"))
+# Let Postgres do the proximity filter of GET /scrap/requests/available instead
+# (nearby_pending_requests, see db_geo_pushdown_migration.sql)
+GEO_PUSHDOWN = os.getenv("GEO_PUSHDOWN", "false").lower() == "true"
+# POST /scrap/donate/bulk: rows per INSERT, and hard caps on what one call may send
+BULK_DONATE_CHUNK_SIZE = int(os.getenv("BULK_DONATE_CHUNK_SIZE", "500"))
+BULK_DONATE_MAX_ITEMS = int(os.getenv("BULK_DONATE_MAX_ITEMS", "5000"))
+BULK_DONATE_MAX_ITEM_BYTES = int(os.getenv("BULK_DONATE_MAX_ITEM_BYTES", "16384"))
+# PUT /scrap/requests/complete: most pickups one call may complete
+BATCH_COMPLETE_MAX_IDS = int(os.getenv("BATCH_COMPLETE_MAX_IDS", "500"))
+# Marketplace stock reservations (see services/stock.py)
+STOCK_RESERVATION_TTL_SECONDS = int(os.getenv("STOCK_RESERVATION_TTL_SECONDS", "600"))  # checkout hold
+STOCK_RESERVATION_SWEEP_SECONDS = int(os.getenv("STOCK_RESERVATION_SWEEP_SECONDS", "60"))  # 0 disables
+# Database functions that lose a serialization/deadlock race are retried (see services/retry.py)
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))
+DB_RETRY_BASE_SECONDS = float(os.getenv("DB_RETRY_BASE_SECONDS", "0.02"))  # doubled per attempt, jittered
+# Outbox for the coin / inventory side effects of completing pickups and fulfilling
+# requirements (see services/outbox.py and db_outbox_migration.sql)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))  # idle wait between drains; 0 disables
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))  # events per drain_outbox call
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))  # then the event is dead-lettered
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "2"))  # doubled per failed attempt
+# In-process dealer inventory index behind /industry/dealers/match (see services/inventory.py)
+INVENTORY_INDEX_REFRESH_SECONDS = float(os.getenv("INVENTORY_INDEX_REFRESH_SECONDS", "300"))
+# How long a feed precomputed by POST /scrap/feeds/warm may be served
+FEED_CACHE_SECONDS = float(os.getenv("FEED_CACHE_SECONDS", "10"))
+
+# Shared HTTP connection pool to Supabase (see database.py), one per API key
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "100"))
+DB_POOL_KEEPALIVE = int(os.getenv("DB_POOL_KEEPALIVE", "20"))
+DB_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("DB_KEEPALIVE_EXPIRY_SECONDS", "30"))
+DB_TIMEOUT_SECONDS = float(os.getenv("DB_TIMEOUT_SECONDS", "10"))
+DB_CONNECT_TIMEOUT_SECONDS = float(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "5"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "true").lower() == "true"
+
+# Keyset pagination on list endpoints (see services/pagination.py)
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "200"))
+
+# Ledger-derived balances (see services/balances.py). Snapshots only cover
+# transactions older than the lag, so still-open database transactions are never skipped.
+BALANCE_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("BALANCE_SNAPSHOT_INTERVAL_SECONDS", "300"))  # 0 disables
+BALANCE_SNAPSHOT_LAG_SECONDS = int(os.getenv("BALANCE_SNAPSHOT_LAG_SECONDS", "300"))
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "500"))
+
+# Per-worker profile cache for role/name/location lookups (see services/profiles.py)
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+PROFILE_CACHE_MAXSIZE = int(os.getenv("PROFILE_CACHE_MAXSIZE", "10000"))
+
+# Per-worker cache of product/requirement listings (see services/response_cache.py); 0 disables
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "1024"))
+
+# Idempotency-Key replay store for purchases, pickups and fulfillments (see services/idempotency.py)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))  # how long a key's response is replayed
+IDEMPOTENCY_MAXSIZE = int(os.getenv("IDEMPOTENCY_MAXSIZE", "10000"))  # per worker; least recently used dropped first
+
+# Dashboard aggregates (GET /stats/..., see services/rollups.py)
+STATS_DEFAULT_DAYS = int(os.getenv("STATS_DEFAULT_DAYS", "30"))  # daily figures returned unless ?days= says otherwise
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "366"))
+
+# Server-sent partner feeds (GET /scrap/requests/stream, see services/feed.py)
+FEED_TICK_SECONDS = float(os.getenv("FEED_TICK_SECONDS", "15"))  # radius growth / cross-worker sync
+FEED_KEEPALIVE_SECONDS = float(os.getenv("FEED_KEEPALIVE_SECONDS", "20"))
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "256"))  # pending events before a slow client is dropped
+
+# Batch dealer -> requirement allocation (GET /industry/allocation/plan, see services/allocation.py)
+ALLOCATION_COST_PER_KG_KM = float(os.getenv("ALLOCATION_COST_PER_KG_KM", "0.05"))  # coins, weighed against price_per_kg
+ALLOCATION_UNKNOWN_DISTANCE_KM = float(os.getenv("ALLOCATION_UNKNOWN_DISTANCE_KM", "100"))  # either side has no location
+ALLOCATION_CANDIDATES = int(os.getenv("ALLOCATION_CANDIDATES", "32"))  # nearest dealers tried per requirement first
+
+# Observability: GET /metrics (see services/metrics.py) and JSON event logs (see services/logs.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG adds the step-by-step purchase/fulfill events
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))  # share of debug/info events written; warnings/errors always are
@@ -0,0 +1,43 @@
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from benchmarks.postgrest_standin import client_for
+from database import get_db
+from main import app
+
+
+@asynccontextmanager
+async def _api(standin, overrides=None):
+    app.dependency_overrides[get_db] = lambda: client_for(standin)
+    app.dependency_overrides.update(overrides or {})
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def api():
+    """`async with api(standin) as client:` calls the app with get_db served by a
+    PostgREST stand-in; `overrides` adds more dependency overrides for the block."""
+    return _api
+
+
+@pytest.fixture
+def profile_row():
+    """A profiles row: profile_row("u1", "user", 100)."""
+    def profile(id, role, coins):
+        return {"id": id, "name": id, "role": role, "scrap_coins": coins}
+    return profile
+
+
+@pytest.fixture
+def pickup_row():
+    """A scrap_requests row with id r<i>, accepted by `partner` and not yet paid."""
+    def pickup(i, user="u1", partner="d1", kg=2.5, scrap_type="iron", status="accepted"):
+        return {"id": f"r{i}", "user_id": user, "partner_id": partner, "scrap_type": scrap_type,
+                "weight_kg": kg, "status": status, "coins_awarded": 0}
+    return pickup
@@ -0,0 +1,59 @@
+import httpx
+from supabase import AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
+
+from config import (
+    SUPABASE_URL, SUPABASE_ANON_KEY, SUPABASE_SERVICE_ROLE_KEY,
+    DB_POOL_SIZE, DB_POOL_KEEPALIVE, DB_KEEPALIVE_EXPIRY_SECONDS,
+    DB_TIMEOUT_SECONDS, DB_CONNECT_TIMEOUT_SECONDS, DB_POOL_TIMEOUT_SECONDS, DB_HTTP2,
+)
+from services.metrics import db_event_hooks
+
+# One Supabase client per API key, created on first use and shared by every router.
+# All PostgREST/Auth traffic of a client goes through a single pooled keep-alive
+# httpx connection pool instead of one pool per router module. Every call is
+# counted and timed per table/operation for /metrics.
+_clients = {}
+
+
+def create_http_client():
+    return httpx.AsyncClient(
+        http2=DB_HTTP2,
+        follow_redirects=True,
+        event_hooks=db_event_hooks(),
+        limits=httpx.Limits(
+            max_connections=DB_POOL_SIZE,
+            max_keepalive_connections=DB_POOL_KEEPALIVE,
+            keepalive_expiry=DB_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            DB_TIMEOUT_SECONDS,
+            connect=DB_CONNECT_TIMEOUT_SECONDS,
+            pool=DB_POOL_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+def _client(key):
+    client = _clients.get(key)
+    if client is None:
+        client = AsyncClient(SUPABASE_URL, key, AsyncClientOptions(httpx_client=create_http_client()))
+        _clients[key] = client
+    return client
+
+
+def get_db() -> AsyncClient:
+    """Service-role client (bypasses RLS) — FastAPI dependency for data access."""
+    return _client(SUPABASE_SERVICE_ROLE_KEY)
+
+
+def get_auth_client() -> AsyncClient:
+    """Anon-key client for Supabase Auth sign up / sign in."""
+    return _client(SUPABASE_ANON_KEY)
+
+
+async def close_clients():
+    """Close every pooled connection (app shutdown)."""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.options.httpx_client.aclose()
@@ -0,0 +1,133 @@
+-- Ledger-derived Scrap Coin balances: snapshots + reconciliation
+-- Run this in Supabase SQL Editor (after db_pagination_migration.sql)
+--
+-- `transactions` is the source of truth. A balance is the user's latest
+-- snapshot plus the sum of the few transactions after it, so reading one never
+-- scans the whole history. profiles.scrap_coins stays the fast wallet that
+-- transfer_coins locks and checks; reconcile_balances compares it with the
+-- ledger and can repair it.
+
+CREATE TABLE IF NOT EXISTS balance_snapshots (
+    user_id UUID PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+    balance BIGINT NOT NULL,
+    covered_until TIMESTAMPTZ NOT NULL, -- balance = sum of transactions with created_at <= this
+    taken_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE balance_snapshots ENABLE ROW LEVEL SECURITY; -- backend (service role) only
+
+-- Finds the transactions newer than the last snapshot cut
+CREATE INDEX IF NOT EXISTS transactions_created_at_idx ON transactions (created_at);
+
+-- Balance from the snapshot + delta; NULL when the profile does not exist
+CREATE OR REPLACE FUNCTION coin_balance(p_user UUID)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'balance', COALESCE(s.balance, 0) + COALESCE(d.delta, 0),
+        'snapshot_balance', s.balance,
+        'covered_until', s.covered_until,
+        'delta', COALESCE(d.delta, 0),
+        'delta_count', d.delta_count
+    )
+    FROM profiles p
+    LEFT JOIN balance_snapshots s ON s.user_id = p.id
+    CROSS JOIN LATERAL (
+        SELECT SUM(t.amount) AS delta, COUNT(*) AS delta_count
+        FROM transactions t
+        WHERE t.user_id = p.id
+          AND t.created_at > COALESCE(s.covered_until, '-infinity')
+    ) d
+    WHERE p.id = p_user;
+$$ LANGUAGE sql STABLE;
+
+-- Roll snapshots forward to NOW() - p_lag. Only users with transactions since the
+-- previous refresh are visited, and each adds just its transactions since its own
+-- cut. The lag keeps the cut behind transactions that are still open (created_at
+-- is their start time), so a late commit never lands behind a cut.
+-- Returns the number of snapshots written.
+CREATE OR REPLACE FUNCTION refresh_balance_snapshots(p_lag INTERVAL DEFAULT INTERVAL '5 minutes')
+RETURNS INTEGER AS $$
+DECLARE
+    v_cut TIMESTAMPTZ := NOW() - p_lag;
+    v_since TIMESTAMPTZ;
+    v_count INTEGER;
+BEGIN
+    SELECT COALESCE(MAX(covered_until), '-infinity') INTO v_since FROM balance_snapshots;
+
+    INSERT INTO balance_snapshots AS s (user_id, balance, covered_until, taken_at)
+    SELECT a.user_id, COALESCE(prev.balance, 0) + delta.amount, v_cut, NOW()
+    FROM (
+        SELECT DISTINCT user_id FROM transactions WHERE created_at > v_since AND created_at <= v_cut
+    ) a
+    LEFT JOIN balance_snapshots prev ON prev.user_id = a.user_id
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(SUM(t.amount), 0) AS amount
+        FROM transactions t
+        WHERE t.user_id = a.user_id
+          AND t.created_at > COALESCE(prev.covered_until, '-infinity')
+          AND t.created_at <= v_cut
+    ) delta
+    ON CONFLICT (user_id) DO UPDATE
+        SET balance = EXCLUDED.balance, covered_until = EXCLUDED.covered_until, taken_at = EXCLUDED.taken_at
+        -- A concurrent refresh that already moved further ahead wins
+        WHERE s.covered_until < EXCLUDED.covered_until;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One reconciliation chunk: the next p_limit profiles after p_after (by id) with
+-- the wallet balance, the full ledger sum and the snapshot + delta balance
+CREATE OR REPLACE FUNCTION ledger_balances(p_after UUID DEFAULT NULL, p_limit INTEGER DEFAULT 500)
+RETURNS TABLE (user_id UUID, wallet_balance INTEGER, ledger_balance BIGINT, snapshot_balance BIGINT) AS $$
+    SELECT
+        p.id,
+        p.scrap_coins,
+        COALESCE((SELECT SUM(t.amount) FROM transactions t WHERE t.user_id = p.id), 0),
+        (coin_balance(p.id) ->> 'balance')::BIGINT
+    FROM profiles p
+    WHERE p_after IS NULL OR p.id > p_after
+    ORDER BY p.id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Make the wallet and snapshot agree with the ledger for one user. The wallet
+-- row is locked first, so no transfer_coins can commit in between.
+CREATE OR REPLACE FUNCTION repair_balance(p_user UUID)
+RETURNS JSON AS $$
+DECLARE
+    v_wallet INTEGER;
+    v_ledger BIGINT;
+BEGIN
+    SELECT scrap_coins INTO v_wallet FROM profiles WHERE id = p_user FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'profile_not_found: %', p_user;
+    END IF;
+
+    SELECT COALESCE(SUM(amount), 0) INTO v_ledger FROM transactions WHERE user_id = p_user;
+
+    IF v_wallet <> v_ledger THEN
+        UPDATE profiles SET scrap_coins = v_ledger WHERE id = p_user;
+    END IF;
+
+    -- Recompute the snapshot from the ledger up to its own cut
+    UPDATE balance_snapshots s
+    SET balance = (
+        SELECT COALESCE(SUM(t.amount), 0) FROM transactions t
+        WHERE t.user_id = p_user AND t.created_at <= s.covered_until
+    ), taken_at = NOW()
+    WHERE s.user_id = p_user;
+
+    RETURN json_build_object('wallet_before', v_wallet, 'ledger_balance', v_ledger);
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION coin_balance(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION refresh_balance_snapshots(INTERVAL) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION ledger_balances(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION repair_balance(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION coin_balance(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION refresh_balance_snapshots(INTERVAL) TO service_role;
+GRANT EXECUTE ON FUNCTION ledger_balances(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION repair_balance(UUID) TO service_role;
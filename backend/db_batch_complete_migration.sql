@@ -0,0 +1,105 @@
+-- Batch pickup completion
+-- Run this in Supabase SQL Editor (after db_balance_migration.sql)
+--
+-- complete_scrap_requests completes many accepted pickups of one partner in a
+-- single transaction. It pays each donor what PUT /scrap/requests/{id}/complete
+-- would (weight * get_coin_multiplier, partner may go negative), but wallets
+-- are updated once per user, the ledger rows go in one multi-row insert and a
+-- dealer's inventory is upserted once per scrap type.
+
+CREATE OR REPLACE FUNCTION complete_scrap_requests(p_partner UUID, p_ids UUID[])
+RETURNS JSON AS $$
+DECLARE
+    v_role user_role;
+    v_completed JSON;
+    v_skipped JSON;
+    v_inventory JSON := '[]'::JSON;
+    v_balances JSON;
+BEGIN
+    SELECT role INTO v_role FROM profiles WHERE id = p_partner;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'profile_not_found: %', p_partner;
+    END IF;
+
+    -- Claim the requests that are still accepted by this partner; anything
+    -- else (unknown, someone else's, already completed) is reported as skipped
+    CREATE TEMP TABLE _batch ON COMMIT DROP AS
+    WITH claimed AS (
+        UPDATE scrap_requests r
+        SET status = 'completed',
+            coins_awarded = FLOOR(r.weight_kg * get_coin_multiplier(r.scrap_type))::INTEGER
+        WHERE r.id = ANY(p_ids) AND r.partner_id = p_partner AND r.status = 'accepted'
+        RETURNING r.id, r.user_id, r.scrap_type, r.weight_kg, r.coins_awarded
+    )
+    SELECT * FROM claimed;
+
+    -- Lock every wallet involved in id order, like transfer_coins, so a batch
+    -- and concurrent single transfers cannot deadlock
+    PERFORM 1 FROM profiles
+    WHERE id = p_partner OR id IN (SELECT user_id FROM _batch)
+    ORDER BY id FOR UPDATE;
+
+    -- One wallet update per user: donors gain, the partner pays the total. The
+    -- deltas are summed per user first: a partner who donated one of the
+    -- requests is both, and an UPDATE applies only one source row per target
+    UPDATE profiles p SET scrap_coins = p.scrap_coins + d.delta
+    FROM (
+        SELECT user_id, SUM(delta) AS delta
+        FROM (
+            SELECT user_id, coins_awarded AS delta FROM _batch
+            UNION ALL
+            SELECT p_partner, -coins_awarded FROM _batch
+        ) deltas
+        GROUP BY user_id
+    ) d
+    WHERE p.id = d.user_id AND d.delta <> 0;
+
+    -- Both ledger rows of every paid pickup in one insert
+    INSERT INTO transactions (user_id, amount, type, reference_id, description)
+    SELECT l.user_id, l.amount, l.type, b.id, l.description
+    FROM _batch b
+    CROSS JOIN LATERAL (VALUES
+        (p_partner, -b.coins_awarded, 'pickup_cost',
+         format('Spent %s coins to collect %skg of %s', b.coins_awarded, b.weight_kg, b.scrap_type)),
+        (b.user_id, b.coins_awarded, 'donation_reward',
+         format('Earned %s coins for donating %skg of %s', b.coins_awarded, b.weight_kg, b.scrap_type))
+    ) AS l(user_id, amount, type, description)
+    WHERE b.coins_awarded > 0;
+
+    -- Dealers stock what they collected, one upsert row per scrap type
+    IF v_role = 'dealer' THEN
+        WITH stocked AS (
+            INSERT INTO dealer_inventory (dealer_id, scrap_type, quantity_kg)
+            SELECT p_partner, scrap_type, SUM(weight_kg) FROM _batch GROUP BY scrap_type
+            ON CONFLICT (dealer_id, scrap_type)
+            DO UPDATE SET quantity_kg = dealer_inventory.quantity_kg + EXCLUDED.quantity_kg
+            RETURNING *
+        )
+        SELECT COALESCE(json_agg(row_to_json(stocked)), '[]'::JSON) INTO v_inventory FROM stocked;
+    END IF;
+
+    SELECT COALESCE(json_agg(json_build_object(
+        'id', id, 'user_id', user_id, 'scrap_type', scrap_type,
+        'weight_kg', weight_kg, 'coins_awarded', coins_awarded
+    )), '[]'::JSON) INTO v_completed FROM _batch;
+
+    SELECT COALESCE(json_agg(id), '[]'::JSON) INTO v_skipped
+    FROM unnest(p_ids) AS id WHERE id NOT IN (SELECT b.id FROM _batch b);
+
+    SELECT json_object_agg(id, scrap_coins) INTO v_balances
+    FROM profiles WHERE id = p_partner OR id IN (SELECT user_id FROM _batch);
+
+    DROP TABLE _batch;
+
+    RETURN json_build_object(
+        'completed', v_completed,
+        'skipped', v_skipped,
+        'inventory', v_inventory,
+        'balances', v_balances
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only the backend (service role) may move coins
+REVOKE EXECUTE ON FUNCTION complete_scrap_requests(UUID, UUID[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION complete_scrap_requests(UUID, UUID[]) TO service_role;
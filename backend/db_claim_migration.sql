@@ -0,0 +1,52 @@
+-- Atomic pickup claims
+-- Run this in Supabase SQL Editor (after db_stock_reservation_migration.sql)
+--
+-- claim_scrap_request accepts a pending pickup in one conditional UPDATE that
+-- also requires the partner to be a dealer/artist with enough coins to pay
+-- weight * get_coin_multiplier. When many partners race for a new request the
+-- row lock decides: one UPDATE matches, the rest re-check status = 'pending',
+-- match nothing and fail with already_claimed. The reads that explain a
+-- failure only run after the UPDATE missed.
+
+CREATE OR REPLACE FUNCTION claim_scrap_request(p_request UUID, p_partner UUID)
+RETURNS scrap_requests AS $$
+DECLARE
+    v_request scrap_requests;
+    v_partner profiles;
+    v_required INTEGER;
+BEGIN
+    UPDATE scrap_requests r
+    SET partner_id = p_partner, status = 'accepted', updated_at = NOW()
+    FROM profiles p
+    WHERE r.id = p_request AND r.status = 'pending'
+      AND p.id = p_partner AND p.role IN ('dealer', 'artist')
+      AND p.scrap_coins >= FLOOR(r.weight_kg * get_coin_multiplier(r.scrap_type))
+    RETURNING r.* INTO v_request;
+
+    IF FOUND THEN
+        RETURN v_request;
+    END IF;
+
+    -- Missed: say why
+    SELECT * INTO v_partner FROM profiles WHERE id = p_partner;
+    IF NOT FOUND OR v_partner.role NOT IN ('dealer', 'artist') THEN
+        RAISE EXCEPTION 'not_a_partner: %', p_partner;
+    END IF;
+
+    SELECT * INTO v_request FROM scrap_requests WHERE id = p_request;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'request_not_found: %', p_request;
+    END IF;
+    IF v_request.status <> 'pending' THEN
+        RAISE EXCEPTION 'already_claimed'
+            USING DETAIL = json_build_object('status', v_request.status)::TEXT;
+    END IF;
+
+    v_required := FLOOR(v_request.weight_kg * get_coin_multiplier(v_request.scrap_type))::INTEGER;
+    RAISE EXCEPTION 'insufficient_coins'
+        USING DETAIL = json_build_object('balance', v_partner.scrap_coins, 'needed', v_required)::TEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION claim_scrap_request(UUID, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION claim_scrap_request(UUID, UUID) TO service_role;
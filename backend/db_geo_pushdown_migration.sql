@@ -0,0 +1,89 @@
+-- Proximity filtering in the database
+-- Run this in Supabase SQL Editor (after db_claim_migration.sql)
+--
+-- nearby_pending_requests returns only the pending requests a partner may see
+-- (inside their time-decayed radius, see services/geo.py), newest first, with
+-- distance_km computed here, so a poll transfers the nearby rows instead of
+-- every pending request. A partial (latitude, longitude) index serves the
+-- bounding box of the largest radius; the exact distance is only computed for
+-- the rows inside it. Plain lat/lon keeps this working without PostGIS.
+
+-- calculate_distance as inlinable SQL (same result), clamped so rounding can
+-- never push asin() out of its domain
+CREATE OR REPLACE FUNCTION calculate_distance(lat1 FLOAT, lon1 FLOAT, lat2 FLOAT, lon2 FLOAT)
+RETURNS FLOAT AS $$
+    SELECT 6371 * 2 * asin(LEAST(1, sqrt(
+        sin(radians(lat2 - lat1) / 2) ^ 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(radians(lon2 - lon1) / 2) ^ 2
+    )))
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS scrap_requests_pending_geo_idx
+    ON scrap_requests (latitude, longitude) WHERE status = 'pending';
+
+-- Pending requests for a partner at (p_lat, p_lon) as the JSON rows
+-- GET /scrap/requests/available returns: the request, its donor under
+-- "profiles" and, when located, "distance_km". Requests without a location
+-- (NULL or 0 coordinates) are always included; a NULL partner location
+-- returns every pending request.
+CREATE OR REPLACE FUNCTION nearby_pending_requests(
+    p_lat FLOAT,
+    p_lon FLOAT,
+    p_base_km FLOAT DEFAULT 5,
+    p_growth_km_per_min FLOAT DEFAULT 0.5,
+    p_max_km FLOAT DEFAULT 50
+)
+RETURNS JSON AS $$
+DECLARE
+    v_dlat FLOAT;
+    v_dlon FLOAT;
+    v_result JSON;
+BEGIN
+    IF p_lat IS NOT NULL AND p_lon IS NOT NULL THEN
+        v_dlat := p_max_km / 111.19492664455873;   -- km per degree of latitude
+        v_dlon := LEAST(p_max_km / (111.19492664455873 * GREATEST(cos(radians(p_lat)), 1e-6)), 180);
+    END IF;
+
+    WITH located AS (
+        SELECT r.id, calculate_distance(p_lat, p_lon, r.latitude, r.longitude) AS distance_km
+        FROM scrap_requests r
+        WHERE v_dlat IS NOT NULL
+          AND r.status = 'pending'
+          AND r.latitude BETWEEN p_lat - v_dlat AND p_lat + v_dlat
+          AND (r.longitude BETWEEN p_lon - v_dlon AND p_lon + v_dlon
+               OR r.longitude <= p_lon + v_dlon - 360    -- box crosses the antimeridian
+               OR r.longitude >= p_lon - v_dlon + 360)
+          AND r.latitude <> 0 AND r.longitude <> 0
+    ), visible AS (
+        SELECT l.id, l.distance_km
+        FROM located l
+        JOIN scrap_requests r ON r.id = l.id
+        WHERE l.distance_km <= LEAST(
+            p_max_km,
+            p_base_km + GREATEST(0, EXTRACT(EPOCH FROM NOW() - r.created_at) / 60) * p_growth_km_per_min
+        )
+        UNION ALL
+        SELECT r.id, NULL
+        FROM scrap_requests r
+        WHERE r.status = 'pending'
+          AND (v_dlat IS NULL OR r.latitude IS NULL OR r.longitude IS NULL OR r.latitude = 0 OR r.longitude = 0)
+    )
+    SELECT COALESCE(json_agg(
+        to_jsonb(r)
+        || jsonb_build_object('profiles', CASE WHEN p.id IS NOT NULL THEN
+            jsonb_build_object('name', p.name, 'location', p.location, 'phone', p.phone) END)
+        || CASE WHEN v.distance_km IS NULL THEN '{}'::JSONB
+                ELSE jsonb_build_object('distance_km', round(v.distance_km::NUMERIC, 1)) END
+        ORDER BY r.created_at DESC
+    ), '[]'::JSON)
+    INTO v_result
+    FROM visible v
+    JOIN scrap_requests r ON r.id = v.id
+    LEFT JOIN profiles p ON p.id = r.user_id;
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+REVOKE EXECUTE ON FUNCTION nearby_pending_requests(FLOAT, FLOAT, FLOAT, FLOAT, FLOAT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION nearby_pending_requests(FLOAT, FLOAT, FLOAT, FLOAT, FLOAT) TO service_role;
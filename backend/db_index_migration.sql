@@ -0,0 +1,53 @@
+-- Indexes for the filters the routers run on every request
+-- Run this in Supabase SQL Editor (after db_geo_pushdown_migration.sql)
+--
+-- db_pagination_migration.sql already covers scrap_requests (status,
+-- created_at) / (user_id, created_at) and transactions (user_id, created_at).
+-- The ones below serve the remaining hot filters; benchmarks/plan_check.py
+-- EXPLAINs every query the routers send and fails on a sequential scan.
+
+-- One inventory row per dealer and scrap type. schema.sql declares this;
+-- databases created before it get it here (merge duplicate rows first).
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'dealer_inventory'::REGCLASS AND contype = 'u'
+          AND conkey = ARRAY(
+              SELECT attnum FROM pg_attribute
+              WHERE attrelid = 'dealer_inventory'::REGCLASS AND attname IN ('dealer_id', 'scrap_type')
+              ORDER BY attnum
+          )::SMALLINT[]
+    ) THEN
+        ALTER TABLE dealer_inventory
+            ADD CONSTRAINT dealer_inventory_dealer_id_scrap_type_key UNIQUE (dealer_id, scrap_type);
+    END IF;
+END;
+$$;
+
+-- GET /industry/allocation/plan?scrap_type=: positive stock of one scrap type
+CREATE INDEX IF NOT EXISTS dealer_inventory_type_quantity_idx
+    ON dealer_inventory (scrap_type, quantity_kg DESC);
+
+-- GET /industry/allocation/plan: open / partially fulfilled requirements (of one scrap type)
+CREATE INDEX IF NOT EXISTS industry_requirements_status_type_idx
+    ON industry_requirements (status, scrap_type);
+
+-- GET /industry/requirements/{id}: its fulfillments
+CREATE INDEX IF NOT EXISTS requirement_fulfillments_requirement_idx
+    ON requirement_fulfillments (requirement_id);
+
+-- Add p_kg to a dealer's stock of one scrap type in one statement (PUT
+-- /scrap/requests/{id}/complete); concurrent pickups of the same type cannot
+-- lose an update or insert a second row. Returns the row after the change.
+CREATE OR REPLACE FUNCTION add_dealer_inventory(p_dealer UUID, p_scrap_type scrap_type, p_kg DECIMAL)
+RETURNS dealer_inventory AS $$
+    INSERT INTO dealer_inventory (dealer_id, scrap_type, quantity_kg)
+    VALUES (p_dealer, p_scrap_type, p_kg)
+    ON CONFLICT (dealer_id, scrap_type)
+    DO UPDATE SET quantity_kg = dealer_inventory.quantity_kg + EXCLUDED.quantity_kg
+    RETURNING *;
+$$ LANGUAGE sql;
+
+REVOKE EXECUTE ON FUNCTION add_dealer_inventory(UUID, scrap_type, DECIMAL) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION add_dealer_inventory(UUID, scrap_type, DECIMAL) TO service_role;
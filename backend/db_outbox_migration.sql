@@ -0,0 +1,298 @@
+-- Transactional outbox for the side effects of completing pickups and fulfilling requirements
+-- Run this in Supabase SQL Editor (after db_index_migration.sql)
+--
+-- PUT /scrap/requests/{id}/complete and POST /industry/requirements/{id}/fulfill
+-- commit their own state change together with an outbox_events row, in one
+-- function call. Paying the donor / dealer (transfer_coins) and stocking the
+-- dealer (add_dealer_inventory) happen afterwards: the backend's outbox worker
+-- (services/outbox.py) calls drain_outbox, which applies a batch of due events,
+-- each in its own subtransaction, and marks it done in the same transaction as
+-- its effects, so an event is applied exactly once. A failed event is retried
+-- with exponential backoff and dead-lettered (status 'dead', last_error kept)
+-- after p_max_attempts. To replay dead events once the cause is fixed:
+--   SELECT requeue_outbox_events();
+--
+-- Batch completion (complete_scrap_requests, db_batch_complete_migration.sql)
+-- stays synchronous on purpose. It already pays and stocks in the same single
+-- transaction, with one wallet update per user and one stock upsert per scrap
+-- type for the whole batch. Queuing it would turn that into one event per
+-- pickup, applied one by one, for a wait it only pays once per route. Both
+-- paths end in the same wallets, ledger and stock. The batch simply returns
+-- final balances where a single completion returns expected ones.
+
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL, -- 'pickup_completed', 'requirement_fulfilled'
+    idempotency_key TEXT NOT NULL UNIQUE, -- one event per state change, however often it is enqueued
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- 'pending', 'done', 'dead'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), -- not retried before this
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMPTZ
+);
+
+ALTER TABLE outbox_events ENABLE ROW LEVEL SECURITY; -- backend (service role) only
+
+-- The worker's queue, and the dead letters
+CREATE INDEX IF NOT EXISTS outbox_events_due_idx ON outbox_events (available_at, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS outbox_events_dead_idx ON outbox_events (id) WHERE status = 'dead';
+
+-- Complete one accepted pickup of p_partner: the request is marked completed
+-- with its coins_awarded (weight * get_coin_multiplier) and a pickup_completed
+-- event is queued to pay the donor and stock a dealer. new_balance is the
+-- donor's balance once that payout is applied. Raises request_not_found when
+-- the request is not accepted by p_partner.
+CREATE OR REPLACE FUNCTION complete_scrap_request(p_request UUID, p_partner UUID)
+RETURNS JSON AS $$
+DECLARE
+    v_request scrap_requests;
+    v_role user_role;
+    v_balance INTEGER;
+    v_event BIGINT;
+BEGIN
+    UPDATE scrap_requests
+    SET status = 'completed',
+        coins_awarded = FLOOR(weight_kg * get_coin_multiplier(scrap_type))::INTEGER
+    WHERE id = p_request AND partner_id = p_partner AND status = 'accepted'
+    RETURNING * INTO v_request;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'request_not_found: %', p_request;
+    END IF;
+
+    SELECT role INTO v_role FROM profiles WHERE id = p_partner;
+    -- A partner collecting their own donation pays themselves: no change
+    SELECT scrap_coins + CASE WHEN id = p_partner THEN 0 ELSE v_request.coins_awarded END INTO v_balance
+    FROM profiles WHERE id = v_request.user_id;
+
+    INSERT INTO outbox_events (kind, idempotency_key, payload)
+    VALUES ('pickup_completed', 'pickup_completed:' || p_request, jsonb_build_object(
+        'request_id', v_request.id, 'user_id', v_request.user_id,
+        'partner_id', p_partner, 'partner_role', v_role,
+        'scrap_type', v_request.scrap_type, 'weight_kg', v_request.weight_kg,
+        'coins', v_request.coins_awarded
+    ))
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id INTO v_event;
+
+    RETURN json_build_object(
+        'id', v_request.id, 'user_id', v_request.user_id, 'scrap_type', v_request.scrap_type,
+        'weight_kg', v_request.weight_kg, 'coins_awarded', v_request.coins_awarded,
+        'new_balance', v_balance, 'event_id', v_event
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- p_dealer supplies up to p_kg of a requirement: as much as is still needed
+-- comes off the dealer's stock (conditional decrement), the fulfillment row is
+-- written and the requirement's progress updated. The requirement row is locked
+-- first, so concurrent suppliers cannot overshoot required_kg. When the
+-- requirement has a price a requirement_fulfilled event is queued to pay the
+-- dealer what the industry can afford: coins_earned of the coins_due, as of
+-- now, and coins_pending the shortfall. Raises invalid_quantity,
+-- requirement_not_found, requirement_closed, requirement_full or
+-- insufficient_inventory (DETAIL {"available", "needed", "scrap_type"};
+-- available is null when the dealer has none).
+CREATE OR REPLACE FUNCTION record_fulfillment(p_requirement UUID, p_dealer UUID, p_kg DECIMAL)
+RETURNS JSON AS $$
+DECLARE
+    v_requirement industry_requirements;
+    v_kg DECIMAL;
+    v_available DECIMAL;
+    v_inventory dealer_inventory;
+    v_fulfillment requirement_fulfillments;
+    v_cost INTEGER;
+    v_earned INTEGER := 0;
+    v_event BIGINT;
+BEGIN
+    IF p_kg IS NULL OR p_kg <= 0 THEN
+        RAISE EXCEPTION 'invalid_quantity: %', p_kg;
+    END IF;
+
+    SELECT * INTO v_requirement FROM industry_requirements WHERE id = p_requirement FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'requirement_not_found: %', p_requirement;
+    END IF;
+    IF v_requirement.status = 'closed' THEN
+        RAISE EXCEPTION 'requirement_closed';
+    END IF;
+
+    v_kg := LEAST(p_kg, v_requirement.required_kg - v_requirement.fulfilled_kg);
+    IF v_kg <= 0 THEN
+        RAISE EXCEPTION 'requirement_full';
+    END IF;
+
+    UPDATE dealer_inventory
+    SET quantity_kg = quantity_kg - v_kg, updated_at = NOW()
+    WHERE dealer_id = p_dealer AND scrap_type = v_requirement.scrap_type AND quantity_kg >= v_kg
+    RETURNING * INTO v_inventory;
+
+    IF NOT FOUND THEN
+        SELECT quantity_kg INTO v_available FROM dealer_inventory
+        WHERE dealer_id = p_dealer AND scrap_type = v_requirement.scrap_type;
+        RAISE EXCEPTION 'insufficient_inventory' USING DETAIL = json_build_object(
+            'available', v_available, 'needed', v_kg, 'scrap_type', v_requirement.scrap_type
+        )::TEXT;
+    END IF;
+
+    INSERT INTO requirement_fulfillments (requirement_id, dealer_id, quantity_kg, status)
+    VALUES (p_requirement, p_dealer, v_kg, 'completed')
+    RETURNING * INTO v_fulfillment;
+
+    UPDATE industry_requirements
+    SET fulfilled_kg = fulfilled_kg + v_kg,
+        status = CASE WHEN fulfilled_kg + v_kg >= required_kg THEN 'closed' ELSE 'partially_fulfilled' END::requirement_status,
+        updated_at = NOW()
+    WHERE id = p_requirement
+    RETURNING * INTO v_requirement;
+
+    v_cost := FLOOR(v_kg * COALESCE(v_requirement.price_per_kg, 0))::INTEGER;
+    IF v_cost > 0 THEN
+        -- What the 'partial' transfer will move if the balance does not change
+        SELECT LEAST(v_cost, GREATEST(scrap_coins, 0)) INTO v_earned
+        FROM profiles WHERE id = v_requirement.industry_id;
+
+        INSERT INTO outbox_events (kind, idempotency_key, payload)
+        VALUES ('requirement_fulfilled', 'requirement_fulfilled:' || v_fulfillment.id, jsonb_build_object(
+            'fulfillment_id', v_fulfillment.id, 'requirement_id', p_requirement,
+            'industry_id', v_requirement.industry_id, 'dealer_id', p_dealer,
+            'scrap_type', v_requirement.scrap_type, 'quantity_kg', v_kg, 'coins', v_cost
+        ))
+        RETURNING id INTO v_event;
+    END IF;
+
+    RETURN json_build_object(
+        'fulfillment_id', v_fulfillment.id, 'scrap_type', v_requirement.scrap_type, 'quantity_kg', v_kg,
+        'fulfilled_kg', v_requirement.fulfilled_kg, 'required_kg', v_requirement.required_kg,
+        'status', v_requirement.status, 'inventory', row_to_json(v_inventory),
+        'coins_due', v_cost, 'coins_earned', v_earned, 'coins_pending', v_cost - v_earned, 'event_id', v_event
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- The side effects of one event; what it returns is reported back to the worker
+CREATE OR REPLACE FUNCTION apply_outbox_event(p_kind TEXT, p_payload JSONB)
+RETURNS JSON AS $$
+DECLARE
+    v_coins INTEGER := (p_payload->>'coins')::INTEGER;
+    v_transfer JSON;
+    v_inventory JSON;
+BEGIN
+    IF p_kind = 'pickup_completed' THEN
+        -- The partner pays the donor (and may go negative, as on accept)
+        v_transfer := transfer_coins(
+            (p_payload->>'partner_id')::UUID, (p_payload->>'user_id')::UUID, v_coins,
+            'donation_reward', (p_payload->>'request_id')::UUID,
+            format('Spent %s coins to collect %skg of %s', v_coins, p_payload->>'weight_kg', p_payload->>'scrap_type'),
+            format('Earned %s coins for donating %skg of %s', v_coins, p_payload->>'weight_kg', p_payload->>'scrap_type'),
+            'overdraft', 'pickup_cost'
+        );
+        IF p_payload->>'partner_role' = 'dealer' THEN
+            SELECT row_to_json(i) INTO v_inventory FROM add_dealer_inventory(
+                (p_payload->>'partner_id')::UUID, (p_payload->>'scrap_type')::scrap_type,
+                (p_payload->>'weight_kg')::DECIMAL
+            ) i;
+        END IF;
+        RETURN json_build_object('transfer', v_transfer, 'inventory', v_inventory);
+    ELSIF p_kind = 'requirement_fulfilled' THEN
+        -- Pays what the industry can afford, up to the full cost
+        v_transfer := transfer_coins(
+            (p_payload->>'industry_id')::UUID, (p_payload->>'dealer_id')::UUID, v_coins,
+            'purchase', (p_payload->>'requirement_id')::UUID,
+            format('Paid {amount} coins for %skg %s', p_payload->>'quantity_kg', p_payload->>'scrap_type'),
+            format('Earned {amount} coins for supplying %skg %s', p_payload->>'quantity_kg', p_payload->>'scrap_type'),
+            'partial'
+        );
+        RETURN json_build_object('transfer', v_transfer);
+    END IF;
+    RAISE EXCEPTION 'unknown_outbox_kind: %', p_kind;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Apply up to p_limit due events, oldest first. Events another worker is
+-- applying right now are skipped, never waited on. Each event runs in its own
+-- subtransaction: a failure rolls back only that event's effects, counts an
+-- attempt and schedules the next one p_retry_seconds * 2^(attempts - 1) later,
+-- or marks the event 'dead' once it has failed p_max_attempts times.
+-- Returns {"events": [{"id", "kind", "status", "attempts", "result" | "error"}],
+-- "backlog", "oldest_seconds", "dead"}; status is 'done', 'retry' or 'dead'.
+CREATE OR REPLACE FUNCTION drain_outbox(p_limit INTEGER, p_max_attempts INTEGER, p_retry_seconds DOUBLE PRECISION)
+RETURNS JSON AS $$
+DECLARE
+    v_event outbox_events;
+    v_result JSON;
+    v_status TEXT;
+    v_events JSONB := '[]'::JSONB;
+BEGIN
+    FOR v_event IN
+        SELECT * FROM outbox_events
+        WHERE status = 'pending' AND available_at <= NOW()
+        ORDER BY available_at, id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    LOOP
+        BEGIN
+            v_result := apply_outbox_event(v_event.kind, v_event.payload);
+            UPDATE outbox_events
+            SET status = 'done', attempts = attempts + 1, processed_at = NOW(), last_error = NULL
+            WHERE id = v_event.id;
+            v_events := v_events || jsonb_build_object(
+                'id', v_event.id, 'kind', v_event.kind, 'status', 'done',
+                'attempts', v_event.attempts + 1, 'result', v_result
+            );
+        EXCEPTION WHEN OTHERS THEN
+            UPDATE outbox_events
+            SET attempts = attempts + 1,
+                last_error = SQLERRM,
+                status = CASE WHEN attempts + 1 >= p_max_attempts THEN 'dead' ELSE 'pending' END,
+                available_at = NOW() + make_interval(secs => p_retry_seconds * 2 ^ attempts)
+            WHERE id = v_event.id
+            RETURNING status INTO v_status;
+            v_events := v_events || jsonb_build_object(
+                'id', v_event.id, 'kind', v_event.kind,
+                'status', CASE WHEN v_status = 'dead' THEN 'dead' ELSE 'retry' END,
+                'attempts', v_event.attempts + 1, 'error', SQLERRM
+            );
+        END;
+    END LOOP;
+
+    RETURN json_build_object(
+        'events', v_events,
+        'backlog', (SELECT COUNT(*) FROM outbox_events WHERE status = 'pending'),
+        'oldest_seconds', (
+            SELECT COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(created_at)), 0)
+            FROM outbox_events WHERE status = 'pending'
+        ),
+        'dead', (SELECT COUNT(*) FROM outbox_events WHERE status = 'dead')
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Put dead events (all, or the given ids) back in the queue with a fresh
+-- attempt budget; returns how many were requeued
+CREATE OR REPLACE FUNCTION requeue_outbox_events(p_ids BIGINT[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    UPDATE outbox_events
+    SET status = 'pending', attempts = 0, available_at = NOW()
+    WHERE status = 'dead' AND (p_ids IS NULL OR id = ANY(p_ids));
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only the backend (service role) may move coins or touch the outbox
+REVOKE EXECUTE ON FUNCTION complete_scrap_request(UUID, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION record_fulfillment(UUID, UUID, DECIMAL) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION apply_outbox_event(TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drain_outbox(INTEGER, INTEGER, DOUBLE PRECISION) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION requeue_outbox_events(BIGINT[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION complete_scrap_request(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION record_fulfillment(UUID, UUID, DECIMAL) TO service_role;
+GRANT EXECUTE ON FUNCTION apply_outbox_event(TEXT, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION drain_outbox(INTEGER, INTEGER, DOUBLE PRECISION) TO service_role;
+GRANT EXECUTE ON FUNCTION requeue_outbox_events(BIGINT[]) TO service_role;
@@ -0,0 +1,38 @@
+-- Keyset pagination indexes for the list endpoints
+-- Run this in Supabase SQL Editor
+--
+-- Every list endpoint pages newest-first on (created_at, id), optionally after
+-- an equality filter. Each index below serves one filter + that order, so a page
+-- is one short index range scan no matter how large the table grows.
+
+-- GET /coins/history/{user_id}
+CREATE INDEX IF NOT EXISTS transactions_user_page_idx
+    ON transactions (user_id, created_at DESC, id DESC);
+
+-- GET /scrap/requests
+CREATE INDEX IF NOT EXISTS scrap_requests_page_idx
+    ON scrap_requests (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS scrap_requests_user_page_idx
+    ON scrap_requests (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS scrap_requests_status_page_idx
+    ON scrap_requests (status, created_at DESC, id DESC);
+
+-- GET /industry/requirements
+CREATE INDEX IF NOT EXISTS industry_requirements_page_idx
+    ON industry_requirements (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS industry_requirements_industry_page_idx
+    ON industry_requirements (industry_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS industry_requirements_status_page_idx
+    ON industry_requirements (status, created_at DESC, id DESC);
+
+-- GET /products/ (available_only=true is the default)
+CREATE INDEX IF NOT EXISTS products_page_idx
+    ON products (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS products_available_page_idx
+    ON products (created_at DESC, id DESC) WHERE is_available;
+
+-- GET /contracts/
+CREATE INDEX IF NOT EXISTS artist_contracts_user_page_idx
+    ON artist_contracts (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS artist_contracts_artist_page_idx
+    ON artist_contracts (artist_id, created_at DESC, id DESC);
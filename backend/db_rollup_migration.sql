@@ -0,0 +1,208 @@
+-- Activity rollups behind the /stats endpoints
+-- Run this in Supabase SQL Editor (after db_outbox_migration.sql), then backfill once:
+--   SELECT rebuild_rollups();
+--
+-- rollup_totals holds each profile's all-time figures and rollup_daily the
+-- same per UTC day, one row per (metric, scrap type). Triggers keep both up to
+-- date in the transaction that changes the source rows, so a dashboard reads a
+-- handful of rows instead of summing request, ledger and fulfillment history:
+--   scrap_requests -> completed   donor: donated_kg, donations
+--                                 partner: collected_kg, pickups
+--   requirement_fulfillments      dealer: supplied_kg, fulfillments
+--                                 industry: received_kg, fulfillments
+--   transactions                  coins_earned / coins_spent of a pickup or a
+--                                 fulfillment (by its scrap type) or of a
+--                                 product sale (sales / purchases, no scrap
+--                                 type); coins_bought for minted coins
+-- Coins are counted when they actually move (the outbox pays pickups and
+-- fulfillments after the fact), so the figures always agree with the ledger.
+
+CREATE TABLE IF NOT EXISTS rollup_totals (
+    subject_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    scrap_type TEXT NOT NULL DEFAULT '', -- '' for metrics without a scrap type
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (subject_id, metric, scrap_type)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    subject_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    day DATE NOT NULL, -- UTC
+    metric TEXT NOT NULL,
+    scrap_type TEXT NOT NULL DEFAULT '',
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (subject_id, day, metric, scrap_type)
+);
+
+ALTER TABLE rollup_totals ENABLE ROW LEVEL SECURITY; -- backend (service role) only
+ALTER TABLE rollup_daily ENABLE ROW LEVEL SECURITY;
+
+-- Add p_amounts[i] to p_metrics[i] of one profile, in the totals and on p_at's day
+CREATE OR REPLACE FUNCTION bump_rollup(
+    p_subject UUID, p_scrap_type TEXT, p_metrics TEXT[], p_amounts NUMERIC[], p_at TIMESTAMPTZ DEFAULT NOW()
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_subject IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO rollup_totals AS t (subject_id, metric, scrap_type, value)
+    SELECT p_subject, m.metric, COALESCE(p_scrap_type, ''), m.amount
+    FROM unnest(p_metrics, p_amounts) AS m(metric, amount)
+    ON CONFLICT (subject_id, metric, scrap_type) DO UPDATE SET value = t.value + EXCLUDED.value;
+
+    INSERT INTO rollup_daily AS d (subject_id, day, metric, scrap_type, value)
+    SELECT p_subject, (p_at AT TIME ZONE 'UTC')::DATE, m.metric, COALESCE(p_scrap_type, ''), m.amount
+    FROM unnest(p_metrics, p_amounts) AS m(metric, amount)
+    ON CONFLICT (subject_id, day, metric, scrap_type) DO UPDATE SET value = d.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_pickup()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_rollup(NEW.user_id, NEW.scrap_type::TEXT, ARRAY['donated_kg', 'donations'], ARRAY[NEW.weight_kg, 1]);
+    PERFORM bump_rollup(NEW.partner_id, NEW.scrap_type::TEXT, ARRAY['collected_kg', 'pickups'], ARRAY[NEW.weight_kg, 1]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_fulfillment()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_requirement industry_requirements;
+BEGIN
+    SELECT * INTO v_requirement FROM industry_requirements WHERE id = NEW.requirement_id;
+    PERFORM bump_rollup(NEW.dealer_id, v_requirement.scrap_type::TEXT,
+                        ARRAY['supplied_kg', 'fulfillments'], ARRAY[NEW.quantity_kg, 1], NEW.created_at);
+    PERFORM bump_rollup(v_requirement.industry_id, v_requirement.scrap_type::TEXT,
+                        ARRAY['received_kg', 'fulfillments'], ARRAY[NEW.quantity_kg, 1], NEW.created_at);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One ledger row: what it paid for decides the metric (see rollup_coin_metrics)
+CREATE OR REPLACE FUNCTION rollup_transaction()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_rollup RECORD;
+BEGIN
+    SELECT * INTO v_rollup FROM rollup_coin_metrics(NEW.type, NEW.reference_id, NEW.amount);
+    IF FOUND THEN
+        PERFORM bump_rollup(NEW.user_id, v_rollup.scrap_type, v_rollup.metrics, v_rollup.amounts, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The rollup metrics of a ledger row, by what its reference_id points at:
+-- a pickup or a requirement (coins_earned / coins_spent under its scrap type),
+-- a product (sales / purchases and the coins), or nothing for a minted coin
+-- purchase (coins_bought). No row for anything else (contracts, burns).
+CREATE OR REPLACE FUNCTION rollup_coin_metrics(p_type TEXT, p_reference UUID, p_amount INTEGER)
+RETURNS TABLE (scrap_type TEXT, metrics TEXT[], amounts NUMERIC[]) AS $$
+DECLARE
+    v_scrap_type TEXT;
+    v_coins TEXT := CASE WHEN p_amount > 0 THEN 'coins_earned' ELSE 'coins_spent' END;
+BEGIN
+    IF p_amount = 0 THEN
+        RETURN;
+    END IF;
+    IF p_reference IS NULL THEN
+        IF p_type = 'purchase' AND p_amount > 0 THEN
+            RETURN QUERY SELECT ''::TEXT, ARRAY['coins_bought'], ARRAY[p_amount::NUMERIC];
+        END IF;
+        RETURN;
+    END IF;
+
+    SELECT r.scrap_type::TEXT INTO v_scrap_type FROM scrap_requests r WHERE r.id = p_reference;
+    IF NOT FOUND THEN
+        SELECT r.scrap_type::TEXT INTO v_scrap_type FROM industry_requirements r WHERE r.id = p_reference;
+    END IF;
+    IF FOUND THEN
+        RETURN QUERY SELECT v_scrap_type, ARRAY[v_coins], ARRAY[ABS(p_amount)::NUMERIC];
+        RETURN;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM products WHERE id = p_reference) THEN
+        RETURN QUERY SELECT ''::TEXT,
+            ARRAY[CASE WHEN p_amount > 0 THEN 'sales' ELSE 'purchases' END, v_coins],
+            ARRAY[1, ABS(p_amount)::NUMERIC];
+    END IF;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+DROP TRIGGER IF EXISTS scrap_requests_rollup ON scrap_requests;
+CREATE TRIGGER scrap_requests_rollup AFTER UPDATE OF status ON scrap_requests
+    FOR EACH ROW WHEN (NEW.status = 'completed' AND OLD.status IS DISTINCT FROM 'completed')
+    EXECUTE FUNCTION rollup_pickup();
+
+DROP TRIGGER IF EXISTS requirement_fulfillments_rollup ON requirement_fulfillments;
+CREATE TRIGGER requirement_fulfillments_rollup AFTER INSERT ON requirement_fulfillments
+    FOR EACH ROW WHEN (NEW.status = 'completed')
+    EXECUTE FUNCTION rollup_fulfillment();
+
+DROP TRIGGER IF EXISTS transactions_rollup ON transactions;
+CREATE TRIGGER transactions_rollup AFTER INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION rollup_transaction();
+
+-- Backfill: recompute both tables from the full history, by the same rules as
+-- the triggers (a pickup's day is its last update). Both tables are locked
+-- for the rebuild, so completions, fulfillments and payments committing
+-- meanwhile wait for it rather than being lost or counted twice; run it off-peak.
+-- Returns {"profiles", "total_rows", "daily_rows"}.
+CREATE OR REPLACE FUNCTION rebuild_rollups()
+RETURNS JSON AS $$
+DECLARE
+    v_daily INTEGER;
+    v_totals INTEGER;
+BEGIN
+    LOCK TABLE rollup_totals, rollup_daily IN EXCLUSIVE MODE;
+    DELETE FROM rollup_daily;
+    DELETE FROM rollup_totals;
+
+    INSERT INTO rollup_daily (subject_id, day, metric, scrap_type, value)
+    SELECT e.subject_id, (e.at AT TIME ZONE 'UTC')::DATE, m.metric, e.scrap_type, SUM(m.amount)
+    FROM (
+        SELECT r.user_id AS subject_id, r.updated_at AS at, r.scrap_type::TEXT AS scrap_type,
+               ARRAY['donated_kg', 'donations'] AS metrics, ARRAY[r.weight_kg, 1] AS amounts
+        FROM scrap_requests r WHERE r.status = 'completed'
+        UNION ALL
+        SELECT r.partner_id, r.updated_at, r.scrap_type::TEXT, ARRAY['collected_kg', 'pickups'], ARRAY[r.weight_kg, 1]
+        FROM scrap_requests r WHERE r.status = 'completed' AND r.partner_id IS NOT NULL
+        UNION ALL
+        SELECT f.dealer_id, f.created_at, q.scrap_type::TEXT, ARRAY['supplied_kg', 'fulfillments'], ARRAY[f.quantity_kg, 1]
+        FROM requirement_fulfillments f JOIN industry_requirements q ON q.id = f.requirement_id
+        WHERE f.status = 'completed'
+        UNION ALL
+        SELECT q.industry_id, f.created_at, q.scrap_type::TEXT, ARRAY['received_kg', 'fulfillments'], ARRAY[f.quantity_kg, 1]
+        FROM requirement_fulfillments f JOIN industry_requirements q ON q.id = f.requirement_id
+        WHERE f.status = 'completed'
+        UNION ALL
+        SELECT t.user_id, t.created_at, c.scrap_type, c.metrics, c.amounts
+        FROM transactions t CROSS JOIN LATERAL rollup_coin_metrics(t.type, t.reference_id, t.amount) c
+    ) e
+    CROSS JOIN LATERAL unnest(e.metrics, e.amounts) AS m(metric, amount)
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS v_daily = ROW_COUNT;
+
+    INSERT INTO rollup_totals (subject_id, metric, scrap_type, value)
+    SELECT subject_id, metric, scrap_type, SUM(value) FROM rollup_daily GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS v_totals = ROW_COUNT;
+
+    RETURN json_build_object(
+        'profiles', (SELECT COUNT(DISTINCT subject_id) FROM rollup_totals),
+        'total_rows', v_totals,
+        'daily_rows', v_daily
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only the backend (service role) writes rollups; its triggers need the helpers
+REVOKE EXECUTE ON FUNCTION bump_rollup(UUID, TEXT, TEXT[], NUMERIC[], TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION rollup_coin_metrics(TEXT, UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION rebuild_rollups() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bump_rollup(UUID, TEXT, TEXT[], NUMERIC[], TIMESTAMPTZ) TO service_role;
+GRANT EXECUTE ON FUNCTION rollup_coin_metrics(TEXT, UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION rebuild_rollups() TO service_role;
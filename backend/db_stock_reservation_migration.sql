@@ -0,0 +1,198 @@
+-- Marketplace stock reservations: conditional decrement + short-lived holds
+-- Run this in Supabase SQL Editor (after db_batch_complete_migration.sql)
+--
+-- Stock is only ever taken with a conditional decrement
+-- (stock_quantity >= wanted, in the same UPDATE), so two buyers can never both
+-- get the last unit. A reservation takes the stock immediately and gives it back
+-- when it is released or expires; a checkout then consumes the reservation.
+-- purchase_product takes the stock (or the reservation) and pays the artist in
+-- one transaction: if the buyer cannot pay, the stock is untouched.
+
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    buyer_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    status TEXT NOT NULL DEFAULT 'held', -- 'held', 'purchased', 'released', 'expired'
+    expires_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE stock_reservations ENABLE ROW LEVEL SECURITY; -- backend (service role) only
+
+-- Finds the holds to expire
+CREATE INDEX IF NOT EXISTS stock_reservations_held_idx ON stock_reservations (product_id, expires_at) WHERE status = 'held';
+
+-- Last line of defence against overselling (existing rows are not re-checked)
+ALTER TABLE products DROP CONSTRAINT IF EXISTS products_stock_non_negative;
+ALTER TABLE products ADD CONSTRAINT products_stock_non_negative CHECK (stock_quantity >= 0) NOT VALID;
+
+-- Give the stock of expired holds back; NULL product = every product.
+-- Holds being consumed right now are skipped, never waited on.
+CREATE OR REPLACE FUNCTION release_expired_reservations(p_product UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    WITH expired AS (
+        UPDATE stock_reservations SET status = 'expired'
+        WHERE id IN (
+            SELECT id FROM stock_reservations
+            WHERE status = 'held' AND expires_at <= NOW()
+              AND (p_product IS NULL OR product_id = p_product)
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING product_id, quantity
+    ), returned AS (
+        UPDATE products p
+        SET stock_quantity = p.stock_quantity + e.quantity, is_available = TRUE
+        FROM (SELECT product_id, SUM(quantity) AS quantity FROM expired GROUP BY product_id) e
+        WHERE p.id = e.product_id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM expired) INTO v_count;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Take p_quantity units if that many are left; raises out_of_stock otherwise.
+-- Returns the product row after the decrement.
+CREATE OR REPLACE FUNCTION take_stock(p_product UUID, p_quantity INTEGER)
+RETURNS products AS $$
+DECLARE
+    v_product products;
+    v_stock INTEGER;
+BEGIN
+    IF p_quantity IS NULL OR p_quantity <= 0 THEN
+        RAISE EXCEPTION 'invalid_quantity: %', p_quantity;
+    END IF;
+
+    PERFORM release_expired_reservations(p_product);
+
+    UPDATE products
+    SET stock_quantity = stock_quantity - p_quantity,
+        is_available = stock_quantity - p_quantity > 0
+    WHERE id = p_product AND stock_quantity >= p_quantity
+    RETURNING * INTO v_product;
+
+    IF NOT FOUND THEN
+        SELECT stock_quantity INTO v_stock FROM products WHERE id = p_product;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'product_not_found: %', p_product;
+        END IF;
+        RAISE EXCEPTION 'out_of_stock'
+            USING DETAIL = json_build_object('available', v_stock, 'requested', p_quantity)::TEXT;
+    END IF;
+
+    RETURN v_product;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hold stock for a checkout for p_ttl_seconds
+CREATE OR REPLACE FUNCTION reserve_stock(p_product UUID, p_buyer UUID, p_quantity INTEGER, p_ttl_seconds INTEGER)
+RETURNS JSON AS $$
+DECLARE
+    v_product products;
+    v_reservation stock_reservations;
+BEGIN
+    v_product := take_stock(p_product, p_quantity);
+
+    INSERT INTO stock_reservations (product_id, buyer_id, quantity, expires_at)
+    VALUES (p_product, p_buyer, p_quantity, NOW() + make_interval(secs => p_ttl_seconds))
+    RETURNING * INTO v_reservation;
+
+    RETURN json_build_object(
+        'reservation_id', v_reservation.id,
+        'product_id', p_product,
+        'quantity', p_quantity,
+        'expires_at', v_reservation.expires_at,
+        'remaining_stock', v_product.stock_quantity
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Give a held reservation's stock back (cart abandoned); false unless p_buyer
+-- holds it
+DROP FUNCTION IF EXISTS release_stock_reservation(UUID);
+CREATE OR REPLACE FUNCTION release_stock_reservation(p_reservation UUID, p_buyer UUID)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_reservation stock_reservations;
+BEGIN
+    UPDATE stock_reservations SET status = 'released'
+    WHERE id = p_reservation AND buyer_id = p_buyer AND status = 'held'
+    RETURNING * INTO v_reservation;
+
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    UPDATE products
+    SET stock_quantity = stock_quantity + v_reservation.quantity, is_available = TRUE
+    WHERE id = v_reservation.product_id;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Buy p_quantity units (or the units held by p_reservation) and pay the artist.
+-- Raises out_of_stock, reservation_not_found (unknown, someone else's, expired or
+-- used) or insufficient_coins; nothing is written in that case.
+CREATE OR REPLACE FUNCTION purchase_product(
+    p_product UUID,
+    p_buyer UUID,
+    p_quantity INTEGER,
+    p_pay_with_coins BOOLEAN DEFAULT TRUE,
+    p_reservation UUID DEFAULT NULL
+)
+RETURNS JSON AS $$
+DECLARE
+    v_product products;
+    v_quantity INTEGER := p_quantity;
+    v_total INTEGER;
+BEGIN
+    IF p_reservation IS NULL THEN
+        v_product := take_stock(p_product, p_quantity);
+    ELSE
+        UPDATE stock_reservations SET status = 'purchased'
+        WHERE id = p_reservation AND product_id = p_product AND buyer_id = p_buyer
+          AND status = 'held' AND expires_at > NOW()
+        RETURNING quantity INTO v_quantity;
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'reservation_not_found: %', p_reservation;
+        END IF;
+        SELECT * INTO v_product FROM products WHERE id = p_product;
+    END IF;
+
+    v_total := COALESCE(v_product.price_coins, 0) * v_quantity;
+
+    IF p_pay_with_coins AND v_total > 0 THEN
+        PERFORM transfer_coins(
+            p_buyer, v_product.artist_id, v_total, 'purchase', p_product,
+            format('Bought %s× ''%s'' for %s coins', v_quantity, v_product.name, v_total),
+            format('Sold %s× ''%s'' for %s coins', v_quantity, v_product.name, v_total),
+            'require'
+        );
+    END IF;
+
+    RETURN json_build_object(
+        'product_id', p_product,
+        'name', v_product.name,
+        'quantity', v_quantity,
+        'unit_price', COALESCE(v_product.price_coins, 0),
+        'total_paid', v_total, -- the price, whether or not it was paid in coins
+        'remaining_stock', v_product.stock_quantity
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION release_expired_reservations(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION take_stock(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION reserve_stock(UUID, UUID, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION release_stock_reservation(UUID, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION purchase_product(UUID, UUID, INTEGER, BOOLEAN, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION release_expired_reservations(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION take_stock(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION reserve_stock(UUID, UUID, INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION release_stock_reservation(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION purchase_product(UUID, UUID, INTEGER, BOOLEAN, UUID) TO service_role;
@@ -1,13 +1,64 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, scrap, industry, products, coins, contracts
+from config import BALANCE_SNAPSHOT_INTERVAL_SECONDS, OUTBOX_POLL_SECONDS, STOCK_RESERVATION_SWEEP_SECONDS
+from database import close_clients, get_db
+from routers import auth, scrap, industry, products, coins, contracts, stats
+from services.balances import snapshot_loop
+from services.feed import feed_hub
+from services.idempotency import REPLAYED_HEADER, IdempotencyMiddleware, idempotency_store
+from services.inventory import inventory_index, load_inventory_index
+from services.logs import get_logger
+from services.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from services.outbox import outbox_worker
+from services.pagination import NEXT_CURSOR_HEADER
+from services.profiles import profile_cache
+from services.response_cache import listing_cache
+from services.stock import reservation_sweep_loop
+
+log = get_logger("startup")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = []
+    if BALANCE_SNAPSHOT_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(snapshot_loop(get_db(), BALANCE_SNAPSHOT_INTERVAL_SECONDS)))
+    if STOCK_RESERVATION_SWEEP_SECONDS > 0:
+        background.append(asyncio.create_task(reservation_sweep_loop(get_db(), STOCK_RESERVATION_SWEEP_SECONDS)))
+    if OUTBOX_POLL_SECONDS > 0:
+        background.append(asyncio.create_task(outbox_worker.run(get_db(), OUTBOX_POLL_SECONDS)))
+    try:
+        await load_inventory_index(get_db())
+        log.info("inventory_index.loaded", rows=len(inventory_index))
+    except Exception as e:
+        # Not fatal: /industry/dealers/match retries the load on first use
+        log.warning("inventory_index.load_failed", error=str(e))
+    yield
+    for task in background:
+        task.cancel()
+    # Release the pooled Supabase connections on shutdown
+    await close_clients()
+
 
 app = FastAPI(
     title="ScrapCrafters API",
     description="AI-Powered Circular Economy Platform Backend",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Idempotency-Key on the endpoints that move coins or stock: retries replay the
+# first response instead of running again (innermost, so CORS and metrics see replays)
+app.add_middleware(IdempotencyMiddleware, routes=[
+    ("POST", "/coins/purchase"),
+    ("POST", "/products/{product_id}/purchase"),
+    ("PUT", "/scrap/requests/{request_id}/complete"),
+    ("POST", "/industry/requirements/{requirement_id}/fulfill"),
+])
+
 # CORS for Flutter web + mobile
 app.add_middleware(
     CORSMiddleware,
@@ -15,8 +66,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", REPLAYED_HEADER],
 )
 
+# Per-route latency / status / in-flight and Supabase calls per request (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(scrap.router)
@@ -24,6 +79,7 @@ app.include_router(industry.router)
 app.include_router(products.router)
 app.include_router(coins.router)
 app.include_router(contracts.router)
+app.include_router(stats.router)
 
 
 @app.get("/")
@@ -40,10 +96,23 @@ async def root():
             "products": "/products",
             "coins": "/coins",
             "contracts": "/contracts",
+            "stats": "/stats",
         },
     }
 
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "profile_cache": profile_cache.stats(),
+        "listing_cache": listing_cache.stats(),
+        "idempotency": idempotency_store.stats(),
+        "feed": feed_hub.stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (this worker's counters only)."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 
@@ -54,6 +54,11 @@ class AcceptScrapRequest(BaseModel):
     partner_id: str
 
 
+class CompleteScrapBatchRequest(BaseModel):
+    partner_id: str
+    request_ids: List[str]
+
+
 # ---- Industry ----
 
 class CreateRequirementRequest(BaseModel):
@@ -84,6 +89,12 @@ class PurchaseProductRequest(BaseModel):
     buyer_id: str
     quantity: int = 1
     pay_with_coins: bool = True
+    reservation_id: Optional[str] = None   # from POST /products/{id}/reserve; quantity is then the reserved one
+
+
+class ReserveProductRequest(BaseModel):
+    buyer_id: str
+    quantity: int = 1
 
 
 class PurchaseCoinsRequest(BaseModel):
@@ -1,20 +1,23 @@
-from fastapi import APIRouter, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_ANON_KEY, SUPABASE_SERVICE_ROLE_KEY
+import math
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from supabase import AsyncClient
+from config import AUTH_TRUST_FORWARDED_FOR
+from database import get_db, get_auth_client
 from models import SignupRequest, LoginRequest
+from services.auth import Session, authorize, get_session
+from services.auth_gateway import Overloaded, RateLimited, auth_gateway
+from services.profiles import profile_cache
+from services.response_cache import listing_cache
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# Use service role for admin operations (creating profiles)
-supabase_admin = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-
 
-@router.post("/signup")
-async def signup(req: SignupRequest):
+async def create_account(req: SignupRequest, db: AsyncClient, auth_client: AsyncClient):
     try:
         # Create user in Supabase Auth
-        auth_response = supabase.auth.sign_up({
+        auth_response = await auth_client.auth.sign_up({
             "email": req.email,
             "password": req.password,
         })
@@ -40,7 +43,7 @@ async def signup(req: SignupRequest):
         if req.organization_name:
             profile_data["organization_name"] = req.organization_name
 
-        supabase_admin.table("profiles").insert(profile_data).execute()
+        await db.table("profiles").insert(profile_data).execute()
 
         return {
             "message": "Signup successful",
@@ -53,10 +56,9 @@ async def signup(req: SignupRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/login")
-async def login(req: LoginRequest):
+async def sign_in(req: LoginRequest, db: AsyncClient, auth_client: AsyncClient):
     try:
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await auth_client.auth.sign_in_with_password({
             "email": req.email,
             "password": req.password,
         })
@@ -65,7 +67,7 @@ async def login(req: LoginRequest):
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
         # Fetch profile
-        profile = supabase_admin.table("profiles").select("*").eq(
+        profile = await db.table("profiles").select("*").eq(
             "id", auth_response.user.id
         ).single().execute()
 
@@ -80,10 +82,58 @@ async def login(req: LoginRequest):
         raise HTTPException(status_code=401, detail=str(e))
 
 
+def client_ip(request: Request):
+    if AUTH_TRUST_FORWARDED_FOR and request.headers.get("x-forwarded-for"):
+        return request.headers["x-forwarded-for"].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def through_gateway(kind, request: Request, email, payload, fn):
+    """Rate-limit, coalesce and queue a Supabase Auth call (services/auth_gateway.py)."""
+    try:
+        return await auth_gateway.call(kind, client_ip(request), email, payload, fn)
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+@router.post("/signup")
+async def signup(
+    req: SignupRequest,
+    request: Request,
+    db: AsyncClient = Depends(get_db),
+    auth_client: AsyncClient = Depends(get_auth_client),
+):
+    """Create the Supabase Auth user and the profile; identical concurrent signups share one."""
+    return await through_gateway(
+        "signup", request, req.email, req.model_dump_json(), lambda: create_account(req, db, auth_client),
+    )
+
+
+@router.post("/login")
+async def login(
+    req: LoginRequest,
+    request: Request,
+    db: AsyncClient = Depends(get_db),
+    auth_client: AsyncClient = Depends(get_auth_client),
+):
+    """Sign in with email/password; identical concurrent logins share one."""
+    return await through_gateway("login", request, req.email, req.password, lambda: sign_in(req, db, auth_client))
+
+
+@router.get("/session")
+async def get_current_session(session: Optional[Session] = Depends(get_session)):
+    """Who the bearer token belongs to, as every handler sees it (verified locally, no Supabase Auth call)."""
+    if session is None:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    return {"user_id": session.user_id, "role": session.role, "expires_at": session.claims["exp"]}
+
+
 @router.get("/profile/{user_id}")
-async def get_profile(user_id: str):
+async def get_profile(user_id: str, db: AsyncClient = Depends(get_db)):
     try:
-        profile = supabase_admin.table("profiles").select("*").eq(
+        profile = await db.table("profiles").select("*").eq(
             "id", user_id
         ).single().execute()
         return profile.data
@@ -92,14 +142,24 @@ async def get_profile(user_id: str):
 
 
 @router.put("/profile/{user_id}")
-async def update_profile(user_id: str, data: dict):
+async def update_profile(
+    user_id: str,
+    data: dict,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    authorize(session, user_id)
     try:
         allowed_fields = ["name", "phone", "location", "latitude", "longitude", "avatar_url", "organization_name"]
         update_data = {k: v for k, v in data.items() if k in allowed_fields}
 
-        result = supabase_admin.table("profiles").update(update_data).eq(
+        result = await db.table("profiles").update(update_data).eq(
             "id", user_id
         ).execute()
+        profile_cache.invalidate(user_id)
+        # Listings embed the seller's / industry's name and location
+        listing_cache.invalidate("products")
+        listing_cache.invalidate("requirements")
         return {"message": "Profile updated", "data": result.data}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,56 +1,74 @@
-from fastapi import APIRouter, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from supabase import AsyncClient
+from database import get_db
 from models import PurchaseCoinsRequest
+from services.auth import Session, authorize, get_session
+from services.balances import get_balance as ledger_balance
+from services.ledger import transfer_coins
+from services.pagination import PageParams, keyset, page_params, paginate, select_columns
 
 router = APIRouter(prefix="/coins", tags=["Scrap Coins"])
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
 
 @router.get("/balance/{user_id}")
-async def get_balance(user_id: str):
-    """Get user's Scrap Coin balance."""
+async def get_balance(
+    user_id: str,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Get user's Scrap Coin balance: latest ledger snapshot + the transactions since."""
+    authorize(session, user_id)
     try:
-        profile = supabase.table("profiles").select("scrap_coins").eq(
-            "id", user_id
-        ).single().execute()
-        return {"balance": profile.data["scrap_coins"]}
+        balance = await ledger_balance(db, user_id)
+        if balance is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return balance
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("/history/{user_id}")
-async def get_transaction_history(user_id: str):
-    """Get user's Scrap Coin transaction history."""
+async def get_transaction_history(
+    user_id: str,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Get user's Scrap Coin transaction history, newest first, one page at a time."""
+    authorize(session, user_id)
     try:
-        result = supabase.table("transactions").select("*").eq(
-            "user_id", user_id
-        ).order("created_at", desc=True).execute()
-        return result.data
+        query = db.table("transactions").select(select_columns(page, "*")).eq("user_id", user_id)
+        result = await keyset(query, page).execute()
+        return paginate(result.data, page, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/purchase")
-async def purchase_coins(req: PurchaseCoinsRequest):
+async def purchase_coins(
+    req: PurchaseCoinsRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
     """Simulate purchasing coins via Razorpay."""
+    authorize(session, req.user_id)
     try:
-        # Get current balance
-        profile = supabase.table("profiles").select("scrap_coins").eq("id", req.user_id).single().execute()
-        current_coins = profile.data.get("scrap_coins", 0)
-
-        # Update balance
-        new_coins = current_coins + req.coins_purchased
-        supabase.table("profiles").update({"scrap_coins": new_coins}).eq("id", req.user_id).execute()
-
-        # Log transaction
-        supabase.table("transactions").insert({
-            "user_id": req.user_id,
-            "amount": req.coins_purchased,
-            "type": "purchase",
-            "description": f"Purchased {req.coins_purchased} coins for ₹{req.amount_inr} via Razorpay"
-        }).execute()
+        transfer = await transfer_coins(
+            db,
+            from_id=None,
+            to_id=req.user_id,
+            amount=req.coins_purchased,
+            type="purchase",
+            credit_description=f"Purchased {req.coins_purchased} coins for ₹{req.amount_inr} via Razorpay",
+        )
+        new_coins = transfer["to_balance"]
 
         return {"message": "Coins purchased successfully!", "new_balance": new_coins}
 
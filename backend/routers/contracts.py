@@ -1,23 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from supabase import AsyncClient
+from database import get_db
 from models import CreateContractRequest, UpdateContractStatus
+from services.auth import Session, authorize, get_session
+from services.ledger import transfer_coins
+from services.profiles import ProfileLoader, get_profiles
+from services.pagination import PageParams, keyset, page_params, paginate, select_columns
 
 router = APIRouter(prefix="/contracts", tags=["Artist Contracts"])
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
 
 @router.post("/")
-async def create_contract(user_id: str, req: CreateContractRequest):
+async def create_contract(
+    user_id: str,
+    req: CreateContractRequest,
+    db: AsyncClient = Depends(get_db),
+    profiles: ProfileLoader = Depends(get_profiles),
+    session: Optional[Session] = Depends(get_session),
+):
     """User creates a contract for an artist."""
+    authorize(session, user_id)
     try:
         # Verify artist exists
-        artist = supabase.table("profiles").select("role").eq(
-            "id", req.artist_id
-        ).single().execute()
-
-        if artist.data["role"] != "artist":
+        if await profiles.role(req.artist_id) != "artist":
             raise HTTPException(status_code=400, detail="Target user is not an artist")
 
         data = {
@@ -30,7 +37,7 @@ async def create_contract(user_id: str, req: CreateContractRequest):
             "status": "pending",
         }
 
-        result = supabase.table("artist_contracts").insert(data).execute()
+        result = await db.table("artist_contracts").insert(data).execute()
         return {"message": "Contract created", "data": result.data}
 
     except HTTPException:
@@ -40,11 +47,21 @@ async def create_contract(user_id: str, req: CreateContractRequest):
 
 
 @router.get("/")
-async def get_contracts(user_id: str = None, artist_id: str = None):
-    """Get contracts for a user or artist."""
+async def get_contracts(
+    response: Response,
+    user_id: str = None,
+    artist_id: str = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncClient = Depends(get_db),
+):
+    """Get contracts for a user or artist, newest first, one page at a time."""
     try:
-        query = supabase.table("artist_contracts").select(
-            "*, user:profiles!artist_contracts_user_id_fkey(name), artist:profiles!artist_contracts_artist_id_fkey(name)"
+        embeds = {
+            "user": "user:profiles!artist_contracts_user_id_fkey(name)",
+            "artist": "artist:profiles!artist_contracts_artist_id_fkey(name)",
+        }
+        query = db.table("artist_contracts").select(
+            select_columns(page, f"*, {embeds['user']}, {embeds['artist']}", embeds)
         )
 
         if user_id:
@@ -52,22 +69,24 @@ async def get_contracts(user_id: str = None, artist_id: str = None):
         if artist_id:
             query = query.eq("artist_id", artist_id)
 
-        result = query.order("created_at", desc=True).execute()
-        return result.data
+        result = await keyset(query, page).execute()
+        return paginate(result.data, page, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.put("/{contract_id}/status")
-async def update_contract_status(contract_id: str, req: UpdateContractStatus):
+async def update_contract_status(contract_id: str, req: UpdateContractStatus, db: AsyncClient = Depends(get_db)):
     """Update contract status (accept, reject, complete)."""
     try:
         valid_statuses = ["accepted", "rejected", "in_progress", "completed"]
         if req.status not in valid_statuses:
             raise HTTPException(status_code=400, detail=f"Status must be one of {valid_statuses}")
 
-        result = supabase.table("artist_contracts").update({
+        result = await db.table("artist_contracts").update({
             "status": req.status,
         }).eq("id", contract_id).execute()
 
@@ -78,41 +97,18 @@ async def update_contract_status(contract_id: str, req: UpdateContractStatus):
         if req.status == "completed":
             contract = result.data[0]
             if contract.get("budget_coins", 0) > 0:
-                # Deduct from user
-                user = supabase.table("profiles").select("scrap_coins").eq(
-                    "id", contract["user_id"]
-                ).single().execute()
-
-                if user.data["scrap_coins"] >= contract["budget_coins"]:
-                    supabase.table("profiles").update({
-                        "scrap_coins": user.data["scrap_coins"] - contract["budget_coins"],
-                    }).eq("id", contract["user_id"]).execute()
-
-                    # Credit to artist
-                    artist = supabase.table("profiles").select("scrap_coins").eq(
-                        "id", contract["artist_id"]
-                    ).single().execute()
-
-                    supabase.table("profiles").update({
-                        "scrap_coins": artist.data["scrap_coins"] + contract["budget_coins"],
-                    }).eq("id", contract["artist_id"]).execute()
-
-                    # Record transactions
-                    supabase.table("transactions").insert({
-                        "user_id": contract["user_id"],
-                        "amount": -contract["budget_coins"],
-                        "type": "contract_payment",
-                        "reference_id": contract_id,
-                        "description": f"Paid {contract['budget_coins']} coins for contract",
-                    }).execute()
-
-                    supabase.table("transactions").insert({
-                        "user_id": contract["artist_id"],
-                        "amount": contract["budget_coins"],
-                        "type": "contract_payment",
-                        "reference_id": contract_id,
-                        "description": f"Earned {contract['budget_coins']} coins from contract",
-                    }).execute()
+                # Paid only if the user can cover the full budget
+                await transfer_coins(
+                    db,
+                    from_id=contract["user_id"],
+                    to_id=contract["artist_id"],
+                    amount=contract["budget_coins"],
+                    type="contract_payment",
+                    reference_id=contract_id,
+                    debit_description=f"Paid {contract['budget_coins']} coins for contract",
+                    credit_description=f"Earned {contract['budget_coins']} coins from contract",
+                    mode="skip",
+                )
 
         return {"message": f"Contract status updated to {req.status}", "data": result.data}
 
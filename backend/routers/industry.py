@@ -1,24 +1,43 @@
-import traceback
-from fastapi import APIRouter, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
-from models import CreateRequirementRequest, FulfillRequirementRequest
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from supabase import AsyncClient
+from database import get_db
+from models import CreateRequirementRequest, FulfillRequirementRequest, ScrapType
+from services.allocation import load_market, plan_allocation
+from services.auth import Session, authorize, get_session
+from services.inventory import (
+    InsufficientInventory,
+    RequirementClosed,
+    RequirementNotFound,
+    inventory_index,
+    load_inventory_index,
+    record_fulfillment,
+)
+from services.logs import get_logger
+from services.outbox import outbox_worker
+from services.profiles import ProfileLoader, get_profiles
+from services.response_cache import listing_cache
+from services.pagination import PageParams, keyset, page_params, paginate, select_columns
 
 router = APIRouter(prefix="/industry", tags=["Industry"])
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+log = get_logger("industry")
 
 
 @router.post("/requirements")
-async def create_requirement(industry_id: str, req: CreateRequirementRequest):
+async def create_requirement(
+    industry_id: str,
+    req: CreateRequirementRequest,
+    db: AsyncClient = Depends(get_db),
+    profiles: ProfileLoader = Depends(get_profiles),
+    session: Optional[Session] = Depends(get_session),
+):
     """Industry posts a scrap requirement."""
+    authorize(session, industry_id)
     try:
         # Verify industry role
-        profile = supabase.table("profiles").select("role").eq(
-            "id", industry_id
-        ).single().execute()
-
-        if profile.data["role"] != "industry":
+        if await profiles.role(industry_id) != "industry":
             raise HTTPException(status_code=403, detail="Only industries can post requirements")
 
         data = {
@@ -31,7 +50,8 @@ async def create_requirement(industry_id: str, req: CreateRequirementRequest):
             "fulfilled_kg": 0,
         }
 
-        result = supabase.table("industry_requirements").insert(data).execute()
+        result = await db.table("industry_requirements").insert(data).execute()
+        listing_cache.invalidate("requirements")
         return {"message": "Requirement posted", "data": result.data}
 
     except HTTPException:
@@ -41,11 +61,27 @@ async def create_requirement(industry_id: str, req: CreateRequirementRequest):
 
 
 @router.get("/requirements")
-async def get_requirements(status: str = None, industry_id: str = None, scrap_type: str = None):
-    """Get industry requirements with optional filters."""
+async def get_requirements(
+    request: Request,
+    response: Response,
+    status: str = None,
+    industry_id: str = None,
+    scrap_type: str = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncClient = Depends(get_db),
+):
+    """Get industry requirements with optional filters, newest first, one page at a time.
+
+    Served from the listing cache with an ETag; If-None-Match revalidation gets a 304.
+    """
+    cached = listing_cache.get(request, "requirements")
+    if cached is not None:
+        return cached
+    version = listing_cache.version("requirements")
     try:
-        query = supabase.table("industry_requirements").select(
-            "*, profiles!industry_requirements_industry_id_fkey(name, organization_name, location)"
+        profiles = "profiles!industry_requirements_industry_id_fkey(name, organization_name, location)"
+        query = db.table("industry_requirements").select(
+            select_columns(page, f"*, {profiles}", {"profiles": profiles})
         )
 
         if status:
@@ -55,25 +91,29 @@ async def get_requirements(status: str = None, industry_id: str = None, scrap_ty
         if scrap_type:
             query = query.eq("scrap_type", scrap_type)
 
-        result = query.order("created_at", desc=True).execute()
-        return result.data
+        result = await keyset(query, page).execute()
+        rows = paginate(result.data, page, response)
+        return listing_cache.put(request, "requirements", version, rows, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/requirements/{requirement_id}")
-async def get_requirement_detail(requirement_id: str):
+async def get_requirement_detail(requirement_id: str, db: AsyncClient = Depends(get_db)):
     """Get single requirement with fulfillment details."""
     try:
-        req = supabase.table("industry_requirements").select(
-            "*, profiles!industry_requirements_industry_id_fkey(name, organization_name, location)"
-        ).eq("id", requirement_id).single().execute()
-
-        # Get fulfillments
-        fulfillments = supabase.table("requirement_fulfillments").select(
-            "*, profiles!requirement_fulfillments_dealer_id_fkey(name, location)"
-        ).eq("requirement_id", requirement_id).execute()
+        # Requirement and its fulfillments are fetched concurrently
+        req, fulfillments = await asyncio.gather(
+            db.table("industry_requirements").select(
+                "*, profiles!industry_requirements_industry_id_fkey(name, organization_name, location)"
+            ).eq("id", requirement_id).single().execute(),
+            db.table("requirement_fulfillments").select(
+                "*, profiles!requirement_fulfillments_dealer_id_fkey(name, location)"
+            ).eq("requirement_id", requirement_id).execute(),
+        )
 
         return {
             "requirement": req.data,
@@ -85,174 +125,97 @@ async def get_requirement_detail(requirement_id: str):
 
 
 @router.post("/requirements/{requirement_id}/fulfill")
-async def fulfill_requirement(requirement_id: str, req: FulfillRequirementRequest):
+async def fulfill_requirement(
+    requirement_id: str,
+    req: FulfillRequirementRequest,
+    db: AsyncClient = Depends(get_db),
+    profiles: ProfileLoader = Depends(get_profiles),
+    session: Optional[Session] = Depends(get_session),
+):
     """Dealer fulfills (partially or fully) an industry requirement.
-    
+
     Flow:
-    1. Validate dealer and requirement
-    2. Check remaining capacity (don't accept more than needed)
-    3. Check dealer has enough inventory
-    4. Deduct from dealer inventory
-    5. Create fulfillment record
-    6. Transfer coins if industry has enough (optional - doesn't block fulfillment)
-    7. Update requirement progress (fulfilled_kg, status)
+    1. Verify the dealer's role (profile cache)
+    2. One `record_fulfillment` call: take no more than the requirement still
+       needs, deduct it from the dealer's inventory (which must cover it),
+       create the fulfillment record, update the requirement's progress
+       (fulfilled_kg, status) and queue the payment, in one transaction
+    3. The outbox worker (services/outbox.py) then transfers the coins: what
+       the industry can afford, up to the full cost; the rest stays pending
     """
+    authorize(session, req.dealer_id)
     try:
-        print(f"[FULFILL] Starting: requirement={requirement_id}, dealer={req.dealer_id}, qty={req.quantity_kg}")
-
-        # Step 1: Verify dealer role
-        dealer = supabase.table("profiles").select("role").eq(
-            "id", req.dealer_id
-        ).single().execute()
+        log.debug("fulfill.start", requirement_id=requirement_id, dealer_id=req.dealer_id, quantity_kg=req.quantity_kg)
 
-        if dealer.data["role"] != "dealer":
+        if await profiles.role(req.dealer_id) != "dealer":
             raise HTTPException(status_code=403, detail="Only dealers can fulfill requirements")
 
-        # Step 2: Get current requirement and check capacity
-        requirement = supabase.table("industry_requirements").select("*").eq(
-            "id", requirement_id
-        ).single().execute()
-
-        if not requirement.data:
-            raise HTTPException(status_code=404, detail="Requirement not found")
+        fulfilled = await record_fulfillment(db, requirement_id, req.dealer_id, req.quantity_kg)
 
-        if requirement.data["status"] == "closed":
-            raise HTTPException(status_code=400, detail="Requirement already closed/fully fulfilled")
-
-        remaining = float(requirement.data["required_kg"]) - float(requirement.data["fulfilled_kg"])
-        actual_qty = min(req.quantity_kg, remaining)
-        print(f"[FULFILL] remaining={remaining}, actual_qty={actual_qty}")
-
-        if actual_qty <= 0:
-            raise HTTPException(status_code=400, detail="Requirement already fully fulfilled. No more supply needed.")
-
-        # Step 3: Check dealer inventory
-        scrap_type = requirement.data["scrap_type"]
-        inventory = supabase.table("dealer_inventory").select("*").eq(
-            "dealer_id", req.dealer_id
-        ).eq("scrap_type", scrap_type).execute()
-
-        if not inventory.data:
-            raise HTTPException(
-                status_code=400,
-                detail=f"You have no {scrap_type} inventory. Complete some pickups first."
-            )
-
-        available_kg = float(inventory.data[0]["quantity_kg"])
-        if available_kg < actual_qty:
+    except HTTPException:
+        raise
+    except RequirementNotFound:
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    except RequirementClosed:
+        raise HTTPException(status_code=400, detail="Requirement already closed/fully fulfilled")
+    except InsufficientInventory as e:
+        if e.available is None:
             raise HTTPException(
                 status_code=400,
-                detail=f"Insufficient inventory. You have {available_kg}kg {scrap_type} but trying to supply {actual_qty}kg."
+                detail=f"You have no {e.scrap_type} inventory. Complete some pickups first."
             )
-
-        print(f"[FULFILL] Inventory check passed: {available_kg}kg available, supplying {actual_qty}kg")
-
-        # Step 4: Deduct from dealer inventory
-        new_inventory_qty = available_kg - actual_qty
-        supabase.table("dealer_inventory").update({
-            "quantity_kg": new_inventory_qty,
-        }).eq("id", inventory.data[0]["id"]).execute()
-        print(f"[FULFILL] Dealer inventory updated: {available_kg} -> {new_inventory_qty}kg")
-
-        # Step 5: Create fulfillment record
-        supabase.table("requirement_fulfillments").insert({
-            "requirement_id": requirement_id,
-            "dealer_id": req.dealer_id,
-            "quantity_kg": actual_qty,
-            "status": "completed",
-        }).execute()
-        print(f"[FULFILL] Fulfillment record created")
-
-        # Step 6: Transfer coins (best-effort, doesn't block fulfillment)
-        price_per_kg = float(requirement.data.get("price_per_kg") or 0)
-        total_coin_cost = int(actual_qty * price_per_kg)
-        coins_transferred = 0
-
-        if total_coin_cost > 0:
-            try:
-                industry_profile = supabase.table("profiles").select("scrap_coins").eq(
-                    "id", requirement.data["industry_id"]
-                ).single().execute()
-                industry_coins = industry_profile.data.get("scrap_coins", 0) or 0
-
-                if industry_coins >= total_coin_cost:
-                    # Full payment
-                    coins_transferred = total_coin_cost
-                elif industry_coins > 0:
-                    # Partial payment (pay what they can)
-                    coins_transferred = industry_coins
-                
-                if coins_transferred > 0:
-                    # Deduct from industry
-                    supabase.table("profiles").update({
-                        "scrap_coins": industry_coins - coins_transferred
-                    }).eq("id", requirement.data["industry_id"]).execute()
-
-                    # Add to dealer
-                    dealer_profile = supabase.table("profiles").select("scrap_coins").eq(
-                        "id", req.dealer_id
-                    ).single().execute()
-                    dealer_coins = dealer_profile.data.get("scrap_coins", 0) or 0
-                    supabase.table("profiles").update({
-                        "scrap_coins": dealer_coins + coins_transferred
-                    }).eq("id", req.dealer_id).execute()
-
-                    # Log transactions
-                    supabase.table("transactions").insert([
-                        {
-                            "user_id": requirement.data["industry_id"],
-                            "amount": -coins_transferred,
-                            "type": "purchase",
-                            "description": f"Paid {coins_transferred} coins for {actual_qty}kg {scrap_type}"
-                        },
-                        {
-                            "user_id": req.dealer_id,
-                            "amount": coins_transferred,
-                            "type": "purchase",
-                            "description": f"Earned {coins_transferred} coins for supplying {actual_qty}kg {scrap_type}"
-                        }
-                    ]).execute()
-                    print(f"[FULFILL] Coins transferred: {coins_transferred}/{total_coin_cost}")
-                else:
-                    print(f"[FULFILL] Industry has 0 coins, skipping payment")
-            except Exception as coin_err:
-                print(f"[FULFILL] WARNING: Coin transfer failed (non-blocking): {coin_err}")
-
-        # Step 7: Update requirement fulfilled amount
-        new_fulfilled = float(requirement.data["fulfilled_kg"]) + actual_qty
-        new_status = "closed" if new_fulfilled >= float(requirement.data["required_kg"]) else "partially_fulfilled"
-
-        supabase.table("industry_requirements").update({
-            "fulfilled_kg": new_fulfilled,
-            "status": new_status,
-        }).eq("id", requirement_id).execute()
-        print(f"[FULFILL] SUCCESS: Requirement updated: {new_fulfilled}/{requirement.data['required_kg']}kg, status={new_status}")
-
-        return {
-            "message": f"Successfully supplied {actual_qty}kg {scrap_type}.",
-            "fulfilled_kg": new_fulfilled,
-            "required_kg": float(requirement.data["required_kg"]),
-            "remaining_kg": float(requirement.data["required_kg"]) - new_fulfilled,
-            "status": new_status,
-            "coins_earned": coins_transferred,
-            "coins_pending": total_coin_cost - coins_transferred,
-        }
-
-    except HTTPException:
-        raise
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient inventory. You have {e.available}kg {e.scrap_type} but trying to supply {e.needed}kg."
+        )
     except Exception as e:
-        print(f"[FULFILL] UNEXPECTED ERROR: {e}")
-        traceback.print_exc()
+        log.exception("fulfill.failed", requirement_id=requirement_id, dealer_id=req.dealer_id, error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+    if fulfilled["event_id"] is not None:
+        outbox_worker.wake()
+    scrap_type = fulfilled["scrap_type"]
+    supplied_kg = float(fulfilled["quantity_kg"])
+    inventory = fulfilled["inventory"]
+    inventory_index.set_quantity(req.dealer_id, scrap_type, float(inventory["quantity_kg"]), inventory)
+    listing_cache.invalidate("requirements")
+    log.info(
+        "fulfill.completed", requirement_id=requirement_id, dealer_id=req.dealer_id, supply_kg=supplied_kg,
+        fulfilled_kg=fulfilled["fulfilled_kg"], required_kg=fulfilled["required_kg"], status=fulfilled["status"],
+        coins_due=fulfilled["coins_due"],
+    )
+
+    return {
+        "message": f"Successfully supplied {supplied_kg}kg {scrap_type}.",
+        "fulfilled_kg": float(fulfilled["fulfilled_kg"]),
+        "required_kg": float(fulfilled["required_kg"]),
+        "remaining_kg": float(fulfilled["required_kg"]) - float(fulfilled["fulfilled_kg"]),
+        "status": fulfilled["status"],
+        "coins_earned": fulfilled["coins_earned"],     # paid by the queued payment
+        "coins_pending": fulfilled["coins_pending"],   # what the industry could not cover
+        "coins_due": fulfilled["coins_due"],
+        "payment": "queued" if fulfilled["event_id"] is not None else "none",
+    }
+
 
 @router.get("/dealers/match/{requirement_id}")
-async def match_dealers(requirement_id: str):
-    """Smart matching: find best dealers for a requirement based on scrap type and availability."""
+async def match_dealers(
+    requirement_id: str,
+    limit: int = Query(None, ge=1, description="Return only the top `limit` dealers"),
+    db: AsyncClient = Depends(get_db),
+):
+    """Smart matching: find best dealers for a requirement based on scrap type and availability.
+
+    Dealers come from the in-process inventory index, already ordered by stock,
+    so only the top `limit` rows are read.
+    """
     try:
-        requirement = supabase.table("industry_requirements").select("*").eq(
-            "id", requirement_id
-        ).single().execute()
+        requirement, _ = await asyncio.gather(
+            db.table("industry_requirements").select("*").eq(
+                "id", requirement_id
+            ).single().execute(),
+            load_inventory_index(db),
+        )
 
         if not requirement.data:
             raise HTTPException(status_code=404, detail="Requirement not found")
@@ -260,16 +223,11 @@ async def match_dealers(requirement_id: str):
         scrap_type = requirement.data["scrap_type"]
         remaining = float(requirement.data["required_kg"]) - float(requirement.data["fulfilled_kg"])
 
-        # Find dealers with matching inventory
-        dealers_with_inventory = supabase.table("dealer_inventory").select(
-            "*, profiles!dealer_inventory_dealer_id_fkey(name, location, phone)"
-        ).eq("scrap_type", scrap_type).gt("quantity_kg", 0).execute()
-
-        # Rank dealers by availability (simplified smart matching)
+        # Availability score (0-100) grows with stock, so stock order is score order
         ranked = []
-        for d in dealers_with_inventory.data:
+        for d in inventory_index.top(scrap_type, limit):
             qty = float(d["quantity_kg"])
-            score = min(qty / remaining, 1.0) * 100  # availability score (0-100)
+            score = min(qty / remaining, 1.0) * 100 if remaining > 0 else 100.0
             ranked.append({
                 "dealer_id": d["dealer_id"],
                 "dealer_name": d["profiles"]["name"] if d.get("profiles") else "Unknown",
@@ -279,8 +237,6 @@ async def match_dealers(requirement_id: str):
                 "match_score": round(score, 1),
             })
 
-        ranked.sort(key=lambda x: x["match_score"], reverse=True)
-
         return {
             "requirement_scrap_type": scrap_type,
             "remaining_kg": remaining,
@@ -291,3 +247,20 @@ async def match_dealers(requirement_id: str):
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/allocation/plan")
+async def allocation_plan(scrap_type: ScrapType = None, db: AsyncClient = Depends(get_db)):
+    """Allocate all dealer stock across all open requirements in one pass.
+
+    Unlike /dealers/match (one requirement, ranked by stock), every open
+    requirement competes for the same dealers, nearer and better-paying matches
+    first. The plan is advisory: dealers still supply through /fulfill.
+    """
+    try:
+        requirements, inventory = await load_market(db, scrap_type.value if scrap_type else None)
+        # NumPy-heavy; keep the event loop free for other requests meanwhile
+        return await asyncio.to_thread(plan_allocation, requirements, inventory)
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,24 +1,34 @@
-import traceback
-from fastapi import APIRouter, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
-from models import CreateProductRequest, PurchaseProductRequest
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from supabase import AsyncClient
+from database import get_db
+from models import CreateProductRequest, PurchaseProductRequest, ReserveProductRequest
+from services import stock
+from services.auth import Session, authorize, get_session
+from services.ledger import InsufficientCoins
+from services.logs import get_logger
+from services.profiles import ProfileLoader, get_profiles
+from services.response_cache import listing_cache
+from services.pagination import PageParams, keyset, page_params, paginate, select_columns
 
 router = APIRouter(prefix="/products", tags=["Products & Marketplace"])
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+log = get_logger("products")
 
 
 @router.post("/")
-async def create_product(artist_id: str, req: CreateProductRequest):
+async def create_product(
+    artist_id: str,
+    req: CreateProductRequest,
+    db: AsyncClient = Depends(get_db),
+    profiles: ProfileLoader = Depends(get_profiles),
+    session: Optional[Session] = Depends(get_session),
+):
     """Artist lists a product on the marketplace with stock quantity."""
+    authorize(session, artist_id)
     try:
         # Verify artist role
-        profile = supabase.table("profiles").select("role").eq(
-            "id", artist_id
-        ).single().execute()
-
-        if profile.data["role"] != "artist":
+        if await profiles.role(artist_id) != "artist":
             raise HTTPException(status_code=403, detail="Only artists can list products")
 
         data = {
@@ -33,7 +43,8 @@ async def create_product(artist_id: str, req: CreateProductRequest):
             "is_available": req.stock_quantity > 0,
         }
 
-        result = supabase.table("products").insert(data).execute()
+        result = await db.table("products").insert(data).execute()
+        listing_cache.invalidate("products")
         return {"message": "Product listed", "data": result.data}
 
     except HTTPException:
@@ -43,28 +54,45 @@ async def create_product(artist_id: str, req: CreateProductRequest):
 
 
 @router.get("/")
-async def list_products(available_only: bool = True):
-    """Browse marketplace products (only in-stock ones by default)."""
+async def list_products(
+    request: Request,
+    response: Response,
+    available_only: bool = True,
+    page: PageParams = Depends(page_params),
+    db: AsyncClient = Depends(get_db),
+):
+    """Browse marketplace products (only in-stock ones by default), newest first, one page at a time.
+
+    Served from the listing cache with an ETag; If-None-Match revalidation gets a 304.
+    """
+    cached = listing_cache.get(request, "products")
+    if cached is not None:
+        return cached
+    version = listing_cache.version("products")
     try:
-        query = supabase.table("products").select(
-            "*, profiles!products_artist_id_fkey(name)"
+        profiles = "profiles!products_artist_id_fkey(name)"
+        query = db.table("products").select(
+            select_columns(page, f"*, {profiles}", {"profiles": profiles})
         )
 
         if available_only:
             query = query.eq("is_available", True)
 
-        result = query.order("created_at", desc=True).execute()
-        return result.data
+        result = await keyset(query, page).execute()
+        rows = paginate(result.data, page, response)
+        return listing_cache.put(request, "products", version, rows, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{product_id}")
-async def get_product(product_id: str):
+async def get_product(product_id: str, db: AsyncClient = Depends(get_db)):
     """Get product details."""
     try:
-        result = supabase.table("products").select(
+        result = await db.table("products").select(
             "*, profiles!products_artist_id_fkey(name, location)"
         ).eq("id", product_id).single().execute()
         return result.data
@@ -73,110 +101,94 @@ async def get_product(product_id: str):
 
 
 @router.post("/{product_id}/purchase")
-async def purchase_product(product_id: str, req: PurchaseProductRequest):
-    """Purchase a product: deduct coins from buyer, add to artist, reduce stock.
-    
-    Flow:
-    1. Get product and validate stock
-    2. Check buyer has enough coins (price × quantity)
-    3. Deduct coins from buyer
-    4. Add coins to artist
-    5. Log transactions for both parties
-    6. Reduce stock (hide product when stock reaches 0)
+async def purchase_product(
+    product_id: str,
+    req: PurchaseProductRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Purchase a product: take the stock, deduct coins from buyer, add to artist.
+
+    One `purchase_product` database call does it all in a single transaction:
+    1. Take `quantity` units if that many are left (conditional decrement, so
+       concurrent buyers can never oversell), or consume `reservation_id`
+    2. Move price × quantity coins buyer -> artist and log both sides
+    3. Hide the product when its stock reaches 0
+    If the buyer cannot pay, the stock is left untouched.
     """
+    authorize(session, req.buyer_id)
+    if req.reservation_id is None and req.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
     try:
-        print(f"[PURCHASE] Starting: product={product_id}, buyer={req.buyer_id}, qty={req.quantity}")
-
-        # 1. Get product
-        product = supabase.table("products").select("*").eq(
-            "id", product_id
-        ).single().execute()
-
-        if not product.data:
-            raise HTTPException(status_code=404, detail="Product not found")
-
-        stock = product.data.get("stock_quantity", 0) or 0
-        if stock <= 0:
-            raise HTTPException(status_code=400, detail="Product is out of stock")
-
-        if req.quantity > stock:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Only {stock} units available. You requested {req.quantity}."
-            )
-
-        if req.quantity <= 0:
-            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
-
-        unit_price = product.data.get("price_coins", 0) or 0
-        total_cost = unit_price * req.quantity
-        artist_id = product.data["artist_id"]
-
-        print(f"[PURCHASE] unit_price={unit_price}, total={total_cost}, stock={stock}")
-
-        # 2. Check buyer coins
-        if req.pay_with_coins and total_cost > 0:
-            buyer = supabase.table("profiles").select("scrap_coins").eq(
-                "id", req.buyer_id
-            ).single().execute()
-            buyer_coins = buyer.data.get("scrap_coins", 0) or 0
-
-            if buyer_coins < total_cost:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Insufficient coins. You have {buyer_coins} but need {total_cost} ({unit_price} × {req.quantity})."
-                )
-
-            # 3. Deduct from buyer
-            supabase.table("profiles").update({
-                "scrap_coins": buyer_coins - total_cost,
-            }).eq("id", req.buyer_id).execute()
-
-            # 4. Add to artist
-            artist_profile = supabase.table("profiles").select("scrap_coins").eq(
-                "id", artist_id
-            ).single().execute()
-            artist_coins = artist_profile.data.get("scrap_coins", 0) or 0
-            supabase.table("profiles").update({
-                "scrap_coins": artist_coins + total_cost,
-            }).eq("id", artist_id).execute()
-
-            # 5. Log transactions for both
-            supabase.table("transactions").insert([
-                {
-                    "user_id": req.buyer_id,
-                    "amount": -total_cost,
-                    "type": "purchase",
-                    "reference_id": product_id,
-                    "description": f"Bought {req.quantity}× '{product.data['name']}' for {total_cost} coins"
-                },
-                {
-                    "user_id": artist_id,
-                    "amount": total_cost,
-                    "type": "purchase",
-                    "reference_id": product_id,
-                    "description": f"Sold {req.quantity}× '{product.data['name']}' for {total_cost} coins"
-                },
-            ]).execute()
-            print(f"[PURCHASE] Coins: buyer -{total_cost}, artist +{total_cost}")
-
-        # 6. Reduce stock
-        new_stock = stock - req.quantity
-        supabase.table("products").update({
-            "stock_quantity": new_stock,
-            "is_available": new_stock > 0,
-        }).eq("id", product_id).execute()
-        print(f"[PURCHASE] Stock: {stock} -> {new_stock}")
+        log.debug("purchase.start", product_id=product_id, buyer_id=req.buyer_id, quantity=req.quantity,
+                  reservation_id=req.reservation_id)
+        result = await stock.purchase(
+            db, product_id, req.buyer_id, req.quantity,
+            pay_with_coins=req.pay_with_coins, reservation_id=req.reservation_id,
+        )
+        listing_cache.invalidate("products")
+        log.info("purchase.completed", product_id=product_id, buyer_id=req.buyer_id, quantity=result["quantity"],
+                 total=result["total_paid"], stock_after=result["remaining_stock"])
 
         return {
-            "message": f"Purchased {req.quantity}× {product.data['name']}!",
-            "total_paid": total_cost,
-            "remaining_stock": new_stock,
+            "message": f"Purchased {result['quantity']}× {result['name']}!",
+            "total_paid": result["total_paid"],
+            "remaining_stock": result["remaining_stock"],
         }
 
-    except HTTPException:
-        raise
+    except stock.ProductNotFound:
+        raise HTTPException(status_code=404, detail="Product not found")
+    except stock.OutOfStock as e:
+        raise HTTPException(status_code=400, detail="Product is out of stock" if e.available <= 0 else str(e))
+    except stock.ReservationInvalid:
+        raise HTTPException(status_code=400, detail="Reservation not found, expired or already used")
+    except InsufficientCoins as e:
+        raise HTTPException(status_code=400, detail=f"Insufficient coins. You have {e.balance} but need {e.needed}.")
     except Exception as e:
-        print(f"[PURCHASE] ERROR: {e}")
-        traceback.print_exc()
+        log.exception("purchase.failed", product_id=product_id, buyer_id=req.buyer_id, error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{product_id}/reserve")
+async def reserve_product(
+    product_id: str,
+    req: ReserveProductRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Hold stock for a checkout. The units leave the stock now and come back
+    unless purchased (with `reservation_id`) before `expires_at`."""
+    authorize(session, req.buyer_id)
+    if req.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    try:
+        reservation = await stock.reserve(db, product_id, req.buyer_id, req.quantity)
+        listing_cache.invalidate("products")
+        return reservation
+
+    except stock.ProductNotFound:
+        raise HTTPException(status_code=404, detail="Product not found")
+    except stock.OutOfStock as e:
+        raise HTTPException(status_code=400, detail="Product is out of stock" if e.available <= 0 else str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/reservations/{reservation_id}")
+async def release_reservation(
+    reservation_id: str,
+    buyer_id: str,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Abandon a checkout: the held units go back to stock. Only the buyer
+    holding the reservation can release it."""
+    authorize(session, buyer_id)
+    try:
+        released = await stock.release(db, reservation_id, buyer_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not released:
+        raise HTTPException(status_code=404, detail="Reservation not found or no longer held")
+    listing_cache.invalidate("products")
+    return {"message": "Reservation released"}
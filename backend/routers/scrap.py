@@ -1,263 +1,501 @@
-from fastapi import APIRouter, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, COIN_MULTIPLIERS
-from models import DonateScrapRequest, AcceptScrapRequest
-import math
-from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from supabase import AsyncClient
+from config import (
+    GEO_INDEX_CELL_DEG, GEO_INDEX_REFRESH_SECONDS, GEO_PUSHDOWN, FEED_CACHE_SECONDS,
+    FEED_TICK_SECONDS, FEED_KEEPALIVE_SECONDS,
+    BULK_DONATE_CHUNK_SIZE, BULK_DONATE_MAX_ITEMS, BULK_DONATE_MAX_ITEM_BYTES,
+    BATCH_COMPLETE_MAX_IDS,
+)
+from database import get_db
+from models import DonateScrapRequest, AcceptScrapRequest, CompleteScrapBatchRequest
+from services.auth import Session, authorize, get_session, require_role
+from services.bulk import BulkBodyError, is_ndjson, iter_json_items
+from services.claims import AlreadyClaimed, NotAPartner, RequestNotFound, claim_pickup, complete_pickup
+from services.feed import feed_hub, sse
+from services.geo import PendingRequestIndex, has_location, haversine_distance, nearby_from_db
+from services.inventory import inventory_index
+from services.logs import get_logger
+from services.outbox import outbox_worker
+from services.ledger import InsufficientCoins, complete_pickups
+from services.profiles import ProfileLoader, get_profiles
+from services.pagination import PageParams, keyset, page_params, paginate, select_columns
+import asyncio
+import time
+from typing import Optional
 
 router = APIRouter(prefix="/scrap", tags=["Scrap Management"])
+log = get_logger("scrap")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+PENDING_SELECT = "*, profiles!scrap_requests_user_id_fkey(name, location, phone)"
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
-        return float('inf')
-    radius = 6371 # km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return radius * c
+# Pending requests bucketed by location, shared by every partner poll on this worker
+pending_index = PendingRequestIndex(cell_deg=GEO_INDEX_CELL_DEG)
 
+# Feeds precomputed by /feeds/warm: partner id -> (index version, computed at, (lat, lon), rows)
+partner_feeds = {}
+
+# Concurrent polls that find the index stale share a single reload
+_index_reload_lock = asyncio.Lock()
+
+# Background task that grows streamed feeds over time; runs while anyone is subscribed
+_feed_ticker = None
+
+
+async def load_pending_index(db):
+    """(Re)build the pending-request index from the database when it is stale."""
+    if pending_index.is_fresh(GEO_INDEX_REFRESH_SECONDS):
+        return
+    async with _index_reload_lock:
+        if pending_index.is_fresh(GEO_INDEX_REFRESH_SECONDS):
+            return
+        await _reload_pending_index(db)
+
+
+async def _reload_pending_index(db):
+    result = await db.table("scrap_requests").select(PENDING_SELECT).eq(
+        "status", "pending"
+    ).execute()
+    pending_index.rebuild(result.data)
+
+
+async def _tick_feeds(db):
+    """Re-diff every open stream: radii grow with age, and other workers' donations
+    and accepts only reach this worker through the periodic index reload."""
+    while len(feed_hub):
+        await asyncio.sleep(FEED_TICK_SECONDS)
+        try:
+            await load_pending_index(db)
+            feed_hub.sync(pending_index)
+        except Exception as e:
+            log.warning("feed.tick_failed", error=str(e))
+
+
+def _ensure_feed_ticker(db):
+    global _feed_ticker
+    if _feed_ticker is None or _feed_ticker.done():
+        _feed_ticker = asyncio.create_task(_tick_feeds(db))
+
+
+def cached_feed(partner_id, lat, lon):
+    """A warmed feed for the partner, if it was computed for where the partner is now,
+    the index has not changed since and it is recent."""
+    hit = partner_feeds.get(partner_id)
+    if hit is None:
+        return None
+    version, computed_at, location, rows = hit
+    if (version != pending_index.version or location != (lat, lon)
+            or time.monotonic() - computed_at > FEED_CACHE_SECONDS):
+        return None
+    return rows
+
+
+def _donation_row(user_id, req: DonateScrapRequest):
+    return {
+        "user_id": user_id,
+        "scrap_type": req.scrap_type.value,
+        "weight_kg": req.weight_kg,
+        "description": req.description,
+        "pickup_address": req.pickup_address,
+        "latitude": req.latitude,
+        "longitude": req.longitude,
+        "image_url": req.image_url,
+        "status": "pending",
+    }
 
 
 @router.post("/donate")
-async def donate_scrap(user_id: str, req: DonateScrapRequest):
+async def donate_scrap(
+    user_id: str,
+    req: DonateScrapRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
     """User donates scrap — creates request, no coins awarded until completed."""
+    authorize(session, user_id)
     try:
-        data = {
-            "user_id": user_id,
-            "scrap_type": req.scrap_type.value,
-            "weight_kg": req.weight_kg,
-            "description": req.description,
-            "pickup_address": req.pickup_address,
-            "latitude": req.latitude,
-            "longitude": req.longitude,
-            "image_url": req.image_url,
-            "status": "pending",
-        }
+        result = await db.table("scrap_requests").insert(_donation_row(user_id, req)).execute()
+
+        # Make the new request visible to partner polls without waiting for a rebuild
+        if result.data and pending_index.loaded_at is not None:
+            created = await db.table("scrap_requests").select(PENDING_SELECT).eq(
+                "id", result.data[0]["id"]
+            ).single().execute()
+            pending_index.add(created.data)
+            feed_hub.publish_added(created.data)
 
-        result = supabase.table("scrap_requests").insert(data).execute()
         return {"message": "Scrap donation request created", "data": result.data}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/donate/bulk")
+async def donate_scrap_bulk(
+    user_id: str,
+    request: Request,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Many donations in one call: a JSON array, or NDJSON (Content-Type:
+    application/x-ndjson), of DonateScrapRequest items.
+
+    Items are validated as the body streams in and inserted BULK_DONATE_CHUNK_SIZE
+    rows per query. Each full chunk is written before more of the body is read,
+    so a call holds at most one chunk and one item in memory. Every item gets a
+    result at its position; chunks already written stay written if a later
+    chunk fails or the body turns out to be malformed.
+    """
+    authorize(session, user_id)
+    results = []
+    batch = []   # (position, row) waiting for the next insert
+    donor = None
+    error = None
+
+    async def flush():
+        nonlocal donor
+        if not batch:
+            return
+        try:
+            inserted = await db.table("scrap_requests").insert([row for _, row in batch]).execute()
+        except Exception as e:
+            for position, _ in batch:
+                results[position] = {"index": position, "status": "failed", "error": str(e)}
+            batch.clear()
+            return
+
+        for (position, _), created in zip(batch, inserted.data):
+            results[position] = {"index": position, "status": "created", "id": created["id"]}
+        batch.clear()
+
+        # Same effect as /donate on partner polls and streams, with one donor lookup per call
+        if pending_index.loaded_at is not None:
+            try:
+                if donor is None:
+                    profile = await db.table("profiles").select("name, location, phone").eq("id", user_id).execute()
+                    donor = profile.data[0] if profile.data else {}
+            except Exception as e:
+                log.warning("bulk_donate.donor_lookup_failed", user_id=user_id, error=str(e))
+                pending_index.invalidate()
+                return
+            for created in inserted.data:
+                row = {**created, "profiles": donor or None}
+                pending_index.add(row)
+                feed_hub.publish_added(row)
+
+    try:
+        items = iter_json_items(
+            request.stream(), is_ndjson(request.headers.get("content-type")), BULK_DONATE_MAX_ITEM_BYTES
+        )
+        async for item in items:
+            position = len(results)
+            if position >= BULK_DONATE_MAX_ITEMS:
+                error = f"More than {BULK_DONATE_MAX_ITEMS} items; the rest were not read"
+                break
+            try:
+                if isinstance(item, ValueError):   # oversized, or an NDJSON line that is not JSON
+                    raise item
+                req = DonateScrapRequest.model_validate(item)
+            except ValidationError as e:
+                results.append({"index": position, "status": "invalid", "errors": jsonable_encoder(
+                    e.errors(include_url=False, include_input=False)
+                )})
+                continue
+            except ValueError as e:
+                results.append({"index": position, "status": "invalid", "errors": [{"msg": str(e)}]})
+                continue
+
+            results.append(None)   # filled in when its chunk is written
+            batch.append((position, _donation_row(user_id, req)))
+            if len(batch) >= BULK_DONATE_CHUNK_SIZE:
+                await flush()
+    except BulkBodyError as e:
+        error = str(e)
+    await flush()
+
+    if error and not results:
+        raise HTTPException(status_code=400, detail=error)
+
+    counts = {status: 0 for status in ("created", "invalid", "failed")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "message": f"{counts['created']} of {len(results)} donations created",
+        **counts,
+        "error": error,
+        "results": results,
+    }
+
+
 @router.get("/requests")
-async def get_scrap_requests(status: str = None, user_id: str = None):
-    """Get scrap requests filtered by status and/or user."""
+async def get_scrap_requests(
+    response: Response,
+    status: str = None,
+    user_id: str = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncClient = Depends(get_db),
+):
+    """Get scrap requests filtered by status and/or user, newest first, one page at a time."""
     try:
-        query = supabase.table("scrap_requests").select("*, profiles!scrap_requests_user_id_fkey(name, location)")
+        profiles = "profiles!scrap_requests_user_id_fkey(name, location)"
+        query = db.table("scrap_requests").select(
+            select_columns(page, f"*, {profiles}", {"profiles": profiles})
+        )
 
         if status:
             query = query.eq("status", status)
         if user_id:
             query = query.eq("user_id", user_id)
 
-        result = query.order("created_at", desc=True).execute()
-        return result.data
+        result = await keyset(query, page).execute()
+        return paginate(result.data, page, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/requests/available")
-async def get_available_requests(partner_id: str):
+async def get_available_requests(
+    partner_id: str,
+    db: AsyncClient = Depends(get_db),
+    profiles: ProfileLoader = Depends(get_profiles),
+):
     """Get all pending scrap requests for partners with intelligent geographic routing."""
     try:
+        if not GEO_PUSHDOWN:
+            # Pending requests come from the in-process spatial index, not a table scan
+            await load_pending_index(db)
+
         # Get partner's location
-        partner_res = supabase.table("profiles").select("latitude, longitude").eq("id", partner_id).single().execute()
-        partner_lat = partner_res.data.get("latitude")
-        partner_lon = partner_res.data.get("longitude")
+        partner = await profiles.get(partner_id)
+        if partner is None:
+            raise HTTPException(status_code=404, detail="Partner not found")
+        partner_lat = partner.get("latitude")
+        partner_lon = partner.get("longitude")
+
+        if GEO_PUSHDOWN:
+            # Postgres sends only the requests inside their time-decayed radius
+            return await nearby_from_db(db, partner_lat, partner_lon)
 
-        # Fetch pending requests
-        result = supabase.table("scrap_requests").select(
-            "*, profiles!scrap_requests_user_id_fkey(name, location, phone)"
-        ).eq("status", "pending").order("created_at", desc=True).execute()
-        
-        pending_requests = result.data
+        warmed = cached_feed(partner_id, partner_lat, partner_lon)
+        if warmed is not None:
+            return warmed
 
         # If partner has no location recorded, return all pending requests as a fallback
         if not partner_lat or not partner_lon:
-            return pending_requests
+            return pending_index.all_rows()
 
-        filtered_requests = []
-        now = datetime.now(timezone.utc)
+        # Only grid cells within the 50 km cap are visited; each request is then
+        # checked against its own time-decayed radius
+        return pending_index.nearby(partner_lat, partner_lon)
 
-        for req in pending_requests:
-            req_lat = req.get("latitude")
-            req_lon = req.get("longitude")
-
-            # Fallback if request has no location, always show it to prevent lost requests
-            if not req_lat or not req_lon:
-                filtered_requests.append(req)
-                continue
-
-            dist_km = haversine_distance(partner_lat, partner_lon, req_lat, req_lon)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            # Extract created_at to determine request age
-            created_at_str = req.get("created_at")
-            try:
-                # Handle Supabase ISO format
-                created_dt = datetime.fromisoformat(created_at_str.replace("Z", "+00:00"))
-                age_minutes = (now - created_dt).total_seconds() / 60.0
-            except Exception:
-                age_minutes = 60 # Default fallback if parsing fails
 
-            # ---- TIME DECAY ALGORITHM ----
-            # Initial radius: 5 km. Expands by 0.5 km per minute unaccepted. Max cap: 50 km.
-            allowed_radius = min(50, 5 + (max(0, age_minutes) * 0.5))
+@router.get("/requests/stream")
+async def stream_available_requests(
+    partner_id: str,
+    db: AsyncClient = Depends(get_db),
+    profiles: ProfileLoader = Depends(get_profiles),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Server-Sent Events version of /requests/available, for the caller's own
+    dealer/artist feed.
+
+    Sends a `snapshot` event with the current feed, then `add` / `remove` events
+    as requests are donated, come into range or are taken. A `close` event means
+    the client fell behind and should reconnect for a fresh snapshot.
+    """
+    authorize(session, partner_id)
+    try:
+        await load_pending_index(db)
+        partner = await profiles.get(partner_id)
+        if partner is None:
+            raise HTTPException(status_code=404, detail="Partner not found")
+        if partner.get("role") not in ("dealer", "artist"):
+            raise HTTPException(status_code=403, detail="Only dealers/artists can stream requests")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            if dist_km <= allowed_radius:
-                req['distance_km'] = round(dist_km, 1) # Annotate distance for frontend
-                filtered_requests.append(req)
+    subscription, rows = feed_hub.subscribe(
+        partner_id, partner.get("latitude"), partner.get("longitude"), pending_index
+    )
+    _ensure_feed_ticker(db)
+
+    async def events():
+        try:
+            yield sse("snapshot", rows)
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(subscription.queue.get(), FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event == "close":
+                    yield sse("close", {"reason": "slow consumer"})
+                    return
+                yield sse(event, data)
+        finally:
+            feed_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/feeds/warm")
+async def warm_partner_feeds(
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Precompute the available-requests feed of every located dealer/artist in one vectorized pass.
+
+    Reloads the index and reads every partner profile, so it takes a signed-in
+    dealer or artist even while AUTH_REQUIRED is off.
+    """
+    require_role(session, ("dealer", "artist"))
+    try:
+        _, partners = await asyncio.gather(
+            load_pending_index(db),
+            db.table("profiles").select("id, latitude, longitude").in_(
+                "role", ["dealer", "artist"]
+            ).execute(),
+        )
+        located = [
+            (p["id"], p["latitude"], p["longitude"])
+            for p in partners.data
+            if has_location(p.get("latitude"), p.get("longitude"))
+        ]
+
+        feeds = pending_index.feeds(located)
+        computed_at = time.monotonic()
+        partner_feeds.clear()
+        for partner_id, lat, lon in located:
+            partner_feeds[partner_id] = (pending_index.version, computed_at, (lat, lon), feeds[partner_id])
 
-        return filtered_requests
+        return {
+            "message": "Partner feeds warmed",
+            "partners": len(feeds),
+            "pending_requests": len(pending_index),
+        }
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.put("/requests/{request_id}/accept")
-async def accept_scrap_request(request_id: str, req: AcceptScrapRequest):
-    """Partner accepts a scrap pickup request."""
+async def accept_scrap_request(
+    request_id: str,
+    req: AcceptScrapRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Partner accepts a scrap pickup request.
+
+    One `claim_scrap_request` call checks the partner's role and coins and moves
+    the request from pending to accepted atomically, so when many partners race
+    for a new request each pays one round-trip and exactly one wins.
+    """
+    authorize(session, req.partner_id)
     try:
-        # Verify partner is dealer or artist
-        partner = supabase.table("profiles").select("role").eq(
-            "id", req.partner_id
-        ).single().execute()
-
-        if partner.data["role"] not in ["dealer", "artist"]:
-            raise HTTPException(status_code=403, detail="Only dealers/artists can accept requests")
-
-        # Verify partner has enough coins to pay for this scrap
-        request_record = supabase.table("scrap_requests").select("*").eq("id", request_id).single().execute()
-        if not request_record.data:
-            raise HTTPException(status_code=404, detail="Request not found")
-
-        scrap_type = request_record.data.get("scrap_type", "other")
-        weight_kg = float(request_record.data.get("weight_kg", 0))
-        multiplier = COIN_MULTIPLIERS.get(scrap_type, 10)
-        required_coins = math.floor(weight_kg * multiplier)
-
-        partner_profile = supabase.table("profiles").select("scrap_coins").eq("id", req.partner_id).single().execute()
-        partner_coins = partner_profile.data.get("scrap_coins", 0) or 0
-
-        if partner_coins < required_coins:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient coins. You need {required_coins} coins to accept this pickup, but you have {partner_coins}."
-            )
-
-        result = supabase.table("scrap_requests").update({
-            "partner_id": req.partner_id,
-            "status": "accepted",
-        }).eq("id", request_id).eq("status", "pending").execute()
+        claimed = await claim_pickup(db, request_id, req.partner_id)
+    except NotAPartner:
+        raise HTTPException(status_code=403, detail="Only dealers/artists can accept requests")
+    except RequestNotFound:
+        raise HTTPException(status_code=404, detail="Request not found")
+    except InsufficientCoins as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient coins. You need {e.needed} coins to accept this pickup, but you have {e.balance}."
+        )
+    except AlreadyClaimed:
+        # Lost the race: the request is no longer pending anywhere
+        pending_index.remove(request_id)
+        feed_hub.publish_removed(request_id)
+        log.debug("accept.lost", request_id=request_id, partner_id=req.partner_id)
+        raise HTTPException(status_code=404, detail="Request not found or already accepted")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if not result.data:
-            raise HTTPException(status_code=404, detail="Request not found or already accepted")
+    pending_index.remove(request_id)
+    feed_hub.publish_removed(request_id)
+    return {"message": "Request accepted", "data": [claimed]}
 
-        return {"message": "Request accepted", "data": result.data}
 
-    except HTTPException:
-        raise
+@router.put("/requests/{request_id}/complete")
+async def complete_scrap_request(
+    request_id: str,
+    req: AcceptScrapRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Mark a scrap request as completed. Awards Scrap Coins to the user.
+
+    One `complete_scrap_request` call completes it and queues the payout (and a
+    dealer's stock) in the same transaction; the outbox worker applies them
+    right after (services/outbox.py), so the partner waits on one round-trip.
+    """
+    authorize(session, req.partner_id)
+    try:
+        completed = await complete_pickup(db, request_id, req.partner_id)
+    except RequestNotFound:
+        raise HTTPException(status_code=404, detail="Request not found")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-
-@router.put("/requests/{request_id}/complete")
-async def complete_scrap_request(request_id: str, req: AcceptScrapRequest):
-    """Mark a scrap request as completed. Awards Scrap Coins to the user."""
+    outbox_worker.wake()
+    pending_index.remove(request_id)
+    feed_hub.publish_removed(request_id)
+    return {
+        "message": "Request completed",
+        "coins_earned": completed["coins_awarded"],
+        "new_balance": completed["new_balance"],   # once the queued payout is applied
+        "payout": "queued",
+    }
+
+
+@router.put("/requests/complete")
+async def complete_scrap_requests(
+    req: CompleteScrapBatchRequest,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """Complete a partner's accepted pickups in one call (e.g. at the end of a route).
+
+    Same payouts and inventory as completing each request on its own, in a single
+    database round-trip. Ids that are not accepted by this partner are returned
+    under `skipped` instead of failing the batch. Payouts and stock are applied
+    in that same transaction, not queued, so `balances` are final.
+    """
+    authorize(session, req.partner_id)
+    if len(req.request_ids) > BATCH_COMPLETE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_COMPLETE_MAX_IDS} requests per batch")
     try:
-        # Get the request
-        request_record = supabase.table("scrap_requests").select("*").eq(
-            "id", request_id
-        ).eq("partner_id", req.partner_id).eq("status", "accepted").single().execute()
-
-        if not request_record.data:
-            raise HTTPException(status_code=404, detail="Request not found")
-
-        scrap_type = request_record.data["scrap_type"]
-        weight_kg = float(request_record.data["weight_kg"])
-        user_id = request_record.data["user_id"]
-
-        # Calculate coins: weight * multiplier
-        multiplier = COIN_MULTIPLIERS.get(scrap_type, 10)
-        coins_earned = math.floor(weight_kg * multiplier)
-
-        # Update request status
-        supabase.table("scrap_requests").update({
-            "status": "completed",
-            "coins_awarded": coins_earned,
-        }).eq("id", request_id).execute()
-
-        # Award coins to user
-        current_profile = supabase.table("profiles").select("scrap_coins").eq(
-            "id", user_id
-        ).single().execute()
-        new_balance = current_profile.data["scrap_coins"] + coins_earned
-
-        supabase.table("profiles").update({
-            "scrap_coins": new_balance,
-        }).eq("id", user_id).execute()
-
-        # Record transaction for user
-        supabase.table("transactions").insert({
-            "user_id": user_id,
-            "amount": coins_earned,
-            "type": "donation_reward",
-            "reference_id": request_id,
-            "description": f"Earned {coins_earned} coins for donating {weight_kg}kg of {scrap_type}",
-        }).execute()
-
-        # Deduct coins from partner
-        partner_profile = supabase.table("profiles").select("scrap_coins").eq(
-            "id", req.partner_id
-        ).single().execute()
-        partner_coins = partner_profile.data.get("scrap_coins", 0) or 0
-        new_partner_balance = partner_coins - coins_earned
-
-        supabase.table("profiles").update({
-            "scrap_coins": new_partner_balance,
-        }).eq("id", req.partner_id).execute()
-
-        # Record transaction for partner
-        supabase.table("transactions").insert({
-            "user_id": req.partner_id,
-            "amount": -coins_earned,
-            "type": "pickup_cost",
-            "reference_id": request_id,
-            "description": f"Spent {coins_earned} coins to collect {weight_kg}kg of {scrap_type}",
-        }).execute()
-
-        # If partner is dealer, add to inventory
-        partner = supabase.table("profiles").select("role").eq(
-            "id", req.partner_id
-        ).single().execute()
-
-        if partner.data["role"] == "dealer":
-            # Upsert dealer inventory
-            existing = supabase.table("dealer_inventory").select("*").eq(
-                "dealer_id", req.partner_id
-            ).eq("scrap_type", scrap_type).execute()
-
-            if existing.data:
-                new_qty = float(existing.data[0]["quantity_kg"]) + weight_kg
-                supabase.table("dealer_inventory").update({
-                    "quantity_kg": new_qty,
-                }).eq("id", existing.data[0]["id"]).execute()
-            else:
-                supabase.table("dealer_inventory").insert({
-                    "dealer_id": req.partner_id,
-                    "scrap_type": scrap_type,
-                    "quantity_kg": weight_kg,
-                }).execute()
+        result = await complete_pickups(db, req.partner_id, req.request_ids)
+
+        for completed in result["completed"]:
+            pending_index.remove(completed["id"])
+            feed_hub.publish_removed(completed["id"])
+        for row in result["inventory"]:
+            inventory_index.set_quantity(req.partner_id, row["scrap_type"], float(row["quantity_kg"]), row)
 
         return {
-            "message": "Request completed",
-            "coins_earned": coins_earned,
-            "new_balance": new_balance,
+            "message": f"{len(result['completed'])} requests completed",
+            "completed": result["completed"],
+            "skipped": result["skipped"],
+            "coins_earned": sum(c["coins_awarded"] for c in result["completed"]),
+            "balances": result["balances"],
         }
 
     except HTTPException:
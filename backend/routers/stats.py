@@ -0,0 +1,53 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from supabase import AsyncClient
+from config import STATS_DEFAULT_DAYS, STATS_MAX_DAYS
+from database import get_db
+from services.auth import Session, authorize, get_session
+from services.rollups import DEALER_METRICS, INDUSTRY_METRICS, USER_METRICS, get_stats
+
+router = APIRouter(prefix="/stats", tags=["Dashboard Stats"])
+
+DaysParam = Query(STATS_DEFAULT_DAYS, ge=0, le=STATS_MAX_DAYS, description="daily figures for this many days back")
+
+
+async def _stats(db, subject_id, metrics, days, session, key):
+    authorize(session, subject_id)
+    try:
+        return {key: subject_id, **await get_stats(db, subject_id, metrics, days)}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/users/{user_id}")
+async def user_stats(
+    user_id: str,
+    days: int = DaysParam,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """A donor's kg donated and coins earned per scrap type, plus coins bought and spent."""
+    return await _stats(db, user_id, USER_METRICS, days, session, "user_id")
+
+
+@router.get("/dealers/{dealer_id}")
+async def dealer_stats(
+    dealer_id: str,
+    days: int = DaysParam,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """A dealer's pickups (kg collected, coins paid) and supplies to industry (kg, coins earned)."""
+    return await _stats(db, dealer_id, DEALER_METRICS, days, session, "dealer_id")
+
+
+@router.get("/industries/{industry_id}")
+async def industry_stats(
+    industry_id: str,
+    days: int = DaysParam,
+    db: AsyncClient = Depends(get_db),
+    session: Optional[Session] = Depends(get_session),
+):
+    """An industry's fulfilled kg per scrap type and the coins paid for it."""
+    return await _stats(db, industry_id, INDUSTRY_METRICS, days, session, "industry_id")
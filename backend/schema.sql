@@ -230,6 +230,95 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Atomic Scrap Coin transfer: debit, credit and both ledger rows in one transaction.
+-- p_from NULL mints coins (e.g. Razorpay purchase), p_to NULL burns them.
+-- p_mode decides what happens when p_from cannot cover p_amount:
+--   'require'   raise insufficient_coins (nothing is written)
+--   'partial'   transfer whatever the payer has
+--   'skip'      transfer nothing
+--   'overdraft' transfer anyway, the payer's balance may go negative
+-- '{amount}' in the descriptions is replaced by the amount actually moved.
+CREATE OR REPLACE FUNCTION transfer_coins(
+    p_from UUID,
+    p_to UUID,
+    p_amount INTEGER,
+    p_type TEXT,
+    p_reference_id UUID DEFAULT NULL,
+    p_debit_description TEXT DEFAULT NULL,
+    p_credit_description TEXT DEFAULT NULL,
+    p_mode TEXT DEFAULT 'require',
+    p_debit_type TEXT DEFAULT NULL
+)
+RETURNS JSON AS $$
+DECLARE
+    v_amount INTEGER := p_amount;
+    v_from_balance INTEGER;
+    v_to_balance INTEGER;
+BEGIN
+    IF p_amount IS NULL OR p_amount < 0 THEN
+        RAISE EXCEPTION 'invalid_amount: %', p_amount;
+    END IF;
+
+    -- Lock both wallets in id order so opposite concurrent transfers cannot deadlock
+    PERFORM 1 FROM profiles WHERE id IN (p_from, p_to) ORDER BY id FOR UPDATE;
+
+    IF p_from IS NOT NULL THEN
+        SELECT scrap_coins INTO v_from_balance FROM profiles WHERE id = p_from;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'profile_not_found: %', p_from;
+        END IF;
+
+        IF v_from_balance < v_amount THEN
+            CASE p_mode
+                WHEN 'require' THEN
+                    RAISE EXCEPTION 'insufficient_coins'
+                        USING DETAIL = json_build_object('balance', v_from_balance, 'needed', v_amount)::TEXT;
+                WHEN 'partial' THEN v_amount := GREATEST(v_from_balance, 0);
+                WHEN 'skip' THEN v_amount := 0;
+                ELSE NULL; -- overdraft
+            END CASE;
+        END IF;
+    END IF;
+
+    IF p_to IS NOT NULL THEN
+        SELECT scrap_coins INTO v_to_balance FROM profiles WHERE id = p_to;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'profile_not_found: %', p_to;
+        END IF;
+    END IF;
+
+    IF v_amount > 0 THEN
+        IF p_from IS NOT NULL THEN
+            UPDATE profiles SET scrap_coins = scrap_coins - v_amount
+            WHERE id = p_from RETURNING scrap_coins INTO v_from_balance;
+
+            INSERT INTO transactions (user_id, amount, type, reference_id, description)
+            VALUES (p_from, -v_amount, COALESCE(p_debit_type, p_type), p_reference_id,
+                    replace(p_debit_description, '{amount}', v_amount::TEXT));
+        END IF;
+
+        IF p_to IS NOT NULL THEN
+            UPDATE profiles SET scrap_coins = scrap_coins + v_amount
+            WHERE id = p_to RETURNING scrap_coins INTO v_to_balance;
+
+            INSERT INTO transactions (user_id, amount, type, reference_id, description)
+            VALUES (p_to, v_amount, p_type, p_reference_id,
+                    replace(p_credit_description, '{amount}', v_amount::TEXT));
+        END IF;
+    END IF;
+
+    RETURN json_build_object(
+        'amount', v_amount,
+        'from_balance', v_from_balance,
+        'to_balance', v_to_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only the backend (service role) may move coins
+REVOKE EXECUTE ON FUNCTION transfer_coins(UUID, UUID, INTEGER, TEXT, UUID, TEXT, TEXT, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION transfer_coins(UUID, UUID, INTEGER, TEXT, UUID, TEXT, TEXT, TEXT, TEXT) TO service_role;
+
 -- ==========================================
 -- STORAGE BUCKETS & POLICIES
 -- ==========================================
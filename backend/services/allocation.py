@@ -0,0 +1,177 @@
+import asyncio
+from collections import defaultdict
+
+import numpy as np
+
+from config import ALLOCATION_CANDIDATES, ALLOCATION_COST_PER_KG_KM, ALLOCATION_UNKNOWN_DISTANCE_KM
+from services.geo import has_location, haversine_many
+from services.pagination import fetch_all
+
+# Distance matrix cells computed at once (requirements x dealers), bounds memory
+BLOCK_CELLS = 2_000_000
+
+REQUIREMENT_COLUMNS = (
+    "id, industry_id, scrap_type, required_kg, fulfilled_kg, price_per_kg, "
+    "profiles!industry_requirements_industry_id_fkey(latitude, longitude)"
+)
+INVENTORY_COLUMNS = "id, dealer_id, scrap_type, quantity_kg, profiles!dealer_inventory_dealer_id_fkey(latitude, longitude)"
+
+
+async def load_market(db, scrap_type=None):
+    """All open requirements and all positive dealer stock (optionally of one scrap type)."""
+
+    def requirements():
+        query = db.table("industry_requirements").select(REQUIREMENT_COLUMNS).in_(
+            "status", ["open", "partially_fulfilled"]
+        )
+        return query.eq("scrap_type", scrap_type) if scrap_type else query
+
+    def inventory():
+        query = db.table("dealer_inventory").select(INVENTORY_COLUMNS).gt("quantity_kg", 0)
+        return query.eq("scrap_type", scrap_type) if scrap_type else query
+
+    return await asyncio.gather(fetch_all(requirements), fetch_all(inventory))
+
+
+def _hundredths(kg):
+    # Quantities are DECIMAL(10, 2); allocating whole hundredths keeps the sums exact
+    return int(round(float(kg or 0) * 100))
+
+
+def _coordinates(rows):
+    lats = np.full(len(rows), np.nan)
+    lons = np.full(len(rows), np.nan)
+    for i, row in enumerate(rows):
+        profile = row.get("profiles") or {}
+        if has_location(profile.get("latitude"), profile.get("longitude")):
+            lats[i] = profile["latitude"]
+            lons[i] = profile["longitude"]
+    return lats, lons
+
+
+class _TypeMarket:
+    """Open requirements and dealer stock of one scrap type."""
+
+    def __init__(self, requirements, inventory, cost_per_kg_km, unknown_km):
+        self.requirements = requirements
+        self.inventory = inventory
+        self.demand = [
+            max(0, _hundredths(r["required_kg"]) - _hundredths(r.get("fulfilled_kg"))) for r in requirements
+        ]
+        self.supply = [_hundredths(d["quantity_kg"]) for d in inventory]
+        self.price = np.array([float(r.get("price_per_kg") or 0) for r in requirements])
+        self.req_lats, self.req_lons = _coordinates(requirements)
+        self.dealer_lats, self.dealer_lons = _coordinates(inventory)
+        self.cost_per_kg_km = cost_per_kg_km
+        self.unknown_km = unknown_km
+        self.shipped = {}   # (requirement position, dealer position) -> [hundredths of a kg, km]
+
+    def _candidates(self, req_idx, dealer_idx, k):
+        """The k nearest of `dealer_idx` for each of `req_idx`, as flat (req, dealer, km) arrays."""
+        block = max(1, BLOCK_CELLS // len(dealer_idx))
+        reqs, dealers, kms = [], [], []
+        for start in range(0, len(req_idx), block):
+            rows = req_idx[start:start + block]
+            km = haversine_many(
+                self.req_lats[rows][:, None], self.req_lons[rows][:, None],
+                self.dealer_lats[dealer_idx][None, :], self.dealer_lons[dealer_idx][None, :],
+            )
+            km = np.where(np.isnan(km), self.unknown_km, km)
+            if k < len(dealer_idx):
+                nearest = np.argpartition(km, k - 1, axis=1)[:, :k]
+                km = np.take_along_axis(km, nearest, axis=1)
+            else:
+                nearest = np.broadcast_to(np.arange(len(dealer_idx)), km.shape)
+            reqs.append(np.repeat(rows, km.shape[1]))
+            dealers.append(dealer_idx[nearest].ravel())
+            kms.append(km.ravel())
+        return np.concatenate(reqs), np.concatenate(dealers), np.concatenate(kms)
+
+    def solve(self, candidates):
+        """Greedy min-cost transport: cheapest (transport cost - price) pairs are filled first.
+
+        Each round only looks at the `k` nearest dealers that still have stock for
+        every requirement still short; `k` grows until a round has seen every pair,
+        after which no requirement is short while a dealer of its type has stock.
+        """
+        demand, supply = self.demand, self.supply
+        k = max(1, candidates)
+        while True:
+            req_idx = np.flatnonzero(np.array(demand) > 0)
+            dealer_idx = np.flatnonzero(np.array(supply) > 0)
+            if not len(req_idx) or not len(dealer_idx):
+                return
+            reqs, dealers, kms = self._candidates(req_idx, dealer_idx, min(k, len(dealer_idx)))
+            costs = self.cost_per_kg_km * kms - self.price[reqs]
+            order = np.argsort(costs, kind="stable")
+            for r, d, km in zip(reqs[order].tolist(), dealers[order].tolist(), kms[order].tolist()):
+                quantity = min(demand[r], supply[d])
+                if quantity > 0:
+                    demand[r] -= quantity
+                    supply[d] -= quantity
+                    self.shipped.setdefault((r, d), [0, km])[0] += quantity
+            if k >= len(dealer_idx):
+                return
+            k *= 4
+
+    def allocations(self):
+        rows = []
+        for (r, d), (quantity, km) in self.shipped.items():
+            requirement, stock = self.requirements[r], self.inventory[d]
+            located = not np.isnan(self.req_lats[r]) and not np.isnan(self.dealer_lats[d])
+            rows.append({
+                "requirement_id": requirement["id"],
+                "industry_id": requirement["industry_id"],
+                "dealer_id": stock["dealer_id"],
+                "inventory_id": stock["id"],
+                "scrap_type": requirement["scrap_type"],
+                "quantity_kg": quantity / 100,
+                "distance_km": round(km, 1) if located else None,
+                "price_per_kg": float(self.price[r]),
+            })
+        return rows
+
+
+def plan_allocation(
+    requirements,
+    inventory,
+    cost_per_kg_km=ALLOCATION_COST_PER_KG_KM,
+    candidates=ALLOCATION_CANDIDATES,
+    unknown_km=ALLOCATION_UNKNOWN_DISTANCE_KM,
+):
+    """Allocate dealer stock to every open requirement at once.
+
+    `requirements` / `inventory` are rows selected with REQUIREMENT_COLUMNS /
+    INVENTORY_COLUMNS. Each scrap type is an independent transport problem:
+    shipping a kg costs `cost_per_kg_km` coins per km (`unknown_km` when either
+    side has no location) and earns the requirement's price_per_kg. Returns the
+    allocations, the requirements left short and per-type totals.
+    """
+    by_type = defaultdict(lambda: ([], []))
+    for row in requirements:
+        by_type[row["scrap_type"]][0].append(row)
+    for row in inventory:
+        if _hundredths(row["quantity_kg"]) > 0:
+            by_type[row["scrap_type"]][1].append(row)
+
+    allocations, unmet, summary = [], [], {}
+    for scrap_type, (type_requirements, type_inventory) in sorted(by_type.items()):
+        market = _TypeMarket(type_requirements, type_inventory, cost_per_kg_km, unknown_km)
+        demand_total, supply_total = sum(market.demand), sum(market.supply)
+        market.solve(candidates)
+        rows = market.allocations()
+        allocations += rows
+
+        for requirement, short in zip(type_requirements, market.demand):
+            if short > 0:
+                unmet.append({"requirement_id": requirement["id"], "scrap_type": scrap_type, "unmet_kg": short / 100})
+        summary[scrap_type] = {
+            "requirements": len(type_requirements),
+            "dealers": len(type_inventory),
+            "demand_kg": demand_total / 100,
+            "supply_kg": supply_total / 100,
+            "allocated_kg": round(sum(row["quantity_kg"] for row in rows), 2),
+            "kg_km": round(sum(q * km for q, km in market.shipped.values()) / 100, 1),
+        }
+
+    return {"allocations": allocations, "unmet": unmet, "summary": summary}
@@ -0,0 +1,197 @@
+"""Local verification of Supabase access tokens (Authorization: Bearer <jwt>).
+
+Tokens are checked against the project's JWT secret (HS256) or the public keys
+of its JWKS, which is fetched once and cached, so authenticating a request is a
+signature check with no call to Supabase Auth. Verified claims are memoized
+per token until the token expires, so a client's later requests skip even the
+signature check. Tokens stay valid until `exp` whatever happens in Supabase
+Auth (sign-out, user deleted); the Supabase default of one hour bounds that.
+
+Handlers take `session: Optional[Session] = Depends(get_session)` and call
+`authorize(session, <the id the caller acts as>)`. While AUTH_REQUIRED is off,
+calls without a token get session None and keep working as before.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+import jwt
+from fastapi import Depends, Header, HTTPException
+
+from config import (
+    AUTH_AUDIENCE,
+    AUTH_JWKS_REFRESH_SECONDS,
+    AUTH_JWKS_URL,
+    AUTH_LEEWAY_SECONDS,
+    AUTH_REQUIRED,
+    AUTH_SESSION_CACHE_MAXSIZE,
+    SUPABASE_JWT_SECRET,
+)
+from services.logs import get_logger
+from services.metrics import auth_verifications
+from services.profiles import ProfileLoader, get_profiles
+
+log = get_logger("auth")
+
+ASYMMETRIC_ALGORITHMS = ["ES256", "RS256", "EdDSA"]
+
+# An unknown key id refetches the JWKS (keys get rotated), but at most this often
+JWKS_MIN_REFETCH_SECONDS = 30
+
+
+class InvalidToken(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Session:
+    user_id: str
+    role: Optional[str]   # profiles.role from the worker's profile cache; None without a profile
+    claims: dict
+
+
+class TokenVerifier:
+    """Verifies access tokens and remembers the claims of each until it expires.
+
+    The memo is an LRU of at most `maxsize` tokens; evicted tokens are simply
+    verified again.
+    """
+
+    def __init__(self, secret=SUPABASE_JWT_SECRET, jwks_url=AUTH_JWKS_URL, audience=AUTH_AUDIENCE,
+                 leeway=AUTH_LEEWAY_SECONDS, maxsize=AUTH_SESSION_CACHE_MAXSIZE,
+                 jwks_refresh=AUTH_JWKS_REFRESH_SECONDS, http=None):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.leeway = leeway
+        self.maxsize = maxsize
+        self.jwks_refresh = jwks_refresh
+        self._http = http   # httpx.AsyncClient for the JWKS fetch; a short-lived one by default
+        self._claims = OrderedDict()   # token -> (expires at, claims)
+        self._keys = {}   # kid -> PyJWK
+        self._keys_fetched_at = None
+        self._keys_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._claims)
+
+    def clear(self):
+        self._claims.clear()
+
+    async def verify(self, token):
+        """The token's claims; raises InvalidToken for a bad signature, wrong
+        audience, missing subject or an expired token."""
+        entry = self._claims.get(token)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._claims.move_to_end(token)
+                auth_verifications.inc("cached")
+                return entry[1]
+            del self._claims[token]
+
+        try:
+            header = jwt.get_unverified_header(token)
+            claims = jwt.decode(
+                token, await self._key_for(header), algorithms=[header.get("alg")],
+                audience=self.audience, leeway=self.leeway, options={"require": ["exp", "sub"]},
+            )
+        except InvalidToken:
+            auth_verifications.inc("rejected")
+            raise
+        except (jwt.PyJWTError, ValueError) as e:
+            auth_verifications.inc("rejected")
+            raise InvalidToken(str(e)) from e
+
+        auth_verifications.inc("verified")
+        self._claims[token] = (claims["exp"] + self.leeway, claims)
+        while len(self._claims) > self.maxsize:
+            self._claims.popitem(last=False)
+        return claims
+
+    async def _key_for(self, header):
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not self.secret:
+                raise InvalidToken("HS256 token but SUPABASE_JWT_SECRET is not set")
+            return self.secret
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise InvalidToken(f"unsupported algorithm: {algorithm}")
+
+        kid = header.get("kid")
+        if kid not in self._keys or self._keys_stale(self.jwks_refresh):
+            await self._refresh_keys()
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidToken(f"unknown signing key: {kid}")
+        return key
+
+    def _keys_stale(self, max_age):
+        return self._keys_fetched_at is None or time.monotonic() - self._keys_fetched_at > max_age
+
+    async def _refresh_keys(self):
+        # Concurrent requests with a new key id share one fetch; forged key ids
+        # cannot make us fetch more than once per JWKS_MIN_REFETCH_SECONDS
+        async with self._keys_lock:
+            if not self._keys_stale(JWKS_MIN_REFETCH_SECONDS):
+                return
+            if not self.jwks_url:
+                raise InvalidToken("asymmetric token but no JWKS URL is configured")
+            try:
+                if self._http is not None:
+                    response = await self._http.get(self.jwks_url)
+                else:
+                    async with httpx.AsyncClient(timeout=5) as http:
+                        response = await http.get(self.jwks_url)
+                response.raise_for_status()
+                keys = jwt.PyJWKSet.from_dict(response.json()).keys
+            except (httpx.HTTPError, jwt.PyJWTError, ValueError) as e:
+                log.warning("auth.jwks_fetch_failed", url=self.jwks_url, error=str(e))
+                self._keys_fetched_at = time.monotonic()   # keep the old keys, retry later
+                return
+            self._keys = {key.key_id: key for key in keys}
+            self._keys_fetched_at = time.monotonic()
+            log.info("auth.jwks_loaded", keys=len(self._keys))
+
+
+token_verifier = TokenVerifier()
+
+
+async def get_session(
+    authorization: Optional[str] = Header(None),
+    profiles: ProfileLoader = Depends(get_profiles),
+) -> Optional[Session]:
+    """FastAPI dependency: the caller's verified session, or None for a call
+    without a token (401 instead when AUTH_REQUIRED)."""
+    if not authorization:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Missing bearer token",
+                                headers={"WWW-Authenticate": "Bearer"})
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Expected 'Authorization: Bearer <token>'",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = await token_verifier.verify(token.strip())
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}",
+                            headers={"WWW-Authenticate": 'Bearer error="invalid_token"'})
+    return Session(user_id=claims["sub"], role=await profiles.role(claims["sub"]), claims=claims)
+
+
+def authorize(session: Optional[Session], user_id):
+    """403 unless the caller is `user_id`; anonymous calls pass while AUTH_REQUIRED is off."""
+    if session is not None and session.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user")
+
+
+def require_role(session: Optional[Session], roles):
+    """For calls made as no particular user: 401 without a token (whatever
+    AUTH_REQUIRED says), 403 unless the caller's role is one of `roles`."""
+    if session is None:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    if session.role not in roles:
+        raise HTTPException(status_code=403, detail=f"Only {'/'.join(roles)} accounts can do this")
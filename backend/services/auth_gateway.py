@@ -0,0 +1,168 @@
+"""Gateway in front of Supabase Auth for signups and logins.
+
+Each call goes through three stages:
+1. Coalescing: a signup or login identical to one still running (same email,
+   password and fields, e.g. a mobile client retrying on a flaky connection)
+   waits for that call and gets its result instead of running again.
+2. Token buckets per client IP and per email for everything else; an empty
+   bucket is a 429 with the seconds until the next token (RateLimited).
+3. At most AUTH_UPSTREAM_CONCURRENCY calls run against Supabase Auth at once.
+   Up to AUTH_UPSTREAM_QUEUE more wait for a slot in arrival order; beyond
+   that, or after waiting AUTH_UPSTREAM_QUEUE_TIMEOUT_SECONDS, callers get a
+   503 (Overloaded) instead of piling onto the upstream.
+
+Limits are per worker.
+"""
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict
+
+from config import (
+    AUTH_EMAIL_BURST,
+    AUTH_EMAIL_RATE_PER_MINUTE,
+    AUTH_IP_BURST,
+    AUTH_IP_RATE_PER_MINUTE,
+    AUTH_RATE_LIMIT_KEYS,
+    AUTH_UPSTREAM_CONCURRENCY,
+    AUTH_UPSTREAM_QUEUE,
+    AUTH_UPSTREAM_QUEUE_TIMEOUT_SECONDS,
+)
+from services.logs import get_logger
+from services.metrics import auth_gateway_requests, auth_upstream_in_flight, auth_upstream_queued
+from services.singleflight import SingleFlight
+
+log = get_logger("auth_gateway")
+
+
+class RateLimited(Exception):
+    def __init__(self, scope, retry_after):
+        self.scope = scope   # "ip" or "email"
+        self.retry_after = retry_after
+        super().__init__(f"Too many attempts for this {scope}. Try again in {math.ceil(retry_after)}s.")
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__("Sign-in service is busy. Try again shortly.")
+
+
+class RateLimiter:
+    """Token buckets per key: `burst` tokens, refilled at `rate_per_minute`.
+
+    Holds at most `maxsize` buckets (least recently used dropped; a dropped
+    bucket comes back full).
+    """
+
+    def __init__(self, rate_per_minute, burst, maxsize=AUTH_RATE_LIMIT_KEYS):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()   # key -> (tokens, refilled at)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key):
+        """Spend one of `key`'s tokens: 0 if there was one, else seconds until there is."""
+        now = time.monotonic()
+        tokens, refilled_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) / self.rate if self.rate > 0 else math.inf
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class ConcurrencyGate:
+    """At most `limit` calls at once; up to `queue` more wait for a slot for at
+    most `timeout` seconds, the rest raise Overloaded right away."""
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.peak = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    async def run(self, fn):
+        if self.running + self.waiting >= self.limit + self.queue:
+            raise Overloaded(self.timeout)
+        self.waiting += 1
+        auth_upstream_queued.inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(self.timeout) from None
+        finally:
+            self.waiting -= 1
+            auth_upstream_queued.dec()
+
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        auth_upstream_in_flight.inc()
+        try:
+            return await fn()
+        finally:
+            self.running -= 1
+            auth_upstream_in_flight.dec()
+            self._slots.release()
+
+
+class AuthGateway:
+    def __init__(self, ip_limiter=None, email_limiter=None, gate=None):
+        if ip_limiter is None:
+            ip_limiter = RateLimiter(AUTH_IP_RATE_PER_MINUTE, AUTH_IP_BURST)
+        if email_limiter is None:
+            email_limiter = RateLimiter(AUTH_EMAIL_RATE_PER_MINUTE, AUTH_EMAIL_BURST)
+        if gate is None:
+            gate = ConcurrencyGate(AUTH_UPSTREAM_CONCURRENCY, AUTH_UPSTREAM_QUEUE, AUTH_UPSTREAM_QUEUE_TIMEOUT_SECONDS)
+        self.ip_limiter = ip_limiter
+        self.email_limiter = email_limiter
+        self.gate = gate
+        self.flights = SingleFlight()
+
+    async def call(self, kind, client_ip, email, payload, fn):
+        """Run `fn` (the signup/login against Supabase Auth) through the limits.
+
+        `payload` is everything that makes two calls identical besides `kind`
+        and `email` (password, signup fields); only its digest is kept.
+        Raises RateLimited or Overloaded; otherwise returns fn's result or
+        raises its exception, shared with any identical concurrent calls.
+        """
+        email = email.strip().lower()
+        key = (kind, email, hashlib.sha256(payload.encode()).hexdigest())
+        outcome = "coalesced" if key in self.flights else "upstream"
+        if outcome == "upstream":   # joining a running call costs Supabase Auth nothing
+            for scope, limiter, bucket in (("ip", self.ip_limiter, client_ip), ("email", self.email_limiter, email)):
+                wait = limiter.take(bucket)
+                if wait:
+                    auth_gateway_requests.inc(kind, "rate_limited")
+                    log.info("auth_gateway.rate_limited", kind=kind, scope=scope, retry_after=round(wait, 1))
+                    raise RateLimited(scope, wait)
+
+        try:
+            result, _ = await self.flights.do(key, lambda: self.gate.run(fn))
+            return result
+        except Overloaded:
+            outcome = "overloaded"
+            log.warning("auth_gateway.overloaded", kind=kind, running=self.gate.running, waiting=self.gate.waiting)
+            raise
+        finally:
+            auth_gateway_requests.inc(kind, outcome)
+
+
+auth_gateway = AuthGateway()
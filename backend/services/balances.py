@@ -0,0 +1,86 @@
+"""Ledger-derived Scrap Coin balances (see db_balance_migration.sql).
+
+Also runnable as a job from backend/:
+    python -m services.balances snapshot
+    python -m services.balances reconcile [--repair] [--chunk 500]
+"""
+import argparse
+import asyncio
+
+from config import BALANCE_SNAPSHOT_LAG_SECONDS, RECONCILE_CHUNK_SIZE
+from services.logs import get_logger
+
+log = get_logger("balances")
+
+
+async def get_balance(db, user_id):
+    """{"balance", "snapshot_balance", "covered_until", "delta", "delta_count"}, or None for an unknown user."""
+    result = await db.rpc("coin_balance", {"p_user": user_id}).execute()
+    return result.data
+
+
+async def refresh_snapshots(db, lag_seconds=BALANCE_SNAPSHOT_LAG_SECONDS):
+    """Roll every user's snapshot forward; returns how many were written."""
+    result = await db.rpc("refresh_balance_snapshots", {"p_lag": f"{int(lag_seconds)} seconds"}).execute()
+    return result.data
+
+
+async def reconcile(db, repair=False, chunk_size=RECONCILE_CHUNK_SIZE):
+    """Walk every profile in id order, chunk by chunk, and compare the wallet
+    (profiles.scrap_coins) and the snapshot balance with the full ledger sum.
+
+    Returns {"checked", "drifted": [row, ...], "repaired"}; with repair=True each
+    drifted user is brought back in line with the ledger.
+    """
+    report = {"checked": 0, "drifted": [], "repaired": 0}
+    after = None
+    while True:
+        chunk = (await db.rpc("ledger_balances", {"p_after": after, "p_limit": chunk_size}).execute()).data
+        if not chunk:
+            return report
+        report["checked"] += len(chunk)
+        for row in chunk:
+            if row["wallet_balance"] != row["ledger_balance"] or row["snapshot_balance"] != row["ledger_balance"]:
+                report["drifted"].append(row)
+                if repair:
+                    await db.rpc("repair_balance", {"p_user": row["user_id"]}).execute()
+                    report["repaired"] += 1
+        after = chunk[-1]["user_id"]
+
+
+async def snapshot_loop(db, interval_seconds):
+    """Background task: refresh snapshots every `interval_seconds` until cancelled."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            written = await refresh_snapshots(db)
+            log.info("balances.snapshots_refreshed", written=written)
+        except Exception as e:
+            log.warning("balances.snapshot_refresh_failed", error=str(e))
+
+
+async def _main(args):
+    from database import close_clients, get_db
+
+    db = get_db()
+    try:
+        if args.command == "snapshot":
+            print(f"Refreshed {await refresh_snapshots(db)} balance snapshots")
+            return
+        report = await reconcile(db, repair=args.repair, chunk_size=args.chunk)
+        for row in report["drifted"]:
+            print(
+                f"{row['user_id']}: wallet {row['wallet_balance']}, snapshot {row['snapshot_balance']}, "
+                f"ledger {row['ledger_balance']}"
+            )
+        print(f"Checked {report['checked']} users, {len(report['drifted'])} drifted, {report['repaired']} repaired")
+    finally:
+        await close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrap Coin balance snapshots and ledger reconciliation")
+    parser.add_argument("command", choices=["snapshot", "reconcile"])
+    parser.add_argument("--repair", action="store_true", help="make drifted wallets match the ledger")
+    parser.add_argument("--chunk", type=int, default=RECONCILE_CHUNK_SIZE, help="profiles per ledger chunk")
+    asyncio.run(_main(parser.parse_args()))
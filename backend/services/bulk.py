@@ -0,0 +1,98 @@
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class BulkBodyError(Exception):
+    """The request body cannot be read any further (malformed array, oversized item)."""
+
+
+def is_ndjson(content_type):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+async def iter_json_items(chunks, ndjson, max_item_bytes):
+    """Yield the items of a JSON array or NDJSON body as they arrive.
+
+    `chunks` is the raw body stream (e.g. `request.stream()`). Yields each item
+    as parsed JSON, or as a `ValueError` when it is larger than `max_item_bytes`
+    or (NDJSON) not JSON, so one bad item only fails itself. At most about one
+    item is buffered at a time; BulkBodyError ends the stream.
+    """
+    items = _ndjson_items if ndjson else _array_items
+    async for item in items(chunks, max_item_bytes):
+        yield item
+
+
+async def _ndjson_items(chunks, max_item_bytes):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line, max_item_bytes)
+        if len(buffer) > max_item_bytes:
+            raise BulkBodyError(f"Item larger than {max_item_bytes} bytes")
+    if buffer.strip():
+        yield _parse_line(buffer, max_item_bytes)
+
+
+def _too_large(max_item_bytes):
+    return ValueError(f"Item larger than {max_item_bytes} bytes")
+
+
+def _parse_line(line, max_item_bytes):
+    if len(line) > max_item_bytes:
+        return _too_large(max_item_bytes)
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def _array_items(chunks, max_item_bytes):
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos = "", 0
+    expect = "["   # "[" -> "first" -> ("," -> "item")* -> "end"; "]" is allowed in "first" and ","
+    async for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "end":
+                raise BulkBodyError("Unexpected data after the closing ]")
+            if expect == "[":
+                if char != "[":
+                    raise BulkBodyError("Expected a JSON array or NDJSON body")
+                pos, expect = pos + 1, "first"
+            elif expect in ("first", ",") and char == "]":
+                pos, expect = pos + 1, "end"
+            elif expect == ",":
+                if char != ",":
+                    raise BulkBodyError("Expected , or ] between array items")
+                pos, expect = pos + 1, "item"
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    item, end = None, None
+                if end is None or (end == len(buffer) and not isinstance(item, (dict, list))):
+                    # Incomplete so far (a bare number may still be growing); anything
+                    # this long without closing is not an item we accept
+                    if len(buffer) - pos > max_item_bytes:
+                        raise BulkBodyError(f"Malformed item or item larger than {max_item_bytes} bytes")
+                    break
+                too_large = end - pos > max_item_bytes
+                pos, expect = end, ","
+                yield _too_large(max_item_bytes) if too_large else item
+    rest = (buffer[pos:] + text.decode(b"", final=True)).strip()
+    if expect != "end" or rest:
+        raise BulkBodyError("Truncated or malformed JSON array")
@@ -0,0 +1,81 @@
+"""Claiming pending pickups with `claim_scrap_request` (see db_claim_migration.sql)
+and completing them with `complete_scrap_request` (see db_outbox_migration.sql).
+
+The claim is one conditional UPDATE that also checks the partner's role and
+coins, so partners racing for a fresh request cost one round-trip each and
+exactly one wins. Losing a claim is final and never retried.
+"""
+import json
+
+from postgrest.exceptions import APIError
+
+from services.ledger import InsufficientCoins
+from services.metrics import pickup_claims
+from services.retry import rpc_with_retry
+
+
+class NotAPartner(Exception):
+    """Only dealers and artists can accept pickups."""
+
+
+class RequestNotFound(Exception):
+    pass
+
+
+class AlreadyClaimed(Exception):
+    """Another partner accepted the request first (or it is no longer pending)."""
+
+    def __init__(self, status):
+        self.status = status
+        super().__init__(f"Request is already {status}")
+
+
+def _raise_for(e: APIError):
+    message = e.message or ""
+    if message == "already_claimed":
+        raise AlreadyClaimed(json.loads(e.details or "{}").get("status")) from e
+    if message == "insufficient_coins":
+        details = json.loads(e.details or "{}")
+        raise InsufficientCoins(details.get("balance", 0), details.get("needed")) from e
+    if message.startswith("not_a_partner"):
+        raise NotAPartner(message) from e
+    if message.startswith("request_not_found"):
+        raise RequestNotFound(message) from e
+    raise e
+
+
+async def claim_pickup(client, request_id, partner_id):
+    """Accept a pending request for `partner_id`; returns the updated request row.
+
+    Raises AlreadyClaimed, NotAPartner, RequestNotFound or InsufficientCoins
+    (the partner could not pay weight * multiplier on completion); every
+    attempt is counted in the `pickup_claims` metric by outcome.
+    """
+    try:
+        claimed = await rpc_with_retry(client, "claim_scrap_request", {
+            "p_request": request_id,
+            "p_partner": partner_id,
+        })
+    except APIError as e:
+        pickup_claims.inc("lost" if e.message == "already_claimed" else "rejected")
+        _raise_for(e)
+    pickup_claims.inc("won")
+    return claimed
+
+
+async def complete_pickup(client, request_id, partner_id):
+    """Mark a request accepted by `partner_id` completed and queue its payout.
+
+    The donor's coins and a dealer's stock are applied afterwards by the outbox
+    worker (services/outbox.py). Returns {"id", "user_id", "scrap_type",
+    "weight_kg", "coins_awarded", "new_balance", "event_id"}, new_balance being
+    the donor's balance once the payout is applied; raises RequestNotFound when
+    the request is not accepted by this partner.
+    """
+    try:
+        return await rpc_with_retry(client, "complete_scrap_request", {
+            "p_request": request_id,
+            "p_partner": partner_id,
+        })
+    except APIError as e:
+        _raise_for(e)
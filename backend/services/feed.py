@@ -0,0 +1,140 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import FEED_QUEUE_SIZE
+from services.geo import DEFAULT_AGE_MINUTES, decay_radius, has_location, haversine_many, parse_created_at
+
+
+class Subscription:
+    """One connected partner stream: its location, the request ids it currently
+    shows, and the queue of (event, data) pairs still to be sent."""
+
+    def __init__(self, partner_id, lat, lon):
+        self.partner_id = partner_id
+        self.lat = lat
+        self.lon = lon
+        self.located = has_location(lat, lon)
+        self.visible = set()
+        self.queue = asyncio.Queue()
+        self.closed = False
+
+
+class FeedHub:
+    """Registry of partner subscriptions on this worker and fan-out of feed changes.
+
+    Partners with a location see the same requests as `PendingRequestIndex.nearby`;
+    partners without one see every pending request, like the polling endpoint.
+    """
+
+    def __init__(self, queue_size=FEED_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions = []
+        self._located = None   # (subscriptions, lats, lons) of located subscribers, rebuilt on change
+        self.events_sent = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, partner_id, lat, lon, index, now=None):
+        """Register a partner; returns (subscription, initial feed rows)."""
+        subscription = Subscription(partner_id, lat, lon)
+        rows = index.nearby(lat, lon, now) if subscription.located else index.all_rows()
+        subscription.visible = {row["id"] for row in rows}
+        self._subscriptions.append(subscription)
+        self._located = None
+        return subscription, rows
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            self._located = None
+
+    def _send(self, subscription, event, data):
+        if subscription.closed:
+            return
+        if subscription.queue.qsize() >= self.queue_size:
+            # Too slow to keep up: end the stream, the client reconnects to a fresh snapshot
+            self.dropped += 1
+            self.unsubscribe(subscription)
+            subscription.queue.put_nowait(("close", None))
+            return
+        subscription.queue.put_nowait((event, data))
+        self.events_sent += 1
+
+    def _located_arrays(self):
+        if self._located is None:
+            located = [s for s in self._subscriptions if s.located]
+            self._located = (
+                located,
+                np.array([s.lat for s in located], dtype=float),
+                np.array([s.lon for s in located], dtype=float),
+            )
+        return self._located
+
+    def publish_added(self, row, now=None):
+        """A new pending request: send it to every partner whose feed it falls in."""
+        request_id = row["id"]
+        lat, lon = row.get("latitude"), row.get("longitude")
+        targets = [(s, None) for s in self._subscriptions if not s.located]
+
+        if not has_location(lat, lon):
+            targets += [(s, None) for s in self._subscriptions if s.located]
+        else:
+            located, lats, lons = self._located_arrays()
+            if located:
+                now_ts = (now or datetime.now(timezone.utc)).timestamp()
+                created_ts = parse_created_at(row.get("created_at"))
+                age = (now_ts - created_ts) / 60 if created_ts is not None else DEFAULT_AGE_MINUTES
+                distances = haversine_many(lats, lons, lat, lon)
+                for position in np.flatnonzero(distances <= decay_radius(age)).tolist():
+                    targets.append((located[position], round(float(distances[position]), 1)))
+
+        for subscription, distance_km in targets:
+            if request_id in subscription.visible:
+                continue
+            subscription.visible.add(request_id)
+            self._send(subscription, "add", row if distance_km is None else {**row, "distance_km": distance_km})
+
+    def publish_removed(self, request_id):
+        """A request left the pending pool (accepted/completed): retract it everywhere."""
+        for subscription in list(self._subscriptions):
+            if request_id in subscription.visible:
+                subscription.visible.discard(request_id)
+                self._send(subscription, "remove", {"id": request_id})
+
+    def sync(self, index, now=None):
+        """Diff every feed against the index: requests that came into range as their
+        radius grew (or were added/removed by another worker) become add/remove events.
+        Located feeds are computed in one vectorized `index.feeds` pass."""
+        located, _, _ = self._located_arrays()
+        feeds = index.feeds([(id(s), s.lat, s.lon) for s in located], now) if located else {}
+        all_rows = None
+        for subscription in list(self._subscriptions):
+            if subscription.located:
+                rows = feeds[id(subscription)]
+            else:
+                if all_rows is None:
+                    all_rows = index.all_rows()
+                rows = all_rows
+            current = {row["id"]: row for row in rows}
+            for request_id in subscription.visible - current.keys():
+                self._send(subscription, "remove", {"id": request_id})
+            for request_id in current.keys() - subscription.visible:
+                self._send(subscription, "add", current[request_id])
+            subscription.visible = set(current)
+
+    def stats(self):
+        return {"subscribers": len(self._subscriptions), "events_sent": self.events_sent, "dropped": self.dropped}
+
+
+def sse(event, data):
+    """One Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+feed_hub = FeedHub()
@@ -0,0 +1,344 @@
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+# ---- TIME DECAY ALGORITHM ----
+# Initial radius: 5 km. Expands by 0.5 km per minute unaccepted. Max cap: 50 km.
+BASE_RADIUS_KM = 5
+RADIUS_GROWTH_KM_PER_MIN = 0.5
+MAX_RADIUS_KM = 50
+
+# Age used when a request's created_at cannot be parsed
+DEFAULT_AGE_MINUTES = 60
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return float('inf')
+    radius = EARTH_RADIUS_KM
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return radius * c
+
+
+def decay_radius(age_minutes):
+    """Allowed pickup radius (km) for a request that has waited `age_minutes`."""
+    return min(MAX_RADIUS_KM, BASE_RADIUS_KM + (max(0, age_minutes) * RADIUS_GROWTH_KM_PER_MIN))
+
+
+def parse_created_at(created_at_str):
+    """Supabase ISO timestamp -> epoch seconds, or None if it cannot be parsed."""
+    try:
+        return datetime.fromisoformat(created_at_str.replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def has_location(lat, lon):
+    # Requests/partners without coordinates (or with 0 placeholders) skip geo routing
+    return bool(lat) and bool(lon)
+
+
+async def nearby_from_db(client, partner_lat, partner_lon):
+    """What `PendingRequestIndex.nearby` returns, filtered by Postgres with
+    `nearby_pending_requests` (see db_geo_pushdown_migration.sql): only the rows
+    the partner may see cross the wire. Without a partner location every
+    pending request is returned."""
+    located = has_location(partner_lat, partner_lon)
+    result = await client.rpc("nearby_pending_requests", {
+        "p_lat": partner_lat if located else None,
+        "p_lon": partner_lon if located else None,
+        "p_base_km": BASE_RADIUS_KM,
+        "p_growth_km_per_min": RADIUS_GROWTH_KM_PER_MIN,
+        "p_max_km": MAX_RADIUS_KM,
+    }).execute()
+    return result.data
+
+
+# ---- Vectorized (NumPy) versions; haversine_distance/decay_radius stay the reference ----
+
+def haversine_many(lat1, lon1, lat2, lon2):
+    """Haversine distance (km) between broadcastable arrays of coordinates."""
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def decay_radius_many(age_minutes):
+    return np.minimum(MAX_RADIUS_KM, BASE_RADIUS_KM + np.maximum(0, age_minutes) * RADIUS_GROWTH_KM_PER_MIN)
+
+
+class PendingColumns:
+    """Columnar snapshot of located pending requests: ids plus lat/lon/created_at arrays."""
+
+    # Upper bound on partners x requests distances held in memory at once
+    MAX_BLOCK_CELLS = 2_000_000
+
+    def __init__(self, ids, lats, lons, created_ts):
+        self.ids = ids
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.created_ts = np.asarray(created_ts, dtype=np.float64)  # NaN when unparseable
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = [r for r in rows if has_location(r.get("latitude"), r.get("longitude"))]
+        return cls(
+            [r["id"] for r in rows],
+            [r["latitude"] for r in rows],
+            [r["longitude"] for r in rows],
+            [_nan_if_none(parse_created_at(r.get("created_at"))) for r in rows],
+        )
+
+    @classmethod
+    def concat(cls, parts):
+        if len(parts) == 1:
+            return parts[0]
+        ids = []
+        for part in parts:
+            ids.extend(part.ids)
+        return cls(
+            ids,
+            np.concatenate([p.lats for p in parts]),
+            np.concatenate([p.lons for p in parts]),
+            np.concatenate([p.created_ts for p in parts]),
+        )
+
+    def allowed_radius(self, now_ts):
+        ages = np.where(np.isnan(self.created_ts), DEFAULT_AGE_MINUTES, (now_ts - self.created_ts) / 60.0)
+        return decay_radius_many(ages)
+
+    def within(self, partner_lat, partner_lon, now_ts):
+        """Positions and distances of requests inside their decayed radius of one partner."""
+        dist = haversine_many(partner_lat, partner_lon, self.lats, self.lons)
+        positions = np.flatnonzero(dist <= self.allowed_radius(now_ts))
+        return positions, dist[positions]
+
+    def within_many(self, partner_lats, partner_lons, now_ts):
+        """`within` for many partners in one pass, computed in bounded partner blocks."""
+        partner_lats = np.asarray(partner_lats, dtype=np.float64)
+        partner_lons = np.asarray(partner_lons, dtype=np.float64)
+        radius = self.allowed_radius(now_ts)
+        block = max(1, self.MAX_BLOCK_CELLS // max(len(self), 1))
+
+        results = []
+        for start in range(0, len(partner_lats), block):
+            dist = haversine_many(
+                partner_lats[start:start + block, None],
+                partner_lons[start:start + block, None],
+                self.lats[None, :],
+                self.lons[None, :],
+            )
+            mask = dist <= radius[None, :]
+            for row in range(dist.shape[0]):
+                positions = np.flatnonzero(mask[row])
+                results.append((positions, dist[row, positions]))
+        return results
+
+
+def _nan_if_none(value):
+    return math.nan if value is None else value
+
+
+class PendingRequestIndex:
+    """Uniform lat/lon grid over pending scrap requests.
+
+    Each pending request is bucketed into a `cell_deg` x `cell_deg` cell, so a
+    partner query only visits the cells overlapping the 50 km cap around the
+    partner instead of every pending row. Requests without coordinates are kept
+    aside and always returned, matching the router's "never lose a request" rule.
+
+    The index lives in-process: the scrap router rebuilds it from the database
+    when it is older than its refresh interval and patches it on donate / accept /
+    complete in between.
+    """
+
+    def __init__(self, cell_deg=0.25):
+        self.cell_deg = cell_deg
+        self.n_cols = int(round(360 / cell_deg))
+        self.n_rows = int(round(180 / cell_deg))
+        self.loaded_at = None
+        self.version = 0      # bumped on every change, used to validate cached feeds
+        self._entries = {}    # request id -> (row, lat, lon, created_ts)
+        self._cells = {}      # (row, col) -> {request id, ...}
+        self._unlocated = set()
+        self._cell_columns = {}   # (row, col) -> PendingColumns, dropped when the cell changes
+        self._all_columns = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, request_id):
+        return request_id in self._entries
+
+    def is_fresh(self, max_age_seconds):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < max_age_seconds
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def _cell(self, lat, lon):
+        row = min(int((lat + 90) // self.cell_deg), self.n_rows - 1)
+        col = int((lon + 180) // self.cell_deg) % self.n_cols
+        return row, col
+
+    def rebuild(self, rows):
+        """Replace the index contents with `rows` (pending requests from the DB)."""
+        self._entries = {}
+        self._cells = {}
+        self._unlocated = set()
+        self._cell_columns = {}
+        self._all_columns = None
+        for row in rows:
+            self.add(row)
+        self.loaded_at = time.monotonic()
+
+    def add(self, row):
+        request_id = row["id"]
+        if request_id in self._entries:
+            self.remove(request_id)
+
+        lat, lon = row.get("latitude"), row.get("longitude")
+        created_ts = parse_created_at(row.get("created_at"))
+        self._entries[request_id] = (row, lat, lon, created_ts)
+        self._changed()
+
+        if has_location(lat, lon):
+            key = self._cell(lat, lon)
+            self._cells.setdefault(key, set()).add(request_id)
+            self._cell_columns.pop(key, None)
+        else:
+            self._unlocated.add(request_id)
+
+    def remove(self, request_id):
+        entry = self._entries.pop(request_id, None)
+        if entry is None:
+            return
+        self._changed()
+        _, lat, lon, _ = entry
+        if has_location(lat, lon):
+            key = self._cell(lat, lon)
+            self._cell_columns.pop(key, None)
+            bucket = self._cells.get(key)
+            if bucket is not None:
+                bucket.discard(request_id)
+                if not bucket:
+                    del self._cells[key]
+        else:
+            self._unlocated.discard(request_id)
+
+    def _changed(self):
+        self.version += 1
+        self._all_columns = None
+
+    def _columns(self, request_ids):
+        ids = list(request_ids)
+        entries = [self._entries[i] for i in ids]
+        return PendingColumns(
+            ids,
+            [e[1] for e in entries],
+            [e[2] for e in entries],
+            [_nan_if_none(e[3]) for e in entries],
+        )
+
+    def _columns_for_cell(self, key):
+        columns = self._cell_columns.get(key)
+        if columns is None:
+            columns = self._cell_columns[key] = self._columns(self._cells[key])
+        return columns
+
+    def _cells_within(self, lat, lon, radius_km):
+        """Yield keys of the non-empty cells overlapping the radius' bounding box."""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        row_lo = max(int((lat - dlat + 90) // self.cell_deg), 0)
+        row_hi = min(int((lat + dlat + 90) // self.cell_deg), self.n_rows - 1)
+
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90)))
+        if cos_lat < 1e-6:
+            col_offsets = range(self.n_cols)  # polar cap: every longitude is in range
+            col_base = 0
+        else:
+            dlon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180)
+            col_base = int((lon - dlon + 180) // self.cell_deg)
+            col_span = int((lon + dlon + 180) // self.cell_deg) - col_base
+            col_offsets = range(min(col_span, self.n_cols - 1) + 1)
+
+        for row in range(row_lo, row_hi + 1):
+            for offset in col_offsets:
+                key = (row, (col_base + offset) % self.n_cols)
+                if key in self._cells:
+                    yield key
+
+    def _sort_newest_first(self, entries):
+        entries.sort(key=lambda e: e[3] if e[3] is not None else float("-inf"), reverse=True)
+
+    def all_rows(self):
+        """Every pending request, newest first (fallback for partners without a location)."""
+        entries = list(self._entries.values())
+        self._sort_newest_first(entries)
+        return [e[0] for e in entries]
+
+    def _feed(self, columns, positions, distances):
+        """Unlocated requests plus the matched located ones, newest first."""
+        matches = [self._entries[i] for i in self._unlocated]
+        matched = {}
+        for position, dist_km in zip(positions.tolist(), distances.tolist()):
+            request_id = columns.ids[position]
+            matched[request_id] = dist_km
+            matches.append(self._entries[request_id])
+
+        self._sort_newest_first(matches)
+        results = []
+        for row, _, _, _ in matches:
+            if row["id"] in matched:
+                row = {**row, "distance_km": round(matched[row["id"]], 1)}  # Annotate distance for frontend
+            results.append(row)
+        return results
+
+    def nearby(self, partner_lat, partner_lon, now=None, max_radius_km=MAX_RADIUS_KM):
+        """Pending requests a partner at (lat, lon) may see right now, newest first.
+
+        Located requests are returned when they fall inside their own time-decayed
+        radius and are annotated with `distance_km`; unlocated requests are always
+        returned unannotated.
+        """
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        parts = [self._columns_for_cell(key) for key in self._cells_within(partner_lat, partner_lon, max_radius_km)]
+        if not parts:
+            return self._feed(None, np.empty(0, dtype=np.intp), np.empty(0))
+
+        columns = PendingColumns.concat(parts)
+        positions, distances = columns.within(partner_lat, partner_lon, now_ts)
+        return self._feed(columns, positions, distances)
+
+    def feeds(self, partners, now=None):
+        """Feeds for many partners in one vectorized pass.
+
+        `partners` is an iterable of (partner_id, lat, lon) with a location; returns
+        {partner_id: rows} with the same contents and order as `nearby`.
+        """
+        partners = list(partners)
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        if self._all_columns is None:
+            self._all_columns = self._columns(
+                request_id for bucket in self._cells.values() for request_id in bucket
+            )
+        columns = self._all_columns
+        results = columns.within_many([p[1] for p in partners], [p[2] for p in partners], now_ts)
+        return {
+            partner[0]: self._feed(columns, positions, distances)
+            for partner, (positions, distances) in zip(partners, results)
+        }
@@ -0,0 +1,224 @@
+"""Idempotency-Key support for endpoints that move coins or stock.
+
+A client that retries POST /coins/purchase and the like after a timeout sends
+the same `Idempotency-Key` header each time. The first request with a key runs
+and its response (anything below 500) is stored for IDEMPOTENCY_TTL_SECONDS.
+Repeats are answered from the store before routing: no dependency runs and no
+database call is made. Repeats that arrive while the first is still running
+wait for it and get the same response (services/singleflight.py). A key sent
+again with a different body is a 422.
+
+Keys are scoped to the caller (the verified token's user, or anonymous) and the
+method + path. The store is per worker, like the other caches: a retry that
+lands on another worker runs again, and the database functions behind these
+endpoints (conditional decrements, single-row claims) are what keep that safe.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from starlette.routing import compile_path
+
+from config import IDEMPOTENCY_MAXSIZE, IDEMPOTENCY_TTL_SECONDS
+from services.auth import InvalidToken, token_verifier
+from services.metrics import idempotency_requests
+from services.singleflight import SingleFlight
+
+HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status", "headers", "body")
+
+    def __init__(self, fingerprint, status, headers, body):
+        self.fingerprint = fingerprint   # sha256 of the request body
+        self.status = status
+        self.headers = headers           # raw ASGI header pairs
+        self.body = body
+
+
+class IdempotencyStore:
+    """TTL + LRU map of (caller, method, path, key) -> StoredResponse."""
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, maxsize=IDEMPOTENCY_MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()   # key -> (expires at, StoredResponse)
+        self.flights = SingleFlight()
+        self._running = {}              # key -> fingerprint of the request being executed
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, stored):
+        self._entries[key] = (time.monotonic() + self.ttl, stored)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {"size": len(self._entries), "maxsize": self.maxsize, "ttl_seconds": self.ttl,
+                "in_flight": len(self.flights)}
+
+
+idempotency_store = IdempotencyStore()
+
+
+async def _caller(scope):
+    """The verified user behind the request's bearer token, "" for none, None for a bad token."""
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    if not authorization:
+        return ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return (await token_verifier.verify(token.strip()))["sub"]
+    except InvalidToken:
+        return None
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return None   # the client went away
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+class _Route:
+    """A (method, path template) the middleware applies to; stands in for the
+    routed endpoint in scope["route"] when a response is replayed."""
+
+    __slots__ = ("method", "path", "regex")
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.regex = compile_path(path)[0]
+
+    def matches(self, scope):
+        return scope["method"] == self.method and self.regex.match(scope["path"]) is not None
+
+
+def _json_response(status, detail):
+    body = json.dumps({"detail": detail}).encode()
+    return StoredResponse(None, status, [(b"content-type", b"application/json"),
+                                         (b"content-length", str(len(body)).encode())], body)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying Idempotency-Key to the given (method, path template) routes.
+
+    Requests without the header, with an invalid token or to other routes pass
+    straight through.
+    """
+
+    def __init__(self, app, routes, store=None):
+        self.app = app
+        self.routes = [_Route(method, path) for method, path in routes]
+        self.store = store if store is not None else idempotency_store
+
+    def _route(self, scope):
+        return next((route for route in self.routes if route.matches(scope)), None)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH", "DELETE"):
+            await self.app(scope, receive, send)
+            return
+        key = dict(scope["headers"]).get(HEADER.encode(), b"").decode("latin-1").strip()
+        route = self._route(scope) if key else None
+        caller = await _caller(scope) if route else None
+        if route is None or caller is None:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await self._send(send, _json_response(400, f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters"))
+            return
+
+        body = await _read_body(receive)
+        if body is None:
+            return
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store_key = (caller, scope["method"], scope["path"], key)
+
+        stored = self.store.get(store_key)
+        if stored is None and store_key in self.store.flights:
+            if self.store._running.get(store_key) != fingerprint:
+                stored = _json_response(422, "Idempotency-Key is already in use with a different request")
+                outcome = "mismatch"
+            else:
+                stored, _ = await self.store.flights.do(store_key, None)
+                outcome = "coalesced"
+        elif stored is None:
+            self.store._running[store_key] = fingerprint
+            stored, _ = await self.store.flights.do(
+                store_key, lambda: self._execute(scope, body, receive, store_key, fingerprint),
+            )
+            outcome = "executed"
+        elif stored.fingerprint != fingerprint:
+            stored = _json_response(422, "Idempotency-Key was already used with a different request")
+            outcome = "mismatch"
+        else:
+            outcome = "replayed"
+
+        idempotency_requests.inc(route.path, outcome)
+        if outcome in ("coalesced", "replayed"):
+            scope["route"] = route   # so per-route metrics count the replay
+            await self._send(send, stored, replayed=True)
+        else:
+            await self._send(send, stored)
+
+    async def _execute(self, scope, body, receive, store_key, fingerprint):
+        """Run the endpoint once with the buffered body; store and return its response."""
+        start, chunks = {}, []
+        replayed_body = False
+
+        async def receive_body():
+            nonlocal replayed_body
+            if not replayed_body:
+                replayed_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive_body, capture)
+        finally:
+            self.store._running.pop(store_key, None)
+        response = StoredResponse(fingerprint, start["status"], list(start.get("headers", [])), b"".join(chunks))
+        if response.status < 500:
+            self.store.put(store_key, response)
+        return response
+
+    @staticmethod
+    async def _send(send, stored, replayed=False):
+        headers = list(stored.headers)
+        if replayed:
+            headers.append((REPLAYED_HEADER.lower().encode(), b"true"))
+        await send({"type": "http.response.start", "status": stored.status, "headers": headers})
+        await send({"type": "http.response.body", "body": stored.body})
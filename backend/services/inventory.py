@@ -0,0 +1,166 @@
+import asyncio
+import bisect
+import json
+import time
+
+from postgrest.exceptions import APIError
+
+from config import INVENTORY_INDEX_REFRESH_SECONDS
+from services.pagination import fetch_all
+from services.retry import rpc_with_retry
+
+INVENTORY_SELECT = "*, profiles!dealer_inventory_dealer_id_fkey(name, location, phone)"
+
+
+class DealerInventoryIndex:
+    """Positive dealer stock per scrap type, kept sorted by quantity (largest first).
+
+    Each scrap type has a list of (-quantity_kg, dealer_id) kept in order with
+    bisect, so the top k dealers are a slice and an update is a binary search
+    plus one insert/delete. Rows carry the embedded dealer profile
+    (INVENTORY_SELECT) for /industry/dealers/match.
+
+    Like the pending-request index it is per worker: rebuilt from the database
+    on startup and when older than its refresh interval, patched by complete /
+    fulfill in between.
+    """
+
+    def __init__(self):
+        self.loaded_at = None
+        self._rows = {}       # (dealer id, scrap type) -> row with quantity_kg > 0
+        self._ranked = {}     # scrap type -> sorted [(-quantity_kg, dealer id), ...]
+        self._profiles = {}   # dealer id -> embedded profile
+
+    def __len__(self):
+        return len(self._rows)
+
+    def is_fresh(self, max_age_seconds):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < max_age_seconds
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def rebuild(self, rows):
+        self._rows = {}
+        self._ranked = {}
+        self._profiles = {}
+        for row in rows:
+            self._profiles[row["dealer_id"]] = row.get("profiles")
+            self._put(row)
+        self.loaded_at = time.monotonic()
+
+    def _put(self, row):
+        quantity = float(row["quantity_kg"])
+        if quantity <= 0:
+            return
+        key = (row["dealer_id"], row["scrap_type"])
+        self._rows[key] = row
+        bisect.insort(self._ranked.setdefault(row["scrap_type"], []), (-quantity, row["dealer_id"]))
+
+    def _drop(self, dealer_id, scrap_type):
+        row = self._rows.pop((dealer_id, scrap_type), None)
+        if row is None:
+            return
+        ranked = self._ranked[scrap_type]
+        entry = (-float(row["quantity_kg"]), dealer_id)
+        del ranked[bisect.bisect_left(ranked, entry)]
+
+    def set_quantity(self, dealer_id, scrap_type, quantity_kg, row=None):
+        """Record a dealer's new stock of one scrap type (0 removes it).
+
+        `row` is the dealer_inventory row when it was just inserted. A dealer
+        whose profile this worker has never seen is not added; the index is
+        marked stale instead so the next read rebuilds it.
+        """
+        if self.loaded_at is None:
+            return
+        existing = self._rows.get((dealer_id, scrap_type))
+        if existing is None and dealer_id not in self._profiles:
+            self.invalidate()
+            return
+        self._drop(dealer_id, scrap_type)
+        base = existing or row or {"dealer_id": dealer_id, "scrap_type": scrap_type}
+        self._put({**base, "quantity_kg": quantity_kg, "profiles": self._profiles[dealer_id]})
+
+    def top(self, scrap_type, k=None):
+        """The k dealers holding the most of `scrap_type` (all when k is None), largest first."""
+        ranked = self._ranked.get(scrap_type, [])
+        return [self._rows[dealer_id, scrap_type] for _, dealer_id in ranked[:k]]
+
+
+inventory_index = DealerInventoryIndex()
+
+
+async def add_dealer_stock(client, dealer_id, scrap_type, quantity_kg):
+    """Add `quantity_kg` to a dealer's stock of `scrap_type` with one upsert
+    (`add_dealer_inventory`, see db_index_migration.sql); returns the row after it."""
+    result = await client.rpc("add_dealer_inventory", {
+        "p_dealer": dealer_id,
+        "p_scrap_type": scrap_type,
+        "p_kg": quantity_kg,
+    }).execute()
+    return result.data
+
+
+class RequirementNotFound(Exception):
+    pass
+
+
+class RequirementClosed(Exception):
+    """The requirement is closed or already has everything it asked for."""
+
+
+class InsufficientInventory(Exception):
+    def __init__(self, available, needed, scrap_type):
+        self.available = available   # None: the dealer has no row for this scrap type
+        self.needed = needed
+        self.scrap_type = scrap_type
+        super().__init__(f"Insufficient inventory. You have {available or 0}kg {scrap_type} but need {needed}kg.")
+
+
+async def record_fulfillment(client, requirement_id, dealer_id, quantity_kg):
+    """Supply up to `quantity_kg` of a requirement from a dealer's stock with
+    `record_fulfillment` (see db_outbox_migration.sql), in one round-trip.
+
+    Only what the requirement still needs is taken; stock, fulfillment row and
+    progress change together. The industry's payment is queued for the outbox
+    worker (services/outbox.py). Returns {"fulfillment_id", "scrap_type",
+    "quantity_kg", "fulfilled_kg", "required_kg", "status", "inventory",
+    "coins_due", "coins_earned", "coins_pending", "event_id"}: of coins_due the
+    payment will move coins_earned (what the industry can afford now).
+    Raises RequirementNotFound, RequirementClosed or
+    InsufficientInventory, in which case nothing was written.
+    """
+    try:
+        return await rpc_with_retry(client, "record_fulfillment", {
+            "p_requirement": requirement_id,
+            "p_dealer": dealer_id,
+            "p_kg": quantity_kg,
+        })
+    except APIError as e:
+        message = e.message or ""
+        if message == "insufficient_inventory":
+            details = json.loads(e.details or "{}")
+            raise InsufficientInventory(details.get("available"), details.get("needed"), details.get("scrap_type")) from e
+        if message.startswith("requirement_not_found"):
+            raise RequirementNotFound(message) from e
+        if message in ("requirement_closed", "requirement_full"):
+            raise RequirementClosed(message) from e
+        raise
+
+
+# Concurrent readers that find the index stale share one reload
+_reload_lock = asyncio.Lock()
+
+
+async def load_inventory_index(db):
+    """(Re)build the inventory index from the database when it is stale."""
+    if inventory_index.is_fresh(INVENTORY_INDEX_REFRESH_SECONDS):
+        return
+    async with _reload_lock:
+        if inventory_index.is_fresh(INVENTORY_INDEX_REFRESH_SECONDS):
+            return
+        rows = await fetch_all(
+            lambda: db.table("dealer_inventory").select(INVENTORY_SELECT).gt("quantity_kg", 0)
+        )
+        inventory_index.rebuild(rows)
@@ -0,0 +1,78 @@
+import json
+
+from postgrest.exceptions import APIError
+
+
+class InsufficientCoins(Exception):
+    """Raised when a 'require' transfer finds the payer's balance too low."""
+
+    def __init__(self, balance, needed):
+        self.balance = balance
+        self.needed = needed
+        super().__init__(f"Insufficient coins. You have {balance} but need {needed}.")
+
+
+async def transfer_coins(
+    client,
+    from_id,
+    to_id,
+    amount,
+    type,
+    reference_id=None,
+    debit_description=None,
+    credit_description=None,
+    mode="require",
+    debit_type=None,
+):
+    """Move Scrap Coins with the `transfer_coins` Postgres function (see schema.sql).
+
+    Debit, credit and both `transactions` rows are written in one round-trip and
+    one database transaction. `from_id=None` mints coins, `to_id=None` burns them.
+    `mode` is 'require', 'partial', 'skip' or 'overdraft'; '{amount}' in the
+    descriptions is replaced by the amount actually moved.
+
+    Returns {"amount", "from_balance", "to_balance"} after the transfer.
+    """
+    try:
+        result = await client.rpc("transfer_coins", {
+            "p_from": from_id,
+            "p_to": to_id,
+            "p_amount": int(amount),
+            "p_type": type,
+            "p_reference_id": reference_id,
+            "p_debit_description": debit_description,
+            "p_credit_description": credit_description,
+            "p_mode": mode,
+            "p_debit_type": debit_type,
+        }).execute()
+    except APIError as e:
+        if e.message == "insufficient_coins":
+            details = json.loads(e.details or "{}")
+            raise InsufficientCoins(details.get("balance", 0), details.get("needed", amount)) from e
+        raise
+
+    return result.data
+
+
+async def complete_pickups(client, partner_id, request_ids):
+    """Complete many accepted pickups of one partner with `complete_scrap_requests`
+    (see db_batch_complete_migration.sql).
+
+    One round-trip and one database transaction for the whole batch: each donor is
+    paid weight * multiplier from the partner's wallet (which may go negative),
+    wallets are updated once per user, all ledger rows go in one insert and a
+    dealer's inventory is upserted once per scrap type. Requests that are not
+    accepted by this partner are left alone.
+
+    Returns {"completed", "skipped", "inventory", "balances"}: the completed
+    requests with their coins_awarded, the ids not completed, the dealer_inventory
+    rows after the upsert and the new balance of every wallet touched.
+
+    Unlike `complete_pickup` nothing goes through the outbox: the coalesced
+    payouts are the point of the batch (see db_outbox_migration.sql).
+    """
+    result = await client.rpc("complete_scrap_requests", {
+        "p_partner": partner_id,
+        "p_ids": list(request_ids),
+    }).execute()
+    return result.data
@@ -0,0 +1,66 @@
+import json
+import logging
+import random
+import sys
+import time
+
+from config import LOG_LEVEL, LOG_SAMPLE_RATE
+from services.metrics import current_request
+
+_root = logging.getLogger("scrapcrafters")
+_root.setLevel(LOG_LEVEL)
+_root.propagate = False
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _root.addHandler(_handler)
+
+
+class EventLogger:
+    """Structured logger: each event is one JSON line {"ts", "level", "event", ...fields}.
+
+    A call below LOG_LEVEL returns after one level check, before any field is
+    formatted, so step-by-step debug events are free on the hot path when
+    disabled. Enabled debug/info events are kept with probability LOG_SAMPLE_RATE
+    (the line records the rate); warnings and errors are always written. Inside
+    an HTTP request the matched route is added.
+    """
+
+    def __init__(self, name, sample_rate=None):
+        self._logger = _root.getChild(name)
+        self.sample_rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def _log(self, level, event, fields, exc_info=False):
+        if not self._logger.isEnabledFor(level):
+            return
+        sampled = level < logging.WARNING and self.sample_rate < 1
+        if sampled and random.random() >= self.sample_rate:
+            return
+        record = {"ts": round(time.time(), 3), "level": logging.getLevelName(level).lower(), "event": event}
+        request = current_request()
+        if request is not None:
+            record["route"] = request.route
+        record.update(fields)
+        if sampled:
+            record["sample_rate"] = self.sample_rate
+        self._logger.log(level, json.dumps(record, default=str), exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """error() with the current exception's traceback."""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name):
+    return EventLogger(name)
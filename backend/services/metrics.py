@@ -0,0 +1,313 @@
+import bisect
+import time
+from contextvars import ContextVar
+
+from config import METRICS_ENABLED
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}   # label values -> value
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def label_sets(self):
+        return list(self._values)
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; per label set it keeps non-cumulative bucket counts,
+    the sum and the count, and renders them cumulatively like Prometheus expects."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def value(self, *labels):
+        """(count, sum) of one label set."""
+        series = self._values.get(labels)
+        return (series[2], series[1]) if series else (0, 0.0)
+
+    def render(self):
+        lines = self._header()
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.add(Counter(
+    "scrapcrafters_http_requests_total", "HTTP requests served.", ("method", "route", "status"),
+))
+http_errors = registry.add(Counter(
+    "scrapcrafters_http_request_errors_total", "HTTP requests answered with a 4xx/5xx or an unhandled error.",
+    ("method", "route"),
+))
+http_latency = registry.add(Histogram(
+    "scrapcrafters_http_request_duration_seconds", "Time from request start to the end of the response.",
+    ("method", "route"),
+))
+http_in_flight = registry.add(Gauge(
+    "scrapcrafters_http_requests_in_flight", "HTTP requests being served.", ("method",),
+))
+db_requests = registry.add(Counter(
+    "scrapcrafters_db_requests_total", "Supabase (PostgREST/Auth) calls.", ("table", "operation", "status"),
+))
+db_latency = registry.add(Histogram(
+    "scrapcrafters_db_request_duration_seconds", "Time from sending a Supabase call to its response headers.",
+    ("table", "operation"),
+))
+db_retries = registry.add(Counter(
+    "scrapcrafters_db_retries_total", "Database function calls retried after a serialization failure or deadlock.",
+    ("function", "code"),
+))
+pickup_claims = registry.add(Counter(
+    "scrapcrafters_pickup_claims_total",
+    "Pickup accept attempts by outcome: won, lost (someone else claimed it first) or rejected.",
+    ("outcome",),
+))
+auth_verifications = registry.add(Counter(
+    "scrapcrafters_auth_verifications_total",
+    "Bearer tokens checked by outcome: cached (verified earlier), verified (signature checked) or rejected.",
+    ("outcome",),
+))
+auth_gateway_requests = registry.add(Counter(
+    "scrapcrafters_auth_gateway_requests_total",
+    "Signups/logins by outcome: upstream (ran), coalesced (shared a running call), rate_limited or overloaded.",
+    ("kind", "outcome"),
+))
+auth_upstream_in_flight = registry.add(Gauge(
+    "scrapcrafters_auth_upstream_in_flight", "Signups/logins running against Supabase Auth.",
+))
+auth_upstream_queued = registry.add(Gauge(
+    "scrapcrafters_auth_upstream_queued", "Signups/logins waiting for an upstream slot.",
+))
+outbox_events = registry.add(Counter(
+    "scrapcrafters_outbox_events_total",
+    "Outbox events drained by this worker, by outcome: done, retry (failed, tried again later) or dead.",
+    ("kind", "outcome"),
+))
+outbox_backlog = registry.add(Gauge(
+    "scrapcrafters_outbox_backlog", "Outbox events waiting to be applied, as of this worker's last drain.",
+))
+outbox_oldest_seconds = registry.add(Gauge(
+    "scrapcrafters_outbox_oldest_event_age_seconds", "Age of the oldest waiting outbox event, as of the last drain.",
+))
+outbox_dead = registry.add(Gauge(
+    "scrapcrafters_outbox_dead_events", "Dead-lettered outbox events (see requeue_outbox_events), as of the last drain.",
+))
+outbox_drain_latency = registry.add(Histogram(
+    "scrapcrafters_outbox_drain_duration_seconds", "Time per drain_outbox batch, including the round-trip.",
+))
+idempotency_requests = registry.add(Counter(
+    "scrapcrafters_idempotency_requests_total",
+    "Requests carrying an Idempotency-Key, by outcome: executed, replayed (stored response), "
+    "coalesced (shared a running execution) or mismatch (key reused with another body).",
+    ("route", "outcome"),
+))
+db_calls_per_request = registry.add(Histogram(
+    "scrapcrafters_db_calls_per_request", "Supabase calls made while serving one HTTP request.",
+    ("route",), buckets=CALL_COUNT_BUCKETS,
+))
+
+
+class RequestStats:
+    """What one HTTP request has done so far; shared with the tasks it spawns."""
+
+    __slots__ = ("scope", "db_calls", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.db_calls = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self):
+        return route_template(self.scope)
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def current_request():
+    """Stats of the HTTP request being served by this task, or None outside one."""
+    return _current.get()
+
+
+def route_template(scope):
+    """The matched path template (e.g. /scrap/requests/{request_id}/accept), so raw
+    ids never become label values. Known only once routing has happened."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, in-flight requests, status and
+    error counts, and the Supabase calls each request made."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        http_in_flight.inc(method)
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            route = route_template(scope)
+            http_in_flight.dec(method)
+            http_requests.inc(method, route, str(status))
+            http_latency.observe(elapsed, method, route)
+            if status >= 400:
+                http_errors.inc(method, route)
+            db_calls_per_request.observe(stats.db_calls, route)
+            _current.reset(token)
+
+
+def _db_target(request):
+    """(table, operation) of a Supabase call from its URL and method."""
+    parts = request.url.path.strip("/").split("/")
+    if parts[:2] == ["rest", "v1"] and len(parts) > 2:
+        if parts[2] == "rpc" and len(parts) > 3:
+            return parts[3], "rpc"
+        operation = {"GET": "select", "HEAD": "count", "PATCH": "update", "DELETE": "delete"}.get(request.method)
+        if operation is None:
+            prefer = request.headers.get("prefer", "")
+            operation = "upsert" if "resolution=" in prefer else "insert"
+        return parts[2], operation
+    if parts and parts[0] == "auth":
+        return "auth", "/".join(parts[2:]) or "auth"
+    return parts[0] if parts else "", request.method.lower()
+
+
+async def _on_db_request(request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+async def _on_db_response(response):
+    request = response.request
+    start = request.extensions.get("metrics_start")
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    table, operation = _db_target(request)
+    db_requests.inc(table, operation, str(response.status_code))
+    db_latency.observe(elapsed, table, operation)
+    stats = _current.get()
+    if stats is not None:
+        stats.db_calls += 1
+        stats.db_seconds += elapsed
+
+
+def db_event_hooks():
+    """httpx event hooks that count and time every Supabase call (see database.py)."""
+    if not METRICS_ENABLED:
+        return {}
+    return {"request": [_on_db_request], "response": [_on_db_response]}
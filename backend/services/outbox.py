@@ -0,0 +1,140 @@
+"""Draining the transactional outbox (see db_outbox_migration.sql).
+
+Completing a pickup or fulfilling a requirement commits its state change and an
+outbox_events row in one function call; paying the donor / dealer and stocking
+the dealer happen here, off the request path. Every worker runs an
+OutboxWorker: one `drain_outbox` call applies a batch of due events, each
+exactly once and in the same database transaction as marking it done, and the
+worker patches its inventory index with the stock the batch added. It drains
+again right away while batches come back full, when a handler wakes it after
+enqueuing, and otherwise every OUTBOX_POLL_SECONDS. Failed events are retried
+by the database with backoff and dead-lettered after OUTBOX_MAX_ATTEMPTS.
+
+Also runnable as a job from backend/:
+    python -m services.outbox drain
+    python -m services.outbox requeue [--id 12 --id 13]
+"""
+import argparse
+import asyncio
+import time
+
+from config import OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE_SECONDS
+from services.inventory import inventory_index
+from services.logs import get_logger
+from services.metrics import (
+    outbox_backlog,
+    outbox_dead,
+    outbox_drain_latency,
+    outbox_events,
+    outbox_oldest_seconds,
+)
+from services.retry import rpc_with_retry
+
+log = get_logger("outbox")
+
+
+async def drain(db, limit=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS, retry_seconds=OUTBOX_RETRY_BASE_SECONDS):
+    """Apply up to `limit` due events in one round-trip.
+
+    Returns {"events": [{"id", "kind", "status", "attempts", "result" | "error"}],
+    "backlog", "oldest_seconds", "dead"}; status is done, retry or dead.
+    """
+    return await rpc_with_retry(db, "drain_outbox", {
+        "p_limit": limit,
+        "p_max_attempts": max_attempts,
+        "p_retry_seconds": retry_seconds,
+    })
+
+
+async def requeue(db, ids=None):
+    """Give dead events (all, or `ids`) a fresh set of attempts; returns how many."""
+    return await rpc_with_retry(db, "requeue_outbox_events", {"p_ids": ids})
+
+
+class OutboxWorker:
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 retry_seconds=OUTBOX_RETRY_BASE_SECONDS):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._wake = None   # created by run(), on the loop it runs on
+
+    def wake(self):
+        """Something was just enqueued: drain now rather than at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def drain_once(self, db):
+        """One batch; returns how many events it took (done, retried or dead)."""
+        t0 = time.perf_counter()
+        report = await drain(db, self.batch_size, self.max_attempts, self.retry_seconds)
+        outbox_drain_latency.observe(time.perf_counter() - t0)
+
+        for event in report["events"]:
+            outbox_events.inc(event["kind"], event["status"])
+            if event["status"] == "done":
+                inventory = (event.get("result") or {}).get("inventory")
+                if inventory:
+                    inventory_index.set_quantity(
+                        inventory["dealer_id"], inventory["scrap_type"], float(inventory["quantity_kg"]), inventory,
+                    )
+            elif event["status"] == "dead":
+                log.error("outbox.dead", id=event["id"], kind=event["kind"], attempts=event["attempts"],
+                          error=event.get("error"))
+            else:
+                log.warning("outbox.retry", id=event["id"], kind=event["kind"], attempts=event["attempts"],
+                            error=event.get("error"))
+
+        outbox_backlog.set(report["backlog"])
+        outbox_oldest_seconds.set(float(report["oldest_seconds"] or 0))
+        outbox_dead.set(report["dead"])
+        if report["events"]:
+            log.debug("outbox.drained", events=len(report["events"]), backlog=report["backlog"])
+        return len(report["events"])
+
+    async def run(self, db, poll_seconds):
+        """Background task: drain until cancelled."""
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                self._wake.clear()
+                try:
+                    taken = await self.drain_once(db)
+                except Exception as e:
+                    log.warning("outbox.drain_failed", error=str(e))
+                    await asyncio.sleep(poll_seconds)
+                    continue
+                if taken >= self.batch_size:
+                    continue   # a full batch: more are probably due
+                try:
+                    await asyncio.wait_for(self._wake.wait(), poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wake = None
+
+
+outbox_worker = OutboxWorker()
+
+
+async def _main(args):
+    from database import close_clients, get_db
+
+    db = get_db()
+    try:
+        if args.command == "requeue":
+            print(f"Requeued {await requeue(db, args.id)} dead events")
+            return
+        total = 0
+        while taken := await outbox_worker.drain_once(db):
+            total += taken
+        print(f"Drained {total} events; {int(outbox_dead.value())} dead")
+    finally:
+        await close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or requeue outbox events")
+    parser.add_argument("command", choices=["drain", "requeue"])
+    parser.add_argument("--id", type=int, action="append", help="requeue only these dead events")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,109 @@
+import base64
+import json
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+
+from config import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+CURSOR_KEYS = ("created_at", "id")
+
+_COLUMN = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# PostgREST caps a response at max-rows (1000 on Supabase); fetch_all reads past it page by page
+FETCH_PAGE_SIZE = 1000
+
+
+@dataclass
+class PageParams:
+    limit: int
+    cursor: Optional[tuple]   # (created_at, id) of the last row already returned
+    fields: Optional[list]
+
+
+def page_params(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns/embeds to return"),
+) -> PageParams:
+    """FastAPI dependency for keyset-paginated list endpoints."""
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    return PageParams(limit=limit, cursor=decode_cursor(cursor) if cursor else None, fields=names)
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor, normalized: they are spliced into a PostgREST filter."""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(row_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def select_columns(params, default, embeds=None):
+    """PostgREST select string for `fields=`, or `default` when no projection was asked for.
+
+    `embeds` maps a field name (e.g. "profiles") to its embedded-resource select.
+    The cursor keys are always fetched; `paginate` drops them again if not requested.
+    """
+    if not params.fields:
+        return default
+    embeds = embeds or {}
+    selected = []
+    for name in params.fields:
+        if name in embeds:
+            selected.append(embeds[name])
+        elif _COLUMN.match(name):
+            selected.append(name)
+        else:
+            raise HTTPException(status_code=400, detail=f"Invalid field: {name}")
+    selected += [key for key in CURSOR_KEYS if key not in params.fields]
+    return ", ".join(selected)
+
+
+def keyset(query, params):
+    """Newest-first keyset page: rows strictly after the cursor, one extra to detect a next page."""
+    if params.cursor:
+        created_at, row_id = params.cursor   # validated by decode_cursor
+        # The lte bound is redundant with the or=() but lets Postgres start the
+        # (created_at, id) index scan at the cursor instead of filtering from the top
+        query = query.lte("created_at", created_at).or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    return query.order("created_at", desc=True).order("id", desc=True).limit(params.limit + 1)
+
+
+def paginate(rows, params, response: Response):
+    """Trim the extra row, set the next-page cursor header and apply the projection."""
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1])
+    if params.fields:
+        extra = [key for key in CURSOR_KEYS if key not in params.fields]
+        if extra:
+            rows = [{k: v for k, v in row.items() if k not in extra} for row in rows]
+    return rows
+
+
+async def fetch_all(make_query):
+    """Every row of `make_query()` (a fresh filtered select each call), read in id-ordered pages."""
+    rows, last_id = [], None
+    while True:
+        query = make_query()
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = (await query.order("id").limit(FETCH_PAGE_SIZE).execute()).data
+        rows += page
+        if len(page) < FETCH_PAGE_SIZE:
+            return rows
+        last_id = page[-1]["id"]
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from fastapi import Depends
+from supabase import AsyncClient
+
+from config import PROFILE_CACHE_MAXSIZE, PROFILE_CACHE_TTL_SECONDS
+from database import get_db
+
+# Slow-changing columns only; coin balances are always read fresh
+PROFILE_COLUMNS = "id, name, role, organization_name, location, latitude, longitude"
+
+
+class ProfileCache:
+    """TTL + LRU cache of profile rows, shared by every request on this worker."""
+
+    def __init__(self, maxsize=PROFILE_CACHE_MAXSIZE, ttl=PROFILE_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows = OrderedDict()   # user id -> (expires at, row)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, user_id):
+        entry = self._rows.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._rows.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id, row):
+        self._rows[user_id] = (time.monotonic() + self.ttl, row)
+        self._rows.move_to_end(user_id)
+        while len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id):
+        self._rows.pop(user_id, None)
+
+    def clear(self):
+        self._rows.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._rows),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+profile_cache = ProfileCache()
+
+
+class ProfileLoader:
+    """Request-scoped profile reads: each id is fetched at most once per request
+    (concurrent lookups share one query), then served from the worker cache."""
+
+    def __init__(self, db, cache=profile_cache):
+        self.db = db
+        self.cache = cache
+        self._memo = {}   # user id -> task resolving to the row (or None)
+
+    async def get(self, user_id):
+        """The profile row (PROFILE_COLUMNS), or None if there is no such profile."""
+        task = self._memo.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(user_id))
+            self._memo[user_id] = task
+        return await task
+
+    async def role(self, user_id):
+        profile = await self.get(user_id)
+        return profile["role"] if profile else None
+
+    async def _load(self, user_id):
+        row = self.cache.get(user_id)
+        if row is not None:
+            return row
+        result = await self.db.table("profiles").select(PROFILE_COLUMNS).eq("id", user_id).execute()
+        if not result.data:
+            return None
+        self.cache.put(user_id, result.data[0])
+        return result.data[0]
+
+
+def get_profiles(db: AsyncClient = Depends(get_db)) -> ProfileLoader:
+    """FastAPI dependency; FastAPI resolves it once per request, so the memo is request-scoped."""
+    return ProfileLoader(db)
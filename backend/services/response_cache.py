@@ -0,0 +1,95 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from config import RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_TTL_SECONDS
+from services.pagination import NEXT_CURSOR_HEADER
+
+# Response headers that are part of a cached listing besides the body
+CACHED_HEADERS = (NEXT_CURSOR_HEADER,)
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    """Per-worker cache of serialized JSON listings keyed by namespace + query string,
+    with strong ETags so clients can revalidate with If-None-Match.
+
+    Mutating endpoints call invalidate(namespace). A response computed while an
+    invalidation happened is served but not stored (namespace version check).
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL_SECONDS, maxsize=RESPONSE_CACHE_MAXSIZE):
+        self.ttl = ttl   # <= 0 disables caching; ETags/304s still apply
+        self.maxsize = maxsize
+        self._entries = OrderedDict()   # (namespace, query) -> (expires at, body, etag, headers)
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def _key(request, namespace):
+        return namespace, tuple(sorted(request.query_params.multi_items()))
+
+    def version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def invalidate(self, namespace):
+        self._versions[namespace] = self.version(namespace) + 1
+        for key in [k for k in self._entries if k[0] == namespace]:
+            del self._entries[key]
+
+    def get(self, request: Request, namespace):
+        """The cached response (or a 304) for this request, or None on a miss."""
+        key = self._key(request, namespace)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        _, body, etag, headers = entry
+        return self._respond(request, body, etag, headers)
+
+    def put(self, request: Request, namespace, version, data, response: Response):
+        """Serialize `data`, store it if nothing was invalidated since `version`, and respond."""
+        body = json.dumps(
+            jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+
+        if self.ttl > 0 and version == self.version(namespace):
+            self._entries[self._key(request, namespace)] = (time.monotonic() + self.ttl, body, etag, headers)
+            self._entries.move_to_end(self._key(request, namespace))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return self._respond(request, body, etag, headers)
+
+    def _respond(self, request, body, etag, headers):
+        headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+listing_cache = ResponseCache()
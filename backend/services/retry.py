@@ -0,0 +1,31 @@
+"""Retrying Postgres function calls that lost a serialization or deadlock race."""
+import asyncio
+import random
+
+from postgrest.exceptions import APIError
+
+from config import DB_RETRY_ATTEMPTS, DB_RETRY_BASE_SECONDS
+from services.logs import get_logger
+from services.metrics import db_retries
+
+log = get_logger("retry")
+
+# serialization_failure, deadlock_detected: the transaction was rolled back, retrying is safe
+RETRYABLE_CODES = {"40001", "40P01"}
+
+
+async def rpc_with_retry(client, function, params, attempts=None):
+    """`client.rpc(function, params)`, retried with jittered exponential backoff
+    while it fails with a RETRYABLE_CODES error. Returns the response data; any
+    other APIError (and the last retryable one) is raised."""
+    attempts = attempts or DB_RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        try:
+            result = await client.rpc(function, params).execute()
+            return result.data
+        except APIError as e:
+            if e.code not in RETRYABLE_CODES or attempt + 1 >= attempts:
+                raise
+            db_retries.inc(function, e.code)
+            log.debug("rpc.retry", function=function, code=e.code, attempt=attempt + 1)
+            await asyncio.sleep(DB_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
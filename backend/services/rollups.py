@@ -0,0 +1,82 @@
+"""Dashboard aggregates from the rollup tables (see db_rollup_migration.sql).
+
+Triggers keep rollup_totals / rollup_daily current as pickups complete,
+supplies are recorded and coins move, so a profile's figures are two indexed
+reads of a few rows each, however long its history: the totals and at most
+`days` days of daily rows.
+
+Also runnable as a job from backend/ (the backfill, once after the migration):
+    python -m services.rollups rebuild
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+# What each dashboard shows; metrics with no activity yet are reported as 0
+USER_METRICS = ("donated_kg", "donations", "coins_earned", "coins_bought", "purchases", "coins_spent")
+DEALER_METRICS = ("collected_kg", "pickups", "coins_spent", "supplied_kg", "fulfillments", "coins_earned")
+INDUSTRY_METRICS = ("received_kg", "fulfillments", "coins_spent")
+
+
+def _number(metric, value):
+    return round(float(value), 2) if metric.endswith("_kg") else int(value)
+
+
+async def get_stats(db, subject_id, metrics, days):
+    """{"totals": {metric: n}, "by_scrap_type": {type: {metric: n}}, "daily": [{"day", metric: n}]}.
+
+    daily covers the last `days` UTC days (today included), oldest first, and
+    lists only days with activity.
+    """
+    queries = [db.table("rollup_totals").select("metric,scrap_type,value").eq("subject_id", subject_id)]
+    if days > 0:
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).date().isoformat()
+        queries.append(db.table("rollup_daily").select("day,metric,scrap_type,value")
+                       .eq("subject_id", subject_id).gte("day", since).order("day"))
+    totals, *daily = [r.data for r in await asyncio.gather(*(q.execute() for q in queries))]
+
+    summed = dict.fromkeys(metrics, 0)
+    by_type = {}
+    for row in totals:
+        if row["metric"] not in summed:
+            continue
+        summed[row["metric"]] += float(row["value"])
+        if row["scrap_type"]:
+            by_type.setdefault(row["scrap_type"], dict.fromkeys(metrics, 0))[row["metric"]] = _number(
+                row["metric"], row["value"])
+
+    days_seen = {}
+    for row in daily[0] if daily else []:
+        if row["metric"] in summed:
+            day = days_seen.setdefault(row["day"], {"day": row["day"], **dict.fromkeys(metrics, 0)})
+            day[row["metric"]] += float(row["value"])
+
+    return {
+        "totals": {m: _number(m, v) for m, v in summed.items()},
+        "by_scrap_type": dict(sorted(by_type.items())),
+        "daily": [{k: v if k == "day" else _number(k, v) for k, v in day.items()} for day in days_seen.values()],
+    }
+
+
+async def rebuild(db):
+    """Recompute both rollup tables from the full history; returns {"profiles", "total_rows", "daily_rows"}."""
+    result = await db.rpc("rebuild_rollups", {}).execute()
+    return result.data
+
+
+async def _main(args):
+    from database import close_clients, get_db
+
+    db = get_db()
+    try:
+        report = await rebuild(db)
+        print(f"Rebuilt rollups for {report['profiles']} profiles: "
+              f"{report['total_rows']} total rows, {report['daily_rows']} daily rows")
+    finally:
+        await close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the /stats rollup tables from history")
+    parser.add_argument("command", choices=["rebuild"])
+    asyncio.run(_main(parser.parse_args()))
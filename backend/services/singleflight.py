@@ -0,0 +1,37 @@
+"""Request coalescing: concurrent calls with the same key share one execution."""
+import asyncio
+
+
+class SingleFlight:
+    """The first caller of a key runs it; callers that arrive while it is still
+    running await the same task and get the same result or exception.
+
+    The shared task is shielded, so a caller that goes away (client disconnect)
+    does not cancel it for the others. Once it finishes the key is forgotten:
+    the next call runs again.
+    """
+
+    def __init__(self):
+        self._calls = {}   # key -> task
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    async def do(self, key, fn):
+        """(result of `await fn()`, shared); shared is True for callers that joined a running call."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()   # retrieved: nobody may be left awaiting it
@@ -0,0 +1,114 @@
+"""Marketplace stock: conditional decrements, checkout reservations and purchases
+(see db_stock_reservation_migration.sql).
+
+Every call is one Postgres function, so stock can never go below zero however
+many buyers race for the last unit. Calls that lose a serialization/deadlock
+race are retried (services/retry.py).
+"""
+import asyncio
+import json
+
+from postgrest.exceptions import APIError
+
+from config import STOCK_RESERVATION_TTL_SECONDS
+from services.ledger import InsufficientCoins
+from services.logs import get_logger
+from services.response_cache import listing_cache
+from services.retry import rpc_with_retry
+
+log = get_logger("stock")
+
+
+class ProductNotFound(Exception):
+    pass
+
+
+class OutOfStock(Exception):
+    def __init__(self, available, requested):
+        self.available = available
+        self.requested = requested
+        super().__init__(f"Only {available} units available. You requested {requested}.")
+
+
+class ReservationInvalid(Exception):
+    """The reservation does not exist, is someone else's, has expired or was already used."""
+
+
+def _raise_for(e: APIError):
+    message = e.message or ""
+    if message == "out_of_stock":
+        details = json.loads(e.details or "{}")
+        raise OutOfStock(details.get("available", 0), details.get("requested")) from e
+    if message == "insufficient_coins":
+        details = json.loads(e.details or "{}")
+        raise InsufficientCoins(details.get("balance", 0), details.get("needed")) from e
+    if message.startswith("product_not_found"):
+        raise ProductNotFound(message) from e
+    if message.startswith("reservation_not_found"):
+        raise ReservationInvalid(message) from e
+    raise e
+
+
+async def _call(client, function, params):
+    try:
+        return await rpc_with_retry(client, function, params)
+    except APIError as e:
+        _raise_for(e)
+
+
+async def purchase(client, product_id, buyer_id, quantity, pay_with_coins=True, reservation_id=None):
+    """Take the stock (or consume `reservation_id`) and pay the artist, atomically.
+
+    Returns {"product_id", "name", "quantity", "unit_price", "total_paid",
+    "remaining_stock"}; total_paid is the price, also when it is not paid in
+    coins. Raises OutOfStock, InsufficientCoins, ProductNotFound or
+    ReservationInvalid, in which case nothing was written.
+    """
+    return await _call(client, "purchase_product", {
+        "p_product": product_id,
+        "p_buyer": buyer_id,
+        "p_quantity": quantity,
+        "p_pay_with_coins": pay_with_coins,
+        "p_reservation": reservation_id,
+    })
+
+
+async def reserve(client, product_id, buyer_id, quantity, ttl_seconds=STOCK_RESERVATION_TTL_SECONDS):
+    """Hold `quantity` units for a checkout; they return to stock unless purchased
+    within `ttl_seconds`.
+
+    Returns {"reservation_id", "product_id", "quantity", "expires_at", "remaining_stock"}.
+    """
+    return await _call(client, "reserve_stock", {
+        "p_product": product_id,
+        "p_buyer": buyer_id,
+        "p_quantity": quantity,
+        "p_ttl_seconds": int(ttl_seconds),
+    })
+
+
+async def release(client, reservation_id, buyer_id):
+    """Give `buyer_id`'s held reservation's stock back; False if they hold no such reservation."""
+    return await _call(client, "release_stock_reservation", {"p_reservation": reservation_id, "p_buyer": buyer_id})
+
+
+async def release_expired(client, product_id=None):
+    """Return the stock of expired holds (all products by default); returns how many expired."""
+    return await _call(client, "release_expired_reservations", {"p_product": product_id})
+
+
+async def reservation_sweep_loop(db, interval_seconds):
+    """Background task: expire abandoned holds every `interval_seconds` until cancelled.
+
+    Purchases and reservations already expire the holds of the product they touch;
+    this keeps listings right for products nobody is buying.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            expired = await release_expired(db)
+            if expired:
+                listing_cache.invalidate("products")   # the units are back on sale
+                log.info("stock.reservations_expired", count=expired)
+        except Exception as e:
+            log.warning("stock.sweep_failed", error=str(e))
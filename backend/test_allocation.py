@@ -0,0 +1,109 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from benchmarks.bench_allocation import make_market
+from benchmarks.postgrest_standin import PostgrestStandIn
+from services import pagination
+from services.allocation import plan_allocation
+
+
+def at(lat, lon):
+    return {"latitude": lat, "longitude": lon}
+
+
+def requirement(id, kg, price=None, where=None, scrap_type="iron", fulfilled=0):
+    return {
+        "id": id, "industry_id": f"industry-{id}", "scrap_type": scrap_type, "required_kg": kg,
+        "fulfilled_kg": fulfilled, "price_per_kg": price, "profiles": where,
+    }
+
+
+def stock(id, kg, where=None, scrap_type="iron"):
+    return {"id": f"inv-{id}", "dealer_id": id, "scrap_type": scrap_type, "quantity_kg": kg, "profiles": where}
+
+
+@pytest.mark.parametrize("dealers, requirements, candidates", [(600, 40, 32), (60, 300, 32), (300, 100, 1)])
+def test_plan_is_feasible_and_maximal(dealers, requirements, candidates):
+    reqs, inventory = make_market(dealers, requirements)
+    plan = plan_allocation(reqs, inventory, candidates=candidates)
+
+    shipped_from, shipped_to = defaultdict(float), defaultdict(float)
+    for row in plan["allocations"]:
+        assert row["quantity_kg"] > 0
+        shipped_from[row["inventory_id"]] += row["quantity_kg"]
+        shipped_to[row["requirement_id"]] += row["quantity_kg"]
+    for row in inventory:
+        assert shipped_from[row["id"]] <= row["quantity_kg"] + 1e-9
+    for row in reqs:
+        assert shipped_to[row["id"]] <= row["required_kg"] - row["fulfilled_kg"] + 1e-9
+
+    # Per scrap type either every requirement is met or every dealer is sold out
+    for scrap_type, totals in plan["summary"].items():
+        assert totals["allocated_kg"] == pytest.approx(min(totals["demand_kg"], totals["supply_kg"]))
+        short = [u for u in plan["unmet"] if u["scrap_type"] == scrap_type]
+        assert bool(short) == (totals["demand_kg"] > totals["supply_kg"])
+
+
+def test_nearer_dealers_and_better_prices_win():
+    plan = plan_allocation(
+        [
+            requirement("cheap", 10, price=1, where=at(19.07, 72.88)),
+            requirement("pays", 10, price=20, where=at(19.07, 72.88)),
+            requirement("delhi", 5, where=at(28.61, 77.21)),
+            requirement("done", 5, fulfilled=5),
+        ],
+        [
+            stock("near", 10, at(19.08, 72.88)),
+            stock("far", 4, at(19.50, 72.88)),
+            stock("delhi", 8, at(28.62, 77.21)),
+            stock("nowhere", 2),
+            stock("empty", 0, at(19.07, 72.88)),
+        ],
+    )
+    shipped = {(r["requirement_id"], r["dealer_id"]): r["quantity_kg"] for r in plan["allocations"]}
+    assert shipped == {
+        ("pays", "near"): 10,       # the nearest stock goes to the better-paying requirement
+        ("delhi", "delhi"): 5,
+        ("cheap", "far"): 4,
+        ("cheap", "nowhere"): 2,    # unknown distance (100 km) still beats shipping from Delhi
+        ("cheap", "delhi"): 3,      # Delhi's surplus goes last
+    }
+    assert plan["unmet"] == [{"requirement_id": "cheap", "scrap_type": "iron", "unmet_kg": 1.0}]
+    distances = {r["dealer_id"]: r["distance_km"] for r in plan["allocations"]}
+    assert distances["near"] == 1.1 and distances["nowhere"] is None
+    assert plan["summary"]["iron"]["dealers"] == 4
+
+
+def test_plan_endpoint_reads_every_page(api, monkeypatch):
+    monkeypatch.setattr(pagination, "FETCH_PAGE_SIZE", 2)
+    # The stand-in serves embedded profiles as stored on the row
+    standin = PostgrestStandIn(tables={
+        "industry_requirements": [
+            {"id": f"r{i}", "industry_id": "p-industry", "scrap_type": "iron", "required_kg": 10,
+             "fulfilled_kg": 0, "price_per_kg": 5, "status": status, "profiles": at(19.07, 72.88)}
+            for i, status in enumerate(["open", "partially_fulfilled", "closed", "open", "open"])
+        ] + [{"id": "r9", "industry_id": "p-industry", "scrap_type": "glass", "required_kg": 10,
+              "fulfilled_kg": 0, "status": "open"}],
+        "dealer_inventory": [
+            {"id": f"i{i}", "dealer_id": "p-dealer", "scrap_type": "iron", "quantity_kg": kg,
+             "profiles": at(19.08, 72.88)}
+            for i, kg in enumerate([15, 0, 15, 15])
+        ],
+    })
+
+    async def fetch(params):
+        async with api(standin) as client:
+            return await client.get("/industry/allocation/plan", params=params)
+
+    response = asyncio.run(fetch({"scrap_type": "iron"}))
+    assert response.status_code == 200
+    plan = response.json()
+    assert plan["summary"] == {"iron": {
+        "requirements": 4, "dealers": 3, "demand_kg": 40.0, "supply_kg": 45.0, "allocated_kg": 40.0, "kg_km": 44.5,
+    }}
+    assert {r["requirement_id"] for r in plan["allocations"]} == {"r0", "r1", "r3", "r4"}
+    assert plan["unmet"] == []
+
+    assert asyncio.run(fetch({"scrap_type": "gold"})).status_code == 422
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from services import auth, metrics
+from services.auth import InvalidToken, TokenVerifier
+from services.profiles import profile_cache
+
+SECRET = "test-jwt-secret-with-at-least-32-bytes"
+
+
+def token(sub="u1", key=SECRET, algorithm="HS256", ttl=3600, headers=None, **claims):
+    now = int(time.time())
+    payload = {"sub": sub, "aud": "authenticated", "role": "authenticated", "iat": now, "exp": now + ttl, **claims}
+    return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+
+def test_tokens_are_verified_once_then_served_from_the_memo():
+    verifier = TokenVerifier(secret=SECRET, jwks_url=None)
+    good = token()
+    before = {o: metrics.auth_verifications.value(o) for o in ("verified", "cached")}
+
+    claims = [asyncio.run(verifier.verify(good)) for _ in range(3)]
+
+    assert claims[0]["sub"] == "u1" and claims[0] == claims[2]
+    assert metrics.auth_verifications.value("verified") - before["verified"] == 1
+    assert metrics.auth_verifications.value("cached") - before["cached"] == 2
+    assert len(verifier) == 1
+
+
+@pytest.mark.parametrize("bad", [
+    token(ttl=-120),                          # expired (past the 30s leeway)
+    token(key="another-secret-of-at-least-32-bytes"),
+    token(aud="anon"),
+    jwt.encode({"aud": "authenticated", "exp": int(time.time()) + 60}, SECRET, algorithm="HS256"),   # no sub
+    "not-a-jwt",
+])
+def test_bad_tokens_are_rejected(bad):
+    with pytest.raises(InvalidToken):
+        asyncio.run(TokenVerifier(secret=SECRET, jwks_url=None).verify(bad))
+
+
+def test_asymmetric_tokens_use_the_cached_jwks():
+    key = ec.generate_private_key(ec.SECP256R1())
+    jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(key.public_key()))
+    fetches = []
+
+    def jwks(request):
+        fetches.append(request.url)
+        return httpx.Response(200, json={"keys": [{**jwk, "kid": "k1", "alg": "ES256", "use": "sig"}]})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(jwks)) as http:
+            verifier = TokenVerifier(secret=None, jwks_url="http://auth/jwks", http=http)
+            first = await verifier.verify(token("a", key, "ES256", headers={"kid": "k1"}))
+            second = await verifier.verify(token("b", key, "ES256", headers={"kid": "k1"}))
+            with pytest.raises(InvalidToken):   # unknown key id: no second fetch this soon
+                await verifier.verify(token("c", key, "ES256", headers={"kid": "k2"}))
+            with pytest.raises(InvalidToken):   # HS256 without a shared secret
+                await verifier.verify(token())
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert (first["sub"], second["sub"]) == ("a", "b")
+    assert len(fetches) == 1
+
+
+def test_handlers_get_the_verified_caller(api, monkeypatch):
+    monkeypatch.setattr(auth.token_verifier, "secret", SECRET)
+    auth.token_verifier.clear()
+    profile_cache.clear()
+    standin = PostgrestStandIn(tables={
+        "profiles": [{"id": "u1", "name": "U1", "role": "user", "scrap_coins": 0},
+                     {"id": "u2", "name": "U2", "role": "user", "scrap_coins": 0}],
+    })
+    donation = {"scrap_type": "iron", "weight_kg": 2}
+
+    async def run():
+        async with api(standin) as client:
+            bearer = {"Authorization": f"Bearer {token('u1')}"}
+            return (
+                await client.get("/auth/session", headers=bearer),
+                await client.post("/scrap/donate", params={"user_id": "u1"}, json=donation, headers=bearer),
+                await client.post("/scrap/donate", params={"user_id": "u2"}, json=donation, headers=bearer),
+                await client.post("/scrap/donate", params={"user_id": "u2"}, json=donation,
+                                  headers={"Authorization": "Bearer forged"}),
+                await client.post("/scrap/donate", params={"user_id": "u2"}, json=donation),
+            )
+
+    session, own, other, forged, anonymous = asyncio.run(run())
+    assert session.json()["user_id"] == "u1" and session.json()["role"] == "user"
+    assert own.status_code == 200
+    assert other.status_code == 403
+    assert forged.status_code == 401 and forged.headers["www-authenticate"].startswith("Bearer")
+    assert anonymous.status_code == 200   # AUTH_REQUIRED is off
+    assert [r["user_id"] for r in standin.tables["scrap_requests"]] == ["u1", "u2"]
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+from database import get_auth_client
+from routers import auth
+from services.auth_gateway import AuthGateway, ConcurrencyGate, RateLimiter
+from services.singleflight import SingleFlight
+
+
+def gateway(ip=(6000, 1000), email=(600, 100), concurrency=(20, 500, 10)):
+    return AuthGateway(RateLimiter(*ip), RateLimiter(*email), ConcurrencyGate(*concurrency))
+
+
+def call_all(api, standin, requests):
+    """Send (path, json, client ip) requests concurrently; responses in order."""
+    async def run():
+        async with api(standin, {get_auth_client: lambda: client_for(standin, key="anon")}) as client:
+            return await asyncio.gather(*(
+                client.post(path, json=body, headers={"X-Forwarded-For": ip}) for path, body, ip in requests
+            ))
+
+    return asyncio.run(run())
+
+
+def signup_body(email, password="secret-pass"):
+    return {"email": email, "password": password, "name": email.split("@")[0]}
+
+
+def test_token_bucket_allows_the_burst_then_meters():
+    limiter = RateLimiter(rate_per_minute=60, burst=3)
+    assert [limiter.take("ip") for _ in range(3)] == [0, 0, 0]
+    assert limiter.take("ip") == pytest.approx(1, abs=0.05)   # one token per second
+    assert limiter.take("other-ip") == 0
+
+
+def test_single_flight_shares_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        flights = SingleFlight()
+        first = await asyncio.gather(*(flights.do("k", work) for _ in range(10)))
+        again = await flights.do("k", work)
+        return first, again, len(flights)
+
+    first, again, left = asyncio.run(run())
+    assert [r for r, _ in first] == [1] * 10
+    assert [shared for _, shared in first].count(False) == 1
+    assert again == (2, False) and left == 0
+
+
+def test_identical_signups_share_one_upstream_call(api, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(auth, "auth_gateway", gateway())
+    standin = PostgrestStandIn(latency=0.01)
+
+    responses = call_all(api, standin, [("/auth/signup", signup_body("asha@example.com"), "10.0.0.1")] * 25)
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()["user_id"] for r in responses}) == 1
+    assert standin.auth_calls == 1
+    assert len(standin.tables["profiles"]) == 1
+
+    logins = call_all(api, standin,
+                      [("/auth/login", {"email": "asha@example.com", "password": "secret-pass"}, "10.0.0.1")] * 10
+                      + [("/auth/login", {"email": "asha@example.com", "password": "wrong"}, "10.0.0.1")])
+    assert [r.status_code for r in logins] == [200] * 10 + [401]
+    assert standin.auth_calls == 3   # one login per distinct password
+
+
+def test_rate_limits_per_ip_and_per_email(api, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(auth, "auth_gateway", gateway(ip=(6, 3), email=(6, 2)))
+    standin = PostgrestStandIn()
+
+    by_ip = call_all(api, standin, [("/auth/signup", signup_body(f"u{i}@example.com"), "10.0.0.2") for i in range(5)])
+    by_email = call_all(api, standin, [("/auth/login", {"email": "x@example.com", "password": f"p{i}"}, f"10.0.1.{i}")
+                                  for i in range(4)])
+
+    assert sorted(r.status_code for r in by_ip) == [200, 200, 200, 429, 429]
+    assert all(int(r.headers["retry-after"]) >= 1 for r in by_ip if r.status_code == 429)
+    assert sorted(r.status_code for r in by_email) == [401, 401, 429, 429]
+    assert standin.auth_calls == 5
+
+
+def test_upstream_concurrency_is_capped_and_the_rest_queue(api, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(auth, "auth_gateway", gateway(concurrency=(4, 100, 10)))
+    standin = PostgrestStandIn(latency=0.005)
+
+    responses = call_all(api, standin,
+                         [("/auth/signup", signup_body(f"c{i}@example.com"), f"10.1.0.{i}") for i in range(40)])
+
+    assert {r.status_code for r in responses} == {200}
+    assert standin.auth_calls == 40 and standin.auth_peak <= 4
+
+
+def test_overflowing_the_queue_sheds_load(api, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(auth, "auth_gateway", gateway(concurrency=(2, 3, 10)))
+    standin = PostgrestStandIn(latency=0.05)
+
+    responses = call_all(api, standin,
+                         [("/auth/signup", signup_body(f"q{i}@example.com"), f"10.2.0.{i}") for i in range(10)])
+
+    statuses = [r.status_code for r in responses]
+    assert statuses.count(200) == 5 and statuses.count(503) == 5
+    assert standin.auth_calls == 5
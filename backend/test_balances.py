@@ -0,0 +1,51 @@
+import asyncio
+import uuid
+
+import pytest
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+from services.balances import reconcile
+
+
+def ledger_standin(users):
+    """Stand-in whose RPCs mirror ledger_balances / repair_balance from db_balance_migration.sql."""
+    standin = PostgrestStandIn(tables={"profiles": users})
+
+    def ledger_balances(standin, params):
+        rows = sorted(standin.tables["profiles"], key=lambda p: p["id"])
+        if params["p_after"]:
+            rows = [p for p in rows if p["id"] > params["p_after"]]
+        return [
+            {"user_id": p["id"], "wallet_balance": p["scrap_coins"], "ledger_balance": p["ledger"],
+             "snapshot_balance": p["snapshot"]}
+            for p in rows[:params["p_limit"]]
+        ]
+
+    def repair_balance(standin, params):
+        profile = next(p for p in standin.tables["profiles"] if p["id"] == params["p_user"])
+        before = profile["scrap_coins"]
+        profile["scrap_coins"] = profile["snapshot"] = profile["ledger"]
+        return {"wallet_before": before, "ledger_balance": profile["ledger"]}
+
+    standin.rpc.update(ledger_balances=ledger_balances, repair_balance=repair_balance)
+    return standin
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 500])
+def test_reconcile_reports_and_repairs_drift(chunk_size):
+    users = [{"id": str(uuid.uuid4()), "scrap_coins": i, "ledger": i, "snapshot": i} for i in range(10)]
+    users[2]["scrap_coins"] = 999   # wallet drifted from the ledger
+    users[7]["snapshot"] = -1       # snapshot drifted from the ledger
+    standin = ledger_standin(users)
+
+    report = asyncio.run(reconcile(client_for(standin), chunk_size=chunk_size))
+    assert report["checked"] == 10
+    assert {row["user_id"] for row in report["drifted"]} == {users[2]["id"], users[7]["id"]}
+    assert report["repaired"] == 0
+    assert users[2]["scrap_coins"] == 999
+
+    report = asyncio.run(reconcile(client_for(standin), repair=True, chunk_size=chunk_size))
+    assert report["repaired"] == 2
+    assert users[2]["scrap_coins"] == 2 and users[7]["snapshot"] == 7
+
+    assert asyncio.run(reconcile(client_for(standin), chunk_size=chunk_size))["drifted"] == []
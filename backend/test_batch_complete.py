@@ -0,0 +1,71 @@
+import asyncio
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from benchmarks.standin_functions import complete_scrap_requests
+from routers import scrap
+from services.feed import FeedHub
+from services.geo import PendingRequestIndex
+from services.inventory import inventory_index
+
+DEALER = "dealer-1"
+
+
+def put(api, standin, body):
+    async def run():
+        async with api(standin) as client:
+            return await client.put("/scrap/requests/complete", json=body)
+
+    return asyncio.run(run())
+
+
+def test_batch_pays_donors_and_stocks_dealer_in_one_round_trip(api, pickup_row, monkeypatch):
+    standin = PostgrestStandIn(
+        tables={
+            "profiles": [
+                {"id": DEALER, "name": "Dealer", "role": "dealer", "scrap_coins": 100},
+                {"id": "u1", "name": "U1", "role": "user", "scrap_coins": 0},
+                {"id": "u2", "name": "U2", "role": "user", "scrap_coins": 5},
+            ],
+            "scrap_requests": [
+                pickup_row(1, "u1", DEALER, 2.5),
+                pickup_row(2, "u1", DEALER, 1, "glass"),
+                pickup_row(3, "u2", DEALER, 4),
+                pickup_row(4, "u2", "artist-1", 4),
+                pickup_row(5, "u2", DEALER, 1, status="completed"),
+            ],
+            "dealer_inventory": [{"id": "inv-iron", "dealer_id": DEALER, "scrap_type": "iron", "quantity_kg": 10}],
+        },
+        rpc={"complete_scrap_requests": complete_scrap_requests},
+    )
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+    hub = FeedHub()
+    monkeypatch.setattr(scrap, "feed_hub", hub)
+    scrap.pending_index.rebuild([])
+    subscription, _ = hub.subscribe("partner", None, None, scrap.pending_index)
+    subscription.visible.update({"r1", "r2", "r3", "r4"})
+    inventory_index.rebuild([{**standin.tables["dealer_inventory"][0], "profiles": {"name": "Dealer"}}])
+
+    response = put(api, standin, {"partner_id": DEALER, "request_ids": [f"r{i}" for i in range(1, 6)]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [c["id"] for c in body["completed"]] == ["r1", "r2", "r3"]
+    assert body["skipped"] == ["r4", "r5"]
+    assert body["coins_earned"] == 75 + 20 + 120
+    assert body["balances"] == {DEALER: 100 - 215, "u1": 95, "u2": 125}
+    assert standin.requests == 1
+
+    assert subscription.queue.qsize() == 3   # one "remove" per completed pickup
+    assert subscription.visible == {"r4"}
+    assert [(r["scrap_type"], r["quantity_kg"]) for r in inventory_index.top("iron")] == [("iron", 16.5)]
+    glass = next(r for r in standin.tables["dealer_inventory"] if r["scrap_type"] == "glass")
+    assert [r["id"] for r in inventory_index.top("glass")] == [glass["id"]]
+    inventory_index.invalidate()
+
+
+def test_batch_size_is_capped(api, monkeypatch):
+    monkeypatch.setattr(scrap, "BATCH_COMPLETE_MAX_IDS", 2)
+    standin = PostgrestStandIn(rpc={"complete_scrap_requests": complete_scrap_requests})
+    response = put(api, standin, {"partner_id": DEALER, "request_ids": ["a", "b", "c"]})
+    assert response.status_code == 400 and "At most 2" in response.json()["detail"]
+    assert standin.requests == 0
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from routers import scrap
+from services.feed import FeedHub
+from services.geo import PendingRequestIndex
+
+DONOR = "donor-1"
+
+
+def donation(i, **extra):
+    return {"scrap_type": "iron", "weight_kg": i + 1, "pickup_address": f"Flat {i}", **extra}
+
+
+def post(api, standin, body, content_type="application/json"):
+    async def run():
+        async with api(standin) as client:
+            return await client.post(
+                "/scrap/donate/bulk", params={"user_id": DONOR}, content=body,
+                headers={"Content-Type": content_type},
+            )
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    monkeypatch.setattr(scrap, "BULK_DONATE_CHUNK_SIZE", 3)
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+    return PostgrestStandIn(tables={"profiles": [{"id": DONOR, "name": "Society", "location": "Pune", "phone": "9"}]})
+
+
+def test_array_body_is_validated_per_item_and_inserted_in_chunks(api, standin):
+    items = [donation(i) for i in range(7)]
+    items[2] = {"scrap_type": "gold", "weight_kg": 1}
+    items[5] = {"weight_kg": "heavy"}
+    response = post(api, standin, json.dumps(items).encode())
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["invalid"], body["failed"], body["error"]) == (5, 2, 0, None)
+    assert [r["status"] for r in body["results"]] == ["created", "created", "invalid", "created", "created", "invalid", "created"]
+    assert body["results"][2]["errors"][0]["loc"] == ["scrap_type"]
+    assert {e["loc"][0] for e in body["results"][5]["errors"]} == {"scrap_type", "weight_kg"}
+
+    rows = standin.tables["scrap_requests"]
+    assert [row["pickup_address"] for row in rows] == ["Flat 0", "Flat 1", "Flat 3", "Flat 4", "Flat 6"]
+    assert all(row["user_id"] == DONOR and row["status"] == "pending" for row in rows)
+    assert [r["id"] for r in body["results"] if r["status"] == "created"] == [row["id"] for row in rows]
+    assert standin.requests == 2   # 5 valid items in chunks of 3
+
+
+def test_streamed_ndjson_reaches_index_and_feeds(api, standin, monkeypatch):
+    hub = FeedHub()
+    monkeypatch.setattr(scrap, "feed_hub", hub)
+    scrap.pending_index.rebuild([])
+    subscription, _ = hub.subscribe("partner", None, None, scrap.pending_index)
+
+    async def body():
+        yield b'{"scrap_type": "glass", "weight_kg": 2}\n{"scrap_type": '
+        yield b'"plastic", "weight_kg": 3}\nnot json\n\n'
+        yield b'{"scrap_type": "copper", "weight_kg": 4}'
+
+    response = post(api, standin, body(), "application/x-ndjson; charset=utf-8")
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "created", "invalid", "created"]
+    assert results[2]["errors"][0]["msg"].startswith("Invalid JSON")
+
+    assert len(scrap.pending_index) == 3
+    assert scrap.pending_index.all_rows()[0]["profiles"] == {"name": "Society", "location": "Pune", "phone": "9"}
+    assert subscription.queue.qsize() == 3
+
+
+def test_malformed_body_keeps_written_chunks(api, standin):
+    items = ",".join(json.dumps(donation(i)) for i in range(4))
+    response = post(api, standin, f'[{items}, {{"scrap_type": '.encode())
+    body = response.json()
+    assert body["created"] == 4 and body["error"] == "Truncated or malformed JSON array"
+    assert len(standin.tables["scrap_requests"]) == 4
+
+    assert post(api, standin, b'{"scrap_type": "iron"}').status_code == 400
+    assert post(api, standin, b"[]").json()["results"] == []
+
+
+def test_item_caps(api, standin, monkeypatch):
+    monkeypatch.setattr(scrap, "BULK_DONATE_MAX_ITEMS", 4)
+    body = post(api, standin, json.dumps([donation(i) for i in range(6)]).encode()).json()
+    assert body["created"] == 4 and body["error"].startswith("More than 4 items")
+
+    # An oversized item that arrived whole only fails itself; one still growing
+    # past the cap ends the body
+    monkeypatch.setattr(scrap, "BULK_DONATE_MAX_ITEM_BYTES", 200)
+    body = post(api, standin, json.dumps([donation(0, description="x" * 500), donation(1)]).encode()).json()
+    assert [r["status"] for r in body["results"]] == ["invalid", "created"]
+    assert body["results"][0]["errors"] == [{"msg": "Item larger than 200 bytes"}]
+
+    async def endless():
+        yield b'[{"description": "'
+        while True:
+            yield b"x" * 100
+
+    response = post(api, standin, endless())
+    assert response.status_code == 400 and "larger than 200 bytes" in response.json()["detail"]
@@ -0,0 +1,55 @@
+import asyncio
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from benchmarks.standin_functions import FUNCTIONS
+from routers import scrap
+from services import metrics
+from services.geo import PendingRequestIndex
+
+
+def seeded(partners, latency=0.0):
+    return PostgrestStandIn(tables={
+        "profiles": [{"id": "donor", "name": "D", "role": "user", "scrap_coins": 0},
+                     {"id": "poor", "name": "P", "role": "dealer", "scrap_coins": 5}]
+        + [{"id": f"p{i}", "name": f"P{i}", "role": "dealer", "scrap_coins": 500} for i in range(partners)],
+        "scrap_requests": [{"id": "r1", "user_id": "donor", "scrap_type": "iron", "weight_kg": 2, "status": "pending"}],
+    }, rpc=FUNCTIONS, latency=latency)
+
+
+def accept(api, standin, partners):
+    async def run():
+        async with api(standin) as client:
+            return await asyncio.gather(*(
+                client.put("/scrap/requests/r1/accept", json={"partner_id": partner}) for partner in partners
+            ))
+
+    return asyncio.run(run())
+
+
+def test_one_partner_wins_a_raced_request(api, monkeypatch):
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+    standin = seeded(100, latency=0.001)
+    before = {o: metrics.pickup_claims.value(o) for o in ("won", "lost")}
+
+    responses = accept(api, standin, [f"p{i}" for i in range(100)])
+
+    won = [r for r in responses if r.status_code == 200]
+    assert len(won) == 1
+    assert {r.json()["detail"] for r in responses if r.status_code != 200} == {"Request not found or already accepted"}
+    request = standin.tables["scrap_requests"][0]
+    assert request["status"] == "accepted" and won[0].json()["data"][0]["partner_id"] == request["partner_id"]
+    assert standin.requests == 100   # one round-trip per partner, winner or loser
+    assert metrics.pickup_claims.value("won") - before["won"] == 1
+    assert metrics.pickup_claims.value("lost") - before["lost"] == 99
+
+
+def test_claim_rejections(api):
+    standin = seeded(0)
+    standin.tables["profiles"].append({"id": "user", "name": "U", "role": "user", "scrap_coins": 900})
+
+    poor, not_partner = accept(api, standin, ["poor", "user"])
+
+    assert poor.status_code == 400
+    assert poor.json()["detail"] == "Insufficient coins. You need 60 coins to accept this pickup, but you have 5."
+    assert not_partner.status_code == 403
+    assert standin.tables["scrap_requests"][0]["status"] == "pending"
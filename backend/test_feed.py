@@ -0,0 +1,161 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.bench_geo_index import make_partners, make_pending
+from benchmarks.postgrest_standin import PostgrestStandIn
+from benchmarks.standin_functions import FUNCTIONS
+from routers import scrap
+from services.auth import Session, get_session
+from services.feed import FeedHub
+from services.geo import PendingRequestIndex
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def apply(feed, events):
+    """Replay add/remove events onto a client's {id: row} view of its feed."""
+    for event, data in events:
+        if event == "add":
+            feed[data["id"]] = data
+        elif event == "remove":
+            feed.pop(data["id"], None)
+
+
+def test_thousands_of_streams_stay_in_sync_with_nearby():
+    now = datetime.now(timezone.utc)
+    index = PendingRequestIndex()
+    index.rebuild(make_pending(2000, now))
+    hub = FeedHub(queue_size=10**6)
+
+    partners = make_partners(3000) + [(None, None)] * 20
+    subscriptions, feeds = [], []
+    for position, (lat, lon) in enumerate(partners):
+        subscription, rows = hub.subscribe(f"partner-{position}", lat, lon, index, now)
+        subscriptions.append(subscription)
+        feeds.append({row["id"]: row for row in rows})
+    assert len(hub) == 3020
+
+    # A donation in Mumbai reaches exactly the streams whose feed now contains it
+    donated = {"id": "new", "latitude": 19.07, "longitude": 72.88, "created_at": now.isoformat()}
+    index.add(donated)
+    hub.publish_added(donated, now)
+    for subscription, feed, (lat, lon) in zip(subscriptions, feeds, partners):
+        expected = lat is None or "new" in {r["id"] for r in index.nearby(lat, lon, now)}
+        events = drain(subscription)
+        assert [event for event, _ in events] == (["add"] if expected else [])
+        apply(feed, events)
+
+    # Taking a request retracts it only where it was shown
+    shown = [s for s in subscriptions if "req-5" in s.visible]
+    index.remove("req-5")
+    hub.publish_removed("req-5")
+    assert 0 < len(shown) < len(subscriptions)
+    for subscription, feed in zip(subscriptions, feeds):
+        events = drain(subscription)
+        assert events == ([("remove", {"id": "req-5"})] if subscription in shown else [])
+        apply(feed, events)
+
+    # Half an hour later every radius has grown by 15 km; after a sync each client's
+    # replayed view equals what a fresh poll would return
+    later = now + timedelta(minutes=30)
+    hub.sync(index, later)
+    for subscription, feed, (lat, lon) in zip(subscriptions, feeds, partners):
+        apply(feed, drain(subscription))
+        expected = index.all_rows() if lat is None else index.nearby(lat, lon, later)
+        assert set(feed) == {row["id"] for row in expected}
+
+    hub.sync(index, later)   # nothing changed since: no events
+    assert all(subscription.queue.empty() for subscription in subscriptions)
+
+
+def test_slow_consumer_is_dropped():
+    now = datetime.now(timezone.utc)
+    index = PendingRequestIndex()
+    index.rebuild([])
+    hub = FeedHub(queue_size=2)
+    subscription, rows = hub.subscribe("p", None, None, index, now)
+    assert rows == []
+
+    for i in range(3):
+        hub.publish_added({"id": f"r{i}", "latitude": None, "longitude": None}, now)
+
+    assert [event for event, _ in drain(subscription)] == ["add", "add", "close"]
+    assert len(hub) == 0 and subscription.closed
+    assert hub.stats() == {"subscribers": 0, "events_sent": 2, "dropped": 1}
+
+
+def test_stream_endpoint_and_router_hooks(api, monkeypatch):
+    partner, donor = str(uuid.uuid4()), str(uuid.uuid4())
+    old = {
+        "id": str(uuid.uuid4()), "user_id": donor, "status": "pending", "scrap_type": "iron",
+        "weight_kg": 1, "latitude": None, "longitude": None, "created_at": "2026-01-01T00:00:00+00:00",
+    }
+    standin = PostgrestStandIn(tables={
+        "profiles": [
+            {"id": partner, "name": "Dealer", "role": "dealer", "scrap_coins": 1000, "latitude": None, "longitude": None},
+            {"id": donor, "name": "Donor", "role": "user", "phone": "1"},
+        ],
+        "scrap_requests": [old],
+    }, rpc=FUNCTIONS)
+    hub = FeedHub(queue_size=2)
+    monkeypatch.setattr(scrap, "feed_hub", hub)
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+
+    async def run():
+        async with api(standin) as client:
+            missing = await client.get("/scrap/requests/stream", params={"partner_id": str(uuid.uuid4())})
+            assert missing.status_code == 404
+            donor_stream = await client.get("/scrap/requests/stream", params={"partner_id": donor})
+            assert donor_stream.status_code == 403
+
+            stream = asyncio.ensure_future(client.get("/scrap/requests/stream", params={"partner_id": partner}))
+            while not len(hub):
+                await asyncio.sleep(0.01)
+
+            donated = await client.post(f"/scrap/donate?user_id={donor}", json={
+                "scrap_type": "plastic", "weight_kg": 2, "pickup_address": "Somewhere",
+            })
+            assert donated.status_code == 200
+            accepted = await client.put(f"/scrap/requests/{old['id']}/accept", json={"partner_id": partner})
+            assert accepted.status_code == 200
+            # Once the stream has caught up, a burst it cannot drain in time overflows
+            # its queue (size 2) and ends it
+            (subscription,) = hub._subscriptions
+            while not subscription.queue.empty():
+                await asyncio.sleep(0.01)
+            for request_id in ("x", "y", "z"):
+                hub.publish_added({"id": request_id, "latitude": None, "longitude": None})
+            return donated.json()["data"][0]["id"], await stream
+
+    new_id, response = asyncio.run(run())
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = [frame.split("\n") for frame in response.text.strip().split("\n\n")]
+    events = [(lines[0].removeprefix("event: "), json.loads(lines[1].removeprefix("data: "))) for lines in frames]
+
+    assert [event for event, _ in events] == ["snapshot", "add", "remove", "add", "add", "close"]
+    assert [row["id"] for row in events[0][1]] == [old["id"]]
+    assert events[1][1]["id"] == new_id
+    assert events[2][1] == {"id": old["id"]}
+    assert [data["id"] for _, data in events[3:5]] == ["x", "y"]
+    assert len(hub) == 0
+
+
+def test_stream_is_only_for_the_callers_own_feed(api, monkeypatch):
+    standin = PostgrestStandIn(tables={"profiles": [{"id": "d1", "name": "Dealer", "role": "dealer"}]})
+    monkeypatch.setattr(scrap, "feed_hub", FeedHub())
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+    caller = Session(user_id="d2", role="dealer", claims={})
+
+    async def run():
+        async with api(standin, {get_session: lambda: caller}) as client:
+            return await client.get("/scrap/requests/stream", params={"partner_id": "d1"})
+
+    assert asyncio.run(run()).status_code == 403
+    assert len(scrap.feed_hub) == 0
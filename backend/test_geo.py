@@ -0,0 +1,196 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_geo_index import linear_scan, make_partners, make_pending
+from benchmarks.postgrest_standin import PostgrestStandIn
+from benchmarks.standin_functions import FUNCTIONS
+from routers import scrap
+from services.auth import Session, get_session
+from services.geo import (
+    PendingColumns,
+    PendingRequestIndex,
+    decay_radius,
+    decay_radius_many,
+    haversine_distance,
+    haversine_many,
+)
+from services.profiles import profile_cache
+
+
+def test_index_matches_linear_scan():
+    now = datetime.now(timezone.utc)
+    rows = make_pending(3000, now)
+    index = PendingRequestIndex()
+    index.rebuild(rows)
+
+    for lat, lon in make_partners(25):
+        expected = sorted(linear_scan(rows, lat, lon, now), key=lambda r: r["id"])
+        actual = sorted(index.nearby(lat, lon, now), key=lambda r: r["id"])
+        assert actual == expected
+
+
+def test_index_add_remove():
+    now = datetime.now(timezone.utc)
+    index = PendingRequestIndex()
+    index.rebuild([])
+    row = {
+        "id": "a",
+        "latitude": 19.07,
+        "longitude": 72.88,
+        "created_at": (now - timedelta(minutes=1)).isoformat(),
+    }
+    index.add(row)
+    assert [r["id"] for r in index.nearby(19.08, 72.88, now)] == ["a"]
+    # 5.5 km radius after one minute: a partner 20 km away must not see it yet
+    assert index.nearby(19.25, 72.88, now) == []
+
+    index.remove("a")
+    assert len(index) == 0
+    assert index.nearby(19.08, 72.88, now) == []
+
+
+def test_unlocated_requests_always_returned_newest_first():
+    now = datetime.now(timezone.utc)
+    index = PendingRequestIndex()
+    index.rebuild([
+        {"id": "old", "latitude": None, "longitude": None, "created_at": (now - timedelta(hours=2)).isoformat()},
+        {"id": "new", "latitude": 0, "longitude": 0, "created_at": now.isoformat()},
+    ])
+    assert [r["id"] for r in index.nearby(51.5, -0.1, now)] == ["new", "old"]
+    assert [r["id"] for r in index.all_rows()] == ["new", "old"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_haversine_many_matches_scalar(seed):
+    rng = random.Random(seed)
+    points = [
+        (rng.uniform(-89, 89), rng.uniform(-180, 180), rng.uniform(-89, 89), rng.uniform(-180, 180))
+        for _ in range(200)
+    ]
+    # Include near-coincident and antipodal-ish pairs
+    points += [(lat, lon, lat + 1e-7, lon - 1e-7) for lat, lon, _, _ in points[:20]]
+    points += [(lat, lon, -lat, lon + 179.999) for lat, lon, _, _ in points[:20]]
+
+    lat1, lon1, lat2, lon2 = map(np.array, zip(*points))
+    vectorized = haversine_many(lat1, lon1, lat2, lon2)
+    for (a, b, c, d), got in zip(points, vectorized):
+        assert got == pytest.approx(haversine_distance(a, b, c, d), rel=1e-9, abs=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_decay_radius_many_matches_scalar(seed):
+    rng = random.Random(seed)
+    ages = [rng.uniform(-30, 300) for _ in range(500)]
+    assert decay_radius_many(np.array(ages)).tolist() == [decay_radius(a) for a in ages]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_batch_feeds_match_scalar_scan(seed):
+    now = datetime.now(timezone.utc)
+    rows = make_pending(2000, now, seed=seed)
+    index = PendingRequestIndex()
+    index.rebuild(rows)
+    partners = [(i, lat, lon) for i, (lat, lon) in enumerate(make_partners(40, seed=seed))]
+
+    feeds = index.feeds(partners, now)
+    for partner_id, lat, lon in partners:
+        expected = {r["id"]: r.get("distance_km") for r in linear_scan(rows, lat, lon, now)}
+        actual = {r["id"]: r.get("distance_km") for r in feeds[partner_id]}
+        # Requests sitting exactly on their radius may flip on float rounding
+        borderline = {
+            r["id"] for r in rows
+            if r["latitude"] and abs(
+                haversine_distance(lat, lon, r["latitude"], r["longitude"])
+                - decay_radius((now.timestamp() - datetime.fromisoformat(r["created_at"]).timestamp()) / 60)
+            ) < 1e-9
+        }
+        assert {k: v for k, v in actual.items() if k not in borderline} == \
+            {k: v for k, v in expected.items() if k not in borderline}
+
+
+def test_within_many_blocks_match_single_partner():
+    now = datetime.now(timezone.utc)
+    columns = PendingColumns.from_rows(make_pending(500, now))
+    columns.MAX_BLOCK_CELLS = 1200  # force several partner blocks
+    partners = make_partners(30)
+
+    batched = columns.within_many([p[0] for p in partners], [p[1] for p in partners], now.timestamp())
+    for (lat, lon), (positions, distances) in zip(partners, batched):
+        single_positions, single_distances = columns.within(lat, lon, now.timestamp())
+        assert positions.tolist() == single_positions.tolist()
+        assert np.allclose(distances, single_distances)
+
+
+def test_pushdown_returns_the_index_feed(api, monkeypatch):
+    now = datetime.now(timezone.utc)
+    (lat, lon), = make_partners(1)
+    standin = PostgrestStandIn(tables={
+        "profiles": [{"id": "partner", "name": "P", "role": "dealer", "latitude": lat, "longitude": lon},
+                     {"id": "nowhere", "name": "N", "role": "dealer", "latitude": None, "longitude": None}],
+        "scrap_requests": [{**row, "profiles": {"name": "D"}} for row in make_pending(2000, now)],
+    }, rpc=FUNCTIONS)
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+    profile_cache.clear()
+
+    def feeds(pushdown):
+        monkeypatch.setattr(scrap, "GEO_PUSHDOWN", pushdown)
+
+        async def run():
+            async with api(standin) as client:
+                return [(await client.get("/scrap/requests/available", params={"partner_id": p})).json()
+                        for p in ("partner", "nowhere")]
+
+        return asyncio.run(run())
+
+    from_index = feeds(False)
+    standin.requests = 0
+    nearby, everything = feeds(True)
+
+    assert standin.requests == 2   # one call per poll, no table scan
+    assert 0 < len(nearby) < 2000 and len(everything) == 2000
+    assert [r["id"] for r in nearby] == [r["id"] for r in from_index[0]]
+    assert [r.get("distance_km") for r in nearby] == [r.get("distance_km") for r in from_index[0]]
+    assert {r["id"] for r in everything} == {r["id"] for r in from_index[1]}
+
+
+def test_warmed_feeds_need_a_partner_and_follow_its_location(api, monkeypatch):
+    now = datetime.now(timezone.utc)
+    (lat, lon), (lat2, lon2) = make_partners(2)
+    standin = PostgrestStandIn(tables={
+        "profiles": [{"id": "partner", "name": "P", "role": "dealer", "latitude": lat, "longitude": lon}],
+        "scrap_requests": [{**row, "profiles": {"name": "D"}} for row in make_pending(2000, now)],
+    })
+    monkeypatch.setattr(scrap, "pending_index", PendingRequestIndex())
+    monkeypatch.setattr(scrap, "partner_feeds", {})
+    monkeypatch.setattr(scrap, "GEO_PUSHDOWN", False)
+    profile_cache.clear()
+
+    def warm(role):
+        caller = Session(user_id="caller", role=role, claims={}) if role else None
+
+        async def run():
+            async with api(standin, {get_session: lambda: caller}) as client:
+                return await client.post("/scrap/feeds/warm")
+
+        return asyncio.run(run())
+
+    assert warm(None).status_code == 401   # even with AUTH_REQUIRED off
+    assert warm("user").status_code == 403
+    assert not scrap.partner_feeds
+    assert warm("artist").json()["partners"] == 1
+    assert scrap.cached_feed("partner", lat, lon) is not None
+
+    # The partner moved: the feed warmed for the old spot is not served
+    profile_cache.put("partner", {**standin.tables["profiles"][0], "latitude": lat2, "longitude": lon2})
+    assert scrap.cached_feed("partner", lat2, lon2) is None
+
+    async def poll():
+        async with api(standin) as client:
+            return (await client.get("/scrap/requests/available", params={"partner_id": "partner"})).json()
+
+    moved = asyncio.run(poll())
+    assert [r["id"] for r in moved] == [r["id"] for r in scrap.pending_index.nearby(lat2, lon2)]
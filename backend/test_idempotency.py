@@ -0,0 +1,135 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from benchmarks.standin_functions import FUNCTIONS
+from services.idempotency import IdempotencyStore, StoredResponse, idempotency_store
+from services.inventory import inventory_index
+from services.metrics import idempotency_requests
+from services.profiles import profile_cache
+
+
+@pytest.fixture
+def standin(profile_row, pickup_row):
+    """Builds a fresh marketplace (and forgets stored keys) each time it is called."""
+    def marketplace():
+        profile_cache.clear()
+        inventory_index.invalidate()
+        idempotency_store.clear()
+        return PostgrestStandIn(tables={
+            "profiles": [profile_row("u1", "user", 100), profile_row("artist", "artist", 0),
+                         profile_row("d1", "dealer", 1000), profile_row("ind", "industry", 1000)],
+            "products": [{"id": "p1", "artist_id": "artist", "name": "Lamp", "price_coins": 10,
+                          "stock_quantity": 5, "is_available": True}],
+            "scrap_requests": [pickup_row(1)],
+            "industry_requirements": [{"id": "req", "industry_id": "ind", "scrap_type": "iron", "required_kg": 100,
+                                       "fulfilled_kg": 0, "price_per_kg": 8, "status": "open"}],
+            "dealer_inventory": [{"id": "inv", "dealer_id": "d1", "scrap_type": "iron", "quantity_kg": 30}],
+            "requirement_fulfillments": [],
+        }, rpc=FUNCTIONS, latency=0.005)
+    return marketplace
+
+
+def coins_of(db, id):
+    return next(p["scrap_coins"] for p in db.tables["profiles"] if p["id"] == id)
+
+
+# Route templates, as the metrics label them
+TEMPLATES = {
+    "coins": "/coins/purchase",
+    "product": "/products/{product_id}/purchase",
+    "complete": "/scrap/requests/{request_id}/complete",
+    "fulfill": "/industry/requirements/{requirement_id}/fulfill",
+}
+# (method, path, body, what the one execution changed)
+ENDPOINTS = {
+    "coins": ("POST", "/coins/purchase", {"user_id": "u1", "amount_inr": 10, "coins_purchased": 50},
+              lambda db: coins_of(db, "u1") == 150),
+    "product": ("POST", "/products/p1/purchase", {"buyer_id": "u1", "quantity": 2},
+                lambda db: db.tables["products"][0]["stock_quantity"] == 3 and coins_of(db, "u1") == 80),
+    "complete": ("PUT", "/scrap/requests/r1/complete", {"partner_id": "d1"},
+                 lambda db: len(db.tables["outbox_events"]) == 1),
+    "fulfill": ("POST", "/industry/requirements/req/fulfill", {"dealer_id": "d1", "quantity_kg": 4},
+                lambda db: db.tables["dealer_inventory"][0]["quantity_kg"] == 26
+                and len(db.tables["requirement_fulfillments"]) == 1),
+}
+
+
+def send(api, db, requests, waves=1):
+    """Send `waves` rounds of (method, path, body, key) requests, each round concurrently."""
+    async def run():
+        async with api(db) as client:
+            responses = []
+            for _ in range(waves):
+                responses += await asyncio.gather(*(
+                    client.request(method, path, json=body, headers={"Idempotency-Key": key} if key else {})
+                    for method, path, body, key in requests
+                ))
+            return responses
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_retry_storm_runs_the_endpoint_once(api, standin, endpoint):
+    method, path, body, applied_once = ENDPOINTS[endpoint]
+    once = standin()
+    first, = send(api, once, [(method, path, body, None)])
+    assert first.status_code == 200 and applied_once(once)
+
+    stormed = standin()
+    key = str(uuid.uuid4())
+    executed = idempotency_requests.value(TEMPLATES[endpoint], "executed")
+    responses = send(api, stormed, [(method, path, body, key)] * 25, waves=2)   # 25 concurrent, then 25 more
+
+    assert {r.status_code for r in responses} == {200}
+    assert {r.content for r in responses} == {responses[0].content}
+    assert [r.headers.get("idempotent-replayed") for r in responses].count(None) == 1
+    assert stormed.requests == once.requests   # flat: the same database calls as a single request
+    assert applied_once(stormed)
+    assert idempotency_requests.value(TEMPLATES[endpoint], "executed") == executed + 1
+
+
+def test_new_key_runs_again_and_reused_key_with_other_body_is_rejected(api, standin):
+    db = standin()
+    method, path, body, _ = ENDPOINTS["product"]
+
+    first, replay, other, mismatch = send(api, db, [(method, path, body, "k1")], waves=2) + send(api, db, [
+        (method, path, body, "k2"), (method, path, {**body, "quantity": 1}, "k1"),
+    ])
+
+    assert [r.status_code for r in (first, replay, other)] == [200, 200, 200]
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert mismatch.status_code == 422
+    assert db.tables["products"][0]["stock_quantity"] == 1   # k1 and k2, two units each
+    assert db.requests == 2
+
+
+def test_client_errors_are_replayed_and_requests_without_a_key_pass_through(api, standin):
+    db = standin()
+    db.tables["products"][0]["stock_quantity"] = 0
+    method, path, body, _ = ENDPOINTS["product"]
+
+    out, again = send(api, db, [(method, path, body, "sold-out")], waves=2)
+    assert out.status_code == again.status_code == 400
+    assert db.requests == 1
+
+    unkeyed, = send(api, db, [("POST", "/products/p1/purchase", {"buyer_id": "u1", "quantity": 2}, None)])
+    assert unkeyed.status_code == 400
+    assert db.requests == 2   # no key: nothing stored, nothing replayed
+
+
+def test_store_expires_and_evicts_least_recently_used():
+    store = IdempotencyStore(ttl=60, maxsize=2)
+    response = StoredResponse("f", 200, [], b"{}")
+    store.put("a", response)
+    store.put("b", response)
+    assert store.get("a") is response
+    store.put("c", response)                     # "b" was used least recently
+    assert (store.get("b"), len(store)) == (None, 2)
+
+    store._entries["a"] = (time.monotonic() - 1, response)
+    assert store.get("a") is None and len(store) == 1
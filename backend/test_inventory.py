@@ -0,0 +1,107 @@
+import asyncio
+import random
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+from benchmarks.standin_functions import FUNCTIONS
+from services.inventory import DealerInventoryIndex, inventory_index
+from services.outbox import outbox_worker
+from services.profiles import profile_cache
+
+
+def row(dealer, scrap_type, kg):
+    return {"id": f"{dealer}-{scrap_type}", "dealer_id": dealer, "scrap_type": scrap_type,
+            "quantity_kg": kg, "profiles": {"name": dealer, "location": "Pune", "phone": "1"}}
+
+
+def test_top_k_matches_a_full_sort_through_updates():
+    rng = random.Random(5)
+    rows = [row(f"d{i}", rng.choice(["iron", "glass"]), round(rng.uniform(0, 50), 2)) for i in range(2000)]
+    index = DealerInventoryIndex()
+    index.rebuild(rows)
+    stock = {(r["dealer_id"], r["scrap_type"]): r["quantity_kg"] for r in rows}
+
+    for _ in range(3000):
+        dealer, scrap_type = rng.choice(list(stock))
+        stock[dealer, scrap_type] = rng.choice([0, round(rng.uniform(0, 80), 2)])
+        index.set_quantity(dealer, scrap_type, stock[dealer, scrap_type])
+
+    for scrap_type in ("iron", "glass"):
+        expected = sorted(
+            ((-kg, dealer) for (dealer, t), kg in stock.items() if t == scrap_type and kg > 0)
+        )
+        assert [(-r["quantity_kg"], r["dealer_id"]) for r in index.top(scrap_type)] == expected
+        assert [r["dealer_id"] for r in index.top(scrap_type, 10)] == [d for _, d in expected[:10]]
+        assert all(r["profiles"]["name"] == r["dealer_id"] for r in index.top(scrap_type, 10))
+    assert index.top("copper", 5) == []
+
+
+def test_unknown_dealer_marks_index_stale():
+    index = DealerInventoryIndex()
+    index.set_quantity("d1", "iron", 5)       # not loaded yet: ignored
+    assert len(index) == 0 and index.loaded_at is None
+
+    index.rebuild([row("d1", "iron", 5)])
+    index.set_quantity("d1", "glass", 3, {"id": "new", "dealer_id": "d1", "scrap_type": "glass"})
+    assert [r["id"] for r in index.top("glass")] == ["new"]
+    assert index.top("glass")[0]["profiles"]["name"] == "d1"
+
+    index.set_quantity("d2", "iron", 7)       # profile unknown on this worker
+    assert not index.is_fresh(60)
+
+
+def test_match_limit_and_incremental_updates(api):
+    requirement = {"id": "req", "industry_id": "ind", "scrap_type": "iron", "required_kg": 20,
+                   "fulfilled_kg": 0, "price_per_kg": 0, "status": "open"}
+    standin = PostgrestStandIn(tables={
+        "profiles": [{"id": "d1", "name": "d1", "role": "dealer"}],
+        "industry_requirements": [requirement],
+        "dealer_inventory": [row(f"d{i}", "iron", kg) for i, kg in enumerate([4, 30, 12, 0, 8], start=1)],
+        "requirement_fulfillments": [],
+    }, rpc=FUNCTIONS)
+    inventory_index.invalidate()
+    profile_cache.clear()
+
+    async def run():
+        async with api(standin) as client:
+            top = await client.get("/industry/dealers/match/req", params={"limit": 2})
+            queries = standin.requests
+            fulfilled = await client.post("/industry/requirements/req/fulfill", json={
+                "dealer_id": "d1", "quantity_kg": 3,
+            })
+            assert fulfilled.status_code == 200
+            after = await client.get("/industry/dealers/match/req")
+            return top, queries, after
+
+    top, queries, after = asyncio.run(run())
+    assert [(d["dealer_id"], d["match_score"]) for d in top.json()["matched_dealers"]] == [("d2", 100.0), ("d3", 60.0)]
+    assert queries == 2   # the requirement plus one inventory page
+    assert [(d["dealer_id"], d["available_kg"]) for d in after.json()["matched_dealers"]] == [
+        ("d2", 30), ("d3", 12), ("d5", 8), ("d1", 1),
+    ]
+
+
+def test_completed_pickups_upsert_dealer_stock(api):
+    pickups = [{"id": f"r{i}", "user_id": "u1", "partner_id": "d1", "scrap_type": "glass", "weight_kg": 2.5,
+                "status": "accepted"} for i in range(3)]
+    standin = PostgrestStandIn(tables={
+        "profiles": [{"id": "d1", "name": "d1", "role": "dealer", "scrap_coins": 1000},
+                     {"id": "u1", "name": "u1", "role": "user", "scrap_coins": 0}],
+        "scrap_requests": pickups,
+        "dealer_inventory": [row("d1", "iron", 4)],
+    }, rpc=FUNCTIONS)
+    inventory_index.rebuild(standin.tables["dealer_inventory"])
+    profile_cache.clear()
+
+    async def run():
+        async with api(standin) as client:
+            return await asyncio.gather(*(
+                client.put(f"/scrap/requests/r{i}/complete", json={"partner_id": "d1"}) for i in range(3)
+            ))
+
+    assert all(r.status_code == 200 for r in asyncio.run(run()))
+    assert not any(r["scrap_type"] == "glass" for r in standin.tables["dealer_inventory"])   # queued, not yet applied
+
+    assert asyncio.run(outbox_worker.drain_once(client_for(standin))) == 3
+    glass = [r for r in standin.tables["dealer_inventory"] if r["scrap_type"] == "glass"]
+    assert len(glass) == 1 and glass[0]["quantity_kg"] == 7.5
+    assert [(r["dealer_id"], r["quantity_kg"]) for r in inventory_index.top("glass")] == [("d1", 7.5)]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+
+import httpx
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from benchmarks.standin_functions import FUNCTIONS
+from services import logs, metrics
+
+ACCEPT = "/scrap/requests/{request_id}/accept"
+
+
+def call(api, standin, *requests):
+    async def run():
+        async with api(standin) as client:
+            return [await client.request(method, url, **kwargs) for method, url, kwargs in requests]
+
+    return asyncio.run(run())
+
+
+def test_routes_and_supabase_calls_are_recorded(api):
+    standin = PostgrestStandIn(tables={
+        "profiles": [{"id": "p1", "name": "P", "role": "dealer", "scrap_coins": 500}],
+        "scrap_requests": [{"id": "r1", "user_id": "u1", "scrap_type": "iron", "weight_kg": 2, "status": "pending"}],
+    }, rpc=FUNCTIONS)
+    before_calls = metrics.db_calls_per_request.value(ACCEPT)
+    before_claims = metrics.db_requests.value("claim_scrap_request", "rpc", "200")
+
+    accepted, missing, scraped = call(api, 
+        standin,
+        ("PUT", "/scrap/requests/r1/accept", {"json": {"partner_id": "p1"}}),
+        ("PUT", "/scrap/requests/r2/accept", {"json": {"partner_id": "p1"}}),
+        ("GET", "/metrics", {}),
+    )
+
+    assert accepted.status_code == 200 and missing.status_code >= 400
+    # one claim_scrap_request call each, won or not
+    calls, total = metrics.db_calls_per_request.value(ACCEPT)
+    assert (calls - before_calls[0], total - before_calls[1]) == (2, 2)
+    assert metrics.db_requests.value("claim_scrap_request", "rpc", "200") - before_claims == 1
+    assert metrics.db_requests.value("claim_scrap_request", "rpc", "400") >= 1
+    assert metrics.http_requests.value("PUT", ACCEPT, "200") >= 1
+    assert metrics.http_errors.value("PUT", ACCEPT) >= 1
+    assert metrics.http_in_flight.value("PUT") == 0
+
+    assert scraped.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = scraped.text
+    assert "# TYPE scrapcrafters_http_request_duration_seconds histogram" in text
+    assert f'scrapcrafters_http_request_duration_seconds_count{{method="PUT",route="{ACCEPT}"}}' in text
+    assert "/scrap/requests/r1" not in text   # raw ids never become labels
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("h", "help", ("route",), buckets=(1, 5))
+    for value in (0.5, 1, 3, 9):
+        histogram.observe(value, 'a"b')
+    assert histogram.render()[2:] == [
+        'h_bucket{route="a\\"b",le="1"} 2',
+        'h_bucket{route="a\\"b",le="5"} 3',
+        'h_bucket{route="a\\"b",le="+Inf"} 4',
+        'h_sum{route="a\\"b"} 13.5',
+        'h_count{route="a\\"b"} 4',
+    ]
+
+
+def test_db_target_from_postgrest_urls():
+    def target(method, url, headers=None):
+        return metrics._db_target(httpx.Request(method, url, headers=headers))
+
+    assert target("GET", "http://db/rest/v1/products?select=*") == ("products", "select")
+    assert target("POST", "http://db/rest/v1/products") == ("products", "insert")
+    assert target("POST", "http://db/rest/v1/products", {"Prefer": "resolution=merge-duplicates"}) == ("products", "upsert")
+    assert target("PATCH", "http://db/rest/v1/products?id=eq.1") == ("products", "update")
+    assert target("POST", "http://db/rest/v1/rpc/transfer_coins") == ("transfer_coins", "rpc")
+    assert target("POST", "http://db/auth/v1/token?grant_type=password") == ("auth", "token")
+
+
+class Captured(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(record.getMessage()))
+
+
+def test_event_logs_are_leveled_and_sampled(monkeypatch):
+    handler = Captured()
+    log = logs.get_logger("test")
+    log._logger.addHandler(handler)
+    log._logger.setLevel(logging.INFO)
+    dumps = []
+    monkeypatch.setattr(logs.json, "dumps", lambda *a, **k: dumps.append(a) or json.JSONEncoder(default=str).encode(a[0]))
+    try:
+        log.debug("skipped", value=1)
+        assert dumps == []   # disabled levels never build the line
+
+        log.info("kept", amount=2)
+        log.sample_rate = 0
+        log.info("sampled_out")
+        log.warning("always", error="x")
+        log.sample_rate = 0.5
+        monkeypatch.setattr(logs.random, "random", lambda: 0.1)
+        log.info("sampled_in")
+    finally:
+        log._logger.removeHandler(handler)
+        log._logger.setLevel(logging.NOTSET)
+
+    assert [(line["event"], line["level"]) for line in handler.lines] == [
+        ("kept", "info"), ("always", "warning"), ("sampled_in", "info"),
+    ]
+    assert handler.lines[0]["amount"] == 2 and "sample_rate" not in handler.lines[0]
+    assert handler.lines[2]["sample_rate"] == 0.5
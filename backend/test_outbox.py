@@ -0,0 +1,134 @@
+import asyncio
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+from benchmarks.standin_functions import FUNCTIONS
+from services.inventory import inventory_index
+from services.metrics import outbox_backlog, outbox_dead, outbox_events
+from services.outbox import OutboxWorker, outbox_worker
+from services.profiles import profile_cache
+
+
+def standin_with(**tables):
+    profile_cache.clear()
+    return PostgrestStandIn(tables=tables, rpc=FUNCTIONS)
+
+
+def send(api, standin, requests, worker=None):
+    """Run (method, path, json) requests concurrently, with `worker` draining alongside if given."""
+    async def run():
+        task = worker and asyncio.create_task(worker.run(client_for(standin), poll_seconds=30))
+        try:
+            async with api(standin) as client:
+                responses = await asyncio.gather(*(
+                    client.request(method, path, json=body) for method, path, body in requests
+                ))
+            if task:
+                for _ in range(100):   # woken by the handlers, long before the 30s poll
+                    if all(e["status"] != "pending" for e in standin.tables.get("outbox_events", [])):
+                        break
+                    await asyncio.sleep(0.01)
+            return responses
+        finally:
+            if task:
+                task.cancel()
+
+    return asyncio.run(run())
+
+
+def drain(standin, worker=outbox_worker):
+    return asyncio.run(worker.drain_once(client_for(standin)))
+
+
+def test_complete_answers_in_one_round_trip_and_pays_through_the_outbox(api, profile_row, pickup_row):
+    standin = standin_with(
+        profiles=[profile_row("d1", "dealer", 1000), profile_row("u1", "user", 0)],
+        scrap_requests=[pickup_row(1), pickup_row(2)],
+        dealer_inventory=[],
+    )
+
+    first = send(api, standin, [("PUT", "/scrap/requests/r1/complete", {"partner_id": "d1"})])[0]
+    assert first.status_code == 200
+    assert first.json()["coins_earned"] == 75 and first.json()["payout"] == "queued"
+    assert first.json()["new_balance"] == 75                            # once the payout is applied
+    assert standin.requests == 1
+    assert standin.tables["profiles"][1]["scrap_coins"] == 0          # not paid yet
+    assert [e["status"] for e in standin.tables["outbox_events"]] == ["pending"]
+
+    done = outbox_events.value("pickup_completed", "done")
+    assert drain(standin) == 1
+    assert drain(standin) == 0                                          # applied once
+    assert outbox_events.value("pickup_completed", "done") == done + 1
+    assert outbox_backlog.value() == 0
+    assert [p["scrap_coins"] for p in standin.tables["profiles"]] == [925, 75]
+    assert [(r["scrap_type"], r["quantity_kg"]) for r in standin.tables["dealer_inventory"]] == [("iron", 2.5)]
+
+    again = send(api, standin, [("PUT", "/scrap/requests/r1/complete", {"partner_id": "d1"})])[0]
+    assert again.status_code == 404
+    assert len(standin.tables["outbox_events"]) == 1
+
+
+def test_running_worker_is_woken_by_the_handler(api, profile_row, pickup_row):
+    standin = standin_with(
+        profiles=[profile_row("d1", "dealer", 1000), profile_row("u1", "user", 0)],
+        scrap_requests=[pickup_row(i) for i in range(5)],
+        dealer_inventory=[],
+    )
+    responses = send(api, standin, [("PUT", f"/scrap/requests/r{i}/complete", {"partner_id": "d1"}) for i in range(5)],
+                     worker=outbox_worker)
+
+    assert {r.status_code for r in responses} == {200}
+    assert {e["status"] for e in standin.tables["outbox_events"]} == {"done"}
+    assert standin.tables["profiles"][1]["scrap_coins"] == 5 * 75
+    assert standin.tables["dealer_inventory"][0]["quantity_kg"] == 12.5
+
+
+def test_fulfill_records_supply_at_once_and_pays_what_the_industry_can(api, profile_row):
+    standin = standin_with(
+        profiles=[profile_row("d1", "dealer", 0), profile_row("ind", "industry", 50)],
+        industry_requirements=[{"id": "req", "industry_id": "ind", "scrap_type": "iron", "required_kg": 10,
+                                "fulfilled_kg": 0, "price_per_kg": 8, "status": "open"}],
+        dealer_inventory=[{"id": "inv", "dealer_id": "d1", "scrap_type": "iron", "quantity_kg": 30}],
+        requirement_fulfillments=[],
+    )
+    inventory_index.invalidate()
+
+    fulfill = "/industry/requirements/req/fulfill"
+    response = send(api, standin, [("POST", fulfill, {"dealer_id": "d1", "quantity_kg": 12})])[0]
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["fulfilled_kg"], body["remaining_kg"], body["status"]) == (10, 0, "closed")
+    assert (body["coins_due"], body["payment"]) == (80, "queued")
+    assert (body["coins_earned"], body["coins_pending"]) == (50, 30)   # what the payment will move
+    assert standin.requests == 2   # dealer role (profile cache miss) + record_fulfillment
+    assert standin.tables["dealer_inventory"][0]["quantity_kg"] == 20
+
+    assert drain(standin) == 1
+    assert [p["scrap_coins"] for p in standin.tables["profiles"]] == [50, 0]   # partial: all the industry had
+    assert [t["amount"] for t in standin.tables["transactions"]] == [-50, 50]
+
+    closed = send(api, standin, [("POST", fulfill, {"dealer_id": "d1", "quantity_kg": 1})])[0]
+    assert closed.status_code == 400
+    assert len(standin.tables["requirement_fulfillments"]) == 1
+
+
+def test_failing_events_are_retried_then_dead_lettered(api, profile_row, pickup_row):
+    standin = standin_with(
+        profiles=[profile_row("d1", "artist", 1000), profile_row("u1", "user", 0)],
+        scrap_requests=[pickup_row(1), pickup_row(2, user="gone")],
+    )
+    worker = OutboxWorker(max_attempts=2, retry_seconds=0)
+    for i in (1, 2):   # one at a time, so the events are queued in this order
+        completed, = send(api, standin, [("PUT", f"/scrap/requests/r{i}/complete", {"partner_id": "d1"})])
+        assert completed.status_code == 200
+
+    dead = outbox_events.value("pickup_completed", "dead")
+    assert drain(standin, worker) == 2   # r1 paid, r2's donor no longer exists
+    events = standin.tables["outbox_events"]
+    assert [(e["status"], e["attempts"]) for e in events] == [("done", 1), ("pending", 1)]
+    assert drain(standin, worker) == 1
+    assert [(e["status"], e["attempts"]) for e in events] == [("done", 1), ("dead", 2)]
+    assert events[1]["last_error"] == "profile_not_found: gone"
+    assert outbox_events.value("pickup_completed", "dead") == dead + 1 and outbox_dead.value() == 1
+    assert drain(standin, worker) == 0
+    assert standin.tables["profiles"][0]["scrap_coins"] == 925   # the failed payout moved nothing
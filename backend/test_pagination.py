@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+USER = str(uuid.uuid4())
+
+
+def make_standin(count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    standin = PostgrestStandIn()
+    standin.seed("transactions", [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": USER,
+            "amount": i,
+            "type": "donation_reward",
+            # Groups of three rows share a timestamp, so ties are broken by id
+            "created_at": (start + timedelta(seconds=i // 3)).isoformat(),
+        }
+        for i in range(count)
+    ])
+    return standin
+
+
+def get_pages(api, standin, path, limit):
+    async def walk():
+        async with api(standin) as client:
+            pages, cursor = [], None
+            while True:
+                params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+                response = await client.get(path, params=params)
+                assert response.status_code == 200, response.text
+                pages.append(response.json())
+                cursor = response.headers.get(NEXT_CURSOR_HEADER)
+                if cursor is None:
+                    return pages
+
+    return asyncio.run(walk())
+
+
+def test_cursor_round_trip():
+    row = {"created_at": "2024-01-01T00:00:00.123456+00:00", "id": str(uuid.uuid4())}
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], row["id"])
+
+
+@pytest.mark.parametrize("created_at,id", [
+    ('2024-01-01T00:00:00+00:00",id.gt."0', str(uuid.uuid4())),
+    ("2024-01-01T00:00:00+00:00", 'x"),user_id.neq.("'),
+    ("yesterday", str(uuid.uuid4())),
+    (1704067200, str(uuid.uuid4())),
+])
+def test_forged_cursors_are_rejected(created_at, id):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(encode_cursor({"created_at": created_at, "id": id}))
+    assert (raised.value.status_code, raised.value.detail) == (400, "Invalid cursor")
+
+
+@pytest.mark.parametrize("count,limit", [(0, 10), (10, 10), (11, 10), (100, 7)])
+def test_history_pages_cover_every_row_once_in_order(api, count, limit):
+    standin = make_standin(count)
+    pages = get_pages(api, standin, f"/coins/history/{USER}", limit)
+
+    rows = [row for page in pages for row in page]
+    expected = sorted(standin.tables["transactions"], key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    assert [r["id"] for r in rows] == [r["id"] for r in expected]
+    assert all(len(page) == limit for page in pages[:-1])
+    assert len(pages[-1]) <= limit
+
+
+def test_fields_projection_and_bad_input(api):
+    standin = make_standin(5)
+
+    async def call():
+        async with api(standin) as client:
+            projected = await client.get(f"/coins/history/{USER}", params={"fields": "amount,type", "limit": 2})
+            bad_field = await client.get(f"/coins/history/{USER}", params={"fields": "amount;drop"})
+            bad_cursor = await client.get(f"/coins/history/{USER}", params={"cursor": "nope"})
+            return projected, bad_field, bad_cursor
+
+    projected, bad_field, bad_cursor = asyncio.run(call())
+    assert projected.status_code == 200
+    assert [set(row) for row in projected.json()] == [{"amount", "type"}] * 2
+    assert NEXT_CURSOR_HEADER in projected.headers
+    assert bad_field.status_code == 400
+    assert bad_cursor.status_code == 400
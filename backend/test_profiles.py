@@ -0,0 +1,59 @@
+import asyncio
+import uuid
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+from services import profiles as profiles_module
+from services.profiles import ProfileCache, ProfileLoader, profile_cache
+
+
+def test_cache_ttl_lru_and_counters(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(profiles_module.time, "monotonic", lambda: clock[0])
+    cache = ProfileCache(maxsize=2, ttl=10)
+
+    cache.put("a", {"role": "user"})
+    cache.put("b", {"role": "dealer"})
+    assert cache.get("a") == {"role": "user"}   # "a" is now most recently used
+    cache.put("c", {"role": "artist"})           # evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == {"role": "artist"}
+
+    clock[0] += 11
+    assert cache.get("a") is None                # expired
+    assert cache.stats() == {
+        "size": 2, "maxsize": 2, "ttl_seconds": 10, "hits": 2, "misses": 2, "evictions": 1, "hit_ratio": 0.5,
+    }
+
+
+def test_loader_fetches_each_profile_once_per_request():
+    user = str(uuid.uuid4())
+    standin = PostgrestStandIn(tables={"profiles": [{"id": user, "name": "Dealer", "role": "dealer"}]})
+    cache = ProfileCache()
+
+    async def handler():
+        loader = ProfileLoader(client_for(standin), cache)
+        roles = await asyncio.gather(loader.role(user), loader.role(user), loader.get(user))
+        return roles, await loader.get(str(uuid.uuid4()))
+
+    (role_a, role_b, row), missing = asyncio.run(handler())
+    assert role_a == role_b == row["role"] == "dealer"
+    assert missing is None
+    assert standin.requests == 2                 # one per distinct id
+    assert cache.stats()["misses"] == 2
+
+    asyncio.run(handler())                       # a new request: the dealer comes from the cache
+    assert standin.requests == 3
+    assert cache.stats()["hits"] == 1
+
+
+def test_profile_update_invalidates_cache(api):
+    user = str(uuid.uuid4())
+    standin = PostgrestStandIn(tables={"profiles": [{"id": user, "name": "Old", "role": "user"}]})
+    profile_cache.put(user, {"id": user, "name": "Old", "role": "user"})
+
+    async def update():
+        async with api(standin) as client:
+            return await client.put(f"/auth/profile/{user}", json={"name": "New"})
+
+    assert asyncio.run(update()).status_code == 200
+    assert profile_cache.get(user) is None
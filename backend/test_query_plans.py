@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+DSN = os.getenv("PLAN_CHECK_DSN")
+
+
+@pytest.mark.skipif(not DSN, reason="set PLAN_CHECK_DSN to a Postgres with schema.sql and the db_*_migration.sql files applied")
+def test_hot_queries_use_indexes():
+    pytest.importorskip("psycopg2")
+    from benchmarks.plan_check import check
+
+    queries, offenders, failures = check(DSN)   # at the default scale: tiny tables are rightly seq-scanned
+    assert not failures
+    assert len(queries) > 30
+    assert [sql for _, sql, _ in offenders] == []
@@ -0,0 +1,76 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import Request, Response
+
+from benchmarks.postgrest_standin import PostgrestStandIn
+from services.response_cache import ResponseCache, listing_cache
+
+ARTIST = str(uuid.uuid4())
+
+
+def make_standin():
+    now = datetime.now(timezone.utc).isoformat()
+    return PostgrestStandIn(tables={
+        "profiles": [{"id": ARTIST, "name": "Artist", "role": "artist"}],
+        "products": [
+            {"id": str(uuid.uuid4()), "artist_id": ARTIST, "name": f"Lamp {i}", "is_available": True,
+             "stock_quantity": 2, "price_coins": 10, "created_at": now, "profiles": {"name": "Artist"}}
+            for i in range(3)
+        ],
+    })
+
+
+def run(api, standin, calls):
+    async def go():
+        async with api(standin) as client:
+            return await calls(client)
+
+    return asyncio.run(go())
+
+
+def test_listing_cache_etag_and_invalidation(api):
+    listing_cache.invalidate("products")
+    standin = make_standin()
+
+    async def calls(client):
+        first = await client.get("/products/")
+        queries_after_first = standin.requests
+        second = await client.get("/products/")
+        queries_after_second = standin.requests
+        revalidated = await client.get("/products/", headers={"If-None-Match": first.headers["etag"]})
+        other_params = await client.get("/products/", params={"limit": 1})
+        created = await client.post("/products/", params={"artist_id": ARTIST}, json={
+            "name": "Bowl", "price_coins": 5, "stock_quantity": 1,
+        })
+        after_create = await client.get("/products/", headers={"If-None-Match": first.headers["etag"]})
+        return (first, second, revalidated, other_params, created, after_create,
+                queries_after_first, queries_after_second)
+
+    first, second, revalidated, other_params, created, after_create, q1, q2 = run(api, standin, calls)
+
+    assert first.status_code == 200 and len(first.json()) == 3
+    assert first.headers["etag"].startswith('"')
+    assert second.content == first.content and second.headers["etag"] == first.headers["etag"]
+    assert q2 == q1                                   # served from the cache
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert len(other_params.json()) == 1               # keyed by query parameters
+    assert created.status_code == 200
+    assert after_create.status_code == 200             # invalidated: new body, new ETag
+    assert len(after_create.json()) == 4
+    assert after_create.headers["etag"] != first.headers["etag"]
+
+
+def test_response_computed_across_an_invalidation_is_not_stored():
+    cache = ResponseCache(ttl=30)
+    request = Request({"type": "http", "method": "GET", "path": "/products/", "query_string": b"", "headers": []})
+
+    version = cache.version("products")
+    cache.invalidate("products")                        # a purchase lands while the listing is read
+    served = cache.put(request, "products", version, [{"stock_quantity": 1}], Response())
+    assert served.status_code == 200
+    assert cache.get(request, "products") is None
+
+    cache.put(request, "products", cache.version("products"), [{"stock_quantity": 0}], Response())
+    assert cache.get(request, "products").body == b'[{"stock_quantity":0}]'
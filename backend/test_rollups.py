@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.postgrest_standin import PostgrestStandIn, client_for
+from benchmarks.standin_functions import FUNCTIONS
+from services.inventory import inventory_index
+from services.outbox import outbox_worker
+from services.profiles import profile_cache
+from services.rollups import rebuild
+
+
+@pytest.fixture
+def marketplace(profile_row, pickup_row):
+    profile_cache.clear()
+    inventory_index.invalidate()
+    return PostgrestStandIn(tables={
+        "profiles": [profile_row("u1", "user", 100), profile_row("d1", "dealer", 1000),
+                     profile_row("ind", "industry", 1000), profile_row("artist", "artist", 0)],
+        "scrap_requests": [pickup_row(1, kg=2.5), pickup_row(2, kg=1.5), pickup_row(3, kg=4, scrap_type="copper")],
+        "industry_requirements": [{"id": "req", "industry_id": "ind", "scrap_type": "iron", "required_kg": 100,
+                                   "fulfilled_kg": 0, "price_per_kg": 8, "status": "open"}],
+        "requirement_fulfillments": [],
+        "dealer_inventory": [],
+        "products": [{"id": "p1", "artist_id": "artist", "name": "Lamp", "price_coins": 10,
+                      "stock_quantity": 5, "is_available": True}],
+    }, rpc=FUNCTIONS)
+
+
+def call(api, standin, *requests):
+    """Run (method, path, json) requests one after another; the outbox is drained after each write."""
+    async def run():
+        async with api(standin) as client:
+            responses = []
+            for method, path, body in requests:
+                responses.append(await client.request(method, path, json=body))
+                while method != "GET" and await outbox_worker.drain_once(client_for(standin)):
+                    pass
+            return responses
+
+    return asyncio.run(run())
+
+
+def activity(api, standin):
+    return call(
+        api, standin,
+        ("PUT", "/scrap/requests/r1/complete", {"partner_id": "d1"}),
+        ("PUT", "/scrap/requests/complete", {"partner_id": "d1", "request_ids": ["r2", "r3"]}),
+        ("POST", "/industry/requirements/req/fulfill", {"dealer_id": "d1", "quantity_kg": 3}),
+        ("POST", "/products/p1/purchase", {"buyer_id": "u1", "quantity": 2}),
+        ("POST", "/coins/purchase", {"user_id": "u1", "amount_inr": 10, "coins_purchased": 50}),
+    )
+
+
+def stats(api, standin, *paths):
+    return [r.json() for r in call(api, standin, *(("GET", path, None) for path in paths))]
+
+
+PATHS = ("/stats/users/u1", "/stats/dealers/d1", "/stats/industries/ind")
+
+
+def test_stats_follow_every_completion_fulfillment_and_purchase(api, marketplace):
+    assert {r.status_code for r in activity(api, marketplace)} == {200}
+
+    user, dealer, industry = stats(api, marketplace, *PATHS)
+
+    assert user["user_id"] == "u1"
+    assert user["totals"] == {"donated_kg": 8.0, "donations": 3, "coins_earned": 75 + 45 + 160,
+                              "coins_bought": 50, "purchases": 1, "coins_spent": 20}
+    assert user["by_scrap_type"]["copper"] == {"donated_kg": 4.0, "donations": 1, "coins_earned": 160,
+                                               "coins_bought": 0, "purchases": 0, "coins_spent": 0}
+    today = datetime.now(timezone.utc).date().isoformat()
+    assert user["daily"] == [{"day": today, **user["totals"]}]
+
+    assert dealer["totals"] == {"collected_kg": 8.0, "pickups": 3, "coins_spent": 280,
+                                "supplied_kg": 3.0, "fulfillments": 1, "coins_earned": 24}
+    assert industry["totals"] == {"received_kg": 3.0, "fulfillments": 1, "coins_spent": 24}
+    assert list(industry["by_scrap_type"]) == ["iron"]
+
+
+def test_stats_read_a_constant_number_of_rows_however_long_the_history(api, marketplace):
+    standin = marketplace
+    activity(api, standin)
+    for i in range(200):   # far more history, none of it read by /stats
+        standin.tables["transactions"].append({"id": f"t{i}", "user_id": "u1", "amount": 5, "type": "purchase",
+                                               "reference_id": None, "description": ""})
+
+    before = standin.requests
+    stats(api, standin, "/stats/users/u1")
+    assert standin.requests - before == 2    # totals + daily rows
+    stats(api, standin, "/stats/users/u1?days=0")
+    assert standin.requests - before == 3    # totals only
+
+
+def test_rebuild_recomputes_the_same_figures_from_history(api, marketplace, pickup_row):
+    standin = marketplace
+    activity(api, standin)
+    live = stats(api, standin, *PATHS)
+
+    # History from before the rollups existed, three days back
+    earlier = (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
+    standin.tables["scrap_requests"].append(
+        {**pickup_row(9, kg=10, scrap_type="glass"), "status": "completed", "updated_at": earlier}
+    )
+    standin.tables["rollup_totals"].clear()
+    standin.tables["rollup_daily"].clear()
+
+    report = asyncio.run(rebuild(client_for(standin)))
+    assert report["profiles"] == 4
+
+    user, dealer, industry = stats(api, standin, *PATHS)
+    assert dealer["totals"] == {**live[1]["totals"], "collected_kg": 18.0, "pickups": 4}
+    assert industry == live[2]
+    assert user["totals"] == {**live[0]["totals"], "donated_kg": 18.0, "donations": 4}
+    assert [d["day"] for d in user["daily"]] == [earlier[:10], live[0]["daily"][0]["day"]]
+    assert [d["day"] for d in stats(api, standin, "/stats/users/u1?days=2")[0]["daily"]] == [live[0]["daily"][0]["day"]]
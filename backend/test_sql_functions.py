@@ -0,0 +1,638 @@
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+DSN = os.getenv("PLAN_CHECK_DSN")
+
+# The plpgsql functions themselves, run on a real Postgres (the other tests run
+# their Python mirrors in benchmarks/standin_functions.py)
+pytestmark = pytest.mark.skipif(
+    not DSN, reason="set PLAN_CHECK_DSN to a Postgres with schema.sql and the db_*_migration.sql files applied"
+)
+psycopg2 = pytest.importorskip("psycopg2")
+
+
+@pytest.fixture
+def cur():
+    """A cursor whose transaction is rolled back after the test: nothing it writes is kept."""
+    conn = psycopg2.connect(DSN)
+    try:
+        yield conn.cursor()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+class Committing(psycopg2.extensions.cursor):
+    """Remembers the profiles created through it, so they can be deleted."""
+    created = None
+
+
+@pytest.fixture
+def committed():
+    """An autocommit cursor, for tests that need other connections to see their rows.
+    The profiles it creates (and everything that cascades from them) are deleted after."""
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=Committing)
+    cur.created = []
+    try:
+        yield cur
+    finally:
+        if cur.created:
+            cur.execute("DELETE FROM scrap_requests WHERE partner_id = ANY(%s::UUID[])", (cur.created,))
+            cur.execute("DELETE FROM auth.users WHERE id = ANY(%s::UUID[])", (cur.created,))
+        conn.close()
+
+
+def profile(cur, role="user", coins=0):
+    id = str(uuid.uuid4())
+    cur.execute("INSERT INTO auth.users (id) VALUES (%s)", (id,))
+    cur.execute(
+        "INSERT INTO profiles (id, name, email, role, scrap_coins) VALUES (%s, %s, %s, %s, %s)",
+        (id, role, f"{id}@example.com", role, coins),
+    )
+    if isinstance(cur, Committing):
+        cur.created.append(id)
+    return id
+
+
+def call(cur, function, **params):
+    """SELECT function(p_name => value, ...); returns its result (JSON comes back parsed).
+    Lists of strings are passed as UUID[]."""
+    args = ", ".join(
+        f"p_{name} => %({name})s" + ("::UUID[]" if isinstance(value, list) and value and isinstance(value[0], str) else "")
+        for name, value in params.items()
+    )
+    cur.execute(f"SELECT {function}({args})", params)
+    return cur.fetchone()[0]
+
+
+def fails(cur, message, function, **params):
+    """Call a function that must raise `message`; the transaction stays usable. Returns the error."""
+    cur.execute("SAVEPOINT call")
+    with pytest.raises(psycopg2.Error, match=message) as raised:
+        call(cur, function, **params)
+    cur.execute("ROLLBACK TO SAVEPOINT call")
+    return raised.value
+
+
+def coins(cur, *ids):
+    cur.execute("SELECT id::TEXT, scrap_coins FROM profiles WHERE id = ANY(%s::UUID[])", (list(ids),))
+    balances = dict(cur.fetchall())
+    return [balances[id] for id in ids]
+
+
+def ledger(cur, reference):
+    """(user_id, amount, type, description) rows for a reference, debits first."""
+    cur.execute(
+        "SELECT user_id::TEXT, amount, type, description FROM transactions WHERE reference_id = %s ORDER BY amount",
+        (reference,),
+    )
+    return cur.fetchall()
+
+
+def blocked(cur, pid):
+    """Wait until backend `pid` is waiting on a lock."""
+    for _ in range(200):
+        cur.execute("SELECT wait_event_type FROM pg_stat_activity WHERE pid = %s", (pid,))
+        if cur.fetchone()[0] == "Lock":
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"backend {pid} never blocked")
+
+
+# ---- transfer_coins (schema.sql) ----
+
+def transfer(cur, payer, payee, amount, mode, reference=None):
+    return call(
+        cur, "transfer_coins", **{"from": payer, "to": payee}, amount=amount, type="purchase",
+        reference_id=reference or str(uuid.uuid4()), debit_description="Paid {amount}",
+        credit_description="Got {amount}", mode=mode, debit_type="payment",
+    )
+
+
+def test_transfer_writes_both_wallets_and_both_ledger_rows(cur):
+    payer, payee = profile(cur, coins=100), profile(cur, coins=5)
+    reference = str(uuid.uuid4())
+
+    assert transfer(cur, payer, payee, 30, "require", reference) == {"amount": 30, "from_balance": 70, "to_balance": 35}
+    assert coins(cur, payer, payee) == [70, 35]
+    assert ledger(cur, reference) == [(payer, -30, "payment", "Paid 30"), (payee, 30, "purchase", "Got 30")]
+
+
+@pytest.mark.parametrize("mode, moved", [("partial", 40), ("skip", 0), ("overdraft", 100)])
+def test_short_balance_is_handled_by_mode(cur, mode, moved):
+    payer, payee = profile(cur, coins=40), profile(cur)
+    reference = str(uuid.uuid4())
+
+    result = transfer(cur, payer, payee, 100, mode, reference)
+
+    assert result == {"amount": moved, "from_balance": 40 - moved, "to_balance": moved}
+    assert coins(cur, payer, payee) == [40 - moved, moved]
+    # Nothing moved, nothing written; otherwise the amount actually moved on both sides
+    assert ledger(cur, reference) == ([(payer, -moved, "payment", f"Paid {moved}"),
+                                       (payee, moved, "purchase", f"Got {moved}")] if moved else [])
+
+
+def test_require_refuses_a_short_balance_and_changes_nothing(cur):
+    payer, payee = profile(cur, coins=40), profile(cur)
+    reference = str(uuid.uuid4())
+
+    error = fails(cur, "insufficient_coins", "transfer_coins", **{"from": payer, "to": payee}, amount=100,
+                  type="purchase", reference_id=reference, mode="require")
+
+    assert error.diag.message_detail.replace(" ", "") == '{"balance":40,"needed":100}'
+    assert coins(cur, payer, payee) == [40, 0]
+    assert ledger(cur, reference) == []
+
+
+def test_partial_never_takes_a_negative_balance_further_down(cur):
+    payer, payee = profile(cur, coins=-10), profile(cur)
+    assert transfer(cur, payer, payee, 25, "partial")["amount"] == 0
+    assert coins(cur, payer, payee) == [-10, 0]
+
+
+def test_mint_burn_and_bad_arguments(cur):
+    user = profile(cur, coins=10)
+    minted = call(cur, "transfer_coins", **{"from": None, "to": user}, amount=50, type="purchase")
+    burned = call(cur, "transfer_coins", **{"from": user, "to": None}, amount=20, type="purchase")
+
+    assert minted == {"amount": 50, "from_balance": None, "to_balance": 60}
+    assert burned == {"amount": 20, "from_balance": 40, "to_balance": None}
+    fails(cur, "invalid_amount", "transfer_coins", **{"from": user, "to": None}, amount=-1, type="purchase")
+    fails(cur, "profile_not_found", "transfer_coins", **{"from": user, "to": str(uuid.uuid4())}, amount=1,
+          type="purchase")
+
+
+def test_wallets_are_locked_in_id_order(committed):
+    low, high = sorted([profile(committed, coins=100), profile(committed, coins=100)])
+    holder = psycopg2.connect(DSN)
+    payer = psycopg2.connect(DSN)
+    try:
+        # Hold the higher id; a transfer from it must take the lower id first and then wait
+        holder.cursor().execute("SELECT 1 FROM profiles WHERE id = %s FOR UPDATE", (high,))
+        thread = threading.Thread(target=lambda: (transfer(payer.cursor(), high, low, 10, "require"), payer.commit()))
+        thread.start()
+        blocked(committed, payer.get_backend_pid())
+
+        with pytest.raises(psycopg2.errors.LockNotAvailable):
+            holder.cursor().execute("SELECT 1 FROM profiles WHERE id = %s FOR UPDATE NOWAIT", (low,))
+        holder.rollback()
+        thread.join(5)
+        assert coins(committed, low, high) == [110, 90]
+    finally:
+        holder.close()
+        payer.close()
+
+
+def test_opposite_concurrent_transfers_never_deadlock(committed):
+    a, b = profile(committed, coins=1000), profile(committed, coins=1000)
+    errors = []
+
+    def shuttle(payer, payee):
+        conn = psycopg2.connect(DSN)
+        conn.autocommit = True
+        try:
+            for _ in range(100):
+                transfer(conn.cursor(), payer, payee, 1, "require")
+        except psycopg2.Error as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=shuttle, args=pair) for pair in [(a, b), (b, a)] * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert coins(committed, a, b) == [1000, 1000]
+
+
+# ---- Balance snapshots (db_balance_migration.sql) ----
+
+def entry(cur, user, amount, minutes_ago):
+    cur.execute(
+        "INSERT INTO transactions (user_id, amount, type, created_at) "
+        "VALUES (%s, %s, 'purchase', NOW() - make_interval(mins => %s))",
+        (user, amount, minutes_ago),
+    )
+
+
+def test_balance_is_the_snapshot_plus_the_newer_entries(cur):
+    cur.execute("DELETE FROM balance_snapshots")   # a clean cut for this transaction only
+    user = profile(cur)
+    entry(cur, user, 50, 60)
+    entry(cur, user, -20, 30)
+
+    assert call(cur, "refresh_balance_snapshots", lag="10 minutes") >= 1
+    entry(cur, user, 5, 1)
+    balance = call(cur, "coin_balance", user=user)
+    assert (balance["balance"], balance["snapshot_balance"], balance["delta"], balance["delta_count"]) == (35, 30, 5, 1)
+
+    # The next refresh only adds what came after the previous cut
+    cur.execute("UPDATE transactions SET amount = 1000 WHERE user_id = %s AND amount = 50", (user,))
+    call(cur, "refresh_balance_snapshots", lag="0 seconds")
+    cur.execute("SELECT balance FROM balance_snapshots WHERE user_id = %s", (user,))
+    assert cur.fetchone() == (35,)
+    assert call(cur, "coin_balance", user=str(uuid.uuid4())) is None
+
+
+def test_reconciliation_reports_and_repairs_drift(cur):
+    cur.execute("DELETE FROM balance_snapshots")
+    user = profile(cur, coins=100)   # the wallet says 100, the ledger 30
+    entry(cur, user, 50, 60)
+    entry(cur, user, -20, 30)
+    call(cur, "refresh_balance_snapshots", lag="0 seconds")
+    cur.execute("UPDATE balance_snapshots SET balance = 999 WHERE user_id = %s", (user,))
+
+    cur.execute("SELECT * FROM ledger_balances(NULL, 100000) WHERE user_id = %s", (user,))
+    assert cur.fetchone()[1:] == (100, 30, 999)
+    cur.execute("SELECT COUNT(*) FROM ledger_balances(%s, 100000) WHERE user_id <= %s", (user, user))
+    assert cur.fetchone() == (0,)   # chunks continue strictly after p_after
+
+    assert call(cur, "repair_balance", user=user) == {"wallet_before": 100, "ledger_balance": 30}
+    cur.execute("SELECT * FROM ledger_balances(NULL, 100000) WHERE user_id = %s", (user,))
+    assert cur.fetchone()[1:] == (30, 30, 30)
+    fails(cur, "profile_not_found", "repair_balance", user=str(uuid.uuid4()))
+
+
+# ---- Batch completion (db_batch_complete_migration.sql) ----
+
+def pickup(cur, donor, partner, kg, scrap_type="iron", status="accepted"):
+    cur.execute(
+        "INSERT INTO scrap_requests (user_id, partner_id, scrap_type, weight_kg, status) "
+        "VALUES (%s, %s, %s, %s, %s) RETURNING id::TEXT",
+        (donor, partner, scrap_type, kg, status),
+    )
+    return cur.fetchone()[0]
+
+
+def test_batch_complete_pays_donors_stocks_the_dealer_and_skips_the_rest(cur):
+    dealer, donor, other = profile(cur, "dealer", 500), profile(cur), profile(cur, "dealer")
+    ids = [pickup(cur, donor, dealer, 2), pickup(cur, donor, dealer, 3, "copper"), pickup(cur, donor, dealer, 1)]
+    others = [pickup(cur, donor, other, 1), pickup(cur, donor, dealer, 1, status="pending")]
+
+    result = call(cur, "complete_scrap_requests", partner=dealer, ids=ids + others)
+
+    earned = sum(c["coins_awarded"] for c in result["completed"])
+    assert sorted(c["id"] for c in result["completed"]) == sorted(ids)
+    assert sorted(result["skipped"]) == sorted(others)
+    assert result["balances"] == {dealer: 500 - earned, donor: earned}
+    assert coins(cur, dealer, donor) == [500 - earned, earned]
+    assert {row["scrap_type"]: float(row["quantity_kg"]) for row in result["inventory"]} == {"iron": 3, "copper": 3}
+    assert [len(ledger(cur, id)) for id in ids] == [2, 2, 2]
+
+
+def test_batch_complete_nets_a_partner_who_donated_one_of_the_requests(cur):
+    dealer, donor = profile(cur, "dealer", 500), profile(cur)
+    own, theirs = pickup(cur, dealer, dealer, 2), pickup(cur, donor, dealer, 3)
+
+    result = call(cur, "complete_scrap_requests", partner=dealer, ids=[own, theirs])
+
+    awarded = {c["id"]: c["coins_awarded"] for c in result["completed"]}
+    # The dealer pays itself for its own pickup: only the other donor's coins leave its wallet
+    assert coins(cur, dealer, donor) == [500 - awarded[theirs], awarded[theirs]]
+    assert result["balances"] == {dealer: 500 - awarded[theirs], donor: awarded[theirs]}
+    assert [amount for _, amount, _, _ in ledger(cur, own)] == [-awarded[own], awarded[own]]
+
+
+# ---- Stock and reservations (db_stock_reservation_migration.sql) ----
+
+def product(cur, artist, stock, price=10):
+    cur.execute(
+        "INSERT INTO products (artist_id, name, price_coins, stock_quantity, is_available) "
+        "VALUES (%s, 'Lamp', %s, %s, %s) RETURNING id::TEXT",
+        (artist, price, stock, stock > 0),
+    )
+    return cur.fetchone()[0]
+
+
+def stock_of(cur, id):
+    cur.execute("SELECT stock_quantity, is_available FROM products WHERE id = %s", (id,))
+    return cur.fetchone()
+
+
+def test_purchase_takes_stock_and_pays_or_changes_nothing(cur):
+    artist, buyer = profile(cur, "artist"), profile(cur, coins=25)
+    lamp = product(cur, artist, 3)
+
+    bought = call(cur, "purchase_product", product=lamp, buyer=buyer, quantity=2)
+    assert (bought["total_paid"], bought["remaining_stock"]) == (20, 1)
+    assert coins(cur, buyer, artist) == [5, 20]
+    assert [amount for _, amount, _, _ in ledger(cur, lamp)] == [-20, 20]
+
+    fails(cur, "insufficient_coins", "purchase_product", product=lamp, buyer=buyer, quantity=1)
+    error = fails(cur, "out_of_stock", "purchase_product", product=lamp, buyer=buyer, quantity=2)
+    assert error.diag.message_detail.replace(" ", "") == '{"available":1,"requested":2}'
+    assert stock_of(cur, lamp) == (1, True)
+
+    free = call(cur, "purchase_product", product=lamp, buyer=buyer, quantity=1, pay_with_coins=False)
+    assert (free["total_paid"], free["remaining_stock"]) == (10, 0)
+    assert stock_of(cur, lamp) == (0, False)
+    assert coins(cur, buyer) == [5]
+    fails(cur, "product_not_found", "purchase_product", product=str(uuid.uuid4()), buyer=buyer, quantity=1)
+
+
+def test_reservations_hold_release_expire_and_are_consumed_once(cur):
+    artist, buyer, other = profile(cur, "artist"), profile(cur, coins=100), profile(cur, coins=100)
+    lamp = product(cur, artist, 5)
+
+    held = call(cur, "reserve_stock", product=lamp, buyer=buyer, quantity=2, ttl_seconds=600)
+    assert held["remaining_stock"] == 3
+    fails(cur, "reservation_not_found", "purchase_product", product=lamp, buyer=other, quantity=1,
+          reservation=held["reservation_id"])
+    assert call(cur, "release_stock_reservation", reservation=held["reservation_id"], buyer=other) is False
+    assert call(cur, "purchase_product", product=lamp, buyer=buyer, quantity=99,
+                reservation=held["reservation_id"])["quantity"] == 2
+    fails(cur, "reservation_not_found", "purchase_product", product=lamp, buyer=buyer, quantity=1,
+          reservation=held["reservation_id"])
+
+    released = call(cur, "reserve_stock", product=lamp, buyer=buyer, quantity=1, ttl_seconds=600)
+    assert call(cur, "release_stock_reservation", reservation=released["reservation_id"], buyer=buyer) is True
+    assert call(cur, "release_stock_reservation", reservation=released["reservation_id"], buyer=buyer) is False
+
+    call(cur, "reserve_stock", product=lamp, buyer=buyer, quantity=3, ttl_seconds=0)   # expired at once
+    assert stock_of(cur, lamp) == (0, False)
+    assert call(cur, "release_expired_reservations", product=lamp) == 1
+    assert stock_of(cur, lamp) == (3, True)
+    assert coins(cur, buyer, artist) == [80, 20]
+
+
+def test_concurrent_buyers_never_oversell(committed):
+    artist = profile(committed, "artist")
+    buyers = [profile(committed, coins=100) for _ in range(200)]
+    lamp = product(committed, artist, 25)
+    outcomes = []
+
+    def buy(chunk):
+        conn = psycopg2.connect(DSN)
+        conn.autocommit = True
+        try:
+            for buyer in chunk:
+                try:
+                    call(conn.cursor(), "purchase_product", product=lamp, buyer=buyer, quantity=1)
+                    outcomes.append("sold")
+                except psycopg2.Error as e:
+                    outcomes.append(e.diag.message_primary)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=buy, args=(buyers[i::20],)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(set(outcomes)) == ["out_of_stock", "sold"] and outcomes.count("sold") == 25
+    assert stock_of(committed, lamp) == (0, False)
+    assert coins(committed, artist) == [250]
+    committed.execute("SELECT COUNT(*) FROM transactions WHERE reference_id = %s AND amount < 0", (lamp,))
+    assert committed.fetchone() == (25,)
+
+
+# ---- Pickup claims (db_claim_migration.sql) ----
+
+def test_claim_accepts_a_pending_request_or_says_why_not(cur):
+    donor, dealer, poor = profile(cur), profile(cur, "dealer", 100), profile(cur, "artist", 10)
+    request = pickup(cur, donor, None, 2, status="pending")   # costs 2 * 30 = 60 coins
+
+    error = fails(cur, "insufficient_coins", "claim_scrap_request", request=request, partner=poor)
+    assert error.diag.message_detail.replace(" ", "") == '{"balance":10,"needed":60}'
+    fails(cur, "not_a_partner", "claim_scrap_request", request=request, partner=donor)
+    fails(cur, "request_not_found", "claim_scrap_request", request=str(uuid.uuid4()), partner=dealer)
+
+    cur.execute("SELECT * FROM claim_scrap_request(%s, %s)", (request, dealer))
+    columns = [c.name for c in cur.description]
+    claimed = dict(zip(columns, cur.fetchone()))
+    assert (str(claimed["partner_id"]), claimed["status"]) == (dealer, "accepted")
+
+    error = fails(cur, "already_claimed", "claim_scrap_request", request=request, partner=dealer)
+    assert error.diag.message_detail.replace(" ", "") == '{"status":"accepted"}'
+    assert coins(cur, dealer) == [100]   # claiming moves no coins
+
+
+def test_exactly_one_of_many_racing_partners_wins(committed):
+    donor = profile(committed)
+    partners = [profile(committed, "dealer", 1000) for _ in range(100)]
+    request = pickup(committed, donor, None, 2, status="pending")
+    outcomes = []
+    start = threading.Barrier(20)
+
+    def claim(chunk):
+        conn = psycopg2.connect(DSN)
+        conn.autocommit = True
+        try:
+            start.wait()
+            for partner in chunk:
+                try:
+                    call(conn.cursor(), "claim_scrap_request", request=request, partner=partner)
+                    outcomes.append(partner)
+                except psycopg2.Error as e:
+                    outcomes.append(e.diag.message_primary)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=claim, args=(partners[i::20],)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [o for o in outcomes if o != "already_claimed"]
+    assert len(outcomes) == 100 and len(winners) == 1
+    committed.execute("SELECT partner_id::TEXT, status FROM scrap_requests WHERE id = %s", (request,))
+    assert committed.fetchone() == (winners[0], "accepted")
+
+
+# ---- Proximity (db_geo_pushdown_migration.sql) ----
+
+def located(cur, donor, lat, lon, minutes_ago=0, status="pending"):
+    cur.execute(
+        "INSERT INTO scrap_requests (user_id, scrap_type, weight_kg, status, latitude, longitude, created_at) "
+        "VALUES (%s, 'iron', 1, %s, %s, %s, NOW() - make_interval(mins => %s)) RETURNING id::TEXT",
+        (donor, status, lat, lon, minutes_ago),
+    )
+    return cur.fetchone()[0]
+
+
+def test_nearby_requests_follow_the_decaying_radius(cur):
+    from services.geo import haversine_distance
+
+    donor = profile(cur)
+    lat, lon = 12.9716, 77.5946
+    near = located(cur, donor, lat + 0.009, lon, minutes_ago=1)             # ~1 km, inside 5 km
+    waiting = located(cur, donor, lat + 0.18, lon, minutes_ago=60)          # ~20 km, radius grew to 35 km
+    fresh_far = located(cur, donor, lat + 0.18, lon)                        # ~20 km, radius still 5 km
+    too_far = located(cur, donor, lat + 0.9, lon, minutes_ago=600)          # ~100 km, past the 50 km cap
+    unlocated = located(cur, donor, None, None, minutes_ago=2)
+    taken = located(cur, donor, lat, lon, status="accepted")
+    ours = {near, waiting, fresh_far, too_far, unlocated, taken}
+
+    rows = [r for r in call(cur, "nearby_pending_requests", lat=lat, lon=lon) if r["id"] in ours]
+
+    assert [r["id"] for r in rows] == [near, unlocated, waiting]   # newest first
+    assert rows[0]["distance_km"] == round(haversine_distance(lat, lon, lat + 0.009, lon), 1)
+    assert "distance_km" not in rows[1] and rows[0]["profiles"]["name"] == "user"
+    everywhere = [r["id"] for r in call(cur, "nearby_pending_requests", lat=None, lon=None) if r["id"] in ours]
+    assert sorted(everywhere) == sorted(ours - {taken})
+
+
+def test_nearby_box_wraps_the_antimeridian(cur):
+    donor = profile(cur)
+    east = located(cur, donor, 0.5, -179.95, minutes_ago=30)   # ~11 km across the date line
+    rows = call(cur, "nearby_pending_requests", lat=0.5, lon=179.95)
+    assert [r["distance_km"] for r in rows if r["id"] == east] == [11.1]
+
+
+# ---- Outbox (db_outbox_migration.sql) ----
+
+def drain(cur, max_attempts=3):
+    return call(cur, "drain_outbox", limit=100, max_attempts=max_attempts, retry_seconds=0)
+
+
+def test_completion_queues_its_payout_and_the_worker_applies_it_once(cur):
+    dealer, donor = profile(cur, "dealer", 500), profile(cur, coins=10)
+    request = pickup(cur, donor, dealer, 2.5)   # 2.5 * 30 = 75 coins
+
+    completed = call(cur, "complete_scrap_request", request=request, partner=dealer)
+    assert (completed["coins_awarded"], completed["new_balance"]) == (75, 85)
+    assert coins(cur, dealer, donor) == [500, 10]   # queued, not paid
+    fails(cur, "request_not_found", "complete_scrap_request", request=request, partner=dealer)
+
+    report = drain(cur)
+    event, = [e for e in report["events"] if e["id"] == completed["event_id"]]
+    assert (event["status"], event["result"]["inventory"]["quantity_kg"]) == ("done", 2.5)
+    assert coins(cur, dealer, donor) == [425, 85]
+    assert [amount for _, amount, _, _ in ledger(cur, request)] == [-75, 75]
+    assert not [e for e in drain(cur)["events"] if e["id"] == completed["event_id"]]
+
+
+def test_fulfillment_takes_what_is_needed_and_queues_what_the_industry_can_pay(cur):
+    dealer, industry = profile(cur, "dealer"), profile(cur, "industry", 50)
+    call(cur, "add_dealer_inventory", dealer=dealer, scrap_type="iron", kg=30)
+    cur.execute(
+        "INSERT INTO industry_requirements (industry_id, scrap_type, required_kg, price_per_kg) "
+        "VALUES (%s, 'iron', 10, 8) RETURNING id::TEXT", (industry,),
+    )
+    requirement = cur.fetchone()[0]
+
+    error = fails(cur, "insufficient_inventory", "record_fulfillment", requirement=requirement, dealer=industry, kg=1)
+    assert error.diag.message_detail.replace(" ", "") == '{"available":null,"needed":1,"scrap_type":"iron"}'
+    fails(cur, "invalid_quantity", "record_fulfillment", requirement=requirement, dealer=dealer, kg=0)
+
+    supplied = call(cur, "record_fulfillment", requirement=requirement, dealer=dealer, kg=12)
+    assert (supplied["quantity_kg"], supplied["status"], float(supplied["inventory"]["quantity_kg"])) == (10, "closed", 20)
+    assert (supplied["coins_due"], supplied["coins_earned"], supplied["coins_pending"]) == (80, 50, 30)
+    fails(cur, "requirement_closed", "record_fulfillment", requirement=requirement, dealer=dealer, kg=1)
+
+    drain(cur)
+    assert coins(cur, industry, dealer) == [0, 50]
+
+
+def test_failing_events_are_retried_dead_lettered_and_requeued(cur):
+    dealer = profile(cur, "artist", 100)
+    cur.execute(
+        "INSERT INTO outbox_events (kind, idempotency_key, payload) VALUES "
+        "('pickup_completed', %s, jsonb_build_object('partner_id', %s::TEXT, 'user_id', gen_random_uuid(), "
+        "'request_id', gen_random_uuid(), 'coins', 10, 'weight_kg', 1, 'scrap_type', 'iron')) RETURNING id",
+        (f"test:{uuid.uuid4()}", dealer),
+    )
+    id = cur.fetchone()[0]
+
+    def attempt():
+        event, = [e for e in drain(cur, max_attempts=2)["events"] if e["id"] == id]
+        return event["status"], event["attempts"]
+
+    assert attempt() == ("retry", 1)
+    assert attempt() == ("dead", 2)
+    cur.execute("SELECT status, last_error FROM outbox_events WHERE id = %s", (id,))
+    status, error = cur.fetchone()
+    assert status == "dead" and error.startswith("profile_not_found")
+    assert coins(cur, dealer) == [100]   # each failed attempt was rolled back
+
+    assert call(cur, "requeue_outbox_events", ids=[id]) == 1
+    assert attempt() == ("retry", 1)
+
+
+# ---- Rollups (db_rollup_migration.sql) ----
+
+def rollups(cur, *subjects, day=None):
+    """{subject: {(metric, scrap_type): value}} from rollup_totals, or from `day` in rollup_daily."""
+    if day is None:
+        cur.execute("SELECT subject_id::TEXT, metric, scrap_type, value FROM rollup_totals "
+                    "WHERE subject_id = ANY(%s::UUID[])", (list(subjects),))
+    else:
+        cur.execute("SELECT subject_id::TEXT, metric, scrap_type, value FROM rollup_daily "
+                    "WHERE subject_id = ANY(%s::UUID[]) AND day = %s", (list(subjects), day))
+    found = {subject: {} for subject in subjects}
+    for subject, metric, scrap_type, value in cur.fetchall():
+        found[subject][metric, scrap_type] = float(value)
+    return found
+
+
+def activity(cur):
+    """A donor, a dealer, an industry and an artist, doing one of everything the triggers count."""
+    donor, dealer = profile(cur, coins=100), profile(cur, "dealer", 1000)
+    industry, artist = profile(cur, "industry", 1000), profile(cur, "artist")
+    call(cur, "complete_scrap_request", request=pickup(cur, donor, dealer, 2.5), partner=dealer)
+    call(cur, "complete_scrap_requests", partner=dealer, ids=[pickup(cur, donor, dealer, 2.5)])
+    drain(cur)   # pays the first pickup and stocks its 2.5 kg
+    cur.execute(
+        "INSERT INTO industry_requirements (industry_id, scrap_type, required_kg, price_per_kg) "
+        "VALUES (%s, 'iron', 100, 8) RETURNING id::TEXT", (industry,),
+    )
+    call(cur, "record_fulfillment", requirement=cur.fetchone()[0], dealer=dealer, kg=3)
+    drain(cur)
+    call(cur, "purchase_product", product=product(cur, artist, 5), buyer=donor, quantity=2)
+    cur.execute("SELECT transfer_coins(NULL, %s, 50, 'purchase')", (donor,))
+    return donor, dealer, industry, artist
+
+
+def test_triggers_count_pickups_fulfillments_and_coins_as_they_happen(cur):
+    donor, dealer, industry, artist = activity(cur)
+
+    totals = rollups(cur, donor, dealer, industry, artist)
+    assert totals[donor] == {
+        ("donated_kg", "iron"): 5, ("donations", "iron"): 2, ("coins_earned", "iron"): 150,
+        ("purchases", ""): 1, ("coins_spent", ""): 20, ("coins_bought", ""): 50,
+    }
+    assert totals[dealer] == {
+        ("collected_kg", "iron"): 5, ("pickups", "iron"): 2, ("coins_spent", "iron"): 150,
+        ("supplied_kg", "iron"): 3, ("fulfillments", "iron"): 1, ("coins_earned", "iron"): 24,
+    }
+    assert totals[industry] == {("received_kg", "iron"): 3, ("fulfillments", "iron"): 1, ("coins_spent", "iron"): 24}
+    assert totals[artist] == {("sales", ""): 1, ("coins_earned", ""): 20}
+
+    cur.execute("SELECT (NOW() AT TIME ZONE 'UTC')::DATE")
+    assert rollups(cur, donor, dealer, industry, artist, day=cur.fetchone()[0]) == totals
+
+
+def test_rebuild_matches_the_triggers_and_backfills_older_history(cur):
+    donor, dealer, industry, artist = activity(cur)
+    before = rollups(cur, donor, dealer, industry, artist)
+    # Completed before the triggers existed: only a rebuild counts it, on the day it happened
+    cur.execute(
+        "INSERT INTO scrap_requests (user_id, partner_id, scrap_type, weight_kg, status, updated_at) "
+        "VALUES (%s, %s, 'copper', 4, 'completed', NOW() - INTERVAL '3 days')",
+        (donor, dealer),
+    )
+
+    rebuilt = call(cur, "rebuild_rollups")
+    cur.execute("SELECT COUNT(*), COUNT(DISTINCT subject_id) FROM rollup_totals")
+    assert (rebuilt["total_rows"], rebuilt["profiles"]) == cur.fetchone()
+
+    after = rollups(cur, donor, dealer, industry, artist)
+    before[donor].update({("donated_kg", "copper"): 4, ("donations", "copper"): 1})
+    before[dealer].update({("collected_kg", "copper"): 4, ("pickups", "copper"): 1})
+    assert after == before
+    cur.execute("SELECT ((NOW() - INTERVAL '3 days') AT TIME ZONE 'UTC')::DATE")
+    assert rollups(cur, donor, dealer, day=cur.fetchone()[0]) == {
+        donor: {("donated_kg", "copper"): 4, ("donations", "copper"): 1},
+        dealer: {("collected_kg", "copper"): 4, ("pickups", "copper"): 1},
+    }
@@ -0,0 +1,174 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.postgrest_standin import PostgrestStandIn, RPCError, client_for
+from benchmarks.standin_functions import FUNCTIONS
+from main import app
+from services import metrics, retry
+from services.auth import Session, get_session
+from services.response_cache import listing_cache
+from services.stock import reservation_sweep_loop
+
+
+def seeded(stock_quantity, buyers, coins=100, latency=0.0, rpc=FUNCTIONS):
+    return PostgrestStandIn(tables={
+        "profiles": [{"id": "artist", "name": "A", "role": "artist", "scrap_coins": 0}]
+        + [{"id": f"b{i}", "name": f"B{i}", "role": "user", "scrap_coins": coins} for i in range(buyers)],
+        "products": [{"id": "p1", "artist_id": "artist", "name": "Lamp", "price_coins": 10,
+                      "stock_quantity": stock_quantity, "is_available": True}],
+    }, rpc=rpc, latency=latency)
+
+
+def call(api, standin, *requests, concurrent=False):
+    async def run():
+        async with api(standin) as client:
+            if concurrent:
+                return await asyncio.gather(*(client.request(m, url, **kw) for m, url, kw in requests))
+            return [await client.request(m, url, **kw) for m, url, kw in requests]
+
+    return asyncio.run(run())
+
+
+def purchase(buyer, quantity=1, **extra):
+    return ("POST", "/products/p1/purchase", {"json": {"buyer_id": buyer, "quantity": quantity, **extra}})
+
+
+def test_concurrent_buyers_never_oversell(api):
+    standin = seeded(stock_quantity=25, buyers=200, latency=0.001)
+
+    responses = call(api, standin, *(purchase(f"b{i}") for i in range(200)), concurrent=True)
+
+    sold = [r for r in responses if r.status_code == 200]
+    assert len(sold) == 25
+    assert {r.json()["detail"] for r in responses if r.status_code != 200} == {"Product is out of stock"}
+    product = standin.tables["products"][0]
+    assert product["stock_quantity"] == 0 and product["is_available"] is False
+    assert standin.tables["profiles"][0]["scrap_coins"] == 250
+    assert len([t for t in standin.tables["transactions"] if t["amount"] < 0]) == 25
+    assert standin.requests == 200   # one round-trip per purchase
+
+
+def test_failed_payment_leaves_stock_untouched(api):
+    standin = seeded(stock_quantity=3, buyers=1, coins=15)
+
+    short, partial = call(api, standin, purchase("b0", 2), purchase("b0", 5))
+
+    assert short.status_code == 400 and short.json()["detail"] == "Insufficient coins. You have 15 but need 20."
+    assert partial.json()["detail"] == "Only 3 units available. You requested 5."
+    assert standin.tables["products"][0]["stock_quantity"] == 3
+    assert "transactions" not in standin.tables
+
+
+def test_paying_outside_coins_takes_stock_and_reports_the_price(api):
+    standin = seeded(stock_quantity=3, buyers=1, coins=0)
+
+    bought, = call(api, standin, purchase("b0", 2, pay_with_coins=False))
+
+    assert bought.json() == {"message": "Purchased 2× Lamp!", "total_paid": 20, "remaining_stock": 1}
+    assert "transactions" not in standin.tables
+
+
+def test_reservation_is_held_then_consumed_once(api):
+    standin = seeded(stock_quantity=2, buyers=2)
+
+    reserved, = call(api, standin, ("POST", "/products/p1/reserve", {"json": {"buyer_id": "b0", "quantity": 2}}))
+    reservation_id = reserved.json()["reservation_id"]
+    assert reserved.json()["remaining_stock"] == 0
+
+    stolen, other, bought, reused = call(api, 
+        standin,
+        purchase("b1"),
+        purchase("b1", reservation_id=reservation_id),
+        purchase("b0", quantity=1, reservation_id=reservation_id),
+        purchase("b0", reservation_id=reservation_id),
+    )
+
+    assert stolen.json()["detail"] == "Product is out of stock"
+    assert other.json()["detail"] == "Reservation not found, expired or already used"
+    assert bought.status_code == 200
+    assert bought.json() == {"message": "Purchased 2× Lamp!", "total_paid": 20, "remaining_stock": 0}
+    assert reused.status_code == 400
+
+
+def test_released_and_expired_reservations_return_stock(api):
+    standin = seeded(stock_quantity=3, buyers=1)
+
+    first, second = call(api, 
+        standin,
+        ("POST", "/products/p1/reserve", {"json": {"buyer_id": "b0", "quantity": 1}}),
+        ("POST", "/products/p1/reserve", {"json": {"buyer_id": "b0", "quantity": 2}}),
+    )
+    assert standin.tables["products"][0]["stock_quantity"] == 0
+
+    released, again = call(api, 
+        standin,
+        ("DELETE", f"/products/reservations/{first.json()['reservation_id']}", {"params": {"buyer_id": "b0"}}),
+        ("DELETE", f"/products/reservations/{first.json()['reservation_id']}", {"params": {"buyer_id": "b0"}}),
+    )
+    assert released.status_code == 200 and again.status_code == 404
+    assert standin.tables["products"][0]["stock_quantity"] == 1
+
+    held = next(r for r in standin.tables["stock_reservations"] if r["id"] == second.json()["reservation_id"])
+    held["expires_at"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    late, bought = call(api, 
+        standin,
+        purchase("b0", reservation_id=held["id"]),
+        purchase("b0", quantity=3),   # sees the expired hold's units again
+    )
+    assert late.status_code == 400
+    assert bought.status_code == 200 and bought.json()["remaining_stock"] == 0
+    assert held["status"] == "expired"
+
+
+def test_only_the_buyer_can_release_a_reservation(api):
+    standin = seeded(stock_quantity=3, buyers=2)
+    held, = call(api, standin, ("POST", "/products/p1/reserve", {"json": {"buyer_id": "b0", "quantity": 2}}))
+    url = f"/products/reservations/{held.json()['reservation_id']}"
+
+    app.dependency_overrides[get_session] = lambda: Session(user_id="b1", role="user", claims={})
+    as_b0, as_b1 = call(api, standin, ("DELETE", url, {"params": {"buyer_id": "b0"}}),
+                        ("DELETE", url, {"params": {"buyer_id": "b1"}}))
+
+    assert as_b0.status_code == 403   # b1's token
+    assert as_b1.status_code == 404   # b1 holds no such reservation
+    assert standin.tables["products"][0]["stock_quantity"] == 1
+    assert standin.tables["stock_reservations"][0]["status"] == "held"
+
+
+def test_sweep_returns_expired_stock_and_refreshes_listings(api):
+    standin = seeded(stock_quantity=3, buyers=1)
+    held, = call(api, standin, ("POST", "/products/p1/reserve", {"json": {"buyer_id": "b0", "quantity": 2}}))
+    standin.tables["stock_reservations"][0]["expires_at"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    version = listing_cache.version("products")
+
+    async def sweep():
+        task = asyncio.create_task(reservation_sweep_loop(client_for(standin), 0))
+        for _ in range(1000):
+            if listing_cache.version("products") != version:
+                break
+            await asyncio.sleep(0.001)
+        task.cancel()
+
+    asyncio.run(sweep())
+    assert standin.tables["products"][0]["stock_quantity"] == 3
+    assert listing_cache.version("products") != version
+
+
+def test_serialization_failures_are_retried(api, monkeypatch):
+    monkeypatch.setattr(retry, "DB_RETRY_BASE_SECONDS", 0)
+    retried = metrics.db_retries.value("purchase_product", "40001")
+    failures = []
+
+    def flaky(standin, params):
+        if len(failures) < 2:
+            failures.append(params)
+            raise RPCError("could not serialize access", code="40001")
+        return FUNCTIONS["purchase_product"](standin, params)
+
+    standin = seeded(stock_quantity=1, buyers=1, rpc={**FUNCTIONS, "purchase_product": flaky})
+
+    bought, = call(api, standin, purchase("b0"))
+
+    assert bought.status_code == 200 and len(failures) == 2
+    assert metrics.db_retries.value("purchase_product", "40001") - retried == 2
+    assert standin.tables["products"][0]["stock_quantity"] == 0